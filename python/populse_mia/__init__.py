@@ -27,6 +27,7 @@ Contains:
       - user_interface
       - utils
       - info
+      - ingest
       - main
       - software_properties
       - test
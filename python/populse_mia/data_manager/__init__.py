@@ -4,11 +4,21 @@
 
 Contains:
     Module:
+      - autosave
       - data_loader
       - database_mia
+      - database_writer
       - filter
+      - fingerprint
+      - import_journal
+      - index_advisor
       - project
       - project_properties
+      - search_index
+      - snapshot
+      - tag_schema
+      - undo_journal
+      - unit_of_work
 
 """
 
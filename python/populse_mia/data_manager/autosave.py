@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*- #
+"""Module that contains the auto-save of the projects
+
+When the auto-save mode is enabled, the modifications of a project are not
+saved each time they are made: the first modification starts a window (see
+Config.get_auto_save_delay) during which the following ones are gathered,
+and the project is saved once at its end. The files of the project (the
+properties file, only if the properties have changed, and the query log)
+are written by a worker thread, from a copy of their content.
+
+The database session is committed by the thread that owns it, the writer
+thread (see DatabaseWriter), but only once per window. The GUI does not wait
+for the commit: the worker writing the files is started when it is done.
+
+Contains:
+    Class:
+        -AutoSave : Debounced saving of a project
+        -AutoSaveWorker : Inherit from QThread and write the files of a
+        project
+
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import concurrent.futures
+
+# PyQt5 imports
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
+
+# Populse_MIA imports
+from populse_mia.software_properties import Config
+
+
+class AutoSave(QObject):
+    """Debounced saving of a project.
+
+    :param project: current project in the software
+    :param delay: time during which the modifications are gathered, in
+       milliseconds (the auto_save_delay config entry if None)
+
+    .. Methods:
+        - cancel: forgets the pending save
+        - flush: saves the project now if a save is pending
+        - save: saves the project
+        - schedule: schedules a save of the project
+        - wait: waits for the last save to be committed and written
+        - write_files: starts the worker writing the files of a save
+    """
+
+    # Emitted by the writer thread with the future of a commit, once done
+    committed = pyqtSignal(object)
+
+    def __init__(self, project, delay=None):
+        """Initialization of the AutoSave class.
+
+        :param project: current project in the software
+        :param delay: time during which the modifications are gathered
+        """
+
+        super().__init__()
+        self.project = project
+        self.delay = delay
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.save)
+        self.committed.connect(self.write_files)
+        # Future of the commit of the last save, with the properties to
+        # write, until its files are written
+        self.pending = None
+        self.worker = None
+
+    def cancel(self):
+        """Forget the pending save, and wait for the last save to be
+        committed and written (before the project is saved or rolled
+        back)."""
+
+        self.timer.stop()
+        self.wait()
+
+    def flush(self):
+        """Save the project now if a save is pending, and wait for it to be
+        committed and written."""
+
+        if self.timer.isActive():
+            self.timer.stop()
+            self.save()
+        self.wait()
+
+    def save(self):
+        """Save the project: commit the session and write its files in a
+        worker thread.
+
+        The indexes of the tags (see IndexAdvisor) are only updated by the
+        saves made by the user.
+        """
+
+        # The modifications of a unit of work are saved at its end
+        if self.project.current_unit is not None:
+            self.schedule()
+            return
+
+        # The query log is modified by the writer thread: it is copied
+        # right after the commit
+        future = self.project.session.submit(
+            [("save_modifications", ()),
+             (self.project.query_log.get_state, ())])
+        self.pending = (future, self.project.properties_changes())
+        future.add_done_callback(self.committed.emit)
+        self.project.unsavedModifications = False
+
+    def schedule(self):
+        """Schedule a save of the project at the end of the current window,
+        starting one if there is none."""
+
+        if not self.timer.isActive():
+            delay = self.delay
+            if delay is None:
+                delay = Config().get_auto_save_delay()
+            self.timer.start(delay)
+
+    def wait(self):
+        """Wait for the last save to be committed and for its files to be
+        written."""
+
+        if self.pending is not None:
+            concurrent.futures.wait([self.pending[0]])
+            self.write_files(self.pending[0])
+        if self.worker is not None:
+            self.worker.wait()
+            self.worker = None
+
+    def write_files(self, future):
+        """Start the worker writing the files of a save, once the session
+        is committed.
+
+        :param future: future of the commit of the save
+        """
+
+        # Already written by wait
+        if self.pending is None or self.pending[0] is not future:
+            return
+        properties = self.pending[1]
+        self.pending = None
+
+        try:
+            query_log_state = future.result()[1]
+        except Exception as error:
+            print("\nThe project could not be saved: {0}\n".format(error))
+            self.project.unsavedModifications = True
+            return
+
+        self.worker = AutoSaveWorker(self.project, properties,
+                                     query_log_state, self.worker)
+        self.worker.start()
+
+
+class AutoSaveWorker(QThread):
+    """Write the files of a project from a copy of their content.
+
+    :param project: current project in the software
+    :param properties: properties to write, None if they have not changed
+    :param query_log_state: content of the query log to write (see
+       QueryLog.get_state)
+    :param previous: worker of the previous save, whose files are written
+       first
+
+    .. Methods:
+        - run: Override the QThread run method.
+    """
+
+    def __init__(self, project, properties, query_log_state, previous=None):
+        """Initialization of the AutoSaveWorker class.
+
+        :param project: current project in the software
+        :param properties: properties to write, None if they have not
+           changed
+        :param query_log_state: content of the query log to write
+        :param previous: worker of the previous save
+        """
+
+        super().__init__()
+        self.project = project
+        self.properties = properties
+        self.query_log_state = query_log_state
+        self.previous = previous
+
+    def run(self):
+        """Override the QThread run method. Executed when the worker is
+        started, write the files."""
+
+        # The files written by the previous save come first
+        if self.previous is not None:
+            self.previous.wait()
+            self.previous = None
+
+        if self.properties is not None:
+            self.project.saveConfig(self.properties)
+        self.project.query_log.save(self.query_log_state)
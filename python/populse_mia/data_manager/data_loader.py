@@ -6,9 +6,31 @@ Contains:
         -ImportProgress : Inherit from QProgressDialog and handle the
         progress bar
         -ImportWorker : Inherit from QThread and manage the threads
+        -ScansImporter : Import the exported scans in a project, without
+        using Qt
+        -StreamingImportProgress : Inherit from QProgressDialog and handle
+        the progress of an import made during the conversion
+        -StreamingImportWorker : Inherit from QThread and import the scans
+        while MRIFileManager is converting them
+        -VerifyWorker : Inherit from QThread and check the project's scans
+        in the background
     Methods:
+        -check_scans : Check if scans have been modified, on a pool of
+        threads
+        -init_worker_registry : Initialize the tag schema registry of a
+        worker process
         -read_log : Show the evolution of the progress bar and returns its
         feedback
+        -read_scan : Returns the checksum and the tags of an exported scan
+        -read_scans : Reads the exported scans, in a pool of processes if
+        several workers are used
+        -read_streaming : Launch MRIFileManager and import the scans while
+        they are converted
+        -scans_to_verify : Returns the scans of a project and their
+        checksums
+        -source_key : Returns the stats of the files of an exported scan
+        -tag_properties : Returns the type, description, unit and value of a
+        Json tag
         -tags_from_file : Returns a list of [tag, value] contained in a Json
         file
         -verify_scans : Check if the project's scans have been modified
@@ -27,11 +49,14 @@ Contains:
 import glob
 import os.path
 import json
-import hashlib  # To generate the md5 of each path
+import subprocess
 import datetime
 from time import time, sleep
 from datetime import datetime
 import threading
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from itertools import repeat
 
 # PyQt5 imports
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
@@ -43,14 +68,24 @@ from populse_mia.data_manager.project import (
     TAG_FILENAME, TYPE_NII)
 from populse_mia.data_manager.database_mia import (TAG_ORIGIN_BUILTIN,
                                                    TAG_ORIGIN_USER)
+from populse_mia.data_manager.fingerprint import (
+    FingerprintIndex, checksum_matches, compute_checksum, parse_checksum,
+    stat_key)
+from populse_mia.data_manager.import_journal import ImportJournal
+from populse_mia.data_manager.tag_schema import (
+    TagSchemaRegistry, convert_value, infer_type, list_shape,
+    split_properties)
+from populse_mia.software_properties import Config
 
-# Populse_db imports
-from populse_db.database import (
-    FIELD_TYPE_STRING, FIELD_TYPE_DATETIME, FIELD_TYPE_DATE,
-    FIELD_TYPE_TIME, FIELD_TYPE_LIST_STRING, FIELD_TYPE_INTEGER,
-    FIELD_TYPE_LIST_INTEGER, FIELD_TYPE_FLOAT, FIELD_TYPE_LIST_FLOAT,
-    FIELD_TYPE_BOOLEAN, FIELD_TYPE_LIST_BOOLEAN, FIELD_TYPE_LIST_DATE,
-    FIELD_TYPE_LIST_DATETIME, FIELD_TYPE_LIST_TIME)
+# List of tags to remove
+TAGS_TO_REMOVE = ["Dataset data file", "Dataset header file"]
+
+# Maximum number of scans written in the database at once during an import
+IMPORT_BATCH_SIZE = 500
+
+# Registry converting the tags in a worker process reading scans (see
+# init_worker_registry)
+_worker_registry = None
 
 
 class ImportProgress(QProgressDialog):
@@ -93,6 +128,9 @@ class ImportProgress(QProgressDialog):
 class ImportWorker(QThread):
     """Manage threads.
 
+    The scans are imported by a ScansImporter, the worker only runs it in a
+    thread and notifies its progress.
+
     :param project: A Project object
     ;param progress: An ImportProgress object
 
@@ -106,287 +144,844 @@ class ImportWorker(QThread):
         super().__init__()
         self.project = project
         self.progress = progress
+        self.importer = ScansImporter(project)
+        self.lock = self.importer.lock
+
+    @property
+    def scans_added(self):
+        """Scans added by the import.
+
+        scans_added should always be accessed through the lock, and copied
+        before releasing the lock, because its value will change inside the
+        thread.
+        """
+
+        return self.importer.scans_added
+
+    def run(self):
+        """Override the QThread run method. Executed when the worker is
+        started, fills the database and updates the progress.
+        """
+
+        def notify_progress(step):
+            self.notifyProgress.emit(step)
+            sleep(0.1)
+
+        statistics = self.importer.run(notify_progress)
+
+        print('\nData export duration in the database:')
+        print("read_log time: " + str(round(statistics["duration"], 2)) +
+              ' s\n')
+
+
+class ScansImporter:
+    """Import the scans exported by MRIFileManager in a project, without
+    using Qt.
+
+    Used by ImportWorker in the software and by the ingest command-line
+    tool. An import can also be done by steps (start, merge_scans and
+    commit for each batch of scans, then finish), so that the scans are
+    added while the conversion is still running.
+
+    :param project: A Project object
+    :param raw_data_folder: folder containing the exported scans and their
+       logExport*.json files (data/raw_data of the project by default)
+    :param workers: number of processes reading the scans (the
+       import_workers config entry by default)
+    :param batch_size: maximum number of scans written in the database at
+       once by run
+    :param save_batches: True to save the database after each batch written
+       by run, so that an interrupted import only has to write the
+       remaining scans when it is resumed
+
+    .. Methods:
+        - commit : Write the merged scans in the database.
+        - export_log : Returns the most recent export log.
+        - exported_file_names : Returns the scans of the most recent export
+          log.
+        - finish : Add the import to the history and returns its statistics.
+        - merge_scans : Merge scans read by read_scan in the pending
+          documents.
+        - read_journaled : Read scans, reusing the ones recorded in the
+          import journal.
+        - read_scans : Read scans with the importer's workers.
+        - remove_scans : Remove scans added by the import.
+        - run : Import the scans of the most recent export log.
+        - start : Initialise a new import.
+    """
+
+    def __init__(self, project, raw_data_folder=None, workers=None,
+                 batch_size=IMPORT_BATCH_SIZE, save_batches=False):
+        self.project = project
+        self.batch_size = max(1, batch_size)
+        self.save_batches = save_batches
+
+        if raw_data_folder is None:
+            raw_data_folder = os.path.relpath(
+                os.path.join(project.folder, 'data', 'raw_data'))
+
+        self.raw_data_folder = raw_data_folder
+        self.workers = workers
         self.lock = threading.RLock()
         # scans_added should always be accessed through the lock, and copied
         # before releasing the lock, because its value will change inside
         # the thread
         self.scans_added = []
+        self.start()
 
-    def run(self):
-        """Override the QThread run method. Executed when the worker is
-        started, fills the database and updates the progress.
+    def commit(self, notify_progress=None):
+        """Write the merged scans in the database.
+
+        :param notify_progress: function called with the step of the import
+           (2: tags added, 3: documents added)
         """
-        begin = time()
 
-        raw_data_folder = os.path.relpath(os.path.join(self.project.folder,
-                                                       'data', 'raw_data'))
+        # Missing values added thanks to default values
+        for tag in self.project.session.get_fields(COLLECTION_CURRENT):
+            if tag.origin == TAG_ORIGIN_USER:
+                for scan in self.new_documents:
+                    if tag.default_value is not None and \
+                            self.project.session.get_value(
+                                COLLECTION_CURRENT, scan[0], tag.name) is None:
+                        # Value added to history
+                        self.values_added.append([scan, tag.name,
+                                                  tag.default_value,
+                                                  tag.default_value])
+                        self.documents[scan][tag.name] = tag.default_value
+
+        self.project.session.add_fields(self.tags_added)
+
+        if notify_progress is not None:
+            notify_progress(2)
+
+        # The scans already in the database are replaced
+        self.project.session.upsert_documents(COLLECTION_CURRENT,
+                                              list(self.documents.values()))
+        self.project.session.upsert_documents(COLLECTION_INITIAL,
+                                              list(self.documents.values()))
+
+        # The new scans won't need to be hashed again when the project is
+        # opened
+        index = FingerprintIndex(self.project.folder)
+        index.set_many(self.fingerprints)
+        index.close()
+
+        self.statistics["bytes"] += sum(
+            key[0] for path, key, checksum in self.fingerprints)
+        self.statistics["scans"] += len(self.documents)
+        self.statistics["tags_added"] += len(self.tags_names_added)
+        self.fields.update(self.tags_names_added)
+
+        self.documents = {}
+        self.new_documents = []
+        self.tags_added = []
+        self.tags_names_added = []
+        self.fingerprints = []
+
+        if notify_progress is not None:
+            notify_progress(3)
+
+    def export_log(self, since=None):
+        """Give the most recent export log of the raw_data folder.
+
+        :param since: if given, only a log modified after this time is
+           returned
+        :returns: the path of the export log, or None if there is none
+        """
 
         # Checking all the export logs from MRIManager and taking the most
         # recent
-        list_logs = glob.glob(os.path.join(raw_data_folder, "logExport*.json"))
+        list_logs = glob.glob(os.path.join(self.raw_data_folder,
+                                           "logExport*.json"))
 
         if len(list_logs) == 0:
-            list_dict_log = []
+            return None
+
+        log_to_read = max(list_logs, key=os.path.getctime)
 
-        else:
-            log_to_read = max(list_logs, key=os.path.getctime)
+        if since is not None and os.path.getmtime(log_to_read) < since:
+            return None
 
-            with open(log_to_read, "r", encoding="utf-8") as file:
-                list_dict_log = json.load(file)
+        return log_to_read
+
+    def exported_file_names(self, since=None, log_path=None):
+        """Give the scans successfully exported in the most recent export
+        log.
+
+        :param since: if given, only a log modified after this time is read
+        :param log_path: path of the export log to read (the most recent
+           one by default)
+        :returns: the file names of the scans (without the extension), or
+           None if there is no export log
+        """
+
+        if log_path is None:
+            log_path = self.export_log(since)
+
+            if log_path is None:
+                return None
+
+        with open(log_path, "r", encoding="utf-8") as file:
+            list_dict_log = json.load(file)
+
+        return [dict_log['NameFile'] for dict_log in list_dict_log
+                if dict_log['StatusExport'] == "Export ok"]
+
+    def finish(self):
+        """Add the import to the history and give its statistics.
+
+        :returns: a dictionary of statistics about the import: number of
+           scans read ("scans"), added ("scans_added") and skipped because
+           they were written before an interruption ("scans_resumed"),
+           number of conflicts of each tag whose Json properties changed
+           (see TagSchemaRegistry, "tag_conflicts"), number of tags
+           added ("tags_added"), size of the scans read ("bytes"), duration
+           of the reading ("read_duration") and of the whole import
+           ("duration"), in seconds
+        """
 
         # For history
-        historyMaker = list()
-        historyMaker.append("add_scans")
+        self.project.history.record("add_scans", self.scans_added,
+                                    self.values_added)
+
+        # The schemas of the tags will be used by the next imports
+        self.registry.save()
+
+        self.statistics["scans_added"] = len(self.scans_added)
+        self.statistics["tag_conflicts"] = dict(self.registry.conflicts)
+        self.statistics["duration"] = time() - self.begin
+        return dict(self.statistics)
+
+    def merge_scans(self, scans):
+        """Merge scans in the documents to write in the database.
+
+        :param scans: iterable of scans read by read_scan
+        """
+
+        begin = time()
+
+        for scan in scans:
+            file_database_path = scan["path"]
+            original_md5 = scan["checksum"]
+
+            document_not_existing = self.project.session.get_document(
+                COLLECTION_CURRENT, file_database_path) is None
+
+            if document_not_existing:
+                with self.lock:
+                    # Scan added to history
+                    self.scans_added.append(file_database_path)
+                self.new_documents.append(file_database_path)
+
+            self.documents[file_database_path] = {}
+            self.documents[file_database_path][TAG_FILENAME] = \
+                file_database_path
+
+            # For each tag in each scan
+            for tag_name, tag_type, description, unit, value in scan["tags"]:
+                if (tag_name not in self.fields and
+                        tag_name not in self.tags_names_added):
+                    # Adding the tag as it's not in the database yet
+                    self.tags_added.append(
+                        [COLLECTION_CURRENT, tag_name, tag_type,
+                         description, False, TAG_ORIGIN_BUILTIN, unit,
+                         None])
+                    self.tags_added.append(
+                        [COLLECTION_INITIAL, tag_name, tag_type,
+                         description, False, TAG_ORIGIN_BUILTIN, unit,
+                         None])
+                    self.tags_names_added.append(tag_name)
+
+                # The value is accepted if it's not empty or null
+                if value is not None and value != "":
+
+                    if document_not_existing:
+                        self.values_added.append(
+                            [file_database_path, tag_name, value,
+                             value])  # Value added to history
+                    self.documents[file_database_path][tag_name] = value
+
+            if document_not_existing:
+                # Tags added manually
+                # Value added to history
+                self.values_added.append(
+                    [file_database_path, TAG_CHECKSUM, original_md5,
+                     original_md5])
+                # Value added to history
+                self.values_added.append([file_database_path, TAG_TYPE,
+                                          TYPE_NII, TYPE_NII])
+            self.documents[file_database_path][TAG_CHECKSUM] = original_md5
+            self.documents[file_database_path][TAG_TYPE] = TYPE_NII
+            self.fingerprints.append((file_database_path, scan["stat"],
+                                      original_md5))
+
+        self.statistics["read_duration"] += time() - begin
+
+    def read_scans(self, file_names):
+        """Read scans with the importer's workers.
+
+        :param file_names: names of the exported files (without the
+           extension)
+        :returns: an iterator over the scans read by read_scan
+        """
+
+        for scan in read_scans(file_names, self.raw_data_folder,
+                               self.project.folder, self.workers,
+                               self.checksum_algorithm, self.registry):
+            # Tags learned by the worker processes
+            self.registry.merge(scan.pop("schema_changes"))
+            yield scan
+
+    def remove_scans(self, scans):
+        """Remove scans added by the import from the database and the
+        history of the import.
+
+        :param scans: database paths of the scans
+        """
+
+        for scan in scans:
+            for collection in (COLLECTION_CURRENT, COLLECTION_INITIAL):
+                if self.project.session.get_document(collection,
+                                                     scan) is not None:
+                    self.project.session.remove_document(collection, scan)
+
+        with self.lock:
+            self.scans_added[:] = [scan for scan in self.scans_added
+                                   if scan not in scans]
+        self.values_added[:] = [value for value in self.values_added
+                                if value[0] not in scans]
+
+        index = FingerprintIndex(self.project.folder)
+        index.remove(scans)
+        index.close()
+
+    def read_journaled(self, file_names, journal):
+        """Read scans, reusing the ones recorded in the import journal.
+
+        The scans that are read are recorded in the journal.
+
+        :param file_names: names of the exported files (without the
+           extension)
+        :param journal: ImportJournal of the import
+        :returns: the list of the scans read by read_scan, in the order of
+           file_names
+        """
+
+        begin = time()
+        source_keys = {}
+        scans = {}
+
+        for file_name in file_names:
+            try:
+                source_keys[file_name] = source_key(file_name,
+                                                    self.raw_data_folder)
+            except OSError:
+                # read_scan will report the missing file
+                continue
+
+            scan = journal.get(file_name, source_keys[file_name])
+
+            if (scan is not None and parse_checksum(scan["checksum"])[0] ==
+                    self.checksum_algorithm):
+                scans[file_name] = scan
+
+        # The scans are read (checksum, Json parsing and tag type inference)
+        # by a pool of processes, only the merge is done here
+        to_read = [file_name for file_name in file_names
+                   if file_name not in scans]
+        read = dict(zip(to_read, self.read_scans(to_read)))
+        journal.record((file_name, source_keys[file_name], scan)
+                       for file_name, scan in read.items())
+        scans.update(read)
+
+        self.statistics["read_duration"] += time() - begin
+        return [scans[file_name] for file_name in file_names]
+
+    def run(self, notify_progress=None):
+        """Import the scans of the most recent export log in the database.
+
+        The progress of the import is recorded in an ImportJournal, so that
+        an interrupted import is resumed where it stopped.
+
+        :param notify_progress: function called with the step of the import
+           (1: scans read, 2: tags added, 3: documents added)
+        :returns: the statistics of the import (see finish)
+        """
+
+        self.start()
+        log_path = self.export_log()
+        file_names = []
+        journal = ImportJournal(self.project.folder)
+
+        try:
+            if log_path is not None:
+                file_names = self.exported_file_names(log_path=log_path)
+
+                if journal.begin(log_path, file_names):
+                    # The scans written before the interruption of the
+                    # import are skipped, if they are still in the database
+                    resumed = set(
+                        file_name for file_name, scan in
+                        journal.committed().items()
+                        if self.project.session.get_value(
+                            COLLECTION_CURRENT, scan["path"],
+                            TAG_CHECKSUM) == scan["checksum"])
+                    file_names = [file_name for file_name in file_names
+                                  if file_name not in resumed]
+                    self.statistics["scans_resumed"] = len(resumed)
+
+            # The database is written by bounded batches, recorded in the
+            # journal
+            batches = [file_names[i:i + self.batch_size]
+                       for i in range(0, len(file_names),
+                                      self.batch_size)] or [[]]
+
+            for index, batch in enumerate(batches):
+                last = index == len(batches) - 1
+                self.merge_scans(self.read_journaled(batch, journal))
+
+                if last and notify_progress is not None:
+                    notify_progress(1)
+
+                self.commit(notify_progress if last else None)
+
+                # A batch not saved is lost if the software crashes, it is
+                # written again when the import is resumed
+                if self.save_batches:
+                    self.project.session.save_modifications()
+                    journal.mark_committed(batch)
+
+            statistics = self.finish()
+            journal.finish()
+
+        finally:
+            journal.close()
+
+        return statistics
+
+    def start(self):
+        """Initialise a new import."""
+
+        self.begin = time()
+        config = Config()
+
+        if self.workers is None:
+            self.workers = config.get_import_workers()
+
+        self.checksum_algorithm = config.get_checksum_algorithm()
+        self.registry = TagSchemaRegistry(
+            os.path.join(self.project.folder, "database", "tag_schema.json"))
+        # Fields of the database, to know the tags to add
+        self.fields = set(self.project.session.get_fields_names(
+            COLLECTION_CURRENT))
+
         with self.lock:
             self.scans_added = []
-        values_added = []
-        tags_added = []
-        tags_names_added = []
-        documents = {}
+        self.values_added = []
+        # Documents, tags and fingerprints merged but not written yet
+        self.documents = {}
+        self.new_documents = []
+        self.tags_added = []
+        self.tags_names_added = []
+        self.fingerprints = []
+        self.statistics = {"scans": 0, "scans_added": 0, "scans_resumed": 0,
+                           "tags_added": 0, "tag_conflicts": {}, "bytes": 0,
+                           "read_duration": 0, "duration": 0}
+
+
+class StreamingImportProgress(QProgressDialog):
+    """Handle the progress bar of an import made while MRIFileManager is
+    converting the scans.
 
-        # List of tags to remove
-        tags_to_remove = ["Dataset data file", "Dataset header file"]
+    :param project: A Project object
+    :param command: command launching MRIFileManager
 
-        for dict_log in list_dict_log:
+    .. Methods:
+        - onProgress : Show the number of scans imported.
 
-            if dict_log['StatusExport'] == "Export ok":
-                file_name = dict_log['NameFile']
-                path_name = raw_data_folder
+    """
 
-                with open(os.path.join(path_name, file_name) + ".nii",
-                          'rb') as scan_file:
-                    data = scan_file.read()
-                    original_md5 = hashlib.md5(data).hexdigest()
+    def __init__(self, project, command):
+        super(StreamingImportProgress, self).__init__(
+            "Please wait while the paths are being converted and "
+            "imported...", None, 0, 0)
 
-                file_path = os.path.join(raw_data_folder, file_name + ".nii")
-                file_database_path = os.path.relpath(file_path,
-                                                     self.project.folder)
+        self.setWindowTitle("Importing the paths")
+        self.setWindowFlags(Qt.Window | Qt.WindowTitleHint |
+                            Qt.CustomizeWindowHint)
+        self.setModal(True)
 
-                document_not_existing = self.project.session.get_document(
-                    COLLECTION_CURRENT, file_database_path) is None
+        self.setMinimumDuration(0)
+        self.setValue(0)
+        self.setMinimumWidth(350)  # For mac OS
 
-                if document_not_existing:
-                    with self.lock:
-                        # Scan added to history
-                        self.scans_added.append(file_database_path)
+        self.worker = StreamingImportWorker(project, command)
+        self.worker.finished.connect(self.close)
+        self.worker.notifyProgress.connect(self.onProgress)
+        self.worker.start()
 
-                documents[file_database_path] = {}
-                documents[file_database_path][TAG_FILENAME] = \
-                    file_database_path
+    def onProgress(self, i):
+        """Signal to show the number of scans imported
 
-                # print('\ntags_from_file(file_name, path_name): ',
-                # tags_from_file(file_name, path_name))
+        :param i: int, number of scans imported
+        """
 
-                # For each tag in each scan
-                for tag in tags_from_file(file_name, path_name):
+        self.setLabelText("Please wait while the paths are being converted "
+                          "and imported...\n{0} scans imported".format(i))
 
-                    # We do the tag only if it's not in the tags to remove
-                    if tag[0] not in tags_to_remove:
-                        tag_name = tag[0]
 
-                        # print('\ntag_name: ', tag_name)
+class StreamingImportWorker(QThread):
+    """Import the scans while MRIFileManager is converting them.
 
-                        properties = tag[1]
+    MRIFileManager is launched without waiting for it, and the raw_data
+    folder of the project is watched: a scan is imported as soon as its
+    Nifti and Json files have been exported, that is when both files exist
+    and their size and modification time did not change since the previous
+    poll. Once MRIFileManager has exited, the scans of the export log that
+    were not imported are imported, and the scans imported that are not
+    listed as exported in the log are removed.
 
-                        # print('properties: ', properties)
+    :param project: A Project object
+    :param command: command launching MRIFileManager
+    :param poll_interval: time between two polls of the raw_data folder (s)
 
-                        format = ''
-                        description = None
-                        unit = None
-                        tag_type = FIELD_TYPE_STRING
+    .. Methods:
+        - exported_files : Returns the exported scans and the stats of their
+          files.
+        - ingest : Import scans.
+        - run : Override the QThread run method.
+    """
+    # Used to show the number of scans imported
+    notifyProgress = pyqtSignal(int)
 
-                        if isinstance(properties, dict):
-                            format = properties['format']
+    def __init__(self, project, command, poll_interval=1.0):
+        super().__init__()
+        self.project = project
+        self.command = command
+        self.poll_interval = poll_interval
+        self.importer = ScansImporter(project)
+        self.lock = self.importer.lock
+        # Exit code of MRIFileManager
+        self.returncode = None
+        self.ingested = set()
+
+    @property
+    def scans_added(self):
+        """Scans added by the import.
+
+        scans_added should always be accessed through the lock, and copied
+        before releasing the lock, because its value will change inside the
+        thread.
+        """
 
-                            if properties['description'] != "":
-                                description = properties['description']
+        return self.importer.scans_added
 
-                            if properties['units'] != "":
-                                unit = properties['units']
+    def exported_files(self):
+        """Give the scans of the raw_data folder that have both their Nifti
+        and their Json files.
 
-                            if properties['type'] != "":
-                                tag_type = properties['type']
+        :returns: a dictionary associating the name of each scan (without
+           the extension) to the (size, modification time) of its two files
+        """
 
-                            value = properties['value']
+        files = {}
+        raw_data_folder = self.importer.raw_data_folder
 
+        for root, dirs, file_names in os.walk(raw_data_folder):
+            for file_name in file_names:
+                name, extension = os.path.splitext(file_name)
 
-                        else:
-                            if isinstance(properties, list):
-                                value = properties[0]
-                            else:
-                                value = properties
-
-                        # Creating date types
-                        if format is not None and format != "":
-                            format = format.replace("yyyy", "%Y")
-                            format = format.replace("MM", "%m")
-                            format = format.replace("dd", "%d")
-                            format = format.replace("HH", "%H")
-                            format = format.replace("mm", "%M")
-                            format = format.replace("ss", "%S")
-                            format = format.replace("SSS", "%f")
-
-                            if ("%Y" in format and "%m" in format and "%d" in
-                                    format and "%H" in format and
-                                    "%M" in format and "%S" in format):
-                                tag_type = FIELD_TYPE_DATETIME
-
-                            elif ("%Y" in format and "%m" in format and "%d"
-                                  in format):
-                                tag_type = FIELD_TYPE_DATE
-
-                            elif ("%H" in format and "%M" in format and "%S"
-                                  in format):
-                                tag_type = FIELD_TYPE_TIME
-
-                        if tag_name != "Json_Version":
-                            # Preparing value and type
-                            if hasattr(value, '__len__') and type(value) != \
-                                    str:
-                                if ((len(value) is 1 and isinstance(value[0],
-                                                                    list))
-                                        or
-                                        (len(value) is not 1)):
-
-                                    if tag_type == FIELD_TYPE_STRING:
-                                        tag_type = FIELD_TYPE_LIST_STRING
-
-                                    elif tag_type == FIELD_TYPE_INTEGER:
-                                        tag_type = FIELD_TYPE_LIST_INTEGER
-
-                                    elif tag_type == FIELD_TYPE_FLOAT:
-                                        tag_type = FIELD_TYPE_LIST_FLOAT
-
-                                    elif tag_type == FIELD_TYPE_BOOLEAN:
-                                        tag_type = FIELD_TYPE_LIST_BOOLEAN
-
-                                    elif tag_type == FIELD_TYPE_DATE:
-                                        tag_type = FIELD_TYPE_LIST_DATE
-
-                                    elif tag_type == FIELD_TYPE_DATETIME:
-                                        tag_type = FIELD_TYPE_LIST_DATETIME
-
-                                    elif tag_type == FIELD_TYPE_TIME:
-                                        tag_type = FIELD_TYPE_LIST_TIME
-
-                                if len(value) is 1:
-                                    value = value[0]
-
-                                else:
-                                    value_prepared = []
-
-                                    for value_single in value:
-                                        value_prepared.append(value_single[0])
-
-                                    value = value_prepared
-                        # print('value: ', value)
-                        # print('tag_type: ', tag_type)
-
-                        if (tag_type == FIELD_TYPE_DATETIME or
-                                tag_type == FIELD_TYPE_DATE or
-                                tag_type == FIELD_TYPE_TIME):
-
-                            if value is not None and value != "":
-                                value = datetime.strptime(value, format)
-
-                                if tag_type == FIELD_TYPE_TIME:
-                                    value = value.time()
-
-                                elif tag_type == FIELD_TYPE_DATE:
-                                    value = value.date()
-
-                        # TODO time lists
-
-                        tag_row = self.project.session.get_field(
-                            COLLECTION_CURRENT, tag_name)
-
-                        if (tag_row is None and tag_name not in
-                                tags_names_added):
-                            # Adding the tag as it's not in the database yet
-                            tags_added.append(
-                                [COLLECTION_CURRENT, tag_name, tag_type,
-                                 description, False, TAG_ORIGIN_BUILTIN, unit,
-                                 None])
-                            tags_added.append(
-                                [COLLECTION_INITIAL, tag_name, tag_type,
-                                 description, False, TAG_ORIGIN_BUILTIN, unit,
-                                 None])
-                            tags_names_added.append(tag_name)
-
-                        # The value is accepted if it's not empty or null
-                        if value is not None and value != "":
-
-                            if document_not_existing:
-                                values_added.append(
-                                    [file_database_path, tag_name, value,
-                                     value])  # Value added to history
-                            documents[file_database_path][tag_name] = value
-
-                if document_not_existing:
-                    # Tags added manually
-                    # Value added to history
-                    values_added.append(
-                        [file_database_path, TAG_CHECKSUM, original_md5,
-                         original_md5])
-                    # Value added to history
-                    values_added.append([file_database_path, TAG_TYPE,
-                                         TYPE_NII, TYPE_NII])
-                documents[file_database_path][TAG_CHECKSUM] = original_md5
-                documents[file_database_path][TAG_TYPE] = TYPE_NII
+                if extension != ".nii" or name + ".json" not in file_names:
+                    continue
 
-        # Missing values added thanks to default values
-        for tag in self.project.session.get_fields(COLLECTION_CURRENT):
-            if tag.origin == TAG_ORIGIN_USER:
-                for scan in self.scans_added:
-                    if tag.default_value is not None and \
-                            self.project.session.get_value(
-                                COLLECTION_CURRENT, scan[0], tag.name) is None:
-                        # Value added to history
-                        values_added.append([scan, tag.name,
-                                             tag.default_value,
-                                             tag.default_value])
-                        documents[scan][tag.name] = tag.default_value
+                keys = []
+
+                try:
+                    for extension in (".nii", ".json"):
+                        stat = os.stat(os.path.join(root, name + extension))
+                        keys.append((stat.st_size, stat.st_mtime_ns))
+                except OSError:
+                    # The file is being replaced
+                    continue
 
-        self.notifyProgress.emit(1)
-        sleep(0.1)
+                files[os.path.relpath(os.path.join(root, name),
+                                      raw_data_folder)] = tuple(keys)
 
-        self.project.session.add_fields(tags_added)
+        return files
 
-        self.notifyProgress.emit(2)
-        sleep(0.1)
+    def ingest(self, file_names, last_try=False):
+        """Import scans in the database.
 
-        current_paths = self.project.session.get_documents_names(
-            COLLECTION_CURRENT)
+        :param file_names: names of the exported files (without the
+           extension)
+        :param last_try: True to raise the errors instead of trying again
+           at the next poll
+        """
 
-        for document in documents:
-            if document in current_paths:
-                self.project.session.remove_document(COLLECTION_CURRENT,
-                                                     document)
-                self.project.session.remove_document(COLLECTION_INITIAL,
-                                                     document)
+        importer = self.importer
+
+        try:
+            scans = list(importer.read_scans(file_names))
+            names = list(file_names)
+        except (OSError, ValueError):
+            # A scan can't be read yet, the others are imported
+            scans = []
+            names = []
+
+            for file_name in file_names:
+                try:
+                    scans.append(read_scan(file_name,
+                                           importer.raw_data_folder,
+                                           self.project.folder,
+                                           importer.checksum_algorithm,
+                                           importer.registry))
+                    names.append(file_name)
+                except (OSError, ValueError):
+                    if last_try:
+                        raise
+
+        importer.merge_scans(scans)
+        importer.commit()
+        self.ingested.update(names)
+        self.notifyProgress.emit(len(self.ingested))
 
-            self.project.session.add_document(COLLECTION_CURRENT, documents[
-                document], flush=False)
-            self.project.session.add_document(COLLECTION_INITIAL, documents[
-                document], flush=False)
+    def run(self):
+        """Override the QThread run method. Executed when the worker is
+        started, launches MRIFileManager and fills the database with the
+        scans exported.
+        """
 
-        self.project.session.session.flush()
-        self.notifyProgress.emit(3)
-        sleep(0.1)
+        importer = self.importer
+        importer.start()
+        self.ingested = set()
+        begin = time()
 
-        # For history
-        historyMaker.append(self.scans_added)
-        historyMaker.append(values_added)
-        self.project.undos.append(historyMaker)
-        self.project.redos.clear()
+        # The scans already in the raw_data folder are only imported again
+        # if MRIFileManager rewrites them
+        previous = self.exported_files()
+        existing = dict(previous)
 
-        print('\nData export duration in the database:')
-        print("read_log time: " + str(round(time() - begin, 2)) + ' s\n')
-        # print("read_log time: " + str(time() - begin))
+        try:
+            process = subprocess.Popen(self.command)
+        except OSError as e:
+            print("\nmri_conv could not be launched: {0}\n".format(e))
+            self.returncode = 1
+            return
 
-        # pr.disable()
-        # pr.print_stats(sort='time')
-        # prof.print_stats()
+        finished = False
+
+        while not finished:
+            # Checked before listing the files, so that they are all
+            # complete when MRIFileManager has exited
+            finished = process.poll() is not None
+            current = self.exported_files()
+            ready = sorted(
+                name for name, keys in current.items()
+                if name not in self.ingested and existing.get(name) != keys
+                and (finished or previous.get(name) == keys))
+
+            if ready:
+                self.ingest(ready)
+
+            previous = current
+
+            if not finished:
+                sleep(self.poll_interval)
+
+        self.returncode = process.returncode
+
+        # Reconciliation with the export log written by MRIFileManager
+        exported = importer.exported_file_names(since=begin - 1)
+
+        if exported is not None:
+            missed = [name for name in exported if name not in self.ingested]
+
+            if missed:
+                self.ingest(missed, last_try=True)
+
+            not_exported = set(
+                os.path.relpath(os.path.join(importer.raw_data_folder,
+                                             name + ".nii"),
+                                self.project.folder)
+                for name in self.ingested.difference(exported))
+
+            with self.lock:
+                # Only the scans added by the import can be removed
+                not_exported.intersection_update(self.scans_added)
+
+            if not_exported:
+                importer.remove_scans(not_exported)
+
+        if self.returncode == 0 or self.ingested:
+            statistics = importer.finish()
+
+            print('\nData export duration in the database:')
+            print("read_log time: " + str(round(statistics["duration"], 2)) +
+                  ' s\n')
+
+
+class VerifyWorker(QThread):
+    """Check the project's scans in the background.
+
+    The scans and their checksums are read by the thread, in a read-only
+    session of the database (see DatabaseMIA.read_session), so that the
+    session of the project is not used.
+
+    :param project: A Project object
+    :param deep: True to hash all the scans, whatever their stat
+
+    .. Methods:
+        - cancel : Stop the verification.
+        - run : Override the QThread run method.
+    """
+    # Emitted with the database path of each modified (False) or missing
+    # (True) scan
+    notifyProblem = pyqtSignal(str, bool)
+    # Emitted with the number of scans checked
+    notifyProgress = pyqtSignal(int)
+    # Emitted with the number of scans to check, once they are read
+    notifyStarted = pyqtSignal(int)
+
+    def __init__(self, project, deep=False):
+        super(VerifyWorker, self).__init__()
+        self.project_folder = project.folder
+        self.database = project.database
+        self.deep = deep
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop the verification, the scans being hashed are finished."""
+
+        self.cancelled.set()
+
+    def run(self):
+        """Override the QThread run method. Executed when the worker is
+        started, checks the scans and notifies the results.
+        """
+
+        with self.database.read_session() as session:
+            scans = scans_to_verify(session)
+
+        self.notifyStarted.emit(len(scans))
+        check_scans(self.project_folder, scans, self.deep,
+                    on_problem=self.notifyProblem.emit,
+                    on_checked=self.notifyProgress.emit,
+                    cancelled=self.cancelled)
+
+
+def check_scans(project_folder, scans, deep=False, max_workers=None,
+                on_problem=None, on_checked=None, cancelled=None):
+    """Check if scans have been modified or removed, hashing them on a
+    bounded pool of threads.
+
+    This function does not use the project database, so that it can be
+    executed outside of the main thread.
+
+    :param project_folder: path of the project
+    :param scans: list of (database path, recorded checksum) tuples
+    :param deep: True to hash all the scans, whatever their stat
+    :param max_workers: number of threads hashing the scans
+    :param on_problem: function called with the database path of each
+       modified or missing scan and a boolean (True if missing)
+    :param on_checked: function called with the number of scans checked
+    :param cancelled: threading.Event stopping the verification when set
+    """
+
+    if max_workers is None:
+        max_workers = min(4, os.cpu_count() or 1)
+
+    fingerprints = []
+    problems = []
+    to_hash = []
+    checked = 0
+    index = FingerprintIndex(project_folder)
+
+    def report(scan, missing):
+        problems.append(scan)
+
+        if on_problem is not None:
+            on_problem(scan, missing)
+
+    def hash_scan(file_path, checksum):
+        key = stat_key(file_path)
+        return key, checksum_matches(file_path, checksum)
+
+    try:
+        for scan, checksum in scans:
+            file_path = os.path.join(project_folder, scan)
+
+            if not os.path.exists(file_path):
+                # The file is directly reported
+                report(scan, True)
+                checked += 1
+
+            elif checksum is None or (not deep and index.unchanged(
+                    scan, stat_key(file_path), checksum)):
+                checked += 1
+
+            else:
+                to_hash.append((scan, file_path, checksum))
+
+        if on_checked is not None:
+            on_checked(checked)
+
+        # Only a few files are hashed at the same time, so that the pending
+        # work stays bounded whatever the number of scans
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            remaining = iter(to_hash)
+
+            while True:
+                while (len(pending) < 2 * max_workers and
+                       not (cancelled is not None and cancelled.is_set())):
+                    scan_infos = next(remaining, None)
+
+                    if scan_infos is None:
+                        break
+
+                    future = executor.submit(hash_scan, *scan_infos[1:])
+                    pending[future] = scan_infos
+
+                if not pending:
+                    break
+
+                done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    scan, file_path, checksum = pending.pop(future)
+
+                    try:
+                        key, matches = future.result()
+                    except OSError:
+                        # The file has been removed or can't be read anymore
+                        report(scan, True)
+                    else:
+                        if matches:
+                            fingerprints.append((scan, key, checksum))
+                        else:
+                            report(scan, False)
+
+                    checked += 1
+
+                if on_checked is not None:
+                    on_checked(checked)
+
+        index.set_many(fingerprints)
+        index.remove(problems)
+
+    finally:
+        index.close()
+
+
+def init_worker_registry(schemas):
+    """Initialize the TagSchemaRegistry of a worker process reading scans.
+
+    :param schemas: schemas of the tags known by the importing process
+    """
+
+    global _worker_registry
+    _worker_registry = TagSchemaRegistry(track_changes=True)
+    _worker_registry.schemas.update(schemas)
 
 
 def read_log(project, main_window):
@@ -407,6 +1002,30 @@ def read_log(project, main_window):
     return scans_added
 
 
+def read_streaming(project, main_window, command):
+    """Launch MRIFileManager, show the progress of the import of the scans
+    while they are converted, and returns its feedback.
+
+    :param project: current project in the software
+    :param main_window: software's main window
+    :param command: command launching MRIFileManager
+    :returns: the exit code of MRIFileManager and the scans that have been
+       added
+    """
+
+    main_window.progress = StreamingImportProgress(project, command)
+    main_window.progress.show()
+    main_window.progress.exec()
+
+    worker = main_window.progress.worker
+    # The dialog can be closed before the end of the thread
+    worker.wait()
+
+    with worker.lock:
+        scans_added = list(worker.scans_added)
+    return worker.returncode, scans_added
+
+
 # def save_project(project):
 #     """
 #     Saves the modifications of the project
@@ -416,6 +1035,133 @@ def read_log(project, main_window):
 #
 #     project.saveModifications()
 
+
+def read_scan(file_name, raw_data_folder, project_folder, algorithm="md5",
+              registry=None):
+    """Read a scan exported by MRIFileManager.
+
+    This function does not use the database, so that it can be executed in
+    a worker process: it computes the checksum of the Nifti file and
+    converts its Json tags to database values.
+
+    :param file_name: name of the exported file (without the extension)
+    :param raw_data_folder: path of the raw_data folder of the project
+    :param project_folder: path of the project
+    :param algorithm: algorithm of the checksum
+    :param registry: TagSchemaRegistry converting the tags (the registry of
+       the worker process by default)
+    :returns: a dictionary with the database path of the scan ("path"), its
+       checksum ("checksum"), the stat of the file when hashed ("stat"), its
+       tags ("tags", list of [tag name, type, description, unit, value])
+       and the changes of the registry of the worker process
+       ("schema_changes", see TagSchemaRegistry.pop_changes)
+    """
+
+    if registry is None:
+        registry = _worker_registry
+
+    file_path = os.path.join(raw_data_folder, file_name + ".nii")
+
+    tags = []
+
+    for tag_name, properties in tags_from_file(file_name, raw_data_folder):
+
+        # We do the tag only if it's not in the tags to remove
+        if tag_name not in TAGS_TO_REMOVE:
+            tags.append([tag_name] + registry.convert(tag_name, properties))
+
+    key = stat_key(file_path)
+
+    return {"path": os.path.relpath(file_path, project_folder),
+            "checksum": compute_checksum(file_path, algorithm),
+            "stat": key,
+            "tags": tags,
+            "schema_changes": registry.pop_changes()}
+
+
+def read_scans(file_names, raw_data_folder, project_folder, workers=1,
+               algorithm="md5", registry=None):
+    """Read the scans exported by MRIFileManager, in parallel if several
+    workers are used.
+
+    :param file_names: names of the exported files (without the extension)
+    :param raw_data_folder: path of the raw_data folder of the project
+    :param project_folder: path of the project
+    :param workers: number of worker processes (the scans are read in the
+       current process if 1)
+    :param algorithm: algorithm of the checksums
+    :param registry: TagSchemaRegistry converting the tags (copied in the
+       worker processes)
+    :returns: an iterator over the scans read by read_scan, in the order of
+       file_names
+    """
+
+    if registry is None:
+        registry = TagSchemaRegistry()
+
+    if workers <= 1 or len(file_names) <= 1:
+        for file_name in file_names:
+            yield read_scan(file_name, raw_data_folder, project_folder,
+                            algorithm, registry)
+
+    else:
+        workers = min(workers, len(file_names))
+        # Scans are sent by chunks to limit the inter-process communications
+        chunk_size = max(1, len(file_names) // (workers * 4))
+
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=init_worker_registry,
+                                 initargs=(registry.schemas,)) as executor:
+            for scan in executor.map(
+                    read_scan, file_names,
+                    repeat(raw_data_folder, len(file_names)),
+                    repeat(project_folder, len(file_names)),
+                    repeat(algorithm, len(file_names)),
+                    chunksize=chunk_size):
+                yield scan
+
+
+def scans_to_verify(session):
+    """Give the scans of a project, with their recorded checksum.
+
+    :param session: session of the project database (or a read-only session)
+    :returns: the list of (database path, checksum) tuples of the scans
+    """
+
+    return [(scan, session.get_value(COLLECTION_CURRENT, scan, TAG_CHECKSUM))
+            for scan in session.get_documents_names(COLLECTION_CURRENT)]
+
+
+def source_key(file_name, raw_data_folder):
+    """Give the stats of the Nifti and Json files of an exported scan, used
+    to detect if they changed since the scan was read.
+
+    :param file_name: name of the exported file (without the extension)
+    :param raw_data_folder: path of the raw_data folder of the project
+    :returns: the stat keys (see fingerprint.stat_key) of the two files
+    """
+
+    file_path = os.path.join(raw_data_folder, file_name)
+    return stat_key(file_path + ".nii") + stat_key(file_path + ".json")
+
+
+def tag_properties(tag_name, properties):
+    """Give the database type, description, unit and value of a Json tag,
+    with the full inference (see TagSchemaRegistry to reuse it).
+
+    :param tag_name: name of the tag
+    :param properties: Json properties of the tag (dictionary or value)
+    :returns: [type, description, unit, value] of the tag
+    """
+
+    (json_type, json_format, description, unit,
+     value) = split_properties(properties)
+    reshape, promote = list_shape(tag_name, value)
+    tag_type, date_format = infer_type(json_type, json_format, promote)
+    return [tag_type, description, unit,
+            convert_value(value, reshape, tag_type, date_format)]
+
+
 def tags_from_file(file_path, path):
     """Return a list of [tag, value] contained in a Json file.
 
@@ -430,35 +1176,21 @@ def tags_from_file(file_path, path):
     return json_tags
 
 
-def verify_scans(project):
+def verify_scans(project, deep=False):
     """Check if the project's scans have been modified.
 
+    Only the scans whose stat (size, modification time and inode) changed
+    since they were last hashed are read again, unless deep is True.
+
     :param project: current project in the software
+    :param deep: True to hash all the scans, whatever their stat
     :returns: the list of scans that have been modified
     """
 
-    # Returning the files that are problematic
-    return_list = []
-    for scan in project.session.get_documents_names(COLLECTION_CURRENT):
-
-        file_name = scan
-        file_path = os.path.relpath(os.path.join(project.folder, file_name))
-
-        if os.path.exists(file_path):
-            # If the file exists, we do the checksum
-            with open(file_path, 'rb') as scan_file:
-                data = scan_file.read()
-                actual_md5 = hashlib.md5(data).hexdigest()
-
-            initial_checksum = project.session.get_value(COLLECTION_CURRENT,
-                                                         scan, TAG_CHECKSUM)
-            if initial_checksum is not None and actual_md5 != initial_checksum:
-                return_list.append(file_name)
-
-        else:
-            # Otherwise, we directly add the file in the list
-            return_list.append(file_name)
-
-    return return_list
-
+    scans = scans_to_verify(project.session)
+    problems = set()
+    check_scans(project.folder, scans, deep,
+                on_problem=lambda scan, missing: problems.add(scan))
 
+    # Returning the files that are problematic, in the database order
+    return [scan for scan, checksum in scans if scan in problems]
@@ -6,6 +6,11 @@ Contains:
     Class:
     -DatabaseMIA
     -DatabaseSessionMIA
+    -ModifiedValues
+    -ValuesBlock
+    Methods:
+    -copy_database
+    -remove_database
 
 """
 
@@ -18,11 +23,18 @@ Contains:
 # for details.
 ##########################################################################
 
+import os
+import shutil
+import time
+import types
+from collections import OrderedDict
+from contextlib import contextmanager
+
 from sqlalchemy import (
-    create_engine, MetaData, String, Boolean, Integer,
-    Enum, Column, Table)
+    create_engine, event, MetaData, String, Boolean, Integer,
+    Enum, Column, Table, sql)
 from sqlalchemy.exc import ArgumentError
-from sqlalchemy.schema import CreateTable
+from sqlalchemy.schema import CreateTable, DropTable
 from sqlalchemy.orm import mapper
 
 # Populse_db imports
@@ -33,9 +45,15 @@ from populse_db.database import (
     FIELD_TYPE_LIST_INTEGER, FIELD_TYPE_DATETIME, FIELD_TYPE_INTEGER,
     FIELD_TYPE_FLOAT, FIELD_TYPE_TIME, FIELD_TYPE_BOOLEAN,
     FIELD_TYPE_LIST_BOOLEAN, FIELD_TYPE_JSON, FIELD_TYPE_LIST_JSON,
-    COLLECTION_TABLE, DatabaseSession, ALL_TYPES, LIST_TYPES, TYPE_TO_COLUMN)
+    COLLECTION_TABLE, DatabaseSession, Document, ALL_TYPES, LIST_TYPES,
+    TYPE_TO_COLUMN)
 from populse_db.filter import QUERY_MIXED
 
+# Populse_MIA imports
+from populse_mia.data_manager.search_index import (SearchIndex,
+                                                   search_index_available)
+from populse_mia.data_manager.snapshot import ColumnarSnapshot
+
 TAG_ORIGIN_BUILTIN = "builtin"
 TAG_ORIGIN_USER = "user"
 
@@ -49,6 +67,12 @@ TAG_UNIT_MHZ = "MHz"
 ALL_UNITS = [TAG_UNIT_MS, TAG_UNIT_MM,
              TAG_UNIT_DEGREE, TAG_UNIT_HZPIXEL, TAG_UNIT_MHZ]
 
+# Number of compiled filters kept by a session
+COMPILED_FILTERS_SIZE = 256
+
+# Temporary table holding the documents a filter is restricted to
+CANDIDATES_TABLE = "mia_candidates"
+
 
 class DatabaseMIA(Database):
     """Class overriding the default behavior of populse_db
@@ -60,6 +84,7 @@ class DatabaseMIA(Database):
         - __exit__: releases a DatabaseSession previously created by __enter__
         - _Database__create_empty_schema: overrides the method creating the
         empty schema
+        - read_session: context giving a read-only session
     """
 
     def __init__(self, string_engine):
@@ -70,6 +95,13 @@ class DatabaseMIA(Database):
         super().__init__(string_engine, caches=True, list_tables=True,
                          query_type=QUERY_MIXED)
 
+        if string_engine.startswith('sqlite'):
+            @event.listens_for(self.engine, "connect")
+            def set_journal_mode(dbapi_connection, connection_record):
+                """Use the write-ahead log, so that the read sessions are
+                not blocked by the session writing the database."""
+                dbapi_connection.execute('pragma journal_mode=WAL')
+
     def __enter__(self):
         """Return a DatabaseSession instance for using the database. This is
         supposed to be called using a "with" statement.
@@ -134,6 +166,25 @@ class DatabaseMIA(Database):
             del current_session._populse_db_counter
             self._Database__scoped_session.remove()
 
+    @contextmanager
+    def read_session(self):
+        """Context giving a read-only session, that can be used by another
+        thread than the one writing the database (see DatabaseWriter).
+
+        The session has its own connection, on which SQLite refuses the
+        writes, and does not fill the documents cache: it reads the values
+        committed when it is opened.
+
+        :returns: the DatabaseSessionMIA
+        """
+
+        session = self._Database__scoped_session.session_factory()
+        try:
+            session.execute("PRAGMA query_only = ON")
+            yield DatabaseSessionMIA(self, session, read_only=True)
+        finally:
+            session.close()
+
     def _Database__create_empty_schema(self, string_engine):
         """Override the method creating the empty schema, in order to add
         columns to field table
@@ -195,14 +246,99 @@ class DatabaseMIA(Database):
 class DatabaseSessionMIA(DatabaseSession):
     """Class overriding the database session of populse_db
 
+    The documents written are marked in the bitsets of the values modified
+    (see get_modified), in the full-text indexes (see search_values) and in
+    the columnar snapshots (see get_snapshot), so that they are compared,
+    indexed and patched again when they are next read. Each write
+    increments the write version of the session.
+
+    :param database: DatabaseMIA instance
+    :param session: SQLAlchemy session attached to the database
+    :param read_only: True for a session opened by DatabaseMIA.read_session
+
     .. Methods:
         - add_collection: overrides the method adding a collection
+        - add_document: overrides the method adding a document, to record
+          the write
         - add_field: adds a field to the database, if it does not already exist
         - add_fields: adds the list of fields
+        - add_value: overrides the method adding a value, to record the
+          write
+        - checkpoint: writes the write-ahead log in the database file
+        - compile_filter: gives the query of a filter, compiled once per
+          schema version
+        - ensure_field_for_value: overrides the method creating a
+          missing field from a value, to give it the MIA attributes
+        - filter_documents_names: gives the names of the documents matching
+          a filter, among candidate documents
+        - get_modified: gives the values of a collection that differ from
+          the values of a reference collection
         - get_shown_tags: gives the list of visible tags
+        - get_snapshot: gives a read-only columnar view of the values of a
+          collection
+        - get_texts: gives the values of several documents and fields, as
+          text
+        - get_values: gives the values of several documents and fields in
+          one query
+        - record_schema_change: records a change of the fields of
+          collections
+        - record_write: records a change of the values of documents
+        - remove_document: overrides the method removing a document, to
+          record the write
+        - remove_documents: removes documents in bulk
+        - remove_field: overrides the method removing fields, to record the
+          schema change
+        - remove_value: overrides the method removing a value, to record the
+          write
+        - run_commands: runs a batch of commands
+        - search_values: gives the names of the documents with a value
+          containing a string, using the full-text index
         - set_shown_tags: sets the list of visible tags
+        - set_value: overrides the method setting a value, to record the
+          write
+        - set_values: overrides the method setting values, to record the
+          write
+        - unsave_modifications: overrides the method rolling back the
+          session, to invalidate the values modified and indexed
+        - update_documents: sets the values of several documents in bulk
+        - update_fields: adds and removes fields in a single schema change
+          per collection
+        - upsert_documents: adds or replaces documents in bulk
     """
 
+    def __init__(self, database, session, read_only=False):
+        """Initialization of the DatabaseSessionMIA class.
+
+        :param database: DatabaseMIA instance
+        :param session: SQLAlchemy session attached to the database
+        :param read_only: True for a read-only session
+        """
+
+        self.read_only = read_only
+        # Monotonically increasing version, incremented by each write
+        self.write_version = 0
+        # Collection -> version of the last change of its fields
+        self.schema_versions = {}
+        # (collection, reference collection) -> ModifiedValues
+        self.modified = {}
+        # Collection -> ColumnarSnapshot
+        self.snapshots = {}
+        # (collection, filter, schema version) -> compiled query, the least
+        # recently used first
+        self.compiled_filters = OrderedDict()
+        # Collection -> SearchIndex
+        self.search_indexes = {}
+        # QueryLog recording the filters run, None to not record them
+        self.query_log = None
+        super().__init__(database, session)
+
+    @property
+    def _DatabaseSession__caches(self):
+        """Override the property telling if the caches are used: a
+        read-only session reads the rows from the database."""
+
+        return self.database.caches and not self.read_only
+
     def add_collection(self, name, primary_key, visibility, origin, unit,
                        default_value):
         """Override the method adding a collection of populse_db.
@@ -324,6 +460,7 @@ class DatabaseSessionMIA(DatabaseSession):
             self._DatabaseSession__fields[collection][name] = field_row
 
         self.session.add(field_row)
+        self.record_schema_change([collection])
 
         # Fields creation
         if field_type in LIST_TYPES:
@@ -379,6 +516,25 @@ class DatabaseSessionMIA(DatabaseSession):
 
         self.unsaved_modifications = True
 
+    def add_document(self, collection, document, create_missing_fields=True,
+                     flush=True):
+        """Override the method adding a document, to record the write.
+
+        :param collection: document collection (str, must be existing)
+        :param document: dictionary of document values or document
+           primary key
+        :param create_missing_fields: bool to know if the missing fields
+           must be created
+        :param flush: bool to know if the session must be flushed
+        """
+
+        super().add_document(collection, document, create_missing_fields,
+                             flush)
+        if isinstance(document, dict):
+            collection_row = self.get_collection(collection)
+            document = document[collection_row.primary_key]
+        self.record_write(collection, [document])
+
     def add_fields(self, fields):
         """Add the list of fields.
 
@@ -386,23 +542,203 @@ class DatabaseSessionMIA(DatabaseSession):
         visibility, origin, unit, default_value)
         """
 
-        collections = []
+        self.update_fields(added_fields=fields)
 
-        for field in fields:
-            # Adding each field
-            self.add_field(field[0], field[1], field[2], field[3], field[4],
-                           field[5], field[6], field[7], False)
-            if field[0] not in collections:
-                collections.append(field[0])
+    def add_value(self, collection, document, field, value, checks=True):
+        """Override the method adding a value, to record the write.
+
+        :param collection: document collection (str, must be existing)
+        :param document: document name (str, must be existing)
+        :param field: field name (str, must be existing)
+        :param value: value to add
+        :param checks: bool to know if the value must be checked
+        """
+
+        super().add_value(collection, document, field, value, checks)
+        self.record_write(collection, [document], fields=[field])
+
+    def checkpoint(self):
+        """Write the transactions of the write-ahead log in the database
+        file and truncate the log, so that the database file can be copied
+        alone.
+
+        The session must not have unsaved modifications: the log can not
+        be written during a transaction.
+        """
+
+        self.session.execute("PRAGMA wal_checkpoint(TRUNCATE)")
 
-        # Updating the table classes
+    def compile_filter(self, collection, filter_query):
+        """Give the query of a filter.
+
+        The parsing and the translation of a filter to SQL are done once for
+        the same filter and the same fields of the collection.
+
+        :param collection: document collection (str, must be existing)
+        :param filter_query: filter (str, see filter_documents)
+        :returns: the query (see filter_documents)
+        """
+
+        key = (collection, filter_query,
+               self.schema_versions.get(collection, 0))
+        query = self.compiled_filters.get(key)
+        if query is not None:
+            self.compiled_filters.move_to_end(key)
+            return query
+
+        query = self._DatabaseSession__filter_query(collection, filter_query)
+        self.compiled_filters[key] = query
+        if len(self.compiled_filters) > COMPILED_FILTERS_SIZE:
+            self.compiled_filters.popitem(last=False)
+        return query
+
+    def ensure_field_for_value(self, collection, field, value,
+                               create=True):
+        """Override the method creating a missing field from a value: the
+        field is created as a visible user tag.
+
+        :param collection: document collection (str, must be existing)
+        :param field: field name
+        :param value: value whose type gives the type of the field
+        :param create: bool to know if the missing field must be created,
+           a ValueError being raised otherwise
+        """
+
+        if self.get_field(collection, field) is not None:
+            return
+        if not create:
+            raise ValueError("Collection {0} has no field {1}".format(
+                collection, field))
+        try:
+            field_type = self._DatabaseSession__python_value_type(value)
+        except KeyError:
+            raise ValueError(
+                "Collection {0} has no field {1} and it cannot be created "
+                "from a value of type {2}".format(collection, field,
+                                                  type(value)))
+        self.add_field(collection, field, field_type, None, True,
+                       TAG_ORIGIN_USER, None, None)
+
+    def filter_documents_names(self, collection, filter_query,
+                               documents=None):
+        """Give the names of the documents matching a filter.
+
+        Contrary to filter_documents, the filter is compiled once (see
+        compile_filter) and the candidate documents are written in a
+        temporary table instead of being added to the filter, so that the
+        filter does not depend on them. The filter is recorded in the query
+        log of the session, if any.
+
+        :param collection: document collection (str, must be existing)
+        :param filter_query: filter (str, see filter_documents)
+        :param documents: names of the documents to search in (all the
+           documents of the collection if None)
+        :returns: the list of the names of the matching documents
+        """
+
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(
+                collection))
+
+        table = self.metadata.tables[
+            self.name_to_valid_column_name(collection)]
+        pk_column = table.c[
+            self.name_to_valid_column_name(collection_row.primary_key)]
+        query = self.compile_filter(collection, filter_query)
+
+        python_filter = None
+        if query is None:
+            select = table.select()
+        elif isinstance(query, types.FunctionType):
+            select = table.select()
+            python_filter = query
+        elif isinstance(query, tuple):
+            sql_condition, python_filter = query
+            select = table.select(sql_condition)
+        else:
+            select = table.select(query)
+
+        # The whole rows are only needed by the Python part of the filter
+        if python_filter is None:
+            select = select.with_only_columns([pk_column])
+
+        # The pending ORM changes are written before the query
         self.session.flush()
 
-        # Classes reloaded in order to add the new column attribute
-        self._DatabaseSession__update_table_classes()
+        start = time.perf_counter()
+        candidates = None
+        if documents is not None:
+            candidates = sql.table(CANDIDATES_TABLE, sql.column("name"))
+            self.session.execute(sql.text(
+                "CREATE TEMP TABLE IF NOT EXISTS {0} "
+                "(name TEXT PRIMARY KEY)".format(CANDIDATES_TABLE)))
+            self.session.execute(candidates.delete())
+            documents = list(dict.fromkeys(documents))
+            if documents:
+                self.session.execute(
+                    candidates.insert(),
+                    [{"name": document} for document in documents])
+            select = select.where(pk_column.in_(
+                sql.select([candidates.c.name])))
 
-        for collection in collections:
-            self._DatabaseSession__refresh_cache_documents(collection)
+        try:
+            if python_filter is None:
+                names = [row[0] for row in self.session.execute(select)]
+
+            else:
+                names = []
+                for row in self.session.execute(select):
+                    document = Document(self, collection, row)
+                    if python_filter(document):
+                        names.append(getattr(document,
+                                             collection_row.primary_key))
+
+        finally:
+            if candidates is not None:
+                self.session.execute(candidates.delete())
+
+        if self.query_log is not None:
+            self.query_log.record_filter(collection, filter_query,
+                                         time.perf_counter() - start,
+                                         len(names))
+        return names
+
+    def get_modified(self, collection, reference):
+        """Give the values of a collection that differ from the values of
+        a reference collection (for example the values modified by the
+        user since the import).
+
+        The bitsets are built at the first call, then only the documents
+        written since the previous call are compared again.
+
+        :param collection: document collection (str, must be existing)
+        :param reference: reference collection (str, must be existing)
+        :returns: the up-to-date ModifiedValues of the collection
+        """
+
+        modified = self.modified.get((collection, reference))
+        if modified is None:
+            modified = ModifiedValues()
+            self.modified[(collection, reference)] = modified
+            documents, fields = None, None
+        else:
+            documents, fields = modified.pop_pending()
+            if not documents:
+                return modified
+
+        values = self.get_values(collection, documents, fields)
+        reference_values = self.get_values(reference, values.documents,
+                                           values.fields)
+        modified.update(values, reference_values, fields is None)
+        if documents is not None:
+            # The documents that do not exist any more have no bitset
+            primary_key = self.get_collection(collection).primary_key
+            keys = self.get_values(collection, documents, [primary_key])
+            modified.discard([document for document, key in
+                              zip(keys.documents, keys.columns[primary_key])
+                              if key is None])
+        return modified
 
     def get_shown_tags(self):
         """Give the list of visible tags.
@@ -419,6 +755,364 @@ class DatabaseSessionMIA(DatabaseSession):
                 visible_names.append(field.field_name)
         return visible_names
 
+    def get_snapshot(self, collection, fields=None):
+        """Give a read-only columnar view of the values of a collection.
+
+        The snapshot of the collection is built at the first call, then
+        only patched with the documents written since the previous call. It
+        is rebuilt when the fields of the collection change.
+
+        :param collection: document collection (str, must be existing)
+        :param fields: field names (all the fields if None)
+        :returns: the SnapshotView, whose version is the write version of
+           the session
+        """
+
+        snapshot = self.snapshots.get(collection)
+        if snapshot is None:
+            snapshot = ColumnarSnapshot(self.get_values(collection),
+                                        self.write_version)
+            self.snapshots[collection] = snapshot
+        else:
+            documents = snapshot.pop_pending()
+            if documents:
+                snapshot.update(
+                    self.get_values(collection, documents, snapshot.fields),
+                    self.get_collection(collection).primary_key,
+                    self.write_version)
+        return snapshot.view(fields)
+    def get_texts(self, collection, documents=None, fields=None):
+        """Give the values of several documents and fields, converted to
+        text by SQLite as its LIKE operator does.
+
+        :param collection: document collection (str, must be existing)
+        :param documents: list of document names (all the documents of the
+           collection if None)
+        :param fields: list of field names (all the fields of the
+           collection if None)
+        :returns: a generator of (document, field, text) tuples, text being
+           None for a value not defined
+        """
+
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(
+                collection))
+
+        if fields is None:
+            fields = self.get_fields_names(collection)
+        fields = [field for field in fields
+                  if self.get_field(collection, field) is not None]
+
+        table = self.metadata.tables[
+            self.name_to_valid_column_name(collection)]
+        pk_column = table.c[
+            self.name_to_valid_column_name(collection_row.primary_key)]
+        select = sql.select(
+            [pk_column] +
+            [sql.cast(table.c[self.name_to_valid_column_name(field)], String)
+             for field in fields])
+
+        # The pending ORM changes are written before the query
+        self.session.flush()
+
+        if documents is None:
+            selects = [select]
+        else:
+            documents = list(documents)
+            # By chunks to stay under the SQLite variables limit
+            selects = [select.where(pk_column.in_(documents[i:i + 500]))
+                       for i in range(0, len(documents), 500)]
+
+        for chunk_select in selects:
+            for row in self.session.execute(chunk_select).fetchall():
+                for position, field in enumerate(fields, 1):
+                    yield row[0], field, row[position]
+
+    def get_values(self, collection, documents=None, fields=None):
+        """Give the values of several documents and fields.
+
+        Contrary to get_value, which builds the whole document for each
+        value, the values are read with one query (per chunk of documents)
+        and only the requested fields are converted.
+
+        :param collection: document collection (str, must be existing)
+        :param documents: list of document names (all the documents of the
+           collection if None)
+        :param fields: list of field names (all the fields of the
+           collection if None)
+        :returns: a ValuesBlock, with None values for the documents and the
+           fields that do not exist
+        """
+
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(
+                collection))
+
+        if fields is None:
+            fields = self.get_fields_names(collection)
+        fields = list(fields)
+
+        types = {}
+        for field in fields:
+            field_row = self.get_field(collection, field)
+            types[field] = field_row.type if field_row is not None else None
+        known_fields = [field for field in fields
+                        if types[field] is not None]
+
+        table_class = self.table_classes[
+            self.name_to_valid_column_name(collection)]
+        pk_column = getattr(table_class, self.name_to_valid_column_name(
+            collection_row.primary_key))
+        columns = [getattr(table_class, self.name_to_valid_column_name(field))
+                   for field in known_fields]
+
+        # The pending ORM changes are written before the query
+        self.session.flush()
+
+        rows = {}
+        if documents is None:
+            for row in self.session.query(pk_column, *columns):
+                rows[row[0]] = row
+            documents = list(rows)
+        else:
+            documents = list(documents)
+            # By chunks to stay under the SQLite variables limit
+            for i in range(0, len(documents), 500):
+                for row in self.session.query(pk_column, *columns).filter(
+                        pk_column.in_(documents[i:i + 500])):
+                    rows[row[0]] = row
+
+        block = ValuesBlock(documents, fields, types)
+        for position, field in enumerate(known_fields, 1):
+            field_type = types[field]
+            if field_type.startswith('list_') or field_type == FIELD_TYPE_JSON:
+                convert = self._DatabaseSession__column_to_python
+                block.columns[field] = [
+                    convert(field_type, rows[document][position])
+                    if document in rows else None for document in documents]
+            else:
+                block.columns[field] = [
+                    rows[document][position] if document in rows else None
+                    for document in documents]
+
+        return block
+
+    def record_schema_change(self, collections):
+        """Record a change of the fields of collections: their compiled
+        filters, values modified, full-text indexes and snapshots are
+        invalidated.
+
+        :param collections: collection names
+        """
+
+        self.write_version += 1
+        for collection in collections:
+            self.schema_versions[collection] = self.write_version
+
+        # The bitsets are compared again and the values indexed again when
+        # they are next read
+        for collections_compared in list(self.modified):
+            if set(collections_compared) & set(collections):
+                del self.modified[collections_compared]
+        for collection in collections:
+            search_index = self.search_indexes.pop(collection, None)
+            if search_index is not None:
+                search_index.close()
+            self.snapshots.pop(collection, None)
+
+    def record_write(self, collection, documents, removed=False,
+                     fields=None):
+        """Record a change of the values of documents: they will be
+        compared again in the bitsets of the values modified, indexed again
+        in the full-text index of the collection and patched in its
+        snapshot.
+
+        :param collection: document collection
+        :param documents: document names
+        :param removed: True if the documents have been removed
+        :param fields: names of the fields written (all the fields if None)
+        """
+
+        for (compared, reference), modified in self.modified.items():
+            if removed and collection == compared:
+                modified.discard(documents)
+            elif collection in (compared, reference):
+                modified.mark(documents, fields)
+
+        search_index = self.search_indexes.get(collection)
+        if search_index is not None:
+            search_index.mark(documents, None if removed else fields)
+
+        snapshot = self.snapshots.get(collection)
+        if snapshot is not None:
+            snapshot.mark(documents)
+
+        self.write_version += 1
+
+    def remove_document(self, collection, document):
+        """Override the method removing a document, to record the write.
+
+        :param collection: document collection (str, must be existing)
+        :param document: document name (str, must be existing)
+        """
+
+        super().remove_document(collection, document)
+        self.record_write(collection, [document], removed=True)
+
+    def remove_documents(self, collection, documents):
+        """Remove documents from a collection.
+
+        Contrary to remove_document, the rows of the collection table and
+        of the list tables are deleted with one statement per chunk of
+        documents.
+
+        :param collection: document collection (str, must be existing)
+        :param documents: list of document names (the ones that do not
+           exist are ignored)
+        """
+
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(
+                collection))
+        documents = list(documents)
+
+        collection_table = self.name_to_valid_column_name(collection)
+        pk_column = self.name_to_valid_column_name(collection_row.primary_key)
+        document_table = self.metadata.tables[collection_table]
+        list_tables = [self.metadata.tables[table]
+                       for table in self.metadata.tables
+                       if table.startswith('list_%s_' % collection_table)]
+
+        # The pending ORM changes are written before the bulk statements
+        self.session.flush()
+
+        # By chunks to stay under the SQLite variables limit
+        for i in range(0, len(documents), 500):
+            chunk = documents[i:i + 500]
+            self.session.execute(document_table.delete().where(
+                document_table.c[pk_column].in_(chunk)))
+            if self.list_tables:
+                for list_table in list_tables:
+                    self.session.execute(list_table.delete().where(
+                        list_table.c.document_id.in_(chunk)))
+
+        if self._DatabaseSession__caches:
+            documents_cache = self._DatabaseSession__documents[collection]
+            for document in documents:
+                documents_cache.pop(document, None)
+
+        self.record_write(collection, documents, removed=True)
+        self._DatabaseSession__unsaved_modifications = True
+
+    def remove_field(self, collection, field):
+        """Override the method removing fields, to record the schema
+        change.
+
+        :param collection: field collection (str, must be existing)
+        :param field: field name, or list of field names
+        """
+
+        super().remove_field(collection, field)
+        self.record_schema_change([collection])
+
+    def remove_value(self, collection, document, field, flush=True):
+        """Override the method removing a value, to record the write.
+
+        :param collection: document collection (str, must be existing)
+        :param document: document name (str, must be existing)
+        :param field: field name (str, must be existing)
+        :param flush: bool to know if the session must be flushed
+        """
+
+        super().remove_value(collection, document, field, flush)
+        self.record_write(collection, [document], fields=[field])
+
+    def run_commands(self, commands, flush=False, atomic=False):
+        """Run a batch of commands, in order.
+
+        Through a SessionProxy, the batch is run by the writer thread at
+        once, instead of waiting for it for each command.
+
+        :param commands: list of (function, args, kwargs) tuples, function
+           being the name of a method of the session or a callable (kwargs
+           is optional)
+        :param flush: True to flush the session after the batch
+        :param atomic: True to cancel the commands already run if one of
+           them fails, the modifications made before the batch being kept
+           (the commands must not change the fields)
+        :returns: the list of the results of the commands
+        """
+
+        if atomic:
+            savepoint = self.session.begin_nested()
+            try:
+                results = self.run_commands(commands, flush=True)
+            except BaseException:
+                savepoint.rollback()
+                # The rows cached are read again, as before the batch
+                self._DatabaseSession__fill_caches()
+                raise
+            savepoint.commit()
+            return results
+
+        results = []
+        for command in commands:
+            function, args = command[:2]
+            kwargs = command[2] if len(command) > 2 else {}
+            if isinstance(function, str):
+                function = getattr(self, function)
+            results.append(function(*args, **kwargs))
+        if flush:
+            self.session.flush()
+        return results
+
+    def search_values(self, collection, search, fields, documents=None):
+        """Give the names of the documents with a value containing a
+        string, using the full-text index of the collection.
+
+        The index is built for the fields searched the first time they are
+        searched, then the documents written since the previous search are
+        indexed again.
+
+        :param collection: document collection (str, must be existing)
+        :param search: string to search (% for any string, _ for any
+           character)
+        :param fields: names of the fields to search in
+        :param documents: names of the documents to search in (all the
+           documents of the collection if None)
+        :returns: the list of the names of the matching documents, None if
+           SQLite does not support the index
+        """
+
+        if not search_index_available():
+            return None
+
+        search_index = self.search_indexes.get(collection)
+        if search_index is None:
+            search_index = SearchIndex()
+            self.search_indexes[collection] = search_index
+
+        missing_fields = [field for field in fields
+                          if field not in search_index.fields]
+        if missing_fields:
+            search_index.add(self.get_texts(collection, None,
+                                            missing_fields))
+            search_index.fields.update(missing_fields)
+
+        written_documents, written_fields = search_index.pop_pending()
+        if written_documents and written_fields:
+            search_index.remove(written_documents, written_fields)
+            search_index.add(self.get_texts(collection, written_documents,
+                                            written_fields))
+
+        matching = search_index.search("%" + search + "%", fields)
+        if documents is None:
+            return list(matching)
+        return [document for document in documents if document in matching]
+
     def set_shown_tags(self, field_showed):
         """Set the list of visible tags.
 
@@ -433,3 +1127,545 @@ class DatabaseSessionMIA(DatabaseSession):
             self.session.add(field)
         self.session.flush()
         self.unsaved_modifications = True
+
+    def upsert_documents(self, collection, documents,
+                         create_missing_fields=True):
+        """Add documents to a collection, replacing the existing ones.
+
+        Contrary to remove_document/add_document, the rows of the collection
+        table and of the list tables are written with one executemany per
+        table, and the documents cache is refreshed only once.
+
+        :param collection: document collection (str, must be existing)
+        :param documents: list of dictionaries of document values,
+           containing the primary key of the collection
+        :param create_missing_fields: bool to know if the fields that are
+           not in the collection must be created from the document values
+        """
+
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(
+                collection))
+        primary_key = collection_row.primary_key
+        for document in documents:
+            if primary_key not in document:
+                raise ValueError(
+                    "The primary_key {0} of the collection {1} is missing "
+                    "from the document dictionary".format(primary_key,
+                                                          collection))
+            for field, value in document.items():
+                self.ensure_field_for_value(collection, field, value,
+                                            create=create_missing_fields)
+
+        collection_table = self.name_to_valid_column_name(collection)
+        pk_column = self.name_to_valid_column_name(primary_key)
+        fields = {field: self.get_field(collection, field).type
+                  for document in documents for field in document}
+        columns = {field: self.name_to_valid_column_name(field)
+                   for field in fields}
+        document_ids = [document[primary_key] for document in documents]
+
+        # All the rows are given the same columns, as required by executemany
+        rows = []
+        list_rows = {}
+        for document in documents:
+            row = dict.fromkeys(columns.values())
+            for field, value in document.items():
+                field_type = fields[field]
+                row[columns[field]] = \
+                    self._DatabaseSession__python_to_column(field_type, value)
+                if self.list_tables and isinstance(value, list):
+                    table = 'list_%s_%s' % (collection_table, columns[field])
+                    list_rows.setdefault(table, []).extend(
+                        {'document_id': document[primary_key], 'i': i,
+                         'value': self._DatabaseSession__python_to_column(
+                             field_type[5:], item)}
+                        for i, item in enumerate(value))
+            rows.append(row)
+
+        # The pending ORM changes are written before the bulk statements
+        self.session.flush()
+
+        # Removing the existing documents, by chunks to stay under the
+        # SQLite variables limit
+        document_table = self.metadata.tables[collection_table]
+        list_tables = [self.metadata.tables[table]
+                       for table in self.metadata.tables
+                       if table.startswith('list_%s_' % collection_table)]
+        for i in range(0, len(document_ids), 500):
+            chunk = document_ids[i:i + 500]
+            self.session.execute(document_table.delete().where(
+                document_table.c[pk_column].in_(chunk)))
+            if self.list_tables:
+                for list_table in list_tables:
+                    self.session.execute(list_table.delete().where(
+                        list_table.c.document_id.in_(chunk)))
+
+        if rows:
+            self.session.execute(document_table.insert(), params=rows)
+        for table, params in list_rows.items():
+            if params:
+                self.session.execute(self.metadata.tables[table].insert(),
+                                     params=params)
+
+        # Only the upserted documents are refreshed in the cache, the rows
+        # already loaded by the session being overwritten with the new
+        # values
+        if self._DatabaseSession__caches:
+            documents_cache = self._DatabaseSession__documents[collection]
+            table_class = self.table_classes[collection_table]
+            pk_attribute = getattr(table_class, pk_column)
+            for i in range(0, len(document_ids), 500):
+                for document_row in self.session.query(
+                        table_class).populate_existing().filter(
+                            pk_attribute.in_(document_ids[i:i + 500])):
+                    documents_cache[getattr(document_row, pk_column)] = \
+                        document_row
+
+        self.record_write(collection, document_ids)
+        self._DatabaseSession__unsaved_modifications = True
+
+    def set_value(self, collection, document, field, new_value, flush=True):
+        """Override the method setting a value, to record the write.
+
+        :param collection: document collection (str, must be existing)
+        :param document: document name (str, must be existing)
+        :param field: field name (str, must be existing)
+        :param new_value: new value
+        :param flush: bool to know if the session must be flushed
+        """
+
+        super().set_value(collection, document, field, new_value, flush)
+        self.record_write(collection, [document], fields=[field])
+
+    def set_values(self, collection, document, values, flush=True):
+        """Override the method setting values, to record the write.
+
+        :param collection: document collection (str, must be existing)
+        :param document: document name (str, must be existing)
+        :param values: dictionary of the new values by field name
+        :param flush: bool to know if the session must be flushed
+        """
+
+        super().set_values(collection, document, values, flush)
+        self.record_write(collection, [document], fields=list(values))
+
+    def unsave_modifications(self):
+        """Override the method rolling back the session: the values
+        modified and indexed of all the collections are invalidated."""
+
+        super().unsave_modifications()
+        self.record_schema_change(self.get_collections_names())
+
+    def update_documents(self, collection, values):
+        """Set the values of several documents of a collection.
+
+        The documents are read in one query, merged with the new values and
+        written back with upsert_documents.
+
+        :param collection: document collection (str, must be existing)
+        :param values: dictionary associating the name of each document
+           (str, must be existing) to a dictionary of its new values by
+           field name (a None value removes the value)
+        """
+
+        collection_row = self.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(
+                collection))
+        if not values:
+            return
+
+        primary_key = collection_row.primary_key
+        block = self.get_values(collection, list(values))
+        documents = []
+        for document, new_values in values.items():
+            if block.get(document, primary_key) is None:
+                raise ValueError(
+                    "The document with the name {0} does not exist in the "
+                    "collection {1}".format(document, collection))
+            row = {field: value
+                   for field, value in zip(block.fields, block.row(document))
+                   if value is not None}
+            for field, value in new_values.items():
+                if value is None:
+                    row.pop(field, None)
+                else:
+                    row[field] = value
+            row[primary_key] = document
+            documents.append(row)
+
+        self.upsert_documents(collection, documents,
+                              create_missing_fields=False)
+
+    def update_fields(self, added_fields=(), removed_fields=()):
+        """Add and remove fields, applying a single schema change per
+        collection.
+
+        The new columns are added with a batch of ALTER TABLE statements, or
+        with the table rebuild if fields are also removed from the
+        collection. The table classes and the documents cache are refreshed
+        only once, at the end.
+
+        :param added_fields: list of fields to add (collection, name, type,
+        description, visibility, origin, unit, default_value)
+        :param removed_fields: list of fields to remove (collection, name)
+        """
+
+        # Checks
+        added = {}
+        for field in added_fields:
+            collection, name, field_type, description = field[:4]
+            if self.get_collection(collection) is None:
+                raise ValueError("The collection " +
+                                 str(collection) + " does not exist")
+            if (self.get_field(collection, name) is not None or
+                    name in [added_field[1] for added_field in
+                             added.get(collection, [])]):
+                raise ValueError("A field with the name " + str(name) +
+                                 " already exists in the collection " +
+                                 collection)
+            if not isinstance(name, str):
+                raise ValueError("The field name must be of type " +
+                                 str(str) + ", but field name of type " +
+                                 str(type(name)) + " given")
+            if field_type not in ALL_TYPES:
+                raise ValueError("The field type must be in " +
+                                 str(ALL_TYPES) + ", but " +
+                                 str(field_type) + " given")
+            if not isinstance(description, str) and description is not None:
+                raise ValueError(
+                    "The field description must be of type " + str(str) +
+                    " or None, but field description of type " +
+                    str(type(description)) + " given")
+            added.setdefault(collection, []).append(field)
+
+        removed = {}
+        for collection, name in removed_fields:
+            if self.get_collection(collection) is None:
+                raise ValueError("The collection " +
+                                 str(collection) + " does not exist")
+            field_row = self.get_field(collection, name)
+            if field_row is None:
+                raise ValueError("The field with the name " + str(name) +
+                                 " does not exist in the collection " +
+                                 collection)
+            removed.setdefault(collection, {})[name] = field_row
+
+        # The pending ORM changes are written before the schema changes
+        self.session.flush()
+
+        for collection in set(added) | set(removed):
+            table_name = self.name_to_valid_column_name(collection)
+            new_columns = []
+
+            for field in added.get(collection, []):
+                name, field_type = field[1], field[2]
+                field_row = self.table_classes[FIELD_TABLE](
+                    field_name=name, collection_name=collection,
+                    type=field_type, description=field[3],
+                    visibility=field[4], origin=field[5], unit=field[6],
+                    default_value=field[7])
+                self.session.add(field_row)
+                if self._DatabaseSession__caches:
+                    self._DatabaseSession__fields[collection][name] = \
+                        field_row
+
+                if field_type in LIST_TYPES:
+                    if self.list_tables:
+                        list_table = Table(
+                            'list_%s_%s' % (
+                                table_name,
+                                self.name_to_valid_column_name(name)),
+                            self.metadata,
+                            Column('document_id', String, primary_key=True),
+                            Column('i', Integer, primary_key=True),
+                            Column('value', TYPE_TO_COLUMN[field_type[5:]]))
+                        self.session.execute(CreateTable(list_table))
+                    # The str representation of the lists is stored
+                    column_type = String
+                else:
+                    column_type = \
+                        self._DatabaseSession__field_type_to_column_type(
+                            field_type)
+                new_columns.append(Column(
+                    self.name_to_valid_column_name(name), column_type))
+
+            removed_columns = set()
+            for name, field_row in removed.get(collection, {}).items():
+                column_name = self.name_to_valid_column_name(name)
+                removed_columns.add(column_name)
+                list_table_name = 'list_%s_%s' % (table_name, column_name)
+                if (field_row.type in LIST_TYPES and
+                        list_table_name in self.metadata.tables):
+                    list_table = self.metadata.tables[list_table_name]
+                    self.session.execute(DropTable(list_table))
+                    self.metadata.remove(list_table)
+                self.session.delete(field_row)
+
+            document_table = self.metadata.tables[table_name]
+
+            if removed_columns:
+                # Single rebuild of the table, without the removed columns
+                # and with the added ones
+                kept_columns = [column.name for column in document_table.c
+                                if column.name not in removed_columns]
+                backup_table = Table(
+                    table_name + "_backup", self.metadata,
+                    *([document_table.c[column].copy()
+                       for column in kept_columns] + new_columns))
+                self.session.execute(CreateTable(backup_table))
+                self.session.execute(
+                    sql.insert(backup_table).from_select(
+                        kept_columns, sql.select(
+                            [document_table.c[column]
+                             for column in kept_columns])))
+                self.session.execute(DropTable(document_table))
+                self.session.execute('ALTER TABLE "%s" RENAME TO "%s"' %
+                                     (backup_table.name, table_name))
+                self.metadata.remove(document_table)
+                self.metadata.remove(backup_table)
+                Table(table_name, self.metadata,
+                      *[column.copy() for column in backup_table.c])
+
+            else:
+                for column in new_columns:
+                    column_str_type = column.type.compile(
+                        self.database.engine.dialect)
+                    column_name = column.compile(
+                        dialect=self.database.engine.dialect)
+                    self.session.execute(
+                        'ALTER TABLE "%s" ADD COLUMN %s %s' %
+                        (table_name, column_name, column_str_type))
+                    document_table.append_column(column)
+
+        self.session.flush()
+
+        # Classes reloaded once, in order to update the columns attributes
+        self._DatabaseSession__update_table_classes()
+
+        if self._DatabaseSession__caches:
+            for collection in set(added) | set(removed):
+                for name in removed.get(collection, {}):
+                    self._DatabaseSession__fields[collection].pop(name, None)
+                self._DatabaseSession__refresh_cache_documents(collection)
+
+        self.record_schema_change(set(added) | set(removed))
+        self._DatabaseSession__unsaved_modifications = True
+
+
+class ModifiedValues:
+    """Values of a collection that differ from the values of a reference
+    collection, stored as one bitset per document (see
+    DatabaseSessionMIA.get_modified).
+
+    .. Methods:
+        - discard: forgets documents
+        - documents: gives the documents with modified values
+        - is_modified: tells if a value is modified
+        - mark: marks documents to compare again
+        - pop_pending: gives and forgets the documents to compare again
+        - update: compares the values of documents
+    """
+
+    def __init__(self):
+        """Initialization of the ModifiedValues class."""
+
+        # Field name -> bit of the field in the bitsets
+        self.bits = {}
+        # Document name -> bitset of the fields modified
+        self.rows = {}
+        # Document name -> set of the fields to compare again (None for
+        # all the fields)
+        self.pending = {}
+
+    def discard(self, documents):
+        """Forget documents, which do not exist any more.
+
+        :param documents: document names
+        """
+
+        for document in documents:
+            self.rows.pop(document, None)
+            self.pending.pop(document, None)
+
+    def documents(self, fields=None):
+        """Give the documents with modified values.
+
+        :param fields: field names to consider (all the fields if None)
+        :returns: the set of the document names
+        """
+
+        if fields is None:
+            return {document for document, row in self.rows.items() if row}
+
+        mask = 0
+        for field in fields:
+            mask |= self.bits.get(field, 0)
+        return {document for document, row in self.rows.items()
+                if row & mask}
+
+    def is_modified(self, document, field):
+        """Tell if a value is modified.
+
+        :param document: document name
+        :param field: field name
+        :returns: True if the value differs from the reference value
+        """
+
+        bit = self.bits.get(field)
+        return bit is not None and self.rows.get(document, 0) & bit != 0
+
+    def mark(self, documents, fields=None):
+        """Mark documents to compare again.
+
+        :param documents: document names
+        :param fields: names of the fields to compare again (all the fields
+           if None)
+        """
+
+        for document in documents:
+            if fields is None:
+                self.pending[document] = None
+            else:
+                pending = self.pending.get(document, set())
+                if pending is not None:
+                    pending.update(fields)
+                    self.pending[document] = pending
+
+    def pop_pending(self):
+        """Give the documents to compare again, and forget them.
+
+        :returns: tuple (list of the document names, list of the field
+           names, None if all the fields must be compared)
+        """
+
+        documents = list(self.pending)
+        fields = set()
+        for pending in self.pending.values():
+            if pending is None:
+                fields = None
+                break
+            fields.update(pending)
+        self.pending = {}
+        return documents, None if fields is None else list(fields)
+
+    def update(self, values, reference_values, all_fields):
+        """Compare the values of documents.
+
+        :param values: ValuesBlock of the documents in the collection
+        :param reference_values: ValuesBlock of the same documents and fields
+           in the reference collection
+        :param all_fields: True if the blocks contain all the fields of the
+           collection
+        """
+
+        field_bits = []
+        for field in values.fields:
+            if field not in self.bits:
+                self.bits[field] = 1 << len(self.bits)
+            field_bits.append((field, self.bits[field]))
+
+        mask = 0
+        for field, bit in field_bits:
+            mask |= bit
+
+        for position, document in enumerate(values.documents):
+            row = 0 if all_fields else self.rows.get(document, 0) & ~mask
+            for field, bit in field_bits:
+                if (values.columns[field][position] !=
+                        reference_values.columns[field][position]):
+                    row |= bit
+            if row:
+                self.rows[document] = row
+            else:
+                self.rows.pop(document, None)
+
+
+class ValuesBlock:
+    """Values of several documents and fields of a collection, stored by
+    columns (see DatabaseSessionMIA.get_values).
+
+    :param documents: list of the document names, in the order of the
+       values of each column
+    :param fields: list of the field names
+    :param types: dictionary of the types of the fields (None for a field
+       that does not exist)
+
+    .. Methods:
+        - get: gives the value of a document and a field
+        - row: gives the values of a document, in the order of the fields
+    """
+
+    def __init__(self, documents, fields, types):
+        """Initialization of the ValuesBlock class.
+
+        :param documents: list of the document names
+        :param fields: list of the field names
+        :param types: dictionary of the types of the fields
+        """
+
+        self.documents = documents
+        self.fields = fields
+        self.types = types
+        self.index = {document: position for position, document in
+                      enumerate(documents)}
+        # Field name -> list of the values, in the order of the documents
+        self.columns = {field: [None] * len(documents) for field in fields}
+
+    def get(self, document, field):
+        """Give the value of a document and a field.
+
+        :param document: document name
+        :param field: field name
+        :returns: the value, None if the document or the field is not in
+           the block
+        """
+
+        position = self.index.get(document)
+        if position is None or field not in self.columns:
+            return None
+        return self.columns[field][position]
+
+    def row(self, document):
+        """Give the values of a document.
+
+        :param document: document name
+        :returns: the list of the values, in the order of the fields
+        """
+
+        position = self.index.get(document)
+        if position is None:
+            return [None] * len(self.fields)
+        return [self.columns[field][position] for field in self.fields]
+
+
+def copy_database(source, destination):
+    """Copy a database file with its write-ahead log, so that the copy has
+    the transactions committed but not written in the file yet (see
+    DatabaseSessionMIA.checkpoint).
+
+    :param source: path of the database file
+    :param destination: path of the copy
+    """
+
+    shutil.copy(source, destination)
+    if os.path.exists(source + "-wal"):
+        shutil.copy(source + "-wal", destination + "-wal")
+    elif os.path.exists(destination + "-wal"):
+        os.remove(destination + "-wal")
+    # The shared memory index is rebuilt from the log
+    if os.path.exists(destination + "-shm"):
+        os.remove(destination + "-shm")
+
+
+def remove_database(path):
+    """Remove a database file with its write-ahead log.
+
+    :param path: path of the database file
+    """
+
+    for file_path in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(file_path):
+            os.remove(file_path)
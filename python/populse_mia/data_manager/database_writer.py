@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*- #
+"""Module that contains the thread writing the database of a project
+
+The session of a project (see DatabaseSessionMIA) is owned by a writer
+thread: it is the only session that modifies the database, and its caches
+are only used by this thread. The other threads (the GUI, the imports, the
+pipelines run) use it through a SessionProxy, which sends each call to the
+writer thread and waits for its result. The commands can also be sent by
+batches (see DatabaseSessionMIA.run_commands), run by the writer thread at
+once.
+
+The threads that only read the database, without waiting for the writer,
+open a read-only session (see DatabaseMIA.read_session): the database uses
+the write-ahead log, so that they read the last committed values while the
+writer writes.
+
+Contains:
+    Class:
+        -DatabaseWriter : Thread owning the session writing the database
+        -SessionProxy : Session of a project, whose calls are run by the
+        writer thread
+
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import queue
+import threading
+import types
+from concurrent.futures import Future
+
+
+class DatabaseWriter(threading.Thread):
+    """Thread owning the session writing the database.
+
+    The writer is a daemon thread: a project that is not closed does not
+    prevent the software from exiting, its unsaved modifications being lost
+    as before.
+
+    :param database: DatabaseMIA of the project
+
+    .. Methods:
+        - call: runs a method of the session in the writer thread
+        - close: releases the session and stops the thread
+        - run: Override the Thread run method.
+        - submit: sends a batch of commands to the writer thread
+    """
+
+    def __init__(self, database):
+        """Initialization of the DatabaseWriter class, starting the thread
+        once its session is opened.
+
+        :param database: DatabaseMIA of the project
+        """
+
+        super().__init__(name="DatabaseWriter", daemon=True)
+        self.database = database
+        self.session = None
+        # (commands, flush, future) tuples, None to stop the thread
+        self.commands = queue.Queue()
+        opened = Future()
+        self.commands.put(([(self.__open, ())], False, opened))
+        self.start()
+        opened.result()
+
+    def call(self, method, *args, **kwargs):
+        """Run a method of the session in the writer thread, and wait for
+        its result.
+
+        :param method: name of the method
+        :param args: positional arguments of the method
+        :param kwargs: keyword arguments of the method
+        :returns: the result of the method (a list for a generator, which
+           is consumed by the writer thread)
+        """
+
+        if threading.current_thread() is self:
+            return getattr(self.session, method)(*args, **kwargs)
+        return self.submit([(method, args, kwargs)]).result()[0]
+
+    def close(self):
+        """Release the session, committing it, and stop the thread."""
+
+        if not self.is_alive():
+            return
+        closed = Future()
+        self.commands.put(([(self.database.__exit__, (None, None, None))],
+                           False, closed))
+        self.commands.put(None)
+        closed.result()
+        self.join()
+
+    def run(self):
+        """Override the Thread run method. Run the batches of commands sent
+        to the writer, in order."""
+
+        while True:
+            batch = self.commands.get()
+            if batch is None:
+                break
+
+            commands, flush, future = batch
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if self.session is None:
+                    results = [function(*args)
+                               for function, args in commands]
+                else:
+                    results = self.session.run_commands(commands, flush)
+                    # The generators are consumed by the thread owning the
+                    # session
+                    results = [list(result)
+                               if isinstance(result, types.GeneratorType)
+                               else result for result in results]
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(results)
+
+    def submit(self, commands, flush=False):
+        """Send a batch of commands to the writer thread, without waiting
+        for them to be run.
+
+        A failing command stops the batch: the future gives its exception,
+        the modifications of the previous commands staying in the session.
+
+        :param commands: list of (function, args, kwargs) tuples (see
+           DatabaseSessionMIA.run_commands)
+        :param flush: True to flush the session after the batch
+        :returns: a concurrent.futures.Future of the list of the results
+        """
+
+        future = Future()
+        if threading.current_thread() is self:
+            # A command of the writer can not wait for the next ones
+            try:
+                future.set_result(self.session.run_commands(commands, flush))
+            except Exception as error:
+                future.set_exception(error)
+        else:
+            self.commands.put((commands, flush, future))
+        return future
+
+    def __open(self):
+        """Open the session of the writer thread."""
+
+        self.session = self.database.__enter__()
+        # The writer being the only session modifying the database, the
+        # rows it has loaded stay valid after a commit, so that they can
+        # be read by the other threads without being refreshed
+        self.session.session.expire_on_commit = False
+
+
+class SessionProxy:
+    """Session of a project, whose calls are run by the writer thread.
+
+    The methods of the session are run by the writer thread, and its
+    attributes are set by the writer thread. The other attributes (such as
+    the SQLAlchemy session or the metadata) are only available to the
+    writer thread, for example to a callable run with run_commands.
+
+    :param writer: DatabaseWriter owning the session
+
+    .. Methods:
+        - submit: sends a batch of commands to the writer thread
+    """
+
+    def __init__(self, writer):
+        """Initialization of the SessionProxy class.
+
+        :param writer: DatabaseWriter owning the session
+        """
+
+        object.__setattr__(self, "writer", writer)
+
+    def __getattr__(self, name):
+        """Give an attribute of the session, a method being run by the
+        writer thread.
+
+        :param name: name of the attribute
+        :returns: the attribute
+        :raises AttributeError: for an attribute that is not a method,
+           outside of the writer thread
+        """
+
+        session = self.writer.session
+        if threading.current_thread() is self.writer:
+            return getattr(session, name)
+
+        # The attributes are looked up on the class, so that the properties
+        # are not evaluated outside of the writer thread
+        if not isinstance(getattr(type(session), name, None),
+                          types.FunctionType):
+            raise AttributeError(
+                "The attribute {0} of the session is only available to the "
+                "thread writing the database (see run_commands)".format(
+                    name))
+        method = getattr(session, name)
+
+        def call(*args, **kwargs):
+            return self.writer.call(name, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+    def __setattr__(self, name, value):
+        """Set an attribute of the session, in the writer thread.
+
+        :param name: name of the attribute
+        :param value: new value
+        """
+
+        if threading.current_thread() is self.writer:
+            setattr(self.writer.session, name, value)
+        else:
+            self.writer.submit(
+                [(setattr, (self.writer.session, name, value))]).result()
+
+    def submit(self, commands, flush=False):
+        """Send a batch of commands to the writer thread, without waiting
+        for them to be run (see DatabaseWriter.submit).
+
+        :param commands: list of (function, args, kwargs) tuples
+        :param flush: True to flush the session after the batch
+        :returns: a concurrent.futures.Future of the list of the results
+        """
+
+        return self.writer.submit(commands, flush)
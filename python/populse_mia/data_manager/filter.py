@@ -78,20 +78,14 @@ class Filter:
         :returns: The list of scans matching the filter
         """
 
-        rapid_filter = data_browser.rapid_search.RapidSearch.prepare_filter(
-            self.search_bar, tags, scans)
-        rapid_result = current_project.session.filter_documents(
-            project.COLLECTION_CURRENT, rapid_filter)
-        rapid_list = [getattr(
-            scan, project.TAG_FILENAME) for scan in rapid_result]
+        rapid_list = data_browser.rapid_search.RapidSearch.search_scans(
+            current_project, self.search_bar, tags, scans)
         advanced_filter = \
             data_browser.advanced_search.AdvancedSearch.prepare_filters(
                 self.links, self.fields, self.conditions, self.values,
-                self.nots, rapid_list)
-        advanced_result = current_project.session.filter_documents(
-            project.COLLECTION_CURRENT, advanced_filter)
-        final_result = [getattr(
-            scan, project.TAG_FILENAME) for scan in advanced_result]
+                self.nots)
+        final_result = current_project.session.filter_documents_names(
+            project.COLLECTION_CURRENT, advanced_filter, rapid_list)
         return final_result
 
     def json_format(self):
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*- #
+"""Module to compute and compare the fingerprints (checksums) of the scans
+
+The files are hashed by fixed-size chunks (or through a memory map), so that
+the memory used does not depend on the size of the scans. The algorithm is
+recorded in the value of the Checksum tag as a prefix ("blake2b:<digest>");
+a value without prefix is a md5 digest, as in the projects created before
+the algorithm could be chosen.
+
+The checksums computed are also kept, with the size, modification time and
+inode of the files, in an index stored in the project, so that a file whose
+stat did not change does not need to be hashed again.
+
+Contains:
+    Class:
+        -FingerprintIndex : Index of the checksums and stats of the scans of
+        a project
+    Methods:
+        -checksum_matches : Checks if a file still has a recorded checksum
+        -compute_checksum : Returns the checksum value of a file
+        -file_digest : Returns the hexadecimal digest of a file
+        -format_checksum : Returns the checksum value of a digest
+        -parse_checksum : Returns the algorithm and the digest of a checksum
+        value
+        -stat_key : Returns the (size, mtime_ns, inode) tuple of a file
+
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import hashlib
+import mmap
+import os
+import sqlite3
+
+# Algorithm of the checksums stored without prefix
+DEFAULT_ALGORITHM = "md5"
+
+# Algorithms that can be used for the checksums (blake2b is only provided
+# by hashlib since Python 3.6)
+ALGORITHMS = tuple(algorithm
+                   for algorithm in ("md5", "blake2b", "sha1", "sha256")
+                   if algorithm in hashlib.algorithms_available)
+
+# Size of the chunks read when hashing a file (bytes)
+CHUNK_SIZE = 1024 * 1024
+
+
+class FingerprintIndex:
+    """Index of the checksums of the scans of a project, with the stats of
+    the files when they were hashed.
+
+    The index is a SQLite file stored in the database folder of the project,
+    next to mia.db, and is only a cache: removing it only forces the scans
+    to be hashed again.
+
+    :param project_folder: path of the project
+
+    .. Methods:
+        - close: closes the index
+        - get: returns the stat key and the checksum recorded for a scan
+        - remove: removes scans from the index
+        - set: records the stat key and the checksum of a scan
+        - set_many: records the stat keys and the checksums of scans
+        - unchanged: checks if a scan still has its recorded checksum
+          according to its stat
+    """
+
+    def __init__(self, project_folder):
+        """Initialization of the index.
+
+        :param project_folder: path of the project
+        """
+
+        database_folder = os.path.join(project_folder, "database")
+
+        if not os.path.exists(database_folder):
+            os.makedirs(database_folder)
+
+        self.connection = sqlite3.connect(
+            os.path.join(database_folder, "fingerprints.db"))
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprint ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "inode INTEGER, checksum TEXT)")
+        self.connection.commit()
+
+    def close(self):
+        """Close the index."""
+
+        self.connection.close()
+
+    def get(self, path):
+        """Give the stat key and the checksum recorded for a scan.
+
+        :param path: database path of the scan
+        :returns: the tuple ((size, mtime_ns, inode), checksum), or None if
+           the scan is not in the index
+        """
+
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, inode, checksum FROM fingerprint "
+            "WHERE path = ?", (path,)).fetchone()
+
+        if row is None:
+            return None
+
+        return tuple(row[:3]), row[3]
+
+    def remove(self, paths):
+        """Remove scans from the index.
+
+        :param paths: database paths of the scans
+        """
+
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM fingerprint WHERE path = ?",
+                [(path,) for path in paths])
+
+    def set(self, path, key, checksum):
+        """Record the stat key and the checksum of a scan.
+
+        :param path: database path of the scan
+        :param key: (size, mtime_ns, inode) tuple of the file when hashed
+        :param checksum: checksum value, as stored in the database
+        """
+
+        self.set_many([(path, key, checksum)])
+
+    def set_many(self, fingerprints):
+        """Record the stat keys and the checksums of scans, in one
+        transaction.
+
+        :param fingerprints: iterable of (path, key, checksum) tuples
+        """
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO fingerprint "
+                "(path, size, mtime_ns, inode, checksum) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(path,) + tuple(key) + (checksum,)
+                 for path, key, checksum in fingerprints])
+
+    def unchanged(self, path, key, checksum):
+        """Check if a scan still has its recorded checksum, without reading
+        it.
+
+        :param path: database path of the scan
+        :param key: current (size, mtime_ns, inode) tuple of the file
+        :param checksum: checksum value stored in the database
+        :returns: True if the file has the same stat as when it was hashed
+           to this checksum
+        """
+
+        fingerprint = self.get(path)
+        return fingerprint is not None and fingerprint == (tuple(key),
+                                                          checksum)
+
+
+def checksum_matches(file_path, checksum, chunk_size=CHUNK_SIZE,
+                     use_mmap=False):
+    """Check if a file still has a recorded checksum.
+
+    The file is hashed with the algorithm the checksum was computed with.
+
+    :param file_path: path of the file
+    :param checksum: checksum value, as stored in the database
+    :param chunk_size: size of the chunks read (bytes)
+    :param use_mmap: True to hash the file through a memory map
+    :returns: True if the file matches the checksum
+    """
+
+    algorithm, digest = parse_checksum(checksum)
+    return file_digest(file_path, algorithm, chunk_size, use_mmap) == digest
+
+
+def compute_checksum(file_path, algorithm=DEFAULT_ALGORITHM,
+                     chunk_size=CHUNK_SIZE, use_mmap=False):
+    """Give the checksum value of a file, as stored in the database.
+
+    :param file_path: path of the file
+    :param algorithm: hash algorithm (see ALGORITHMS)
+    :param chunk_size: size of the chunks read (bytes)
+    :param use_mmap: True to hash the file through a memory map
+    :returns: the checksum value
+    """
+
+    return format_checksum(
+        file_digest(file_path, algorithm, chunk_size, use_mmap), algorithm)
+
+
+def file_digest(file_path, algorithm=DEFAULT_ALGORITHM,
+                chunk_size=CHUNK_SIZE, use_mmap=False):
+    """Give the hexadecimal digest of a file, read by chunks.
+
+    :param file_path: path of the file
+    :param algorithm: hash algorithm (see ALGORITHMS)
+    :param chunk_size: size of the chunks read (bytes)
+    :param use_mmap: True to hash the file through a memory map (the pages
+       are then managed by the system instead of a read buffer)
+    :returns: the hexadecimal digest
+    """
+
+    if algorithm not in ALGORITHMS:
+        raise ValueError("The checksum algorithm must be in {0}, "
+                         "{1} given".format(ALGORITHMS, algorithm))
+
+    hasher = hashlib.new(algorithm)
+
+    with open(file_path, 'rb') as scan_file:
+
+        # An empty file can't be mapped
+        if use_mmap and os.fstat(scan_file.fileno()).st_size > 0:
+            with mmap.mmap(scan_file.fileno(), 0,
+                           access=mmap.ACCESS_READ) as data:
+                for start in range(0, len(data), chunk_size):
+                    hasher.update(data[start:start + chunk_size])
+
+        else:
+            buffer = bytearray(chunk_size)
+            view = memoryview(buffer)
+            size = scan_file.readinto(buffer)
+
+            while size:
+                hasher.update(view[:size])
+                size = scan_file.readinto(buffer)
+
+    return hasher.hexdigest()
+
+
+def format_checksum(digest, algorithm=DEFAULT_ALGORITHM):
+    """Give the checksum value of a digest, as stored in the database.
+
+    :param digest: hexadecimal digest
+    :param algorithm: algorithm used to compute the digest
+    :returns: the digest, prefixed by the algorithm if it's not the default
+       one
+    """
+
+    if algorithm == DEFAULT_ALGORITHM:
+        return digest
+
+    return "{0}:{1}".format(algorithm, digest)
+
+
+def parse_checksum(checksum):
+    """Give the algorithm and the digest of a checksum value.
+
+    :param checksum: checksum value, as stored in the database
+    :returns: the tuple (algorithm, digest)
+    """
+
+    algorithm, separator, digest = checksum.partition(":")
+
+    if not separator:
+        return DEFAULT_ALGORITHM, checksum
+
+    return algorithm, digest
+
+
+def stat_key(file_path):
+    """Give the stat of a file used to detect its modifications.
+
+    :param file_path: path of the file
+    :returns: the (size, mtime_ns, inode) tuple of the file
+    """
+
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*- #
+"""Module to record the progress of the imports, so that an interrupted
+import can be resumed
+
+For each scan of the export log being imported, the journal keeps the scan
+read (checksum and converted tags), with the stats of its Nifti and Json
+files, and whether it has been written in the database. When the import
+is restarted after a crash, the scans already written are skipped and the
+scans already read are not hashed and parsed again, as long as their files
+did not change. The scans are stored as Json, their date, datetime and
+time values being written in fixed ISO formats.
+
+Contains:
+    Class:
+        -ImportJournal : Journal of the import of an export log in a project
+
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import json
+import os
+import sqlite3
+from datetime import date, datetime, time
+
+# Populse_db imports
+from populse_db.database import (FIELD_TYPE_DATE, FIELD_TYPE_DATETIME,
+                                 FIELD_TYPE_TIME)
+
+# ISO formats of the date, datetime and time values, by database type
+ISO_FORMATS = {FIELD_TYPE_DATE: "%Y-%m-%d",
+               FIELD_TYPE_DATETIME: "%Y-%m-%dT%H:%M:%S.%f",
+               FIELD_TYPE_TIME: "%H:%M:%S.%f"}
+
+
+class ImportJournal:
+    """Journal of the import of an export log in a project.
+
+    The journal is a SQLite file stored in the database folder of the
+    project, next to mia.db. Each operation is committed at once, so that
+    the journal survives a crash of the software.
+
+    :param project_folder: path of the project
+
+    .. Methods:
+        - begin: starts or resumes the import of an export log
+        - close: closes the journal
+        - committed: returns the scans written in the database
+        - finish: records the end of the import
+        - get: returns a scan read, if its files did not change
+        - mark_committed: records that scans have been written in the
+          database
+        - record: records scans read
+    """
+
+    def __init__(self, project_folder):
+        """Initialization of the journal.
+
+        :param project_folder: path of the project
+        """
+
+        database_folder = os.path.join(project_folder, "database")
+
+        if not os.path.exists(database_folder):
+            os.makedirs(database_folder)
+
+        self.connection = sqlite3.connect(
+            os.path.join(database_folder, "import_journal.db"))
+
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS import ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), log TEXT, "
+                "log_mtime_ns INTEGER, finished INTEGER)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS scan ("
+                "name TEXT PRIMARY KEY, source_key TEXT, scan TEXT, "
+                "committed INTEGER)")
+
+    def begin(self, log_path, file_names):
+        """Start the import of an export log, or resume it if it was
+        interrupted.
+
+        The scans read for a previous import are kept if they are in the
+        export log, since their files may not have changed.
+
+        :param log_path: path of the export log
+        :param file_names: names of the scans of the export log (without the
+           extension)
+        :returns: True if an interrupted import of this log is resumed
+        """
+
+        log_path = os.path.abspath(log_path)
+        log_mtime_ns = os.stat(log_path).st_mtime_ns
+        row = self.connection.execute(
+            "SELECT log, log_mtime_ns, finished FROM import").fetchone()
+        resumed = row is not None and row == (log_path, log_mtime_ns, 0)
+
+        if resumed:
+            return True
+
+        file_names = set(file_names)
+        obsolete = [(name,) for (name,) in self.connection.execute(
+            "SELECT name FROM scan") if name not in file_names]
+
+        with self.connection:
+            self.connection.executemany("DELETE FROM scan WHERE name = ?",
+                                        obsolete)
+            self.connection.execute("UPDATE scan SET committed = 0")
+            self.connection.execute(
+                "INSERT OR REPLACE INTO import (id, log, log_mtime_ns, "
+                "finished) VALUES (0, ?, ?, 0)", (log_path, log_mtime_ns))
+
+        return False
+
+    def close(self):
+        """Close the journal."""
+
+        self.connection.close()
+
+    def committed(self):
+        """Give the scans written in the database by the current import.
+
+        :returns: a dictionary associating the name of each scan to the
+           scan read
+        """
+
+        return {name: _decode_scan(scan) for name, scan in
+                self.connection.execute(
+                    "SELECT name, scan FROM scan WHERE committed = 1")}
+
+    def finish(self):
+        """Record the end of the import: it won't be resumed."""
+
+        with self.connection:
+            self.connection.execute("UPDATE import SET finished = 1")
+
+    def get(self, name, source_key):
+        """Give a scan read, if its files did not change since.
+
+        :param name: name of the scan (without the extension)
+        :param source_key: current stats of the Nifti and Json files of the
+           scan
+        :returns: the scan read (see data_loader.read_scan), or None
+        """
+
+        row = self.connection.execute(
+            "SELECT source_key, scan FROM scan WHERE name = ?",
+            (name,)).fetchone()
+
+        if row is None or json.loads(row[0]) != list(source_key):
+            return None
+
+        return _decode_scan(row[1])
+
+    def mark_committed(self, names):
+        """Record that scans have been written in the database.
+
+        :param names: names of the scans (without the extension)
+        """
+
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE scan SET committed = 1 WHERE name = ?",
+                [(name,) for name in names])
+
+    def record(self, scans):
+        """Record scans read, in one transaction.
+
+        :param scans: iterable of (name, source_key, scan) tuples, scan
+           being returned by data_loader.read_scan
+        """
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO scan (name, source_key, scan, "
+                "committed) VALUES (?, ?, ?, 0)",
+                [(name, json.dumps(list(source_key)), _encode_scan(scan))
+                 for name, source_key, scan in scans])
+
+
+def _decode_scan(text):
+    """Give a scan stored in the journal.
+
+    :param text: Json of the scan
+    :returns: the scan read (see data_loader.read_scan)
+    """
+
+    scan = json.loads(text)
+    scan["stat"] = tuple(scan["stat"])
+
+    for tag in scan["tags"]:
+        iso_format = ISO_FORMATS.get(tag[1])
+
+        if iso_format is not None and isinstance(tag[4], str) and tag[4]:
+            value = datetime.strptime(tag[4], iso_format)
+
+            if tag[1] == FIELD_TYPE_DATE:
+                value = value.date()
+            elif tag[1] == FIELD_TYPE_TIME:
+                value = value.time()
+
+            tag[4] = value
+
+    return scan
+
+
+def _encode_scan(scan):
+    """Give the Json storing a scan in the journal.
+
+    :param scan: scan read (see data_loader.read_scan)
+    :returns: the Json of the scan
+    """
+
+    def encode_value(value):
+        # A datetime is also a date
+        if isinstance(value, datetime):
+            return value.strftime(ISO_FORMATS[FIELD_TYPE_DATETIME])
+        if isinstance(value, date):
+            return value.strftime(ISO_FORMATS[FIELD_TYPE_DATE])
+        if isinstance(value, time):
+            return value.strftime(ISO_FORMATS[FIELD_TYPE_TIME])
+        raise TypeError("{0} is not Json serializable".format(
+            type(value).__name__))
+
+    return json.dumps(scan, default=encode_value)
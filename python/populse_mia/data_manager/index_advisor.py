@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*- #
+"""Module to log the filters run on the database and to index the tags
+filtered the most
+
+The query log of a project keeps the last filters run by the session (see
+DatabaseSessionMIA.filter_documents_names), with their duration, and counts
+how many filters used each tag with an operator that an index can answer
+(not LIKE, whose patterns start with %). The index advisor creates SQLite
+indexes on the columns (and the list tables) of the tags filtered the most,
+drops the indexes of the tags that are not filtered any more, and records in
+the query log the duration of the last filters before and after the change.
+
+Contains:
+    Class:
+        -IndexAdvisor : Creates and drops the indexes of the tags
+        -QueryLog : Log of the filters run on the database
+
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import json
+import os
+import re
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+# Populse_db imports
+from populse_db.database import LIST_TYPES
+
+# Tags of a filter
+FIELD_PATTERN = re.compile(r"\{([^}]+)\}")
+
+# Tags of a filter with their operator
+PREDICATE_PATTERN = re.compile(r"\{([^}]+)\}\s*(==|!=|<=|>=|<|>|IN|I?LIKE)",
+                               re.IGNORECASE)
+
+# Prefix of the names of the indexes created by the advisor
+INDEX_PREFIX = "mia_index_"
+
+# Number of entries kept in the query log
+QUERY_LOG_SIZE = 1000
+
+# Version of the format of the query log file
+QUERY_LOG_VERSION = 1
+
+
+class IndexAdvisor:
+    """Creates and drops the indexes of the tags, depending on how often
+    they are filtered.
+
+    :param session: DatabaseSessionMIA of the project
+    :param query_log: QueryLog of the project
+    :param max_indexes: maximum number of tags indexed per collection
+    :param min_hits: number of filters using a tag from which it is indexed
+
+    .. Methods:
+        - advise: gives the tags to index and the indexes to drop
+        - benchmark: gives the duration of filters
+        - indexes: gives the indexes created by the advisor
+        - optimize: creates and drops the indexes
+    """
+
+    def __init__(self, session, query_log, max_indexes=8, min_hits=10):
+        """Initialization of the IndexAdvisor class.
+
+        :param session: DatabaseSessionMIA of the project
+        :param query_log: QueryLog of the project
+        :param max_indexes: maximum number of tags indexed per collection
+        :param min_hits: number of filters using a tag from which it is
+           indexed
+        """
+
+        self.session = session
+        self.query_log = query_log
+        self.max_indexes = max_indexes
+        self.min_hits = min_hits
+
+    def advise(self, collection):
+        """Give the tags to index and the indexes to drop.
+
+        :param collection: document collection
+        :returns: tuple (list of the tags to index, dictionary of the
+           indexes to drop associated to their tag, None if the tag does not
+           exist any more)
+        """
+
+        hot_fields = [
+            field for field, hits in
+            self.query_log.hits.get(collection, Counter()).most_common()
+            if hits >= self.min_hits and
+            self.session.get_field(collection, field) is not None]
+        hot_fields = hot_fields[:self.max_indexes]
+
+        # A tag whose table has been rebuilt (see remove_field) may have lost
+        # some of its indexes
+        indexes = self.indexes(collection)
+        to_create = [field for field in hot_fields
+                     if any(name not in indexes for name, table, column in
+                            self.__index_targets(collection, field))]
+        to_drop = {name: field for name, field in indexes.items()
+                   if field not in hot_fields}
+        return to_create, to_drop
+
+    def benchmark(self, collection, filters):
+        """Give the duration of filters, without logging them.
+
+        :param collection: document collection
+        :param filters: filters (str)
+        :returns: the total duration in seconds
+        """
+
+        query_log = self.session.query_log
+        self.session.query_log = None
+        try:
+            start = time.perf_counter()
+            for filter_query in filters:
+                self.session.filter_documents_names(collection, filter_query)
+            return time.perf_counter() - start
+
+        finally:
+            self.session.query_log = query_log
+
+    def indexes(self, collection):
+        """Give the indexes created by the advisor on a collection.
+
+        :param collection: document collection
+        :returns: a dictionary associating the name of each index to its tag
+           (None if the tag does not exist any more)
+        """
+
+        names = {}
+        for field in self.session.get_fields_names(collection):
+            for name, table, column in self.__index_targets(collection,
+                                                            field):
+                names[name] = field
+
+        tables = [self.session.name_to_valid_column_name(collection)]
+        tables.extend(name for name in self.session.metadata.tables
+                      if name.startswith("list_" + tables[0] + "_"))
+        indexes = {}
+        for table in tables:
+            for (name,) in self.session.session.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND "
+                    "tbl_name = :table", {"table": table}):
+                if name.startswith(INDEX_PREFIX):
+                    indexes[name] = names.get(name)
+        return indexes
+
+    def optimize(self, collections=None):
+        """Create the indexes of the tags filtered the most, drop the
+        indexes of the other tags, and record the effect in the query log.
+
+        The changes are made in the session: they are written in the
+        project with its other modifications.
+
+        :param collections: document collections (the ones filtered if None)
+        :returns: the list of the query log entries of the changes
+        """
+
+        if collections is None:
+            collections = list(self.query_log.hits)
+
+        events = []
+        for collection in collections:
+            if self.session.get_collection(collection) is None:
+                continue
+
+            to_create, to_drop = self.advise(collection)
+            if not to_create and not to_drop:
+                continue
+
+            # The filters on tags removed since can not be run
+            filters = [
+                filter_query for filter_query in
+                self.query_log.recent_filters(collection)
+                if all(self.session.get_field(collection, field) is not None
+                       for field in FIELD_PATTERN.findall(filter_query))]
+            before = self.benchmark(collection, filters)
+
+            for name in to_drop:
+                self.session.session.execute(
+                    'DROP INDEX IF EXISTS "{0}"'.format(name))
+            for field in to_create:
+                for name, table, column in self.__index_targets(collection,
+                                                                field):
+                    self.session.session.execute(
+                        'CREATE INDEX IF NOT EXISTS "{0}" ON "{1}" '
+                        '("{2}")'.format(name, table, column))
+
+            after = self.benchmark(collection, filters)
+            events.append(self.query_log.record_event(
+                "optimize", collection=collection, created=to_create,
+                dropped=sorted(set(field for field in to_drop.values()
+                                   if field is not None)),
+                filters=len(filters), duration_before=before,
+                duration_after=after))
+
+        return events
+
+    def __index_targets(self, collection, field):
+        """Give the indexes of a tag: on its column, and on the values of
+        its list table for a list tag.
+
+        :param collection: document collection
+        :param field: field name
+        :returns: a list of (index name, table, column) tuples
+        """
+
+        table = self.session.name_to_valid_column_name(collection)
+        column = self.session.name_to_valid_column_name(field)
+        targets = [(INDEX_PREFIX + table + "_" + column, table, column)]
+
+        field_row = self.session.get_field(collection, field)
+        if (field_row is not None and field_row.type in LIST_TYPES and
+                self.session.list_tables):
+            list_table = "list_{0}_{1}".format(table, column)
+            targets.append((INDEX_PREFIX + list_table + "_value", list_table,
+                            "value"))
+        return targets
+
+
+class QueryLog:
+    """Log of the filters run on the database.
+
+    :param path: path of the file where the log is persisted (the log is
+       only kept in memory if None)
+
+    .. Methods:
+        - get_state: gives a copy of the content of the log
+        - record_event: records an event, such as a change of the indexes
+        - record_filter: records a filter run on the database
+        - recent_filters: gives the last distinct filters of a collection
+        - save: writes the log in its file
+    """
+
+    def __init__(self, path=None):
+        """Initialization of the QueryLog class.
+
+        :param path: path of the file where the log is persisted
+        """
+
+        self.path = path
+        self.entries = deque(maxlen=QUERY_LOG_SIZE)
+        # Collection -> Counter of the filters using each tag
+        self.hits = {}
+
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as log_file:
+                    content = json.load(log_file)
+            except (OSError, ValueError):
+                # The statistics are started again
+                content = {}
+
+            if content.get("version") == QUERY_LOG_VERSION:
+                self.entries.extend(content["entries"])
+                self.hits = {collection: Counter(hits) for collection, hits
+                             in content["hits"].items()}
+
+    def get_state(self):
+        """Give a copy of the content of the log, that can be written by
+        save in another thread while the log is modified.
+
+        :returns: dictionary
+        """
+
+        return {"version": QUERY_LOG_VERSION,
+                "entries": list(self.entries),
+                "hits": {collection: dict(hits) for collection, hits
+                         in self.hits.items()}}
+
+    def record_event(self, event, **details):
+        """Record an event, such as a change of the indexes.
+
+        :param event: name of the event
+        :param details: details of the event
+        :returns: the entry recorded
+        """
+
+        entry = dict(details)
+        entry["event"] = event
+        entry["time"] = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+        self.entries.append(entry)
+        return entry
+
+    def record_filter(self, collection, filter_query, duration, results):
+        """Record a filter run on the database.
+
+        :param collection: document collection
+        :param filter_query: filter (str)
+        :param duration: duration of the filter in seconds
+        :param results: number of documents matching the filter
+        """
+
+        fields = sorted(set(FIELD_PATTERN.findall(filter_query)))
+        self.hits.setdefault(collection, Counter()).update(set(
+            field for field, operator in
+            PREDICATE_PATTERN.findall(filter_query)
+            if not operator.upper().endswith("LIKE")))
+        self.record_event("filter", collection=collection,
+                          filter=filter_query, fields=fields,
+                          duration=duration, results=results)
+
+    def recent_filters(self, collection, number=10):
+        """Give the last distinct filters of a collection.
+
+        :param collection: document collection
+        :param number: maximum number of filters
+        :returns: the list of the filters, the most recent first
+        """
+
+        filters = []
+        for entry in reversed(self.entries):
+            if (entry["event"] == "filter" and
+                    entry["collection"] == collection and
+                    entry["filter"] not in filters):
+                filters.append(entry["filter"])
+                if len(filters) == number:
+                    break
+        return filters
+
+    def save(self, state=None):
+        """Write the log in its file.
+
+        :param state: content to write, given by get_state (the current
+           content if None)
+        """
+
+        if self.path is None:
+            return
+
+        folder = os.path.dirname(self.path)
+
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        if state is None:
+            state = self.get_state()
+
+        with open(self.path, "w", encoding="utf-8") as log_file:
+            json.dump(state, log_file)
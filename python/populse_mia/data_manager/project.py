@@ -15,8 +15,10 @@ Contains:
 # for details.
 ##########################################################################
 
+import copy
 import os
 import tempfile
+from contextlib import contextmanager
 from datetime import datetime
 import yaml
 import json
@@ -30,9 +32,14 @@ from PyQt5.QtCore import QCoreApplication
 from populse_mia.software_properties import verCmp
 from populse_mia.data_manager.filter import Filter
 from populse_mia.software_properties import Config
-from populse_mia.utils.utils import set_item_data
 from populse_mia.data_manager.database_mia import (
     DatabaseMIA, TAG_ORIGIN_BUILTIN, TAG_ORIGIN_USER)
+from populse_mia.data_manager.autosave import AutoSave
+from populse_mia.data_manager.database_writer import (DatabaseWriter,
+                                                      SessionProxy)
+from populse_mia.data_manager.index_advisor import IndexAdvisor, QueryLog
+from populse_mia.data_manager.undo_journal import UndoJournal
+from populse_mia.data_manager.unit_of_work import UnitOfWork
 
 # Populse_db imports
 from populse_db.database import (
@@ -76,6 +83,8 @@ class Project():
 
     .. Methods:
         - add_clinical_tags: add the clinical tags to the project
+        - close: release the database session, committing it, and the
+          history
         - getDate: return the date of creation of the project
         - getFilter: return a Filter object
         - getFilterName: input box to get the name of the filter to save
@@ -86,18 +95,25 @@ class Project():
           modifications or not
         - init_filters: initialize the filters at project opening
         - loadProperties: load the properties file
+        - properties_changes: return the properties if they have changed
+          since they were written
         - redo: redo the last action made by the user on the project
-        - reput_values: re-put the value objects in the database
+        - reput_values: re-put the values of an action of the history in
+          the database
         - save_current_filter: save the current filter
-        - saveConfig: save the changes in the properties file
+        - saveConfig: save the changes in the properties file, if the
+          properties have changed
         - setCurrentFilter: set the current filter of the project
         - setDate: set the date of the project
         - saveModifications: save the pending operations of the project
-          (actions still not saved)
+          (actions still not saved), after updating the indexes of the tags
+          if the index advisor is enabled
         - setName: set the name of the project
         - setSortOrder: set the sort order of the project
         - setSortedTag: set the sorted tag of the project
         - undo: undo the last action made by the user on the project
+        - unit_of_work: context buffering the documents and values written,
+          saved at once at its end
         - unsavedModifications(self, value): Modify the window title
           depending of whether the project has unsaved modifications or not.
         - unsaveModifications: unsaves the pending operations of the project
@@ -132,7 +148,18 @@ class Project():
         self.database = DatabaseMIA('sqlite:///' + os.path.join(self.folder,
                                                                 'database',
                                                                 'mia.db'))
-        self.session = self.database.__enter__()
+        # The session is owned by a writer thread, the other threads use it
+        # through a proxy
+        self.writer = DatabaseWriter(self.database)
+        self.session = SessionProxy(self.writer)
+
+        # Filters run on the database, to index the tags filtered the most
+        self.query_log = QueryLog(os.path.join(self.folder, 'database',
+                                               'query_log.json'))
+        self.session.query_log = self.query_log
+
+        # Current unit of work (see unit_of_work)
+        self.current_unit = None
 
         if new_project:
 
@@ -259,10 +286,15 @@ class Project():
             # Base modifications, do not count for unsaved modifications
 
         self.properties = self.loadProperties()
+        # Properties as written in the properties file
+        self.saved_properties = copy.deepcopy(self.properties)
+        # Debounced saving, when the auto-save mode is enabled
+        self.auto_save = AutoSave(self)
 
         self._unsavedModifications = False
-        self.undos = []
-        self.redos = []
+        # Actions that can be undone and redone
+        self.history = UndoJournal(path=os.path.join(
+            self.folder, 'database', 'undo_journal.db'))
         self.init_filters()
 
     def add_clinical_tags(self):
@@ -295,6 +327,13 @@ class Project():
 
         return return_tags
 
+    def close(self):
+        """Release the database session of the project, committing it, and
+        stop the thread writing the database."""
+
+        self.writer.close()
+        self.history.close()
+
     def getDate(self):
         """Return the date of creation of the project.
 
@@ -396,180 +435,132 @@ class Project():
             except yaml.YAMLError as exc:
                 print(exc)
 
+    def properties_changes(self):
+        """Return the properties if they have changed since they were
+        written, and consider them written.
+
+        :returns: a copy of the properties, None if they have not changed
+        """
+
+        if self.properties == self.saved_properties:
+            return None
+        self.saved_properties = copy.deepcopy(self.properties)
+        return self.saved_properties
+
     def redo(self, table):
         """Redo the last action made by the user on the project.
 
         :param table: table on which to apply the modifications
         """
-        # To avoid circular imports
-        from populse_mia.user_interface.data_browser.data_browser import (
-            not_defined_value)
 
         # We can redo if we have an action to make again
-        if len(self.redos) > 0:
-            to_redo = self.redos.pop()
-            self.undos.append(to_redo)
+        action = self.history.redo()
+        if action is not None:
             self.unsavedModifications = True
-            # We pop the redo action in the undo stack
-            # The first element of the list is the type of action made by
-            # the user (add_tag, remove_tags, add_scans, remove_scans,
-            # or modified_values)
-            action = to_redo[0]
-
-            if action == "add_tag":
-                # For adding the tag, we need the tag name,
-                # and all its attributes
-                tag_to_add = to_redo[1]
-                tag_type = to_redo[2]
-                tag_unit = to_redo[3]
-                tag_default_value = to_redo[4]
-                tag_description = to_redo[5]
-                values = to_redo[6]  # List of values stored
-                # Adding the tag
-                self.session.add_field(
-                    COLLECTION_CURRENT, tag_to_add, tag_type,
-                    tag_description, True, TAG_ORIGIN_USER, tag_unit,
-                    tag_default_value)
-                self.session.add_field(
-                    COLLECTION_INITIAL, tag_to_add, tag_type,
-                    tag_description, True, TAG_ORIGIN_USER, tag_unit,
-                    tag_default_value)
+            # The kind of action made by the user (add_tag, remove_tags,
+            # add_scans, remove_scans, modified_values or
+            # modified_visibilities), and its parameters
+            action_id, kind, parameters = action
+
+            if kind == "add_tag":
+                # The parameters are the definitions of the tags
+                # ([name, type, description, visibility, origin, unit,
+                # default_value])
+                self.session.add_fields([
+                    [collection] + list(tag_to_add)
+                    for collection in (COLLECTION_CURRENT, COLLECTION_INITIAL)
+                    for tag_to_add in parameters])
                 # Adding all the values associated
-                for value in values:
-                    self.session.add_value(
-                        COLLECTION_CURRENT, value[0], value[1], value[2])
-                    self.session.add_value(
-                        COLLECTION_INITIAL, value[0], value[1], value[3])
-                column = table.get_index_insertion(tag_to_add)
-                table.add_column(column, tag_to_add)
+                self.reput_values(action_id)
+                for tag_to_add in parameters:
+                    column = table.get_index_insertion(tag_to_add[0])
+                    table.add_column(column, tag_to_add[0])
 
-            if action == "remove_tags":
+            if kind == "remove_tags":
                 # To remove the tags, we need the names
-                # The second element is a list of the removed tags (Tag class)
-                tags_removed = to_redo[1]
-                for i in range(0, len(tags_removed)):
-                    # We reput each tag in the tag list, keeping
-                    # all the tags params
-                    tag_to_remove = tags_removed[i][0].field_name
-                    self.session.remove_field(
-                        COLLECTION_CURRENT, tag_to_remove)
-                    self.session.remove_field(
-                        COLLECTION_INITIAL, tag_to_remove)
+                tags_to_remove = [tag_removed[0]
+                                  for tag_removed in parameters]
+                self.session.update_fields(removed_fields=[
+                    (collection, tag_to_remove)
+                    for collection in (COLLECTION_CURRENT, COLLECTION_INITIAL)
+                    for tag_to_remove in tags_to_remove])
+                for tag_to_remove in tags_to_remove:
                     column_to_remove = table.get_tag_column(tag_to_remove)
                     table.removeColumn(column_to_remove)
 
-            if action == "add_scans":
-                # To add the scans, we need the FileNames and the values
-                # associated to the scans
-                # The second element is a list of the scans to add
-                scans_added = to_redo[1]
-                # We add all the scans
-                for i in range(0, len(scans_added)):
-                    # We remove each scan added
-                    scan_to_add = scans_added[i]
-                    self.session.add_document(COLLECTION_CURRENT, scan_to_add)
-                    self.session.add_document(COLLECTION_INITIAL, scan_to_add)
-                    table.scans_to_visualize.append(scan_to_add)
-                # We add all the values
-                # The third element is a list of the values to add
-                values_added = to_redo[2]
-                for i in range(0, len(values_added)):
-                    value_to_add = values_added[i]
-                    self.session.add_value(
-                        COLLECTION_CURRENT, value_to_add[0],
-                        value_to_add[1], value_to_add[2])
-                    self.session.add_value(
-                        COLLECTION_INITIAL, value_to_add[0],
-                        value_to_add[1], value_to_add[3])
+            if kind == "add_scans":
+                # The parameters are the FileNames of the scans added, we
+                # add them with their values at once
+                self.reput_values(action_id, parameters)
+                table.scans_to_visualize.extend(parameters)
                 table.add_rows(self.session.get_documents_names(
                     COLLECTION_CURRENT))
 
-            if action == "remove_scans":
-                # To remove a scan, we only need the FileName of the scan
-                # The second element is the list of removed scans (Path class)
-                scans_removed = to_redo[1]
-                for i in range(0, len(scans_removed)):
-                    # We reput each scan, keeping the same values
-                    scan_to_remove = getattr(
-                        scans_removed[i], TAG_FILENAME)
-                    self.session.remove_document(
-                        COLLECTION_CURRENT, scan_to_remove)
-                    self.session.remove_document(
-                        COLLECTION_INITIAL, scan_to_remove)
-                    table.scans_to_visualize.remove(scan_to_remove)
-                    table.removeRow(table.get_scan_row(scan_to_remove))
-                    table.itemChanged.disconnect()
-                    table.update_colors()
-                    table.itemChanged.connect(table.change_cell_color)
-
-            if action == "modified_values":  # Not working
-                # To modify the values, we need the cells,
-                # and the updated values
-
-                # The second element is a list of modified values
-                # (reset or value changed)
-                modified_values = to_redo[1]
-                table.itemChanged.disconnect()
-                for i in range(0, len(modified_values)):
-                    # Each modified value is a list of 3 elements:
-                    # scan, tag, and old_value
-                    value_to_restore = modified_values[i]
-                    scan = value_to_restore[0]
-                    tag = value_to_restore[1]
-                    old_value = value_to_restore[2]
-                    new_value = value_to_restore[3]
-
-                    item = table.item(
-                        table.get_scan_row(scan), table.get_tag_column(tag))
-                    if old_value is None:
-                        # Font reput to normal in case it was a not
-                        # defined cell
-                        font = item.font()
-                        font.setItalic(False)
-                        font.setBold(False)
-                        item.setFont(font)
-                    self.session.set_value(
-                        COLLECTION_CURRENT, scan, tag, new_value)
-                    if new_value is None:
-                        font = item.font()
-                        font.setItalic(True)
-                        font.setBold(True)
-                        item.setFont(font)
-                        set_item_data(
-                            item, not_defined_value, FIELD_TYPE_STRING)
-                    else:
-                        set_item_data(
-                            item, new_value, self.session.get_field(
-                                COLLECTION_CURRENT, tag).type)
-                table.update_colors()
-                table.itemChanged.connect(table.change_cell_color)
-
-            if action == "modified_visibilities":
+            if kind == "remove_scans":
+                # The parameters are the FileNames of the scans removed
+                self.session.remove_documents(COLLECTION_CURRENT, parameters)
+                self.session.remove_documents(COLLECTION_INITIAL, parameters)
+                table.remove_rows(parameters)
+                table.update_colors(scans=[])
+
+            if kind == "modified_values":
+                # Each modified value (reset or value changed) is a delta:
+                # scan, tag, old_value and new_value
+                modified_values = list(self.history.values(action_id))
+                new_values = {}
+                for scan, tag, old_value, new_value in modified_values:
+                    new_values.setdefault(scan, {})[tag] = new_value
+                # All the values are set at once
+                self.session.update_documents(COLLECTION_CURRENT,
+                                              new_values)
+
+                # The cells display the new values
+                table.refresh_values(list(new_values))
+                table.update_colors(list(new_values), [
+                    modified_value[1] for modified_value in modified_values])
+
+            if kind == "modified_visibilities":
                 # To revert the modifications of the visualized tags
                 # Old list of columns
                 old_tags = self.session.get_shown_tags()
-                # List of the tags shown before the modification (Tag objects)
-                showed_tags = to_redo[2]
+                # The parameters are the tags visible before and after the
+                # modification
+                showed_tags = parameters[1]
                 self.session.set_shown_tags(showed_tags)
                 # Columns updated
                 table.update_visualized_columns(
                     old_tags, self.session.get_shown_tags())
 
-    def reput_values(self, values):
-        """Re-put the value objects in the database.
+    def reput_values(self, action_id, scans=()):
+        """Re-put the values of an action of the history in the database.
 
-        :param values: List of Value objects
+        The values are the current and initial values of the deltas of the
+        action. They are written with one bulk statement per collection.
+
+        :param action_id: id of the action in the history
+        :param scans: FileNames of the scans to add with their values
         """
 
-        for i in range(0, len(values)):
-            # We reput each value, exactly the same as it was before
-            valueToReput = values[i]
-            self.session.add_value(
-                COLLECTION_CURRENT, valueToReput[0], valueToReput[1],
-                valueToReput[2])
-            self.session.add_value(
-                COLLECTION_INITIAL, valueToReput[0], valueToReput[1],
-                valueToReput[3])
+        current_values = {}
+        initial_values = {}
+        for scan, tag, current_value, initial_value in \
+                self.history.values(action_id):
+            current_values.setdefault(scan, {})[tag] = current_value
+            initial_values.setdefault(scan, {})[tag] = initial_value
+
+        for collection, values in ((COLLECTION_CURRENT, current_values),
+                                   (COLLECTION_INITIAL, initial_values)):
+            documents = []
+            for scan in scans:
+                document = {tag: value for tag, value in
+                            values.pop(scan, {}).items() if value is not None}
+                document[TAG_FILENAME] = scan
+                documents.append(document)
+            if documents:
+                self.session.upsert_documents(collection, documents,
+                                              create_missing_fields=False)
+            # The values of the scans already in the database
+            self.session.update_documents(collection, values)
 
     def save_current_filter(self, custom_filters):
         """Save the current filter.
@@ -626,20 +617,46 @@ class Project():
                     json.dump(new_filter.json_format(), outfile)
                     self.filters.append(new_filter)
 
-    def saveConfig(self):
-        """Save the changes in the properties file."""
+    def saveConfig(self, properties=None):
+        """Save the changes in the properties file, if the properties have
+        changed.
+
+        :param properties: properties to write, given by properties_changes
+           (the current properties if None)
+        """
+
+        if properties is None:
+            properties = self.properties_changes()
+            if properties is None:
+                return
 
         with open(os.path.join(self.folder, 'properties', 'properties.yml'),
                   'w', encoding='utf8') as configfile:
-            yaml.dump(self.properties, configfile,
+            yaml.dump(properties, configfile,
                       default_flow_style=False, allow_unicode=True)
 
     def saveModifications(self):
         """Save the pending operations of the project (actions
         still not saved).
+
+        In a unit of work, the project is saved at the end of the unit.
         """
 
+        if self.current_unit is not None:
+            return
+
+        # Everything is saved, with the files of the last auto-save written
+        # before
+        self.auto_save.cancel()
+
+        # The indexes follow the tags filtered the most, the advisor being
+        # run by the thread writing the database
+        if Config().get_index_advisor():
+            self.session.run_commands(
+                [(IndexAdvisor(self.session, self.query_log).optimize, ())])
+
         self.session.save_modifications()
+        self.query_log.save()
         self.saveConfig()
         self.unsavedModifications = False
 
@@ -696,156 +713,119 @@ class Project():
         :param table: table on which to apply the modifications
         """
 
-        # To avoid circular imports
-        from populse_mia.user_interface.data_browser.data_browser import (
-            not_defined_value)
-
         # We can undo if we have an action to revert
-        if len(self.undos) > 0:
-            to_undo = self.undos.pop()
-            # We pop the undo action in the redo stack
-            self.redos.append(to_undo)
-            # The first element of the list is the type of action
-            # made by the user (add_tag,
-            # remove_tags, add_scans, remove_scans, or modified_values)
-            action = to_undo[0]
+        action = self.history.undo()
+        if action is not None:
+            # The kind of action made by the user (add_tag, remove_tags,
+            # add_scans, remove_scans, modified_values or
+            # modified_visibilities), and its parameters
+            action_id, kind, parameters = action
             self.unsavedModifications = True
-            if action == "add_tag":
-                # For removing the tag added, we just have to memorize
-                # the tag name, and remove it
-                tag_to_remove = to_undo[1]
-                self.session.remove_field(COLLECTION_CURRENT, tag_to_remove)
-                self.session.remove_field(COLLECTION_INITIAL, tag_to_remove)
-                column_to_remove = table.get_tag_column(tag_to_remove)
-                table.removeColumn(column_to_remove)
-            if action == "remove_tags":
+            if kind == "add_tag":
+                # For removing the tags added, we just need their names
+                tags_to_remove = [tag_added[0] for tag_added in parameters]
+                self.session.update_fields(removed_fields=[
+                    (collection, tag_to_remove)
+                    for collection in (COLLECTION_CURRENT, COLLECTION_INITIAL)
+                    for tag_to_remove in tags_to_remove])
+                for tag_to_remove in tags_to_remove:
+                    column_to_remove = table.get_tag_column(tag_to_remove)
+                    table.removeColumn(column_to_remove)
+            if kind == "remove_tags":
                 # To reput the removed tags, we need to reput the
-                # tag in the tag list,
-                # and all the tags values associated to this tag
-                # The second element is a list of the removed tags
-                # ([Tag row, origin, unit, default_value])
-                tags_removed = to_undo[1]
-
-                for i in range(0, len(tags_removed)):
-                    # We reput each tag in the tag list, keeping
-                    # all the tags params
-                    tag_to_reput = tags_removed[i][0]
-                    self.session.add_field(
-                        COLLECTION_CURRENT, tag_to_reput.field_name,
-                        tag_to_reput.type, tag_to_reput.description,
-                        tag_to_reput.visibility, tag_to_reput.origin,
-                        tag_to_reput.unit, tag_to_reput.default_value)
-                    self.session.add_field(
-                        COLLECTION_INITIAL, tag_to_reput.field_name,
-                        tag_to_reput.type, tag_to_reput.description,
-                        tag_to_reput.visibility, tag_to_reput.origin,
-                        tag_to_reput.unit, tag_to_reput.default_value)
-                # The third element is a list of tags values (Value class)
-                values_removed = to_undo[2]
-                self.reput_values(values_removed)
-                for i in range(0, len(tags_removed)):
-                    # We reput each tag in the tag list,
-                    # keeping all the tags params
-                    tag_to_reput = tags_removed[i][0]
-                    column = table.get_index_insertion(tag_to_reput.field_name)
-                    table.add_column(column, tag_to_reput.field_name)
-            if action == "add_scans":
-                # To remove added scans, we just need their file name
-                # The second element is a list of added scans to remove
-                scans_added = to_undo[1]
-                for i in range(0, len(scans_added)):
-                    # We remove each scan added
-                    scan_to_remove = scans_added[i]
-                    self.session.remove_document(
-                        COLLECTION_CURRENT, scan_to_remove)
-                    self.session.remove_document(
-                        COLLECTION_INITIAL, scan_to_remove)
-                    table.removeRow(table.get_scan_row(scan_to_remove))
-                    table.scans_to_visualize.remove(scan_to_remove)
-                table.itemChanged.disconnect()
-                table.update_colors()
-                table.itemChanged.connect(table.change_cell_color)
-            if action == "remove_scans":
-                # To reput a removed scan, we need the scans names,
+                # tags in the tag list, with all their params
+                # ([name, type, description, visibility, origin, unit,
+                # default_value]), and all the values associated
+                self.session.add_fields([
+                    [collection] + list(tag_removed)
+                    for collection in (COLLECTION_CURRENT, COLLECTION_INITIAL)
+                    for tag_removed in parameters])
+                self.reput_values(action_id)
+                for tag_removed in parameters:
+                    column = table.get_index_insertion(tag_removed[0])
+                    table.add_column(column, tag_removed[0])
+            if kind == "add_scans":
+                # To remove added scans, we just need their FileNames
+                self.session.remove_documents(COLLECTION_CURRENT, parameters)
+                self.session.remove_documents(COLLECTION_INITIAL, parameters)
+                table.remove_rows(parameters)
+                table.update_colors(scans=[])
+            if kind == "remove_scans":
+                # To reput the removed scans, we need their FileNames,
                 # and all the values associated
-                # The second element is the list of removed scans (Scan class)
-                scans_removed = to_undo[1]
-                for i in range(0, len(scans_removed)):
-                    # We reput each scan, keeping the same values
-                    scan_to_reput = scans_removed[i]
-                    self.session.add_document(
-                        COLLECTION_CURRENT, getattr(
-                            scan_to_reput, TAG_FILENAME))
-                    self.session.add_document(
-                        COLLECTION_INITIAL, getattr(
-                            scan_to_reput, TAG_FILENAME))
-                    table.scans_to_visualize.append(getattr(
-                        scan_to_reput, TAG_FILENAME))
-
-                # The third element is the list of removed values
-                values_removed = to_undo[2]
-                self.reput_values(values_removed)
+                self.reput_values(action_id, parameters)
+                table.scans_to_visualize.extend(parameters)
                 table.add_rows(self.session.get_documents_names(
                     COLLECTION_CURRENT))
-            if action == "modified_values":
-                # To revert a value changed in the databrowser,
-                # we need two things:
-                # the cell (scan and tag, and the old value)
-                # The second element is a list of modified values (reset,
-                modified_values = to_undo[1]
-                # or value changed)
-                table.itemChanged.disconnect()
-                for i in range(0, len(modified_values)):
-                    # Each modified value is a list of 3 elements:
-                    # scan, tag, and old_value
-                    value_to_restore = modified_values[i]
-                    scan = value_to_restore[0]
-                    tag = value_to_restore[1]
-                    old_value = value_to_restore[2]
-                    new_value = value_to_restore[3]
-                    item = table.item(
-                        table.get_scan_row(scan), table.get_tag_column(tag))
+            if kind == "modified_values":
+                # To revert a value changed in the databrowser, we need
+                # the cell (scan and tag) and the old value
+                modified_values = list(self.history.values(action_id))
+                old_values = {}
+                # If the cell was not defined before, the initial value is
+                # removed too
+                removed_values = {}
+                for scan, tag, old_value, new_value in modified_values:
+                    old_values.setdefault(scan, {})[tag] = old_value
                     if old_value is None:
-                        # If the cell was not defined before, we reput it
-                        self.session.remove_value(
-                            COLLECTION_CURRENT, scan, tag)
-                        self.session.remove_value(
-                            COLLECTION_INITIAL, scan, tag)
-                        set_item_data(
-                            item, not_defined_value, FIELD_TYPE_STRING)
-                        font = item.font()
-                        font.setItalic(True)
-                        font.setBold(True)
-                        item.setFont(font)
-                    else:
-                        # If the cell was there before,
-                        # we just set it to the old value
-                        self.session.set_value(
-                            COLLECTION_CURRENT, scan, tag, old_value)
-                        set_item_data(
-                            item, old_value, self.session.get_field(
-                                COLLECTION_CURRENT, tag).type)
-                        # If the new value is None,
-                        # the not defined font must be removed
-                        if new_value is None:
-                            font = item.font()
-                            font.setItalic(False)
-                            font.setBold(False)
-                            item.setFont(font)
-                table.update_colors()
-                table.itemChanged.connect(table.change_cell_color)
-            if action == "modified_visibilities":
+                        removed_values.setdefault(scan, {})[tag] = None
+                # All the values are set at once
+                self.session.update_documents(COLLECTION_CURRENT,
+                                              old_values)
+                self.session.update_documents(COLLECTION_INITIAL,
+                                              removed_values)
+
+                # The cells display the old values
+                table.refresh_values(list(old_values))
+                table.update_colors(list(old_values), [
+                    modified_value[1] for modified_value in modified_values])
+            if kind == "modified_visibilities":
                 # To revert the modifications of the visualized tags
                 # Old list of columns
                 old_tags = self.session.get_shown_tags()
-                # List of the tags visibles before the modification
-                # (Tag objects)
-                visibles = to_undo[1]
+                # The parameters are the tags visible before and after the
+                # modification
+                visibles = parameters[0]
                 self.session.set_shown_tags(visibles)
                 # Columns updated
                 table.update_visualized_columns(
                     old_tags, self.session.get_shown_tags())
 
+    @contextmanager
+    def unit_of_work(self):
+        """Context buffering the documents and values written in the
+        project, saved at once at its end.
+
+        The documents and values are written through the UnitOfWork given
+        by the context, and the calls to saveModifications are deferred to
+        its end. If an exception is raised in the context, nothing is
+        written: only the buffer of the unit is discarded, the other
+        modifications of the session being kept. A unit of work opened in
+        another one is part of it.
+
+        :returns: the UnitOfWork
+        """
+
+        if self.current_unit is not None:
+            yield self.current_unit
+            return
+
+        unit = UnitOfWork(self.session)
+        self.current_unit = unit
+        try:
+            yield unit
+            # A failing write cancels the ones of the unit (see
+            # UnitOfWork.flush)
+            unit.flush()
+
+        except BaseException:
+            unit.discard()
+            raise
+
+        finally:
+            self.current_unit = None
+
+        self.saveModifications()
 
     @property
     def unsavedModifications(self):
@@ -861,6 +841,10 @@ class Project():
         """
         self._unsavedModifications = value
         app = QCoreApplication.instance()
+        # No window title to modify when the project is used without the
+        # software (e.g. by the ingest command-line tool)
+        if app is None or not hasattr(app, "title"):
+            return
         if self._unsavedModifications :
             if app.title()[-1] != "*":
                 app.set_title(app.title()+"*")
@@ -871,5 +855,6 @@ class Project():
     def unsaveModifications(self):
         """Unsave the pending operations of the project."""
 
+        self.auto_save.cancel()
         self.session.unsave_modifications()
         self.unsavedModifications = False
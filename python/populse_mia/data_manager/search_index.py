@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*- #
+"""Module that contains the full-text index of the values of the documents
+
+The index is an in-memory SQLite FTS5 table using the case sensitive
+trigram tokenizer, as the LIKE operator of the project database is case
+sensitive (see populse_db). A LIKE pattern is searched as the equivalent
+GLOB pattern, which is answered with the index when it contains at least
+three characters. The values are indexed as SQLite converts them to text,
+which is what the LIKE operator of the database compares.
+
+Contains:
+    Class:
+        -SearchIndex : Full-text index of the values of some fields of a
+        collection
+    Methods:
+        -like_to_glob : Returns the GLOB pattern equivalent to a case
+        sensitive LIKE pattern
+        -search_index_available : Returns if SQLite supports the index
+
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import sqlite3
+
+# GLOB patterns of the wildcards of a LIKE pattern and of the characters
+# matching themselves in a LIKE pattern but not in a GLOB pattern
+GLOB_ESCAPES = {"*": "[*]", "?": "[?]", "[": "[[]", "%": "*", "_": "?"}
+
+# True if SQLite supports the FTS5 trigram tokenizer, None until checked
+_AVAILABLE = None
+
+
+class SearchIndex:
+    """Full-text index of the values of some fields of a collection.
+
+    Each indexed value is a row of the FTS5 table, whose id is associated to
+    the document and the field of the value in the cell table.
+
+    .. Methods:
+        - add: indexes values
+        - close: frees the index
+        - mark: marks documents to index again
+        - pop_pending: gives and forgets the documents to index again
+        - remove: removes the values of documents from the index
+        - search: gives the documents with a value matching a pattern
+    """
+
+    def __init__(self):
+        """Initialization of the SearchIndex class."""
+
+        self.connection = sqlite3.connect(":memory:")
+        # Same LIKE as the project database, only the GLOB being answered
+        # with a case sensitive index
+        self.connection.execute("PRAGMA case_sensitive_like=ON")
+        self.connection.execute(
+            "CREATE VIRTUAL TABLE value_index USING fts5(value, "
+            "tokenize='trigram case_sensitive 1')")
+        self.connection.execute(
+            "CREATE TABLE cell (id INTEGER PRIMARY KEY, document TEXT, "
+            "field TEXT)")
+        self.connection.execute(
+            "CREATE INDEX cell_document ON cell (document)")
+        # Fields indexed
+        self.fields = set()
+        # Id of the last value indexed
+        self.last_id = 0
+        # Document name -> set of the fields to index again (None for all
+        # the fields)
+        self.pending = {}
+
+    def add(self, values):
+        """Index values.
+
+        :param values: iterable of (document, field, text) tuples, text
+           being None for a value not defined
+        """
+
+        cells = []
+        texts = []
+        for document, field, text in values:
+            if text is not None:
+                self.last_id += 1
+                cells.append((self.last_id, document, field))
+                texts.append((self.last_id, text))
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO cell (id, document, field) VALUES (?, ?, ?)",
+                cells)
+            self.connection.executemany(
+                "INSERT INTO value_index (rowid, value) VALUES (?, ?)", texts)
+
+    def close(self):
+        """Free the index."""
+
+        self.connection.close()
+
+    def mark(self, documents, fields=None):
+        """Mark documents to index again.
+
+        :param documents: document names
+        :param fields: names of the fields to index again (all the fields
+           if None)
+        """
+
+        for document in documents:
+            if fields is None:
+                self.pending[document] = None
+            else:
+                pending = self.pending.get(document, set())
+                if pending is not None:
+                    pending.update(fields)
+                    self.pending[document] = pending
+
+    def pop_pending(self):
+        """Give the documents to index again, and forget them.
+
+        :returns: tuple (list of the document names, list of the indexed
+           field names to index again)
+        """
+
+        documents = list(self.pending)
+        fields = set()
+        for pending in self.pending.values():
+            if pending is None:
+                fields = self.fields
+                break
+            fields.update(pending)
+        self.pending = {}
+        return documents, [field for field in fields if field in self.fields]
+
+    def remove(self, documents, fields):
+        """Remove the values of documents from the index.
+
+        :param documents: document names
+        :param fields: field names
+        """
+
+        fields = set(fields)
+        with self.connection:
+            for document in documents:
+                cells = [(cell_id,) for cell_id, field in
+                         self.connection.execute(
+                             "SELECT id, field FROM cell WHERE document = ?",
+                             (document,)) if field in fields]
+                self.connection.executemany(
+                    "DELETE FROM value_index WHERE rowid = ?", cells)
+                self.connection.executemany(
+                    "DELETE FROM cell WHERE id = ?", cells)
+
+    def search(self, pattern, fields):
+        """Give the documents with a value matching a pattern.
+
+        :param pattern: case sensitive LIKE pattern (% for any string, _
+           for any character)
+        :param fields: names of the fields to search in
+        :returns: the set of the document names
+        """
+
+        fields = set(fields)
+        return {document for document, field in self.connection.execute(
+            "SELECT cell.document, cell.field FROM value_index "
+            "JOIN cell ON cell.id = value_index.rowid "
+            "WHERE value_index.value GLOB ?", (like_to_glob(pattern),))
+            if field in fields}
+
+
+def like_to_glob(pattern):
+    """Give the GLOB pattern equivalent to a case sensitive LIKE pattern.
+
+    :param pattern: LIKE pattern (% for any string, _ for any character)
+    :returns: the GLOB pattern
+    """
+
+    return "".join(GLOB_ESCAPES.get(character, character)
+                   for character in pattern)
+
+
+def search_index_available():
+    """Tell if SQLite supports the full-text index (FTS5 and its trigram
+    tokenizer, since SQLite 3.34).
+
+    :returns: boolean
+    """
+
+    global _AVAILABLE
+
+    if _AVAILABLE is None:
+        connection = sqlite3.connect(":memory:")
+        try:
+            connection.execute("CREATE VIRTUAL TABLE test USING fts5(value, "
+                               "tokenize='trigram case_sensitive 1')")
+            _AVAILABLE = True
+        except sqlite3.OperationalError:
+            _AVAILABLE = False
+        finally:
+            connection.close()
+
+    return _AVAILABLE
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*- #
+"""Module that contains the columnar snapshots of the collections
+
+A snapshot holds the values of all the documents of a collection, by field:
+a NumPy array and a null mask per numerical field, and a dictionary-encoded
+array (codes in a NumPy array, values in a list of categories) per other
+field. It is kept by the database session (DatabaseSessionMIA.get_snapshot)
+and tied to its write version: the documents written are marked in the
+snapshot, which is patched with them when it is next read, and rebuilt only
+when the fields of the collection change.
+
+The readers are given a SnapshotView, whose columns are read-only views of
+the arrays of the snapshot. A column that has been given is copied before
+being patched, so that the views stay immutable.
+
+Contains:
+    Class:
+        -ColumnarSnapshot : Values of a collection stored by columns
+        -ColumnView : Read-only view of a column of a snapshot
+        -SnapshotView : Read-only view of a snapshot
+
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import numpy as np
+
+# Populse_db imports
+from populse_db.database import (FIELD_TYPE_BOOLEAN, FIELD_TYPE_FLOAT,
+                                 FIELD_TYPE_INTEGER)
+
+# NumPy types of the fields stored without encoding
+NUMERICAL_TYPES = {FIELD_TYPE_INTEGER: np.int64,
+                   FIELD_TYPE_FLOAT: np.float64,
+                   FIELD_TYPE_BOOLEAN: np.bool_}
+
+
+class ColumnView:
+    """Read-only view of a column of a snapshot.
+
+    For a numerical field, values holds the values (undefined where mask is
+    True). For the other fields, values holds the indexes of the values in
+    categories (-1 where mask is True).
+
+    :param field_type: type of the field
+    :param values: read-only NumPy array of the values or of their codes
+    :param mask: read-only NumPy array, True where the value is None
+    :param categories: tuple of the values coded (None for a numerical
+       field)
+
+    .. Methods:
+        - get: gives the value of a row
+        - tolist: gives the values of the column
+    """
+
+    def __init__(self, field_type, values, mask, categories=None):
+        """Initialization of the ColumnView class.
+
+        :param field_type: type of the field
+        :param values: read-only NumPy array of the values or of their codes
+        :param mask: read-only NumPy array, True where the value is None
+        :param categories: tuple of the values coded
+        """
+
+        self.type = field_type
+        self.values = values
+        self.mask = mask
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, row):
+        """Give the value of a row.
+
+        :param row: position of the document in the snapshot
+        :returns: the Python value, None if not defined
+        """
+
+        if self.mask[row]:
+            return None
+        if self.categories is None:
+            return self.values[row].item()
+        return self.categories[self.values[row]]
+
+    def tolist(self):
+        """Give the values of the column.
+
+        :returns: the list of the Python values, None where not defined
+        """
+
+        if self.categories is None:
+            return [None if null else value for value, null in
+                    zip(self.values.tolist(), self.mask.tolist())]
+        categories = self.categories
+        return [None if code < 0 else categories[code]
+                for code in self.values.tolist()]
+
+
+class SnapshotView:
+    """Read-only view of a snapshot, as it was when the view was given.
+
+    The list of the documents and their index are shared with the snapshot
+    and must not be modified.
+
+    :param version: write version of the session when the view was given
+    :param documents: list of the document names, in the order of the rows
+    :param index: dictionary of the row of each document
+    :param columns: dictionary of the ColumnView of each field
+
+    .. Methods:
+        - column: gives the view of a column
+        - get: gives the value of a document and a field
+    """
+
+    def __init__(self, version, documents, index, columns):
+        """Initialization of the SnapshotView class.
+
+        :param version: write version of the session
+        :param documents: list of the document names
+        :param index: dictionary of the row of each document
+        :param columns: dictionary of the ColumnView of each field
+        """
+
+        self.version = version
+        self.documents = documents
+        self.index = index
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.documents)
+
+    def column(self, field):
+        """Give the view of a column.
+
+        :param field: field name
+        :returns: the ColumnView, None if the field is not in the view
+        """
+
+        return self.columns.get(field)
+
+    def get(self, document, field):
+        """Give the value of a document and a field.
+
+        :param document: document name
+        :param field: field name
+        :returns: the value, None if the document or the field is not in
+           the view
+        """
+
+        row = self.index.get(document)
+        column = self.columns.get(field)
+        if row is None or column is None:
+            return None
+        return column.get(row)
+
+
+class ColumnarSnapshot:
+    """Values of a collection stored by columns.
+
+    :param values: ValuesBlock of all the documents and fields of the
+       collection
+    :param version: write version of the session when the values were read
+
+    .. Methods:
+        - mark: marks documents written since the snapshot was updated
+        - pop_pending: gives and forgets the documents written
+        - update: patches the values of documents
+        - view: gives a read-only view of the snapshot
+    """
+
+    def __init__(self, values, version):
+        """Initialization of the ColumnarSnapshot class.
+
+        :param values: ValuesBlock of the collection
+        :param version: write version of the session
+        """
+
+        self.version = version
+        self.documents = list(values.documents)
+        self.index = {document: row for row, document in
+                      enumerate(self.documents)}
+        self.fields = list(values.fields)
+        self.types = dict(values.types)
+        self.size = len(self.documents)
+        # Field name -> [values or codes, mask, categories, codes by value]
+        self.columns = {}
+        # Columns given to readers, to copy before patching them
+        self.shared = set()
+        # True if the documents and their index have been given to readers
+        self.shared_documents = False
+        # Documents written since the snapshot was updated
+        self.pending = set()
+
+        for field in self.fields:
+            self.columns[field] = self.__encode(self.types[field],
+                                                values.columns[field])
+
+    def mark(self, documents):
+        """Mark documents written since the snapshot was updated.
+
+        :param documents: document names
+        """
+
+        self.pending.update(documents)
+
+    def pop_pending(self):
+        """Give the documents written since the snapshot was updated, and
+        forget them.
+
+        :returns: the list of the document names
+        """
+
+        documents = list(self.pending)
+        self.pending = set()
+        return documents
+
+    def update(self, values, primary_key, version):
+        """Patch the values of documents: the documents that do not exist
+        any more are removed, the other ones are updated or added.
+
+        :param values: ValuesBlock of the documents, with all the fields of
+           the snapshot
+        :param primary_key: primary key of the collection, None in values
+           for a document that does not exist
+        :param version: write version of the session when the values were
+           read
+        """
+
+        removed = set(document for document, key in
+                      zip(values.documents, values.columns[primary_key])
+                      if key is None)
+        self.__remove(removed)
+
+        written = [position for position, document in
+                   enumerate(values.documents) if document not in removed]
+        new_documents = [values.documents[position] for position in written
+                         if values.documents[position] not in self.index]
+        if new_documents:
+            self.__unshare_documents()
+            self.__grow(self.size + len(new_documents))
+            for document in new_documents:
+                self.index[document] = self.size
+                self.documents.append(document)
+                self.size += 1
+
+        rows = [self.index[values.documents[position]]
+                for position in written]
+        for field in self.fields:
+            if not rows:
+                break
+            self.__unshare(field)
+            column = self.columns[field]
+            data, mask, categories = column[:3]
+            field_values = values.columns[field]
+            for row, position in zip(rows, written):
+                value = field_values[position]
+                mask[row] = value is None
+                if categories is None:
+                    if value is not None:
+                        data[row] = value
+                else:
+                    data[row] = self.__code(column, value)
+
+        self.version = version
+
+    def view(self, fields=None):
+        """Give a read-only view of the snapshot, without copying its
+        columns.
+
+        :param fields: field names (all the fields if None)
+        :returns: the SnapshotView
+        """
+
+        columns = {}
+        for field in self.fields if fields is None else fields:
+            if field not in self.columns:
+                continue
+            data, mask, categories = self.columns[field][:3]
+            self.shared.add(field)
+            data = data[:self.size]
+            mask = mask[:self.size]
+            data.flags.writeable = False
+            mask.flags.writeable = False
+            columns[field] = ColumnView(
+                self.types[field], data, mask,
+                None if categories is None else tuple(categories))
+        self.shared_documents = True
+        return SnapshotView(self.version, self.documents, self.index,
+                            columns)
+
+    def __code(self, column, value):
+        """Give the code of a value in a dictionary-encoded column, adding
+        it to the categories if needed.
+
+        :param column: [codes, mask, categories, codes by value]
+        :param value: Python value
+        :returns: the code, -1 for None
+        """
+
+        if value is None:
+            return -1
+        categories, codes = column[2], column[3]
+        # The lists are not hashable
+        key = tuple(value) if isinstance(value, list) else value
+        try:
+            code = codes.get(key)
+        except TypeError:
+            key = repr(value)
+            code = codes.get(key)
+        if code is None:
+            code = len(categories)
+            categories.append(value)
+            codes[key] = code
+        return code
+
+    def __encode(self, field_type, values):
+        """Store the values of a field.
+
+        :param field_type: type of the field
+        :param values: list of the Python values
+        :returns: [values or codes, mask, categories, codes by value]
+        """
+
+        mask = np.fromiter((value is None for value in values), dtype=bool,
+                           count=len(values))
+        dtype = NUMERICAL_TYPES.get(field_type)
+        if dtype is not None:
+            data = np.array([0 if value is None else value
+                             for value in values], dtype=dtype)
+            return [data, mask, None, None]
+
+        column = [None, mask, [], {}]
+        column[0] = np.fromiter((self.__code(column, value)
+                                 for value in values), dtype=np.int32,
+                                count=len(values))
+        return column
+
+    def __grow(self, size):
+        """Give the columns the capacity to store a number of documents.
+
+        :param size: number of documents
+        """
+
+        for field in self.fields:
+            data, mask, categories, codes = self.columns[field]
+            if len(data) < size:
+                # The capacity is doubled, so that adding documents one by
+                # one does not copy the arrays each time
+                capacity = max(size, 2 * len(data))
+                new_data = np.zeros(capacity, dtype=data.dtype)
+                new_data[:self.size] = data[:self.size]
+                new_mask = np.ones(capacity, dtype=bool)
+                new_mask[:self.size] = mask[:self.size]
+                self.columns[field] = [new_data, new_mask, categories, codes]
+                self.shared.discard(field)
+
+    def __remove(self, documents):
+        """Remove documents, the columns being copied without their rows.
+
+        :param documents: set of the document names
+        """
+
+        rows = [self.index[document] for document in documents
+                if document in self.index]
+        if not rows:
+            return
+
+        kept = np.ones(self.size, dtype=bool)
+        kept[rows] = False
+        for field in self.fields:
+            data, mask, categories, codes = self.columns[field]
+            self.columns[field] = [data[:self.size][kept],
+                                   mask[:self.size][kept],
+                                   categories, codes]
+        self.shared.clear()
+        self.documents = [document for document in self.documents
+                          if document not in documents]
+        self.index = {document: row for row, document in
+                      enumerate(self.documents)}
+        self.shared_documents = False
+        self.size = len(self.documents)
+
+    def __unshare(self, field):
+        """Copy a column given to readers before modifying it.
+
+        :param field: field name
+        """
+
+        if field in self.shared:
+            data, mask, categories, codes = self.columns[field]
+            self.columns[field] = [
+                data.copy(), mask.copy(),
+                None if categories is None else list(categories),
+                None if codes is None else dict(codes)]
+            self.shared.discard(field)
+
+    def __unshare_documents(self):
+        """Copy the documents and their index given to readers before
+        modifying them."""
+
+        if self.shared_documents:
+            self.documents = list(self.documents)
+            self.index = dict(self.index)
+            self.shared_documents = False
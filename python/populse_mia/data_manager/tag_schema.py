@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*- #
+"""Module to convert the Json tags exported by MRIFileManager to database
+values
+
+The type of a tag is inferred from its Json properties (type, Java date
+format and nesting of the value). As the same tags are found in all the
+scans of an export, the resolved schema of each tag (database type, Python
+date format and list shape) is kept in a registry, persisted in the project.
+Once a tag has been seen, its values are converted by a function resolved
+from its schema, looked up by tag name, Json type and Json format. A tag
+whose properties differ from the ones recorded is a conflict: it is
+converted with the full inference and counted.
+
+Contains:
+    Class:
+        -TagSchemaRegistry : Registry of the resolved schemas of the tags
+    Methods:
+        -convert_value : Returns the database value of a Json value
+        -infer_type : Returns the database type and the Python date format
+        of a tag
+        -list_shape : Returns how a Json value is nested
+        -make_converter : Returns the function converting the Json
+        properties of a tag with a resolved schema
+        -split_properties : Returns the Json type, date format, description,
+        unit and value of a tag
+
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import json
+import os
+from collections import Counter
+from datetime import datetime
+
+# Populse_db imports
+from populse_db.database import (
+    FIELD_TYPE_STRING, FIELD_TYPE_DATETIME, FIELD_TYPE_DATE,
+    FIELD_TYPE_TIME, FIELD_TYPE_LIST_STRING, FIELD_TYPE_INTEGER,
+    FIELD_TYPE_LIST_INTEGER, FIELD_TYPE_FLOAT, FIELD_TYPE_LIST_FLOAT,
+    FIELD_TYPE_BOOLEAN, FIELD_TYPE_LIST_BOOLEAN, FIELD_TYPE_LIST_DATE,
+    FIELD_TYPE_LIST_DATETIME, FIELD_TYPE_LIST_TIME)
+
+# Java date format elements and their Python equivalents
+DATE_FORMAT_ELEMENTS = [("yyyy", "%Y"), ("MM", "%m"), ("dd", "%d"),
+                        ("HH", "%H"), ("mm", "%M"), ("ss", "%S"),
+                        ("SSS", "%f")]
+
+# Database list types of the scalar types
+LIST_TYPES = {FIELD_TYPE_STRING: FIELD_TYPE_LIST_STRING,
+              FIELD_TYPE_INTEGER: FIELD_TYPE_LIST_INTEGER,
+              FIELD_TYPE_FLOAT: FIELD_TYPE_LIST_FLOAT,
+              FIELD_TYPE_BOOLEAN: FIELD_TYPE_LIST_BOOLEAN,
+              FIELD_TYPE_DATE: FIELD_TYPE_LIST_DATE,
+              FIELD_TYPE_DATETIME: FIELD_TYPE_LIST_DATETIME,
+              FIELD_TYPE_TIME: FIELD_TYPE_LIST_TIME}
+
+# Version of the format of the registry file
+SCHEMA_VERSION = 1
+
+
+class TagSchemaRegistry:
+    """Registry of the resolved schemas of the tags.
+
+    The schema of a tag is recorded the first time the tag is converted:
+    its Json type and date format, whether its value is a list, and the
+    resulting database type and Python date format.
+
+    :param path: path of the file where the registry is persisted (the
+       registry is only kept in memory if None)
+    :param track_changes: True to keep the schemas learned and the
+       conflicts since the last call to pop_changes, so that they can be
+       sent back from a worker process
+
+    .. Methods:
+        - convert: returns the type, description, unit and value of a tag
+        - merge: adds the changes of another registry
+        - pop_changes: returns and forgets the schemas learned and the
+          conflicts
+        - save: writes the registry in its file
+        - statistics: returns statistics about the conversions
+    """
+
+    def __init__(self, path=None, track_changes=False):
+        """Initialization of the registry.
+
+        :param path: path of the file where the registry is persisted
+        :param track_changes: True to keep the changes since the last call
+           to pop_changes
+        """
+
+        self.path = path
+        self.track_changes = track_changes
+        # Tag name -> (Json type, Json format, promoted to a list,
+        # database type, Python date format)
+        self.schemas = {}
+        # (tag name, Json type, Json format) -> converter of the recorded
+        # schema (see make_converter), built at the first conversion
+        self.converters = {}
+        self.conflicts = Counter()
+        self.hits = 0
+        self.misses = 0
+        self.learned = {}
+        self.new_conflicts = Counter()
+
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as registry_file:
+                    content = json.load(registry_file)
+            except (OSError, ValueError):
+                # The registry is only a cache, it is rebuilt
+                content = {}
+
+            if content.get("version") == SCHEMA_VERSION:
+                self.schemas = {name: tuple(schema) for name, schema in
+                                content["schemas"].items()}
+                self.conflicts.update(content["conflicts"])
+
+    def convert(self, tag_name, properties):
+        """Give the database type, description, unit and value of a Json
+        tag, using the recorded schema of the tag.
+
+        :param tag_name: name of the tag
+        :param properties: Json properties of the tag (dictionary or value)
+        :returns: [type, description, unit, value] of the tag
+        """
+
+        if isinstance(properties, dict):
+            key = (tag_name, properties['type'], properties['format'])
+
+        else:
+            key = (tag_name, "", "")
+
+        converter = self.converters.get(key)
+
+        if converter is None:
+            schema = self.schemas.get(tag_name)
+
+            if schema is not None and tuple(schema[:2]) == key[1:]:
+                converter = make_converter(tag_name, *schema[2:])
+                self.converters[key] = converter
+
+        if converter is not None:
+            tag = converter(properties)
+
+            # None if the value is not nested as recorded
+            if tag is not None:
+                self.hits += 1
+                return tag
+
+        self.misses += 1
+        (json_type, json_format, description, unit,
+         value) = split_properties(properties)
+        reshape, promote = list_shape(tag_name, value)
+        tag_type, date_format = infer_type(json_type, json_format, promote)
+
+        if tag_name not in self.schemas:
+            schema = (json_type, json_format, promote, tag_type,
+                      date_format)
+            self.schemas[tag_name] = schema
+
+            if self.track_changes:
+                self.learned[tag_name] = schema
+
+        else:
+            # The first schema is kept, as the field is already created
+            self.conflicts[tag_name] += 1
+
+            if self.track_changes:
+                self.new_conflicts[tag_name] += 1
+
+        return [tag_type, description, unit,
+                convert_value(value, reshape, tag_type, date_format)]
+
+    def merge(self, changes):
+        """Add the changes of another registry (see pop_changes).
+
+        :param changes: tuple (schemas learned, conflicts)
+        """
+
+        learned, conflicts = changes
+
+        for tag_name, schema in learned.items():
+            if tag_name not in self.schemas:
+                self.schemas[tag_name] = tuple(schema)
+
+            elif self.schemas[tag_name] != tuple(schema):
+                # Learned in parallel by another worker
+                self.conflicts[tag_name] += 1
+
+        self.conflicts.update(conflicts)
+
+    def pop_changes(self):
+        """Give the schemas learned and the conflicts since the last call,
+        and forget them.
+
+        :returns: tuple (dictionary of the schemas learned, dictionary of
+           the number of conflicts of each tag)
+        """
+
+        changes = (self.learned, dict(self.new_conflicts))
+        self.learned = {}
+        self.new_conflicts = Counter()
+        return changes
+
+    def save(self):
+        """Write the registry in its file."""
+
+        if self.path is None:
+            return
+
+        folder = os.path.dirname(self.path)
+
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        with open(self.path, "w", encoding="utf-8") as registry_file:
+            json.dump({"version": SCHEMA_VERSION,
+                       "schemas": self.schemas,
+                       "conflicts": self.conflicts}, registry_file)
+
+    def statistics(self):
+        """Give statistics about the conversions.
+
+        :returns: a dictionary with the number of tags recorded ("tags"),
+           the number of conversions using a recorded schema ("hits") or
+           the full inference ("misses"), and the number of conflicts of
+           each tag ("conflicts")
+        """
+
+        return {"tags": len(self.schemas), "hits": self.hits,
+                "misses": self.misses, "conflicts": dict(self.conflicts)}
+
+
+def convert_value(value, reshape, tag_type, date_format):
+    """Give the database value of a Json value.
+
+    :param value: Json value of the tag
+    :param reshape: True if the value is a list to unnest (see list_shape)
+    :param tag_type: database type of the tag
+    :param date_format: Python date format of the tag
+    :returns: the database value
+    """
+
+    if reshape:
+        if len(value) == 1:
+            value = value[0]
+
+        else:
+            value = [value_single[0] for value_single in value]
+
+    if (tag_type == FIELD_TYPE_DATETIME or tag_type == FIELD_TYPE_DATE or
+            tag_type == FIELD_TYPE_TIME):
+
+        if value is not None and value != "":
+            value = datetime.strptime(value, date_format)
+
+            if tag_type == FIELD_TYPE_TIME:
+                value = value.time()
+
+            elif tag_type == FIELD_TYPE_DATE:
+                value = value.date()
+
+    # TODO time lists
+
+    return value
+
+
+def infer_type(json_type, json_format, promote):
+    """Give the database type and the Python date format of a tag.
+
+    :param json_type: Json type of the tag ("" if not given)
+    :param json_format: Java date format of the tag ("" if not given)
+    :param promote: True if the value of the tag is a list
+    :returns: tuple (database type, Python date format)
+    """
+
+    date_format = json_format
+    tag_type = FIELD_TYPE_STRING
+
+    if json_type != "":
+        tag_type = json_type
+
+    # Creating date types
+    if date_format is not None and date_format != "":
+        for java_element, python_element in DATE_FORMAT_ELEMENTS:
+            date_format = date_format.replace(java_element, python_element)
+
+        if ("%Y" in date_format and "%m" in date_format and
+                "%d" in date_format and "%H" in date_format and
+                "%M" in date_format and "%S" in date_format):
+            tag_type = FIELD_TYPE_DATETIME
+
+        elif ("%Y" in date_format and "%m" in date_format and
+              "%d" in date_format):
+            tag_type = FIELD_TYPE_DATE
+
+        elif ("%H" in date_format and "%M" in date_format and
+              "%S" in date_format):
+            tag_type = FIELD_TYPE_TIME
+
+    if promote:
+        tag_type = LIST_TYPES.get(tag_type, tag_type)
+
+    return tag_type, date_format
+
+
+def list_shape(tag_name, value):
+    """Give how a Json value is nested.
+
+    :param tag_name: name of the tag
+    :param value: Json value of the tag
+    :returns: tuple (True if the value is a list to unnest, True if the
+       database value is a list)
+    """
+
+    if (tag_name == "Json_Version" or not hasattr(value, '__len__') or
+            type(value) == str):
+        return False, False
+
+    return True, ((len(value) == 1 and isinstance(value[0], list)) or
+                  len(value) != 1)
+
+
+def make_converter(tag_name, promote, tag_type, date_format):
+    """Give the function converting the Json properties of a tag with a
+    resolved schema.
+
+    The function unnests the value and parses the dates as convert_value,
+    without inferring the type of the tag again.
+
+    :param tag_name: name of the tag
+    :param promote: True if the database value is a list
+    :param tag_type: database type of the tag
+    :param date_format: Python date format of the tag
+    :returns: a function giving [type, description, unit, value] from the
+       Json properties of the tag (dictionary or value), or None if the
+       value is not nested as the schema (see list_shape)
+    """
+
+    if tag_type == FIELD_TYPE_DATETIME:
+        def parse(value):
+            return datetime.strptime(value, date_format)
+
+    elif tag_type == FIELD_TYPE_DATE:
+        def parse(value):
+            return datetime.strptime(value, date_format).date()
+
+    elif tag_type == FIELD_TYPE_TIME:
+        def parse(value):
+            return datetime.strptime(value, date_format).time()
+
+    else:
+        parse = None
+
+    unnest = tag_name != "Json_Version"
+
+    def converter(properties):
+        if isinstance(properties, dict):
+            description = properties['description'] or None
+            unit = properties['units'] or None
+            value = properties['value']
+
+        else:
+            description = unit = None
+            value = (properties[0] if isinstance(properties, list)
+                     else properties)
+
+        if (unnest and hasattr(value, '__len__') and
+                not isinstance(value, str)):
+            if len(value) == 1 and not isinstance(value[0], list):
+                if promote:
+                    return None
+                value = value[0]
+
+            elif not promote:
+                return None
+
+            elif len(value) == 1:
+                value = value[0]
+
+            else:
+                value = [value_single[0] for value_single in value]
+
+        elif promote:
+            return None
+
+        if parse is not None and value is not None and value != "":
+            value = parse(value)
+
+        return [tag_type, description, unit, value]
+
+    return converter
+
+
+def split_properties(properties):
+    """Give the Json type, date format, description, unit and value of a
+    tag.
+
+    :param properties: Json properties of the tag (dictionary or value)
+    :returns: tuple (Json type, Java date format, description, unit, value)
+    """
+
+    if isinstance(properties, dict):
+        description = properties['description']
+        unit = properties['units']
+        return (properties['type'], properties['format'],
+                description if description != "" else None,
+                unit if unit != "" else None, properties['value'])
+
+    if isinstance(properties, list):
+        return "", "", None, None, properties[0]
+
+    return "", "", None, None, properties
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*- #
+"""Module that contains the history of the actions made on a project, to
+undo and redo them
+
+The history is a SQLite database, in a file of the database folder of the
+project that is deleted when the project is closed. Each action is a row of
+the action table, with its kind and its parameters (such as the definitions of
+the tags removed), and the values it changed are rows of the delta table
+(document, field and two values). Only the ids and the kinds of the actions
+are kept in Python. The oldest actions are forgotten when the size of the
+database exceeds its budget (see Config.get_undo_memory_budget). The history
+is used by the GUI and by the threads of the imports: its methods are
+serialized by a lock.
+
+Contains:
+    Class:
+        -UndoJournal : History of the actions made on a project
+
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import os
+import pickle
+import sqlite3
+import threading
+
+# Populse_MIA imports
+from populse_mia.software_properties import Config
+
+# Types of the values stored as they are, the others being pickled
+NATIVE_TYPES = (str, int, float)
+
+
+class UndoJournal:
+    """History of the actions made on a project.
+
+    The two values of a delta depend on the kind of the action: the old and
+    the new value for "modified_values", the current and the initial value
+    of the document for the other kinds.
+
+    :param budget: maximum size of the history in bytes (the
+       undo_memory_budget config entry if None)
+    :param path: path of the file of the history, deleted when it is
+       closed (the history is kept in memory if None)
+
+    .. Methods:
+        - can_redo: tells if an action can be redone
+        - can_undo: tells if an action can be undone
+        - clear: forgets all the actions
+        - close: frees the history, deleting its file
+        - record: records an action, forgetting the actions undone
+        - redo: gives the last action undone, moved to the actions to undo
+        - size: gives the size of the history
+        - undo: gives the last action, moved to the actions to redo
+        - values: gives the values changed by an action
+    """
+
+    def __init__(self, budget=None, path=None):
+        """Initialization of the UndoJournal class.
+
+        :param budget: maximum size of the history in bytes
+        :param path: path of the file of the history
+        """
+
+        if budget is None:
+            budget = Config().get_undo_memory_budget() * 1024 * 1024
+        self.budget = budget
+        self.path = path
+
+        # The history of a previous session of the project is not used
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+        # The imports record their action from their worker thread, the
+        # connection being used by one thread at a time
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(
+            ":memory:" if path is None else path, check_same_thread=False)
+        # The file is only a buffer of the history of the current session
+        self.connection.execute("PRAGMA journal_mode=OFF")
+        self.connection.execute("PRAGMA synchronous=OFF")
+        # The deltas of an action are inserted together: the action keeps
+        # the range of their rowids
+        self.connection.execute(
+            "CREATE TABLE action (id INTEGER PRIMARY KEY, kind TEXT, "
+            "parameters BLOB, first_delta INTEGER, last_delta INTEGER)")
+        self.connection.execute(
+            "CREATE TABLE delta (document TEXT, field TEXT, a, b)")
+        # Lists of the (id, kind) tuples of the actions, the last one at
+        # the end
+        self.undos = []
+        self.redos = []
+
+    def can_redo(self):
+        """Tell if an action can be redone.
+
+        :returns: boolean
+        """
+
+        return bool(self.redos)
+
+    def can_undo(self):
+        """Tell if an action can be undone.
+
+        :returns: boolean
+        """
+
+        return bool(self.undos)
+
+    def clear(self):
+        """Forget all the actions."""
+
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM action")
+            self.connection.execute("DELETE FROM delta")
+            self.undos = []
+            self.redos = []
+
+    def close(self):
+        """Free the history, deleting its file."""
+
+        with self.lock:
+            self.connection.close()
+            if self.path is not None and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def record(self, kind, parameters, values):
+        """Record an action, forgetting the actions undone.
+
+        :param kind: kind of the action ("add_tag", "remove_tags",
+           "add_scans", "remove_scans", "modified_values" or
+           "modified_visibilities")
+        :param parameters: parameters of the action (any picklable object)
+        :param values: iterable of (document, field, a, b) sequences
+        """
+
+        with self.lock, self.connection:
+            for action_id, action_kind in self.redos:
+                self.__delete(action_id)
+            self.redos = []
+
+            (first_delta,) = self.connection.execute(
+                "SELECT IFNULL(MAX(rowid), 0) + 1 FROM delta").fetchone()
+            self.connection.executemany(
+                "INSERT INTO delta (document, field, a, b) VALUES "
+                "(?, ?, ?, ?)",
+                ((document, field, _encode(a), _encode(b))
+                 for document, field, a, b in values))
+            (last_delta,) = self.connection.execute(
+                "SELECT IFNULL(MAX(rowid), 0) FROM delta").fetchone()
+            action_id = self.connection.execute(
+                "INSERT INTO action (kind, parameters, first_delta, "
+                "last_delta) VALUES (?, ?, ?, ?)",
+                (kind, pickle.dumps(parameters, pickle.HIGHEST_PROTOCOL),
+                 first_delta, last_delta)).lastrowid
+            self.undos.append((action_id, kind))
+
+            # The pages freed by the actions forgotten are reused by the
+            # next ones
+            while len(self.undos) > 1 and self.size() > self.budget:
+                self.__delete(self.undos.pop(0)[0])
+
+    def redo(self):
+        """Give the last action undone, moved to the actions to undo.
+
+        :returns: tuple (action id, kind, parameters), None if there is no
+           action to redo
+        """
+
+        with self.lock:
+            if not self.redos:
+                return None
+            action = self.redos.pop()
+            self.undos.append(action)
+            return self.__get(action[0])
+
+    def size(self):
+        """Give the size of the history.
+
+        :returns: the size of the pages used, in bytes
+        """
+
+        with self.lock:
+            (page_count,) = self.connection.execute(
+                "PRAGMA page_count").fetchone()
+            (freelist_count,) = self.connection.execute(
+                "PRAGMA freelist_count").fetchone()
+            (page_size,) = self.connection.execute(
+                "PRAGMA page_size").fetchone()
+            return (page_count - freelist_count) * page_size
+
+    def undo(self):
+        """Give the last action, moved to the actions to redo.
+
+        :returns: tuple (action id, kind, parameters), None if there is no
+           action to undo
+        """
+
+        with self.lock:
+            if not self.undos:
+                return None
+            action = self.undos.pop()
+            self.redos.append(action)
+            return self.__get(action[0])
+
+    def values(self, action_id):
+        """Give the values changed by an action.
+
+        :param action_id: id of the action
+        :returns: list of (document, field, a, b) tuples
+        """
+
+        with self.lock:
+            (first_delta, last_delta) = self.connection.execute(
+                "SELECT first_delta, last_delta FROM action WHERE id = ?",
+                (action_id,)).fetchone()
+            return [(document, field, _decode(a), _decode(b))
+                    for document, field, a, b in self.connection.execute(
+                        "SELECT document, field, a, b FROM delta WHERE "
+                        "rowid BETWEEN ? AND ? ORDER BY rowid",
+                        (first_delta, last_delta))]
+
+    def __delete(self, action_id):
+        """Delete an action and its deltas.
+
+        :param action_id: id of the action
+        """
+
+        self.connection.execute(
+            "DELETE FROM delta WHERE rowid BETWEEN (SELECT first_delta FROM "
+            "action WHERE id = :id) AND (SELECT last_delta FROM action WHERE "
+            "id = :id)", {"id": action_id})
+        self.connection.execute("DELETE FROM action WHERE id = ?",
+                                (action_id,))
+
+    def __get(self, action_id):
+        """Give an action.
+
+        :param action_id: id of the action
+        :returns: tuple (action id, kind, parameters)
+        """
+
+        kind, parameters = self.connection.execute(
+            "SELECT kind, parameters FROM action WHERE id = ?",
+            (action_id,)).fetchone()
+        return action_id, kind, pickle.loads(parameters)
+
+
+def _decode(value):
+    """Give the value stored in a delta.
+
+    :param value: column value
+    :returns: the Python value
+    """
+
+    if isinstance(value, bytes):
+        return pickle.loads(value)
+    return value
+
+
+def _encode(value):
+    """Give the column value storing a value in a delta.
+
+    :param value: Python value
+    :returns: the value itself if SQLite stores it as it is, its pickle
+       otherwise
+    """
+
+    if value is None or type(value) in NATIVE_TYPES:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
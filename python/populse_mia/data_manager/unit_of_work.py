@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*- #
+"""Module that contains the unit of work of the projects
+
+A unit of work buffers the documents and values written in a project (see
+Project.unit_of_work), instead of writing them one by one in the database
+session. The values read through the unit of work include the ones it
+buffers. When the unit of work ends, the new documents and the values of
+the existing documents are written with bulk statements per collection
+(DatabaseSessionMIA.upsert_documents and update_documents), and the session
+is committed once.
+
+Contains:
+    Class:
+        -UnitOfWork : Buffer of the documents and values written in a project
+
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+from collections import OrderedDict
+
+
+class UnitOfWork:
+    """Buffer of the documents and values written in a project.
+
+    :param session: DatabaseSessionMIA of the project
+
+    .. Methods:
+        - add_document: adds a document
+        - discard: forgets the documents and values buffered
+        - flush: writes the documents and values buffered in the session
+        - get_document: tells if a document exists
+        - get_documents_names: gives the names of the documents of a
+          collection
+        - get_value: gives the value of a document and a field
+        - set_value: sets the value of a document and a field
+        - set_values: sets values of a document
+    """
+
+    def __init__(self, session):
+        """Initialization of the UnitOfWork class.
+
+        :param session: DatabaseSessionMIA of the project
+        """
+
+        self.session = session
+        # Collection -> OrderedDict of the documents added, with their values
+        self.documents = {}
+        # Collection -> OrderedDict of the values set on the documents
+        # already in the session
+        self.values = {}
+
+    def add_document(self, collection, document):
+        """Add a document.
+
+        :param collection: document collection (str, must be existing)
+        :param document: document name
+        """
+
+        if self.session.get_collection(collection) is None:
+            raise ValueError("The collection {0} does not exist".format(
+                collection))
+        if self.get_document(collection, document):
+            raise ValueError(
+                "A document with the name {0} already exists in the "
+                "collection {1}".format(document, collection))
+        self.documents.setdefault(collection, OrderedDict())[document] = {}
+
+    def discard(self):
+        """Forget the documents and values buffered."""
+
+        self.documents = {}
+        self.values = {}
+
+    def flush(self):
+        """Write the documents and values buffered in the session, without
+        committing it.
+
+        The writes are sent at once to the thread writing the database (see
+        DatabaseSessionMIA.run_commands). If one of them fails, the ones of
+        the unit already written are cancelled, the other modifications of
+        the session being kept.
+        """
+
+        commands = []
+        for collection, documents in self.documents.items():
+            if documents:
+                primary_key = self.session.get_collection(
+                    collection).primary_key
+                commands.append((
+                    "upsert_documents",
+                    (collection,
+                     [dict(values, **{primary_key: document})
+                      for document, values in documents.items()]),
+                    {"create_missing_fields": False}))
+
+        for collection, documents in self.values.items():
+            if documents:
+                commands.append(("update_documents",
+                                 (collection, dict(documents))))
+
+        if commands:
+            self.session.run_commands(commands, flush=True, atomic=True)
+
+        self.discard()
+
+    def get_document(self, collection, document):
+        """Tell if a document exists, in the session or in the buffer.
+
+        :param collection: document collection
+        :param document: document name
+        :returns: True if the document exists
+        """
+
+        return (document in self.documents.get(collection, ()) or
+                self.session.get_document(collection, document) is not None)
+
+    def get_documents_names(self, collection):
+        """Give the names of the documents of a collection, the ones
+        buffered included.
+
+        :param collection: document collection
+        :returns: the list of the document names
+        """
+
+        documents = self.session.get_documents_names(collection)
+        documents.extend(self.documents.get(collection, ()))
+        return documents
+
+    def get_value(self, collection, document, field):
+        """Give the value of a document and a field, the one buffered if
+        any.
+
+        :param collection: document collection
+        :param document: document name
+        :param field: field name
+        :returns: the value, None if not defined
+        """
+
+        added = self.documents.get(collection, {})
+        if document in added:
+            value = added[document].get(field)
+        else:
+            values = self.values.get(collection, {}).get(document, {})
+            if field not in values:
+                return self.session.get_value(collection, document, field)
+            value = values[field]
+
+        # As the values read from the session, the lists and dictionaries
+        # can be modified by the caller
+        if isinstance(value, (list, dict)):
+            return value.copy()
+        return value
+
+    def set_value(self, collection, document, field, value):
+        """Set the value of a document and a field.
+
+        :param collection: document collection (str, must be existing)
+        :param document: document name (str, must be existing)
+        :param field: field name (str, must be existing)
+        :param value: new value
+        """
+
+        self.set_values(collection, document, {field: value})
+
+    def set_values(self, collection, document, values):
+        """Set values of a document.
+
+        The values are checked as by the session, so that an invalid value
+        is reported by the call setting it rather than when the unit of work
+        ends.
+
+        :param collection: document collection (str, must be existing)
+        :param document: document name (str, must be existing)
+        :param values: dictionary of the new values by field name
+        """
+
+        collection_row = self.session.get_collection(collection)
+        if collection_row is None:
+            raise ValueError("The collection {0} does not exist".format(
+                collection))
+        if not self.get_document(collection, document):
+            raise ValueError(
+                "The document with the name {0} does not exist in the "
+                "collection {1}".format(document, collection))
+        for field, value in values.items():
+            field_row = self.session.get_field(collection, field)
+            if field_row is None:
+                raise ValueError(
+                    "The field with the name {0} does not exist in the "
+                    "collection {1}".format(field, collection))
+            if field == collection_row.primary_key:
+                raise ValueError("Impossible to set the primary_key value of "
+                                 "a document")
+            if not self.session._DatabaseSession__check_type_value(
+                    value, field_row.type):
+                raise ValueError("The value {0} is invalid for the type "
+                                 "{1}".format(value, field_row.type))
+
+        added = self.documents.get(collection, {})
+        if document in added:
+            added[document].update(values)
+        else:
+            self.values.setdefault(collection, OrderedDict()).setdefault(
+                document, {}).update(values)
@@ -61,6 +61,7 @@ if sys.version_info < (3 , 6) and sys.version_info >= (3 , 5):
         'mia-processes>=1.2.1',
         'nibabel',
         'nipype',
+        'numpy',
         'pillow',
         'populse-db',
         'pyqt5',
@@ -84,6 +85,7 @@ elif sys.version_info >= (3 , 6):
         'mia-processes>=1.2.1',
         'nibabel',
         'nipype',
+        'numpy',
         'pillow',
         'populse-db',
         'pyqt5',
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*- #
+"""Command-line tool importing MRIFileManager exports in a project.
+
+The scans listed in the most recent logExport*.json file of an export folder
+are imported in a project without the graphical interface, so that the
+ingestion can be run on servers (for example by cron):
+
+    python -m populse_mia.ingest <project> <export_dir> [--workers N]
+
+If the export folder is not the raw_data folder of the project, the exported
+files are first linked (or copied if they can't be) into it.
+
+:Contains:
+    :Function:
+        - ingest
+        - main
+        - stage_export
+
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+
+# Populse_MIA imports
+from populse_mia.data_manager.data_loader import ScansImporter
+from populse_mia.data_manager.project import Project
+from populse_mia.software_properties import Config
+
+
+def ingest(project_folder, export_dir, workers=None, new_project=False):
+    """Import the scans of an export folder in a project and save it.
+
+    :param project_folder: path of the project
+    :param export_dir: folder containing the exported scans and their
+       logExport*.json files
+    :param workers: number of processes reading the scans (the
+       import_workers config entry by default)
+    :param new_project: True to create the project
+    :returns: the statistics of the import (see ScansImporter.run)
+    """
+
+    project = Project(project_folder, new_project)
+
+    try:
+        raw_data_folder = os.path.join(project.folder, 'data', 'raw_data')
+        stage_export(export_dir, raw_data_folder)
+
+        # Each batch of scans is saved, so that an interrupted ingestion
+        # can be resumed
+        importer = ScansImporter(project, workers=workers, save_batches=True)
+        statistics = importer.run()
+        project.saveModifications()
+
+    finally:
+        project.session.unsave_modifications()
+        project.close()
+        # The project is removed from the opened projects, as when the
+        # software is closed
+        config = Config()
+        opened_projects = config.get_opened_projects()
+        if project.folder in opened_projects:
+            opened_projects.remove(project.folder)
+            config.set_opened_projects(opened_projects)
+
+    return statistics
+
+
+def main(argv=None):
+    """Parse the command-line arguments, import the scans and print the
+    throughput of the import.
+
+    :param argv: command-line arguments (sys.argv[1:] by default)
+    :returns: the exit code
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m populse_mia.ingest",
+        description="Import the scans exported by MRIFileManager in a "
+                    "populse_mia project.")
+    parser.add_argument("project", help="path of the project")
+    parser.add_argument("export_dir",
+                        help="folder containing the exported scans and their "
+                             "logExport*.json files")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of processes reading the scans "
+                             "(import_workers config entry by default)")
+    parser.add_argument("--new", action="store_true",
+                        help="create the project")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.export_dir):
+        print("The export folder {0} does not exist".format(args.export_dir),
+              file=sys.stderr)
+        return 1
+
+    try:
+        statistics = ingest(args.project, args.export_dir, args.workers,
+                            args.new)
+    except IOError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    duration = max(statistics["duration"], 1e-6)
+    read_duration = max(statistics["read_duration"], 1e-6)
+    print("{0} scans read ({1} new), {2} tags added".format(
+        statistics["scans"], statistics["scans_added"],
+        statistics["tags_added"]))
+    if statistics["scans_resumed"]:
+        print("{0} scans already imported before the interruption".format(
+            statistics["scans_resumed"]))
+    for tag_name, conflicts in sorted(statistics["tag_conflicts"].items()):
+        print("Tag {0}: {1} scans with other Json properties than the "
+              "first ones".format(tag_name, conflicts))
+    print("Reading: {0:.2f} s, {1:.1f} scans/s, {2:.1f} MB/s".format(
+        statistics["read_duration"], statistics["scans"] / read_duration,
+        statistics["bytes"] / read_duration / 1024 ** 2))
+    print("Total: {0:.2f} s, {1:.1f} scans/s".format(
+        statistics["duration"], statistics["scans"] / duration))
+    return 0
+
+
+def stage_export(export_dir, raw_data_folder):
+    """Put the files of an export folder in the raw_data folder of a project.
+
+    The files are hard-linked when possible, copied otherwise. Nothing is
+    done if the export folder is the raw_data folder.
+
+    :param export_dir: folder containing the exported scans and their
+       logExport*.json files
+    :param raw_data_folder: raw_data folder of the project
+    """
+
+    if (os.path.exists(raw_data_folder) and
+            os.path.samefile(export_dir, raw_data_folder)):
+        return
+
+    list_logs = glob.glob(os.path.join(export_dir, "logExport*.json"))
+
+    if not list_logs:
+        return
+
+    log_to_read = max(list_logs, key=os.path.getctime)
+
+    with open(log_to_read, "r", encoding="utf-8") as file:
+        list_dict_log = json.load(file)
+
+    file_names = [os.path.basename(log_to_read)]
+    for dict_log in list_dict_log:
+        if dict_log['StatusExport'] == "Export ok":
+            file_names.append(dict_log['NameFile'] + ".nii")
+            file_names.append(dict_log['NameFile'] + ".json")
+
+    for file_name in file_names:
+        destination = os.path.join(raw_data_folder, file_name)
+
+        if os.path.exists(destination):
+            os.remove(destination)
+
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        try:
+            os.link(os.path.join(export_dir, file_name), destination)
+        except OSError:
+            shutil.copy2(os.path.join(export_dir, file_name), destination)
+
+    # The copied log must be the most recent one of the raw_data folder
+    os.utime(os.path.join(raw_data_folder, file_names[0]))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
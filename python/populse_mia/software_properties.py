@@ -24,6 +24,10 @@ import os
 import yaml
 import re
 
+# Populse_MIA imports
+from populse_mia.data_manager.fingerprint import (ALGORITHMS,
+                                                  DEFAULT_ALGORITHM)
+
 
 def verCmp(first_ver, sec_ver, comp):
     """Version comparator.
@@ -91,8 +95,18 @@ class Config:
     Object that handles the configuration of the software
 
     .. Methods:
+        - get_auto_save_delay: returns the time during which the
+          modifications are gathered before being auto-saved
+        - get_checksum_algorithm: returns the algorithm used to compute the
+          checksums of the scans
         - get_clinical_mode: returns the value of "clinical mode" checkbox
           in the preferences
+        - get_index_advisor: returns if the indexes of the tags are updated
+          when the project is saved
+        - get_import_streaming: returns if the scans are imported while
+          MRIFileManager is converting them
+        - get_import_workers: returns the number of processes used to read
+          the scans during an import
         - get_matlab_command: returns Matlab command
         - get_matlab_path: returns the path of Matlab's executable
         - get_matlab_standalone_path: returns the path of Matlab Compiler
@@ -102,7 +116,11 @@ class Config:
         - get_mia_path: returns the software's install path
         - get_projects_save_path: returns the folder where the projects are
           saved
+        - get_search_index: returns if the rapid search uses a full-text
+          index of the values
         - get_spm_path: returns the path of SPM12 (license version)
+        - get_undo_memory_budget: returns the maximum size of the history
+          of the actions that can be undone
         - get_spm_standalone_path: returns the path of SPM12 (standalone
           version)
         - get_use_matlab: returns the value of "use matlab" checkbox in the
@@ -130,8 +148,18 @@ class Config:
         - saveConfig: saves the config to the config.yml file
         - setAutoSave: sets the auto-save mode
         - setBackgroundColor: sets the background color
+        - set_auto_save_delay: sets the time during which the modifications
+          are gathered before being auto-saved
+        - set_checksum_algorithm: sets the algorithm used to compute the
+          checksums of the scans
         - set_clinical_mode: sets the value of "clinical mode" checkbox in
           the preferences
+        - set_index_advisor: sets if the indexes of the tags are updated
+          when the project is saved
+        - set_import_streaming: sets if the scans are imported while
+          MRIFileManager is converting them
+        - set_import_workers: sets the number of processes used to read the
+          scans during an import
         - set_matlab_path: sets the path of Matlab's executable
         - set_matlab_standalone_path: sets the path of Matlab Compiler Runtime
         - set_max_projects: sets the maximum number of projects displayed in
@@ -139,7 +167,11 @@ class Config:
         - set_mia_path: sets the software's install path
         - set_mri_conv_path: sets the MRIManager.jar path
         - set_projects_save_path: sets the folder where the projects are saved
+        - set_search_index: sets if the rapid search uses a full-text index
+          of the values
         - set_spm_path: sets the path of SPM12 (license version)
+        - set_undo_memory_budget: sets the maximum size of the history of
+          the actions that can be undone
         - set_spm_standalone_path: sets the path of SPM12 (standalone version)
         - set_use_matlab: sets the value of "use matlab" checkbox in the
           preferences
@@ -165,6 +197,38 @@ class Config:
             self.config["mia_user_path"] = self.get_mia_path()
             self.saveConfig()
 
+    def get_auto_save_delay(self):
+        """Get the time during which the modifications are gathered before
+        being auto-saved.
+
+        :return: integer, in milliseconds (2000 by default)
+
+        """
+        try:
+            return int(self.config["auto_save_delay"])
+        except (KeyError, TypeError, ValueError):
+            return 2000
+
+    def get_checksum_algorithm(self):
+        """Get the algorithm used to compute the checksums of the scans.
+
+        An unknown algorithm (for example mistyped in config.yml) is
+        replaced by the default one, instead of failing during the imports.
+
+        :return: string ("md5" by default)
+
+        """
+        try:
+            algorithm = self.config["checksum_algorithm"]
+        except KeyError:
+            return DEFAULT_ALGORITHM
+        if algorithm not in ALGORITHMS:
+            print('\nWarning: unknown checksum algorithm "{0}" in the '
+                  'configuration, "{1}" is used (the algorithm must be in '
+                  '{2})\n'.format(algorithm, DEFAULT_ALGORITHM, ALGORITHMS))
+            return DEFAULT_ALGORITHM
+        return algorithm
+
     def get_clinical_mode(self):
         """Get if clinical mode is disabled or enabled in the preferences.
 
@@ -176,6 +240,42 @@ class Config:
         except KeyError:
             return True
 
+    def get_index_advisor(self):
+        """Get if the indexes of the tags filtered the most are updated when
+        the project is saved.
+
+        :return: boolean
+
+        """
+        try:
+            return bool(self.config["index_advisor"])
+        except KeyError:
+            return False
+
+    def get_import_streaming(self):
+        """Get if the scans are imported while MRIFileManager is
+        converting them.
+
+        :return: boolean
+
+        """
+        try:
+            return bool(self.config["import_streaming"])
+        except KeyError:
+            return False
+
+    def get_import_workers(self):
+        """Get the number of processes used to read the scans during an
+        import.
+
+        :return: Integer (1 if the scans are read in the importing thread)
+
+        """
+        try:
+            return max(1, int(self.config["import_workers"]))
+        except (KeyError, TypeError, ValueError):
+            return 1
+
     def get_matlab_command(self):
         """Get Matlab command.
 
@@ -338,6 +438,17 @@ class Config:
                 os.mkdir(os.path.join(self.get_mia_path(), 'projects'))
             return os.path.join(self.get_mia_path(), 'projects')
 
+    def get_search_index(self):
+        """Get if the rapid search uses a full-text index of the values.
+
+        :return: boolean
+
+        """
+        try:
+            return bool(self.config["search_index"])
+        except KeyError:
+            return False
+
     def get_spm_path(self):
         """Get the path of SPM12.
 
@@ -360,6 +471,18 @@ class Config:
         except KeyError:
             return ""
 
+    def get_undo_memory_budget(self):
+        """Get the maximum size of the history of the actions that can be
+        undone, the oldest actions being forgotten beyond it.
+
+        :return: integer, in megabytes (256 by default)
+
+        """
+        try:
+            return int(self.config["undo_memory_budget"])
+        except (KeyError, TypeError, ValueError):
+            return 256
+
     def get_use_matlab(self):
         """Get the value of "use matlab" checkbox in the preferences.
 
@@ -493,6 +616,30 @@ class Config:
             yaml.dump(self.config, configfile, default_flow_style=False,
                       allow_unicode=True)
 
+    def set_auto_save_delay(self, delay):
+        """Set the time during which the modifications are gathered before
+        being auto-saved.
+
+        :param: delay: integer, in milliseconds
+
+        """
+        self.config["auto_save_delay"] = delay
+        # Then save the modification
+        self.saveConfig()
+
+    def set_checksum_algorithm(self, algorithm):
+        """Set the algorithm used to compute the checksums of the scans.
+
+        :param: algorithm: string ("md5", "blake2b", "sha1" or "sha256")
+
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError("The checksum algorithm must be in {0}, "
+                             "{1} given".format(ALGORITHMS, algorithm))
+        self.config["checksum_algorithm"] = algorithm
+        # Then save the modification
+        self.saveConfig()
+
     def set_clinical_mode(self, clinical_mode):
         """Enable of disable clinical mode.
 
@@ -503,6 +650,39 @@ class Config:
         # Then save the modification
         self.saveConfig()
 
+    def set_index_advisor(self, index_advisor):
+        """Set if the indexes of the tags filtered the most are updated when
+        the project is saved.
+
+        :param: index_advisor: boolean
+
+        """
+        self.config["index_advisor"] = index_advisor
+        # Then save the modification
+        self.saveConfig()
+
+    def set_import_streaming(self, streaming):
+        """Set if the scans are imported while MRIFileManager is
+        converting them.
+
+        :param: streaming: boolean
+
+        """
+        self.config["import_streaming"] = streaming
+        # Then save the modification
+        self.saveConfig()
+
+    def set_import_workers(self, nb_workers):
+        """Set the number of processes used to read the scans during an
+        import.
+
+        :param: nb_workers: Integer
+
+        """
+        self.config["import_workers"] = nb_workers
+        # Then save the modification
+        self.saveConfig()
+
     def set_matlab_path(self, path):
         """Set the path of Matlab's executable.
 
@@ -563,6 +743,16 @@ class Config:
         # Then save the modification
         self.saveConfig()
 
+    def set_search_index(self, search_index):
+        """Set if the rapid search uses a full-text index of the values.
+
+        :param: search_index: boolean
+
+        """
+        self.config["search_index"] = search_index
+        # Then save the modification
+        self.saveConfig()
+
     def set_spm_path(self, path):
         """Set the path of SPM12 (license version).
 
@@ -583,6 +773,17 @@ class Config:
         # Then save the modification
         self.saveConfig()
 
+    def set_undo_memory_budget(self, budget):
+        """Set the maximum size of the history of the actions that can be
+        undone.
+
+        :param: budget: integer, in megabytes
+
+        """
+        self.config["undo_memory_budget"] = budget
+        # Then save the modification
+        self.saveConfig()
+
     def set_use_matlab(self, use_matlab):
         """Set the value of "use matlab" checkbox in the preferences.
 
@@ -4,6 +4,7 @@
 :Contains:
     :Class:
         - TestMIADataBrowser
+        - TestMIADataManager
         - TestMIAPipelineManager
 
 """
@@ -16,8 +17,13 @@
 # for details.
 ##########################################################################
 
+import hashlib
+import json
 import os, shutil
+import sqlite3
 import sys
+import tempfile
+import threading
 import yaml
 
 # Working from the scripts directory
@@ -29,12 +35,16 @@ from populse_db.database import FIELD_TYPE_INTEGER
 os.chdir(os.path.dirname(os.path.realpath(__file__)))
 
 import unittest
+from unittest import mock
 
 from PyQt5.QtTest import QTest
-from PyQt5.QtWidgets import QApplication, QTableWidgetItem
+from PyQt5.QtGui import QMouseEvent
+from PyQt5.QtWidgets import (QApplication, QProgressDialog,
+                             QStyleOptionViewItem, QTableWidgetItem)
 from populse_mia.data_manager.project import Project, COLLECTION_CURRENT, \
-    COLLECTION_INITIAL, COLLECTION_BRICK, \
+    COLLECTION_INITIAL, COLLECTION_BRICK, TAG_ORIGIN_BUILTIN, \
     TAG_ORIGIN_USER, TAG_FILENAME, TAG_CHECKSUM, TAG_TYPE, TAG_BRICKS, TAG_EXP_TYPE
+from populse_mia.data_manager.project import BRICK_ID, BRICK_NAME
 from populse_db.database import (
             FIELD_TYPE_INTEGER, FIELD_TYPE_LIST_INTEGER, FIELD_TYPE_STRING,
             FIELD_TYPE_BOOLEAN, FIELD_TYPE_FLOAT, FIELD_TYPE_TIME,
@@ -46,6 +56,7 @@ from populse_db.database import (
 from populse_mia.data_manager.project_properties import SavedProjects
 from populse_mia.user_interface.main_window import MainWindow
 from populse_mia.user_interface.data_browser.modify_table import ModifyTable
+from populse_mia.user_interface.data_browser.count_table import CountTable
 from populse_mia.software_properties import Config, verCmp
 from populse_mia.user_interface.pipeline_manager.process_library import *
 from populse_mia.utils.utils import *
@@ -53,6 +64,26 @@ from populse_mia.user_interface.pop_ups import PopUpSaveProjectAs, \
     PopUpNewProject, PopUpOpenProject
 from capsul.api import get_process_instance
 from datetime import datetime
+from populse_mia.data_manager.data_loader import (ScansImporter,
+                                                  StreamingImportWorker,
+                                                  check_scans, read_scans,
+                                                  source_key, tag_properties)
+from populse_mia.data_manager.database_mia import (DatabaseMIA,
+                                                   copy_database,
+                                                   remove_database)
+from populse_mia.data_manager.database_writer import (DatabaseWriter,
+                                                      SessionProxy)
+from populse_mia.data_manager.fingerprint import (
+    FingerprintIndex, checksum_matches, compute_checksum, parse_checksum,
+    stat_key)
+from populse_mia.data_manager.import_journal import ImportJournal
+from populse_mia.data_manager.index_advisor import IndexAdvisor, QueryLog
+from populse_mia.data_manager.search_index import search_index_available
+from populse_mia.data_manager.tag_schema import TagSchemaRegistry
+from populse_mia.data_manager.undo_journal import UndoJournal
+from populse_mia import ingest
+from populse_mia.user_interface.data_browser import table_fill, table_model
+from populse_mia.user_interface.data_browser.rapid_search import RapidSearch
 
 
 class TestMIAPipelineManager(unittest.TestCase):
@@ -2279,18 +2310,21 @@ class TestMIADataBrowser(unittest.TestCase):
         project_8_path = os.path.join(mia_path, 'resources', 'mia', 'project_8')
         self.main_window.switch_project(project_8_path, "project_8")
 
-        self.assertEqual(self.main_window.project.undos, [])
-        self.assertEqual(self.main_window.project.redos, [])
+        history = self.main_window.project.history
+        self.assertEqual(history.undos, [])
+        self.assertEqual(history.redos, [])
 
         # Testing modified value undo/redo
+        modified_value = ('data/raw_data/Guerbet-C6-2014-Rat-K52-Tube27-2014-02-14_10-23-17-02-G1_Guerbet_Anat-RARE__pvm_-00-02-20.000.nii', 'BandWidth', 50000.0, 0.0)
         bw_column = self.main_window.data_browser.table_data.get_tag_column("BandWidth")
         bw_item = self.main_window.data_browser.table_data.item(0, bw_column)
         bw_old = bw_item.text()
         self.assertEqual(int(bw_old), 50000)
         bw_item.setSelected(True)
         bw_item.setText("0")
-        self.assertEqual(self.main_window.project.undos, [['modified_values', [['data/raw_data/Guerbet-C6-2014-Rat-K52-Tube27-2014-02-14_10-23-17-02-G1_Guerbet_Anat-RARE__pvm_-00-02-20.000.nii', 'BandWidth', 50000.0, 0.0]]]])
-        self.assertEqual(self.main_window.project.redos, [])
+        self.assertEqual([kind for action_id, kind in history.undos], ['modified_values'])
+        self.assertEqual(list(history.values(history.undos[-1][0])), [modified_value])
+        self.assertEqual(history.redos, [])
         bw_item = self.main_window.data_browser.table_data.item(0, bw_column)
         bw_set = bw_item.text()
         self.assertEqual(int(bw_set), 0)
@@ -2298,15 +2332,13 @@ class TestMIADataBrowser(unittest.TestCase):
         bw_item = self.main_window.data_browser.table_data.item(0, bw_column)
         bw_undo = bw_item.text()
         self.assertEqual(int(bw_undo), 50000)
-        self.assertEqual(self.main_window.project.redos, [['modified_values', [[
-                                                                                   'data/raw_data/Guerbet-C6-2014-Rat-K52-Tube27-2014-02-14_10-23-17-02-G1_Guerbet_Anat-RARE__pvm_-00-02-20.000.nii',
-                                                                                   'BandWidth', 50000.0, 0.0]]]])
-        self.assertEqual(self.main_window.project.undos, [])
+        self.assertEqual([kind for action_id, kind in history.redos], ['modified_values'])
+        self.assertEqual(list(history.values(history.redos[-1][0])), [modified_value])
+        self.assertEqual(history.undos, [])
         self.main_window.action_redo.trigger()
-        self.assertEqual(self.main_window.project.undos, [['modified_values', [[
-                                                                                   'data/raw_data/Guerbet-C6-2014-Rat-K52-Tube27-2014-02-14_10-23-17-02-G1_Guerbet_Anat-RARE__pvm_-00-02-20.000.nii',
-                                                                                   'BandWidth', 50000.0, 0.0]]]])
-        self.assertEqual(self.main_window.project.redos, [])
+        self.assertEqual([kind for action_id, kind in history.undos], ['modified_values'])
+        self.assertEqual(list(history.values(history.undos[-1][0])), [modified_value])
+        self.assertEqual(history.redos, [])
         bw_item = self.main_window.data_browser.table_data.item(0, bw_column)
         bw_redo = bw_item.text()
         self.assertEqual(int(bw_redo), 0)
@@ -2472,11 +2504,18 @@ class TestMIADataBrowser(unittest.TestCase):
         project_8_path = os.path.join(mia_path, 'resources', 'mia', 'project_8')
         self.main_window.switch_project(project_8_path, "project_8")
 
-        bricks_column = self.main_window.data_browser.table_data.get_tag_column("Bricks")
-        bricks_widget = self.main_window.data_browser.table_data.cellWidget(8, bricks_column)
-        smmooth_button = bricks_widget.children()[1]
-        self.assertEqual(smmooth_button.text(), "smooth1")
-        QTest.mouseClick(smmooth_button, Qt.LeftButton)
+        table_data = self.main_window.data_browser.table_data
+        bricks_column = table_data.get_tag_column("Bricks")
+        bricks_index = table_data.data_model.index(8, bricks_column)
+        table_data.scrollTo(bricks_index)
+        bricks_delegate = table_data.itemDelegate(bricks_index)
+        bricks = bricks_delegate.bricks(bricks_index)
+        self.assertEqual(bricks[0][1], "smooth1")
+        smooth_rect = bricks_delegate.brick_rects(
+            table_data.visualRect(bricks_index), table_data.fontMetrics(),
+            len(bricks))[0]
+        QTest.mouseClick(table_data.viewport(), Qt.LeftButton,
+                         pos=smooth_rect.center())
         brick_history = self.main_window.data_browser.table_data.show_brick_popup
         brick_table = brick_history.table
         self.assertEqual(brick_table.horizontalHeaderItem(0).text(), "Name")
@@ -2544,5 +2583,1393 @@ class TestMIADataBrowser(unittest.TestCase):
         scan = self.main_window.data_browser.table_data.item(8, 0).text()
         self.assertEqual(scan, "data/raw_data/Guerbet-C6-2014-Rat-K52-Tube27-2014-02-14_10-23-17-09-G4_Guerbet_T1SE_800-RARE__pvm_-00-01-42.400.nii")
 
+    def test_table_model(self):
+        """Tests the sort, the removal of rows and the blocks of values of
+        the model of the databrowser table"""
+
+        session = self.main_window.project.session
+        session.add_field(COLLECTION_CURRENT, "Age", FIELD_TYPE_INTEGER, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        ages = [3, 1, 4, 1, 5]
+        scans = ["scan_{0}.nii".format(i) for i in range(len(ages))]
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: scan, "Age": age}
+            for scan, age in zip(scans, ages)])
+
+        model = self.main_window.data_browser.table_data.data_model
+        model.set_tags([TAG_FILENAME, "Age"])
+        model.set_scans(scans)
+
+        def column(tag):
+            return [model.data(model.index(row, model.columns[tag]))
+                    for row in range(model.rowCount())]
+
+        # Stable sort, the values being read from the database and the
+        # persistent indexes following their documents
+        persistent = QtCore.QPersistentModelIndex(model.index(4, 1))
+        model.sort(1, Qt.AscendingOrder)
+        self.assertEqual(column("Age"), [1, 1, 3, 4, 5])
+        self.assertEqual(column(TAG_FILENAME)[:2],
+                         ["scan_1.nii", "scan_3.nii"])
+        self.assertEqual(persistent.row(), 4)
+        session.set_value(COLLECTION_CURRENT, "scan_1.nii", "Age", 10)
+        model.sort(1, Qt.DescendingOrder)
+        self.assertEqual(column("Age"), [10, 5, 4, 3, 1])
+        self.assertEqual(column(TAG_FILENAME)[0], "scan_1.nii")
+        self.assertEqual(persistent.row(), 1)
+        self.assertEqual(model.rows, {scan: row for row, scan in
+                                      enumerate(model.scans)})
+
+        # The rows that are not consecutive are removed
+        model.sort(0, Qt.AscendingOrder)
+        model.remove_scans(["scan_1.nii", "scan_3.nii", "missing.nii"])
+        self.assertEqual(column(TAG_FILENAME),
+                         ["scan_0.nii", "scan_2.nii", "scan_4.nii"])
+        self.assertEqual(column("Age"), [3, 4, 5])
+        self.assertEqual(model.rows, {"scan_0.nii": 0, "scan_2.nii": 1,
+                                      "scan_4.nii": 2})
+
+        # The blocks of values least recently used are forgotten
+        with mock.patch.object(table_model, "BLOCK_SIZE", 1), \
+                mock.patch.object(table_model, "MAX_BLOCKS", 2):
+            model.refresh()
+            for row in (0, 1, 0, 2):
+                model.value(row, "Age")
+            self.assertEqual(list(model.blocks), [0, 2])
+            session.set_value(COLLECTION_CURRENT, "scan_4.nii", "Age", 6)
+            self.assertEqual(model.value(2, "Age"), (5, FIELD_TYPE_INTEGER))
+            self.assertEqual(model.value(1, "Age"), (4, FIELD_TYPE_INTEGER))
+            self.assertEqual(list(model.blocks), [2, 1])
+            model.refresh(["scan_4.nii"])
+            self.assertEqual(model.value(2, "Age"), (6, FIELD_TYPE_INTEGER))
+
+    def test_table_fill(self):
+        """Tests the fill of the databrowser table by chunks, and its
+        cancellation"""
+
+        session = self.main_window.project.session
+        scans = ["scan_{0:03}.nii".format(i)
+                 for i in range(3 * table_fill.CHUNK_SIZE)]
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: scan} for scan in scans])
+        table = self.main_window.data_browser.table_data
+        table.scans_to_visualize = list(scans)
+        fill_rows = table.fill_rows
+        chunks = []
+
+        def cancel():
+            for widget in QApplication.topLevelWidgets():
+                if isinstance(widget, QProgressDialog):
+                    widget.cancel()
+
+        def slow_fill(rows):
+            # Each chunk takes a whole time slice, the fill is cancelled
+            # when the events are processed after the first one
+            if not chunks:
+                QtCore.QTimer.singleShot(0, cancel)
+            chunks.append(len(rows))
+            QTest.qSleep(int(table_fill.FILL_TICK * 1000) + 1)
+            fill_rows(rows)
+
+        with mock.patch.object(table, "fill_rows", slow_fill):
+            table.add_rows(scans)
+        self.assertEqual(chunks, [table_fill.CHUNK_SIZE])
+        self.assertEqual(table.data_model.scans,
+                         scans[:table_fill.CHUNK_SIZE])
+        self.assertEqual(table.scans_to_visualize,
+                         scans[:table_fill.CHUNK_SIZE])
+
+        # A fill of a single chunk is made at once
+        chunks.clear()
+        fill = table_fill.TableFill("Filling")
+        self.assertEqual(fill.run(scans[:10], chunks.append), 10)
+        self.assertEqual(chunks, [scans[:10]])
+        self.assertFalse(fill.canceled)
+
+    def test_bricks(self):
+        """Tests the uuids of the bricks given by the model, and the clicks
+        on the bricks painted by the delegate"""
+
+        session = self.main_window.project.session
+        session.add_document(COLLECTION_BRICK, {BRICK_ID: "uuid_1",
+                                                BRICK_NAME: "smooth"})
+        session.add_document(COLLECTION_BRICK, {BRICK_ID: "uuid_2",
+                                                BRICK_NAME: "normalize"})
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: "scan_0.nii",
+             TAG_BRICKS: ["uuid_1", "uuid_removed", "uuid_2"]},
+            {TAG_FILENAME: "scan_1.nii"}])
+
+        table = self.main_window.data_browser.table_data
+        model = table.data_model
+        model.set_tags([TAG_FILENAME, TAG_BRICKS])
+        model.set_scans(["scan_0.nii", "scan_1.nii"])
+        index = model.index(0, 1)
+        self.assertEqual(model.data(index, table_model.BRICKS_ROLE),
+                         ["uuid_1", "uuid_removed", "uuid_2"])
+        self.assertEqual(model.data(index), "")
+        self.assertFalse(model.flags(index) & Qt.ItemIsEditable)
+        self.assertIsNone(model.data(model.index(0, 0),
+                                     table_model.BRICKS_ROLE))
+        self.assertIsNone(model.data(model.index(1, 1),
+                                     table_model.BRICKS_ROLE))
+
+        # The bricks that do not exist any more are not displayed
+        delegate = table.itemDelegate()
+        self.assertEqual(delegate.bricks(index), [("uuid_1", "smooth"),
+                                                  ("uuid_2", "normalize")])
+        self.assertEqual(delegate.bricks(model.index(1, 1)), [])
+
+        option = QStyleOptionViewItem()
+        option.rect = QtCore.QRect(0, 0, 200, 200)
+        option.fontMetrics = table.fontMetrics()
+        rects = delegate.brick_rects(option.rect, option.fontMetrics, 2)
+
+        def click(point, button=Qt.LeftButton):
+            event = QMouseEvent(QtCore.QEvent.MouseButtonRelease,
+                                QtCore.QPointF(point), button, button,
+                                Qt.NoModifier)
+            return delegate.editorEvent(event, model, option, index)
+
+        with mock.patch.object(table, "show_brick_history") as show:
+            self.assertTrue(click(rects[1].center()))
+            show.assert_called_once_with("uuid_2")
+            click(rects[0].center(), Qt.RightButton)
+            click(QtCore.QPoint(rects[1].center().x(),
+                                rects[1].bottom() + 20))
+            show.assert_called_once_with("uuid_2")
+            self.assertTrue(click(rects[0].center()))
+            show.assert_called_with("uuid_1")
+
+    def test_scan_row_tag_column(self):
+        """Tests the row of the scans and the column of the tags, after a
+        sort, a removal of rows and a move of a column"""
+
+        session = self.main_window.project.session
+        session.add_field(COLLECTION_CURRENT, "Age", FIELD_TYPE_INTEGER, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        session.add_field(COLLECTION_CURRENT, "Name", FIELD_TYPE_STRING, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        ages = {"scan_0.nii": 3, "scan_1.nii": 1, "scan_2.nii": 4,
+                "scan_3.nii": 2}
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: scan, "Age": age, "Name": scan[:-4]}
+            for scan, age in ages.items()])
+
+        table = self.main_window.data_browser.table_data
+        table.data_model.set_tags([TAG_FILENAME, "Age", "Name"])
+        table.data_model.set_scans(list(ages))
+
+        def check(scans):
+            self.assertEqual(table.rowCount(), len(scans))
+            for scan in scans:
+                row = table.get_scan_row(scan)
+                self.assertEqual(table.item(row, 0).text(), scan)
+                self.assertEqual(table.item(
+                    row, table.get_tag_column("Age")).text(),
+                    str(ages[scan]))
+                self.assertEqual(table.item(
+                    row, table.get_tag_column("Name")).text(), scan[:-4])
+
+        self.assertEqual(table.get_tag_column("Age"), 1)
+        check(list(ages))
+
+        table.horizontalHeader().setSortIndicator(1, Qt.DescendingOrder)
+        self.assertEqual(table.get_scan_row("scan_2.nii"), 0)
+        self.assertEqual(table.get_scan_row("scan_1.nii"), 3)
+        check(list(ages))
+
+        table.remove_rows(["scan_0.nii", "scan_2.nii"])
+        self.assertIsNone(table.get_scan_row("scan_0.nii"))
+        self.assertEqual(table.get_scan_row("scan_3.nii"), 0)
+        self.assertEqual(table.get_scan_row("scan_1.nii"), 1)
+        check(["scan_1.nii", "scan_3.nii"])
+
+        # The columns are logical indexes, which do not change when a
+        # column is moved
+        table.horizontalHeader().moveSection(2, 1)
+        self.assertEqual(table.horizontalHeader().visualIndex(
+            table.get_tag_column("Name")), 1)
+        self.assertEqual(table.get_tag_column("Name"), 2)
+        self.assertIsNone(table.get_tag_column("Unknown"))
+        check(["scan_1.nii", "scan_3.nii"])
+
+    def test_update_colors(self):
+        """Tests that only the cells of the documents and tags modified are
+        recolored"""
+
+        session = self.main_window.project.session
+        for collection in (COLLECTION_CURRENT, COLLECTION_INITIAL):
+            session.add_field(collection, "Age", FIELD_TYPE_INTEGER, "",
+                              True, TAG_ORIGIN_BUILTIN, None, None)
+            session.add_field(collection, "Name", FIELD_TYPE_STRING, "",
+                              True, TAG_ORIGIN_USER, None, None)
+            session.upsert_documents(collection, [
+                {TAG_FILENAME: "scan_{0}.nii".format(i), "Age": i,
+                 "Name": "scan"} for i in range(4)])
+
+        table = self.main_window.data_browser.table_data
+        model = table.data_model
+        model.set_tags([TAG_FILENAME, "Age", "Name"])
+        model.set_scans(["scan_{0}.nii".format(i) for i in range(4)])
+        table.update_colors()
+
+        repainted = []
+
+        def record(top_left, bottom_right, roles):
+            repainted.append(((top_left.row(), top_left.column()),
+                              (bottom_right.row(), bottom_right.column()),
+                              list(roles)))
+
+        model.dataChanged.connect(record)
+
+        def colors(row):
+            return [model.data(model.index(row, column),
+                               table_model.COLORS_ROLE)
+                    for column in range(3)]
+
+        self.assertEqual(colors(2), [table_model.COLORS, table_model.COLORS,
+                                     table_model.COLORS_USER])
+
+        session.set_value(COLLECTION_CURRENT, "scan_2.nii", "Age", 20)
+        session.set_value(COLLECTION_CURRENT, "scan_2.nii", "Name", "other")
+        table.update_colors(scans=["scan_2.nii"], tags=["Age"])
+        self.assertEqual(repainted,
+                         [((2, 1), (2, 1), [table_model.COLORS_ROLE])])
+        self.assertEqual(colors(2), [table_model.COLORS,
+                                     table_model.COLORS_MODIFIED,
+                                     table_model.COLORS_USER])
+        self.assertEqual(colors(1), [table_model.COLORS, table_model.COLORS,
+                                     table_model.COLORS_USER])
+
+        # The cells of several documents are repainted at once
+        del repainted[:]
+        session.set_value(COLLECTION_CURRENT, "scan_0.nii", "Age", 10)
+        table.update_colors(scans=["scan_2.nii", "scan_0.nii"],
+                            tags=["Age"])
+        self.assertEqual(repainted,
+                         [((0, 1), (2, 1), [table_model.COLORS_ROLE])])
+        self.assertEqual(model.data(model.index(0, 1),
+                                    table_model.COLORS_ROLE),
+                         table_model.COLORS_MODIFIED)
+
+        # Nothing is repainted after a sort, and everything by default
+        del repainted[:]
+        table.update_colors(scans=[])
+        self.assertEqual(repainted, [])
+        table.update_colors()
+        self.assertEqual(repainted,
+                         [((0, 0), (3, 2), [table_model.COLORS_ROLE])])
+
+    def test_verify_scans(self):
+        """Tests the verification of all the scans, run in the background"""
+
+        project = self.main_window.project
+        path = os.path.join(project.folder, "data", "raw_data", "scan.nii")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as scan_file:
+            scan_file.write(os.urandom(100))
+        project.session.add_document(COLLECTION_CURRENT, {
+            TAG_FILENAME: "data/raw_data/scan.nii",
+            TAG_CHECKSUM: compute_checksum(path)})
+        project.saveModifications()
+
+        def verify():
+            self.main_window.verify_scans()
+            pop_up = self.main_window.pop_up_verify_scans
+            self.assertTrue(pop_up.isVisible())
+            self.main_window.verify_worker.wait()
+            # The signals of the worker are received by the pop-up
+            QApplication.processEvents()
+            return pop_up
+
+        # The scans are all hashed, whatever their stat
+        pop_up = verify()
+        self.assertTrue(self.main_window.verify_worker.deep)
+        self.assertEqual(pop_up.list_widget_scans.count(), 0)
+        self.assertEqual(pop_up.label_progress.text(), "1/1 scans checked")
+        self.assertEqual(pop_up.windowTitle(), "Verify all the scans")
+
+        stat = os.stat(path)
+        with open(path, "wb") as scan_file:
+            scan_file.write(bytes(100))
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        pop_up = verify()
+        self.assertEqual([pop_up.list_widget_scans.item(i).text()
+                          for i in range(pop_up.list_widget_scans.count())],
+                         ["data/raw_data/scan.nii (modified)"])
+        self.assertEqual(pop_up.windowTitle(), "Warning")
+        self.main_window.stop_verification()
+
+
+class TestMIADataManager(unittest.TestCase):
+    """Tests for the data manager modules, which do not need the main
+    window"""
+
+    def setUp(self):
+        """
+        Called before each test
+        """
+
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """
+        Called after each test
+        """
+
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def export_scans(self, raw_data_folder, names):
+        """Write the scans and the export log of MRIFileManager in a
+        folder"""
+
+        os.makedirs(raw_data_folder, exist_ok=True)
+        tag = {"type": "", "format": "", "description": "", "units": ""}
+
+        for name in names:
+            with open(os.path.join(raw_data_folder, name + ".nii"),
+                      "wb") as nifti_file:
+                nifti_file.write(os.urandom(100))
+            with open(os.path.join(raw_data_folder, name + ".json"),
+                      "w") as json_file:
+                json.dump({"AcquisitionDate": dict(
+                    tag, format="yyyy-MM-dd", value=["2020-01-02"]),
+                    "EchoTime": dict(tag, value=[5.5])}, json_file)
+
+        with open(os.path.join(raw_data_folder, "logExport.json"),
+                  "w") as log_file:
+            json.dump([{"NameFile": name, "StatusExport": "Export ok"}
+                       for name in names], log_file)
+        return raw_data_folder
+
+    def new_project(self):
+        """Create a temporary project, closed at the end of the test"""
+
+        # The tests are run in regular mode
+        config = Config()
+        config.set_clinical_mode(False)
+
+        self.app = QApplication.instance()
+        if self.app is None:
+            self.app = QApplication(sys.argv)
+        project = Project(None, True)
+
+        def close():
+            project.unsaveModifications()
+            project.close()
+            config = Config()
+            config.set_opened_projects([])
+            config.saveConfig()
+            shutil.rmtree(project.folder, ignore_errors=True)
+
+        self.addCleanup(close)
+        return project
+
+    def write_file(self, name, content):
+        """Write a file in the folder of the test, and give its path"""
+
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as file:
+            file.write(content)
+        return path
+
+    def test_checksum_algorithm_config(self):
+        """Checks that an unknown checksum algorithm is not used"""
+
+        config = Config()
+        algorithm = config.config.get("checksum_algorithm")
+        try:
+            config.config["checksum_algorithm"] = "sha256"
+            self.assertEqual(config.get_checksum_algorithm(), "sha256")
+            config.config["checksum_algorithm"] = "md55"
+            self.assertEqual(config.get_checksum_algorithm(), "md5")
+            self.assertRaises(ValueError, config.set_checksum_algorithm,
+                              "md55")
+        finally:
+            if algorithm is None:
+                del config.config["checksum_algorithm"]
+            else:
+                config.config["checksum_algorithm"] = algorithm
+
+    def test_auto_save(self):
+        """Checks that the auto-save does not wait for the writer thread,
+        and writes the files once the session is committed"""
+
+        # A delay that is not a number is replaced by the default one
+        config = Config()
+        delay = config.config.get("auto_save_delay")
+        try:
+            config.config["auto_save_delay"] = "soon"
+            self.assertEqual(config.get_auto_save_delay(), 2000)
+        finally:
+            if delay is None:
+                del config.config["auto_save_delay"]
+            else:
+                config.config["auto_save_delay"] = delay
+
+        project = self.new_project()
+        session = project.session
+        session.add_field(COLLECTION_CURRENT, "Age", FIELD_TYPE_INTEGER, "",
+                          True, TAG_ORIGIN_USER, None, None)
+
+        # The writer thread is busy while the project is saved
+        busy = threading.Event()
+        session.submit([(busy.wait, (10,))])
+        project.auto_save.save()
+        self.assertIsNotNone(project.auto_save.pending)
+        self.assertIsNone(project.auto_save.worker)
+        self.assertFalse(os.path.exists(project.query_log.path))
+
+        busy.set()
+        for i in range(100):
+            if project.auto_save.worker is not None:
+                break
+            QTest.qWait(10)
+        self.assertIsNotNone(project.auto_save.worker)
+        project.auto_save.flush()
+        self.assertIsNone(project.auto_save.pending)
+        self.assertFalse(session.has_unsaved_modifications())
+        self.assertTrue(os.path.exists(project.query_log.path))
+
+        # A save still pending is committed and written by flush
+        session.add_document(COLLECTION_CURRENT, "scan.nii")
+        project.auto_save.schedule()
+        project.auto_save.flush()
+        self.assertIsNone(project.auto_save.pending)
+        self.assertFalse(session.has_unsaved_modifications())
+
+    def test_check_scans(self):
+        """Checks that only the scans whose stat changed are hashed again"""
+
+        content = os.urandom(1000)
+        path = self.write_file("scan.nii", content)
+        checksum = compute_checksum(path)
+        scans = [("scan.nii", checksum), ("missing.nii", checksum)]
+
+        def check(deep=False):
+            problems = []
+            check_scans(self.folder, scans, deep, max_workers=2,
+                        on_problem=lambda scan, missing: problems.append(
+                            (scan, missing)))
+            return sorted(problems)
+
+        # The scan is hashed and recorded in the index, the missing one is
+        # reported
+        self.assertEqual(check(), [("missing.nii", True)])
+        index = FingerprintIndex(self.folder)
+        self.assertTrue(index.unchanged("scan.nii", stat_key(path),
+                                        checksum))
+        index.close()
+
+        # A file modified without changing its stat is only detected by a
+        # deep check
+        stat = os.stat(path)
+        self.write_file("scan.nii", bytes(1000))
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(check(), [("missing.nii", True)])
+        self.assertEqual(check(deep=True), [("missing.nii", True),
+                                            ("scan.nii", False)])
+
+        # A modified scan is removed from the index, so it is hashed again
+        self.assertEqual(check(), [("missing.nii", True),
+                                   ("scan.nii", False)])
+
+    def test_copy_database(self):
+        """Checks that the database copied after a checkpoint has the values
+        committed"""
+
+        project = self.new_project()
+        session = project.session
+        session.add_field(COLLECTION_CURRENT, "Age", FIELD_TYPE_INTEGER, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        session.add_document(COLLECTION_CURRENT,
+                             {TAG_FILENAME: "scan.nii", "Age": 30})
+        project.saveModifications()
+        session.checkpoint()
+
+        # The log is empty, a log left at the destination is not used with
+        # the copy
+        path = os.path.join(self.folder, "mia.db")
+        self.write_file("mia.db-wal", os.urandom(100))
+        copy_database(os.path.join(project.folder, "database", "mia.db"),
+                      path)
+        self.assertFalse(os.path.exists(path + "-wal") and
+                         os.path.getsize(path + "-wal"))
+        with DatabaseMIA("sqlite:///" + path) as copy:
+            self.assertEqual(copy.get_value(COLLECTION_CURRENT, "scan.nii",
+                                            "Age"), 30)
+
+        remove_database(path)
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_count_scans(self):
+        """Checks that the count table groups the scans by the values of the
+        selected tags"""
+
+        project = self.new_project()
+        session = project.session
+        session.add_field(COLLECTION_CURRENT, "Patient", FIELD_TYPE_STRING,
+                          "", True, TAG_ORIGIN_USER, None, None)
+        session.add_field(COLLECTION_CURRENT, "EchoTime", FIELD_TYPE_FLOAT,
+                          "", True, TAG_ORIGIN_USER, None, None)
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: "scan_a.nii", "Patient": "P1", "EchoTime": 5.0},
+            {TAG_FILENAME: "scan_b.nii", "Patient": "P1", "EchoTime": 5.0},
+            {TAG_FILENAME: "scan_c.nii", "Patient": "P2", "EchoTime": 7.5},
+            {TAG_FILENAME: "scan_d.nii", "Patient": "P2"}])
+
+        count_table = CountTable(project)
+        count_table.push_buttons[0].setText("Patient")
+        count_table.fill_values(0)
+        count_table.push_buttons[1].setText("EchoTime")
+        count_table.fill_values(1)
+        self.assertEqual(count_table.values_list, [["P1", "P2"], [5.0, 7.5]])
+        count_table.count_scans()
+
+        table = count_table.table
+        self.assertEqual((table.rowCount(), table.columnCount()), (3, 3))
+        self.assertEqual(table.item(0, 1).text(), "2")
+        self.assertEqual(table.item(0, 1).toolTip(),
+                         "scan_a.nii\nscan_b.nii")
+        self.assertEqual(table.item(0, 2).text(), "")
+        self.assertEqual(table.item(1, 1).text(), "")
+        self.assertEqual(table.item(1, 2).toolTip(), "scan_c.nii")
+        self.assertEqual(table.item(2, 2).text(), "1")
+
+        # Counted again after a value is written
+        session.set_value(COLLECTION_CURRENT, "scan_d.nii", "EchoTime", 7.5)
+        count_table.count_scans()
+        self.assertEqual(table.item(1, 2).text(), "2")
+        self.assertEqual(table.item(2, 2).text(), "2")
+
+    def test_database_writer(self):
+        """Checks that the session is only used by the writer thread"""
+
+        writer = DatabaseWriter(DatabaseMIA(
+            "sqlite:///" + os.path.join(self.folder, "mia.db")))
+        self.addCleanup(writer.close)
+        session = SessionProxy(writer)
+        session.add_collection(COLLECTION_CURRENT, TAG_FILENAME, True,
+                               TAG_ORIGIN_BUILTIN, None, None)
+        session.add_field(COLLECTION_CURRENT, "Age", FIELD_TYPE_INTEGER, "",
+                          True, TAG_ORIGIN_USER, None, None)
+
+        # The exception of a command is given by its future, the next
+        # batches being run
+        self.assertRaises(ValueError, session.add_field, COLLECTION_BRICK,
+                          "Age", FIELD_TYPE_INTEGER, "", True,
+                          TAG_ORIGIN_USER, None, None)
+        future = session.submit([
+            (session.add_document, (COLLECTION_CURRENT, "scan.nii")),
+            (int, ("x",)),
+            (session.add_document, (COLLECTION_CURRENT, "other.nii"))])
+        self.assertRaises(ValueError, future.result)
+        self.assertEqual(session.get_documents_names(COLLECTION_CURRENT),
+                         ["scan.nii"])
+
+        # The generators are consumed by the writer thread
+        (names,) = session.submit([
+            (lambda: (name.upper() for name in session.get_documents_names(
+                COLLECTION_CURRENT)), ())]).result()
+        self.assertEqual(names, ["SCAN.NII"])
+
+        # The internals of the session are only available to the writer
+        for name in ("session", "metadata"):
+            self.assertRaises(AttributeError, getattr, session, name)
+        (sql_session,) = session.submit([
+            (lambda: session.session, ())]).result()
+        self.assertIs(sql_session, writer.session.session)
+        session.query_log = None
+        self.assertIsNone(writer.session.query_log)
+
+        writer.close()
+        self.assertFalse(writer.is_alive())
+
+    def test_fingerprint(self):
+        """Checks the checksums of the files and the fingerprint index"""
+
+        content = os.urandom(3000)
+        path = self.write_file("scan.nii", content)
+
+        # Same digest by chunks, through a memory map or at once
+        checksum = compute_checksum(path, chunk_size=64)
+        self.assertEqual(checksum, hashlib.md5(content).hexdigest())
+        self.assertEqual(compute_checksum(path, use_mmap=True), checksum)
+        self.assertEqual(compute_checksum(
+            self.write_file("empty.nii", b""), use_mmap=True),
+            hashlib.md5(b"").hexdigest())
+
+        # The algorithm is recorded as a prefix, except md5
+        blake_checksum = compute_checksum(path, "blake2b", chunk_size=100)
+        self.assertEqual(parse_checksum(blake_checksum),
+                         ("blake2b", hashlib.blake2b(content).hexdigest()))
+        self.assertEqual(parse_checksum(checksum), ("md5", checksum))
+        self.assertTrue(checksum_matches(path, checksum))
+        self.assertTrue(checksum_matches(path, blake_checksum))
+        self.assertRaises(ValueError, compute_checksum, path, "md55")
+
+        # The index tells if a file has been hashed with the same stat
+        index = FingerprintIndex(self.folder)
+        try:
+            key = stat_key(path)
+            self.assertIsNone(index.get("scan.nii"))
+            index.set("scan.nii", key, checksum)
+            self.assertEqual(index.get("scan.nii"), (key, checksum))
+            self.assertTrue(index.unchanged("scan.nii", key, checksum))
+            self.assertFalse(index.unchanged("scan.nii", key,
+                                             blake_checksum))
+            self.write_file("scan.nii", content + b"0")
+            self.assertFalse(index.unchanged("scan.nii", stat_key(path),
+                                             checksum))
+            index.remove(["scan.nii"])
+            self.assertIsNone(index.get("scan.nii"))
+        finally:
+            index.close()
+
+    def test_filter_documents_names(self):
+        """Checks that the filters are compiled once and restricted to the
+        candidate documents"""
+
+        session = self.new_project().session
+        session.add_field(COLLECTION_CURRENT, "Age", FIELD_TYPE_INTEGER, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: "scan_{0}.nii".format(age), "Age": age}
+            for age in range(10)])
+
+        query = session.compile_filter(COLLECTION_CURRENT, "{Age} >= 5")
+        self.assertIs(session.compile_filter(COLLECTION_CURRENT,
+                                             "{Age} >= 5"), query)
+        names = sorted(document.FileName for document in
+                       session.filter_documents(COLLECTION_CURRENT,
+                                                "{Age} >= 5"))
+        self.assertEqual(sorted(session.filter_documents_names(
+            COLLECTION_CURRENT, "{Age} >= 5")), names)
+
+        # Only the candidates are searched, the duplicates being ignored
+        self.assertEqual(sorted(session.filter_documents_names(
+            COLLECTION_CURRENT, "{Age} >= 5",
+            ["scan_1.nii", "scan_6.nii", "scan_7.nii", "scan_6.nii"])),
+            ["scan_6.nii", "scan_7.nii"])
+        self.assertEqual(session.filter_documents_names(
+            COLLECTION_CURRENT, "{Age} >= 5", []), [])
+        self.assertEqual(sorted(session.filter_documents_names(
+            COLLECTION_CURRENT, "{Age} >= 5")), names)
+
+        # The filter is compiled again when the fields change
+        session.add_field(COLLECTION_CURRENT, "Site", FIELD_TYPE_STRING, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        self.assertIsNot(session.compile_filter(COLLECTION_CURRENT,
+                                                "{Age} >= 5"), query)
+
+    def test_get_values(self):
+        """Checks that the values read by blocks are given in the order of
+        the documents and fields requested, with None for the missing
+        ones"""
+
+        session = self.new_project().session
+        session.add_field(COLLECTION_CURRENT, "Age", FIELD_TYPE_INTEGER, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        session.add_field(COLLECTION_CURRENT, "Echoes", FIELD_TYPE_LIST_FLOAT,
+                          "", True, TAG_ORIGIN_USER, None, None)
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: "scan_{0:03}.nii".format(i), "Age": i}
+            for i in range(600)])
+        session.set_value(COLLECTION_CURRENT, "scan_001.nii", "Echoes",
+                          [1.5, 2.5])
+
+        values = session.get_values(
+            COLLECTION_CURRENT, ["scan_002.nii", "missing.nii",
+                                 "scan_001.nii"],
+            ["Echoes", "Unknown", "Age"])
+        self.assertEqual(values.documents,
+                         ["scan_002.nii", "missing.nii", "scan_001.nii"])
+        self.assertEqual(values.fields, ["Echoes", "Unknown", "Age"])
+        self.assertEqual(values.types, {"Echoes": FIELD_TYPE_LIST_FLOAT,
+                                        "Unknown": None,
+                                        "Age": FIELD_TYPE_INTEGER})
+        self.assertEqual(values.columns["Age"], [2, None, 1])
+        self.assertEqual(values.columns["Unknown"], [None, None, None])
+        self.assertEqual(values.get("scan_001.nii", "Echoes"), [1.5, 2.5])
+        self.assertIsNone(values.get("scan_002.nii", "Echoes"))
+        self.assertIsNone(values.get("scan_001.nii", "Weight"))
+        self.assertEqual(values.row("scan_001.nii"), [[1.5, 2.5], None, 1])
+        self.assertEqual(values.row("missing.nii"), [None, None, None])
+        self.assertEqual(values.row("other.nii"), [None, None, None])
+        self.assertEqual(values.row("scan_001.nii"), [
+            session.get_value(COLLECTION_CURRENT, "scan_001.nii", field)
+            for field in ["Echoes", "Unknown", "Age"]])
+
+        # Read by chunks, all the documents and the fields by default
+        documents = ["scan_{0:03}.nii".format(i) for i in reversed(range(600))]
+        values = session.get_values(COLLECTION_CURRENT, documents, ["Age"])
+        self.assertEqual(values.columns["Age"], list(reversed(range(600))))
+        values = session.get_values(COLLECTION_CURRENT)
+        self.assertEqual(sorted(values.documents), sorted(documents))
+        self.assertEqual(values.fields, session.get_fields_names(
+            COLLECTION_CURRENT))
+        self.assertRaises(ValueError, session.get_values, "unknown")
+
+    def test_import_journal(self):
+        """Checks that the scans read are stored in the journal and only
+        reused while their files did not change"""
+
+        project = self.new_project()
+        raw_data_folder = self.export_scans(
+            os.path.join(project.folder, "data", "raw_data"),
+            ["scan_a", "scan_b"])
+        log_path = os.path.join(raw_data_folder, "logExport.json")
+        key_a = source_key("scan_a", raw_data_folder)
+        scan = {"path": "data/raw_data/scan_a.nii", "checksum": "0" * 32,
+                "stat": (100, 1, 2),
+                "tags": [["Date", FIELD_TYPE_DATE, None, None,
+                          datetime(2020, 1, 2).date()],
+                         ["Time", FIELD_TYPE_TIME, None, None,
+                          datetime(2020, 1, 2, 3, 4, 5).time()],
+                         ["Acquired", FIELD_TYPE_DATETIME, None, None,
+                          datetime(2020, 1, 2, 3, 4, 5, 6000)],
+                         ["Empty", FIELD_TYPE_DATETIME, None, None, ""],
+                         ["Names", FIELD_TYPE_LIST_STRING, "Names", None,
+                          ["a", "b"]]]}
+
+        journal = ImportJournal(project.folder)
+        try:
+            self.assertFalse(journal.begin(log_path, ["scan_a", "scan_b"]))
+            journal.record([("scan_a", key_a, scan)])
+            self.assertEqual(journal.get("scan_a", key_a), scan)
+            self.assertIsNone(journal.get("scan_a", key_a[:3] + (0, 0, 0)))
+            self.assertIsNone(journal.get("scan_b", key_a))
+            self.assertEqual(journal.committed(), {})
+            journal.mark_committed(["scan_a"])
+            self.assertEqual(journal.committed(), {"scan_a": scan})
+        finally:
+            journal.close()
+
+        # The interrupted import is resumed, the finished one is not
+        journal = ImportJournal(project.folder)
+        try:
+            self.assertTrue(journal.begin(log_path, ["scan_a", "scan_b"]))
+            journal.finish()
+            self.assertFalse(journal.begin(log_path, ["scan_a", "scan_b"]))
+            self.assertEqual(journal.committed(), {})
+            self.assertEqual(journal.get("scan_a", key_a), scan)
+        finally:
+            journal.close()
+
+        # The scans are stored as Json
+        connection = sqlite3.connect(os.path.join(
+            project.folder, "database", "import_journal.db"))
+        (text,) = connection.execute(
+            "SELECT scan FROM scan WHERE name = 'scan_a'").fetchone()
+        connection.close()
+        self.assertEqual(json.loads(text)["tags"][0][4], "2020-01-02")
+
+    def test_import_journal_batches(self):
+        """Checks that the batches of an import are recorded as written in
+        the journal only if they are saved"""
+
+        project = self.new_project()
+        self.export_scans(os.path.join(project.folder, "data", "raw_data"),
+                          ["scan_a", "scan_b", "scan_c"])
+
+        def committed():
+            journal = ImportJournal(project.folder)
+            try:
+                return sorted(journal.committed())
+            finally:
+                journal.close()
+
+        statistics = ScansImporter(project, workers=1, batch_size=2).run()
+        self.assertEqual(statistics["scans"], 3)
+        self.assertEqual(committed(), [])
+        self.assertEqual(
+            project.session.get_value(COLLECTION_CURRENT,
+                                      os.path.join("data", "raw_data",
+                                                   "scan_a.nii"),
+                                      "AcquisitionDate"),
+            datetime(2020, 1, 2).date())
+
+        ScansImporter(project, workers=1, batch_size=2,
+                      save_batches=True).run()
+        self.assertEqual(committed(), ["scan_a", "scan_b", "scan_c"])
+        self.assertFalse(project.session.has_unsaved_modifications())
+
+    def test_import_workers(self):
+        """Checks that the scans read by several worker processes are given
+        in order, with the schemas of the importing process, and that an
+        error of a worker is raised"""
+
+        project_folder = os.path.join(self.folder, "project")
+        raw_data_folder = os.path.join(project_folder, "data", "raw_data")
+        names = ["scan_{0}".format(i) for i in reversed(range(6))]
+        self.export_scans(raw_data_folder, names)
+
+        registry = TagSchemaRegistry(track_changes=True)
+        registry.convert("EchoTime", {"type": "", "format": "",
+                                      "description": "", "units": "",
+                                      "value": [1.5]})
+
+        scans = list(read_scans(names, raw_data_folder, project_folder,
+                                workers=2, registry=registry))
+        self.assertEqual([scan["path"] for scan in scans],
+                         [os.path.join("data", "raw_data", name + ".nii")
+                          for name in names])
+        self.assertEqual(
+            [(scan["checksum"], scan["tags"]) for scan in scans],
+            [(scan["checksum"], scan["tags"]) for scan in read_scans(
+                names, raw_data_folder, project_folder, workers=1)])
+
+        # The workers only learn the schemas unknown to the registry
+        learned = set()
+        for scan in scans:
+            learned.update(scan["schema_changes"][0])
+        self.assertEqual(learned, {"AcquisitionDate"})
+
+        # A scan that cannot be read stops the reading at its position
+        os.remove(os.path.join(raw_data_folder, "scan_2.json"))
+        scans = read_scans(names, raw_data_folder, project_folder, workers=2,
+                           registry=registry)
+        for name in names[:3]:
+            self.assertTrue(next(scans)["path"].endswith(name + ".nii"))
+        self.assertRaises(FileNotFoundError, next, scans)
+
+    def test_index_advisor(self):
+        """Checks that the tags filtered the most are indexed, and that the
+        query log is kept in its file"""
+
+        project = self.new_project()
+        session = project.session
+        for field, field_type in (("Age", FIELD_TYPE_INTEGER),
+                                  ("Site", FIELD_TYPE_STRING)):
+            session.add_field(COLLECTION_CURRENT, field, field_type, "",
+                              True, TAG_ORIGIN_USER, None, None)
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: "scan_{0}.nii".format(age), "Age": age,
+             "Site": "Paris"} for age in range(10)])
+
+        # The LIKE filters are not counted, as an index does not help them
+        for age in range(3):
+            session.filter_documents_names(
+                COLLECTION_CURRENT,
+                '{{Age}} >= {0} AND {{Site}} LIKE "%ar%"'.format(age))
+        self.assertEqual(project.query_log.hits[COLLECTION_CURRENT],
+                         {"Age": 3})
+        self.assertEqual(len(project.query_log.recent_filters(
+            COLLECTION_CURRENT, 2)), 2)
+
+        def optimize(min_hits):
+            advisor = IndexAdvisor(session, project.query_log,
+                                   min_hits=min_hits)
+            return session.run_commands([
+                (advisor.optimize, ()),
+                (advisor.indexes, (COLLECTION_CURRENT,))])
+
+        events, indexes = optimize(3)
+        self.assertEqual([(event["created"], event["dropped"], event[
+            "filters"]) for event in events], [(["Age"], [], 3)])
+        self.assertEqual(list(indexes.values()), ["Age"])
+        self.assertEqual(optimize(3), [[], indexes])
+
+        # The index of a tag filtered less is dropped
+        events, indexes = optimize(4)
+        self.assertEqual([(event["created"], event["dropped"])
+                          for event in events], [([], ["Age"])])
+        self.assertEqual(indexes, {})
+
+        project.query_log.save()
+        query_log = QueryLog(project.query_log.path)
+        self.assertEqual(query_log.get_state(),
+                         project.query_log.get_state())
+
+    def test_ingest(self):
+        """Checks that the headless tool imports the scans of an export
+        folder in a project"""
+
+        project_folder = os.path.join(self.folder, "project")
+        export_dir = self.export_scans(os.path.join(self.folder, "export"),
+                                       ["scan_a", "scan_b"])
+        database_path = os.path.join(project_folder, "database", "mia.db")
+
+        def scans():
+            with DatabaseMIA("sqlite:///" + database_path) as session:
+                return sorted(session.get_documents_names(
+                    COLLECTION_CURRENT))
+
+        statistics = ingest.ingest(project_folder, export_dir, workers=1,
+                                   new_project=True)
+        self.assertEqual((statistics["scans"], statistics["scans_added"]),
+                         (2, 2))
+        self.assertEqual(scans(), ["data/raw_data/scan_a.nii",
+                                   "data/raw_data/scan_b.nii"])
+        self.assertTrue(os.path.exists(os.path.join(
+            project_folder, "data", "raw_data", "logExport.json")))
+        self.assertNotIn(project_folder, Config().get_opened_projects())
+
+        # The scans already imported are not added again
+        statistics = ingest.ingest(project_folder, export_dir, workers=1)
+        self.assertEqual((statistics["scans"], statistics["scans_added"]),
+                         (2, 0))
+        self.assertEqual(len(scans()), 2)
+
+        # A missing export folder is reported by the exit code
+        self.assertEqual(ingest.main([project_folder, os.path.join(
+            self.folder, "missing")]), 1)
+
+    def test_modified_values(self):
+        """Checks that the values differing from the initial collection are
+        compared again only for the documents written"""
+
+        session = self.new_project().session
+        for collection in (COLLECTION_CURRENT, COLLECTION_INITIAL):
+            session.add_field(collection, "Age", FIELD_TYPE_INTEGER, "",
+                              True, TAG_ORIGIN_USER, None, None)
+            session.upsert_documents(collection, [
+                {TAG_FILENAME: "scan_a.nii", "Age": 1},
+                {TAG_FILENAME: "scan_b.nii", "Age": 2}])
+
+        modified = session.get_modified(COLLECTION_CURRENT,
+                                        COLLECTION_INITIAL)
+        self.assertEqual(modified.documents(), set())
+
+        session.set_value(COLLECTION_CURRENT, "scan_a.nii", "Age", 10)
+        modified = session.get_modified(COLLECTION_CURRENT,
+                                        COLLECTION_INITIAL)
+        self.assertEqual(modified.documents(), {"scan_a.nii"})
+        self.assertTrue(modified.is_modified("scan_a.nii", "Age"))
+        self.assertFalse(modified.is_modified("scan_a.nii", TAG_FILENAME))
+        self.assertFalse(modified.is_modified("scan_b.nii", "Age"))
+
+        # Written back to the initial value, or removed
+        session.set_value(COLLECTION_CURRENT, "scan_a.nii", "Age", 1)
+        session.set_value(COLLECTION_CURRENT, "scan_b.nii", "Age", 20)
+        self.assertEqual(session.get_modified(
+            COLLECTION_CURRENT, COLLECTION_INITIAL).documents(),
+            {"scan_b.nii"})
+        session.remove_document(COLLECTION_CURRENT, "scan_b.nii")
+        self.assertEqual(session.get_modified(
+            COLLECTION_CURRENT, COLLECTION_INITIAL).documents(), set())
+
+    def test_search_values(self):
+        """Checks that the full-text index gives the same documents as the
+        LIKE filter, which is case sensitive"""
+
+        if not search_index_available():
+            self.skipTest("SQLite does not support the full-text index")
+
+        session = self.new_project().session
+        session.add_field(COLLECTION_CURRENT, "Name", FIELD_TYPE_STRING, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: "scan_{0}.nii".format(i), "Name": name}
+            for i, name in enumerate(["Hello World", "hello world", "HELLO",
+                                      "a*b?c[d]", "Hello_World"])])
+
+        for search in ["ello", "Hello", "HELLO", "hello", "llo W", "lo_W",
+                       "o%W", "*b?", "c[d]", "b?c"]:
+            self.assertEqual(
+                sorted(session.search_values(COLLECTION_CURRENT, search,
+                                             ["Name"])),
+                sorted(session.filter_documents_names(
+                    COLLECTION_CURRENT,
+                    RapidSearch.prepare_filter(search, ["Name"]))),
+                search)
+        self.assertEqual(sorted(session.search_values(
+            COLLECTION_CURRENT, "Hello", ["Name"])),
+            ["scan_0.nii", "scan_4.nii"])
+
+    def test_snapshot(self):
+        """Checks that the columnar snapshot is patched with the documents
+        written, rebuilt when the fields change, and that the views already
+        given do not change"""
+
+        session = self.new_project().session
+        session.add_field(COLLECTION_CURRENT, "Age", FIELD_TYPE_INTEGER, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        session.add_field(COLLECTION_CURRENT, "Name", FIELD_TYPE_STRING, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: "scan_a.nii", "Age": 1, "Name": "a"},
+            {TAG_FILENAME: "scan_b.nii", "Age": 2}])
+
+        first = session.get_snapshot(COLLECTION_CURRENT, ["Age", "Name"])
+        self.assertEqual(first.documents, ["scan_a.nii", "scan_b.nii"])
+        self.assertEqual(first.column("Age").tolist(), [1, 2])
+        self.assertEqual(first.column("Name").tolist(), ["a", None])
+        self.assertIsNone(first.column("Unknown"))
+        self.assertFalse(first.column("Age").values.flags.writeable)
+
+        # Patched with the documents written
+        session.set_value(COLLECTION_CURRENT, "scan_b.nii", "Name", "b")
+        session.add_document(COLLECTION_CURRENT, "scan_c.nii")
+        session.set_value(COLLECTION_CURRENT, "scan_c.nii", "Age", 3)
+        second = session.get_snapshot(COLLECTION_CURRENT, ["Age", "Name"])
+        self.assertGreater(second.version, first.version)
+        self.assertEqual(second.documents,
+                         ["scan_a.nii", "scan_b.nii", "scan_c.nii"])
+        self.assertEqual(second.column("Age").tolist(), [1, 2, 3])
+        self.assertEqual(second.get("scan_b.nii", "Name"), "b")
+        self.assertIsNone(second.get("scan_c.nii", "Name"))
+        self.assertEqual(first.column("Name").tolist(), ["a", None])
+        self.assertEqual(len(first), 2)
+
+        session.remove_document(COLLECTION_CURRENT, "scan_a.nii")
+        third = session.get_snapshot(COLLECTION_CURRENT)
+        self.assertEqual(third.documents, ["scan_b.nii", "scan_c.nii"])
+        self.assertEqual(third.column("Age").tolist(), [2, 3])
+        self.assertEqual(second.column("Age").tolist(), [1, 2, 3])
+        self.assertEqual(second.get("scan_a.nii", "Age"), 1)
+
+        # Rebuilt when the fields change
+        session.add_field(COLLECTION_CURRENT, "Weight", FIELD_TYPE_FLOAT, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        session.set_value(COLLECTION_CURRENT, "scan_c.nii", "Weight", 4.5)
+        fourth = session.get_snapshot(COLLECTION_CURRENT, ["Weight"])
+        self.assertEqual(fourth.column("Weight").tolist(), [None, 4.5])
+        session.remove_field(COLLECTION_CURRENT, "Weight")
+        self.assertIsNone(session.get_snapshot(
+            COLLECTION_CURRENT).column("Weight"))
+        self.assertEqual(fourth.column("Weight").tolist(), [None, 4.5])
+
+    def test_streaming_import(self):
+        """Checks that the scans converted while MRIFileManager is running
+        are imported once, and that the scans written when it exits are
+        imported by the final pass"""
+
+        project = self.new_project()
+        raw_data_folder = os.path.join(project.folder, "data", "raw_data")
+        # Removed with the project, after the worker is stopped
+        started = os.path.join(project.folder, "started")
+        exited = os.path.join(project.folder, "exited")
+        # Stands for MRIFileManager, which exits when the test tells it to
+        command = [sys.executable, "-c",
+                   "import os, time\n"
+                   "open({0!r}, 'w').close()\n"
+                   "while not os.path.exists({1!r}):\n"
+                   "    time.sleep(0.02)".format(started, exited)]
+
+        worker = StreamingImportWorker(project, command, poll_interval=0.05)
+        worker.importer.merge_scans = mock.Mock(
+            wraps=worker.importer.merge_scans)
+
+        def wait_for(condition):
+            for _ in range(200):
+                if condition():
+                    break
+                QTest.qSleep(50)
+            self.assertTrue(condition())
+
+        def stop():
+            if worker.isRunning():
+                open(exited, "w").close()
+                worker.wait()
+
+        worker.start()
+        self.addCleanup(stop)
+        # The scans already in raw_data when MRIFileManager is launched are
+        # not imported
+        wait_for(lambda: os.path.exists(started))
+        self.export_scans(raw_data_folder, ["scan_a", "scan_b"])
+        wait_for(lambda: worker.ingested == {"scan_a", "scan_b"})
+        self.assertTrue(worker.isRunning())
+
+        # Converted just before MRIFileManager exits
+        self.export_scans(raw_data_folder,
+                          ["scan_a", "scan_b", "scan_c", "scan_d"])
+        open(exited, "w").close()
+        self.assertTrue(worker.wait(10000))
+
+        self.assertEqual(worker.returncode, 0)
+        self.assertEqual(worker.ingested,
+                         {"scan_a", "scan_b", "scan_c", "scan_d"})
+        merged = [scan["path"] for args, kwargs in
+                  worker.importer.merge_scans.call_args_list
+                  for scan in args[0]]
+        paths = [os.path.join("data", "raw_data", name + ".nii")
+                 for name in ["scan_a", "scan_b", "scan_c", "scan_d"]]
+        self.assertEqual(sorted(merged), paths)
+        self.assertEqual(sorted(worker.scans_added), paths)
+        self.assertEqual(sorted(project.session.get_documents_names(
+            COLLECTION_CURRENT)), paths)
+
+    def test_tag_schema(self):
+        """Checks that the tags converted with the recorded schemas have the
+        same values as with the full inference"""
+
+        tag = {"type": "", "format": "", "description": "", "units": ""}
+        scans = [
+            {"AcquisitionDate": dict(tag, format="yyyy-MM-dd",
+                                     value=["2020-01-02"]),
+             "AcquisitionTime": dict(tag, format="HH:mm:ss.SSS",
+                                     value=["10:11:12.500"]),
+             "EchoTime": dict(tag, units="ms", value=[5.5]),
+             "Dimensions": dict(tag, value=[[64], [64], [32]]),
+             "Json_Version": ["1.0"],
+             "Name": "scan_a"},
+            {"AcquisitionDate": dict(tag, format="yyyy-MM-dd",
+                                     value=["2021-03-04"]),
+             "AcquisitionTime": dict(tag, format="HH:mm:ss.SSS",
+                                     value=[""]),
+             "EchoTime": dict(tag, units="ms", value=[[5.5, 6.5]]),
+             "Dimensions": dict(tag, value=[[128], [128]]),
+             "Json_Version": ["1.1"],
+             "Name": "scan_b"}]
+
+        path = os.path.join(self.folder, "tag_schema.json")
+        registry = TagSchemaRegistry(path)
+        for scan in scans:
+            for tag_name, properties in scan.items():
+                self.assertEqual(registry.convert(tag_name, properties),
+                                 tag_properties(tag_name, properties))
+        self.assertEqual(registry.convert("AcquisitionDate", scans[0][
+            "AcquisitionDate"])[3], datetime(2020, 1, 2).date())
+
+        # EchoTime is a list in the second scan: the first schema is kept
+        self.assertEqual(registry.statistics(),
+                         {"tags": 6, "hits": 6, "misses": 7,
+                          "conflicts": {"EchoTime": 1}})
+        registry.save()
+
+        # The schemas are reused by another registry
+        registry = TagSchemaRegistry(path)
+        for tag_name, properties in scans[0].items():
+            self.assertEqual(registry.convert(tag_name, properties),
+                             tag_properties(tag_name, properties))
+        self.assertEqual(registry.statistics(),
+                         {"tags": 6, "hits": 6, "misses": 0,
+                          "conflicts": {"EchoTime": 1}})
+
+        # A tag whose format changed is a conflict
+        properties = dict(tag, format="yyyy", value=["2020"])
+        self.assertEqual(registry.convert("AcquisitionDate", properties),
+                         tag_properties("AcquisitionDate", properties))
+        self.assertEqual(registry.statistics()["conflicts"],
+                         {"EchoTime": 1, "AcquisitionDate": 1})
+
+    def test_undo_journal(self):
+        """Checks the actions undone and redone, and the eviction of the
+        oldest actions"""
+
+        path = os.path.join(self.folder, "undo_journal.db")
+        history = UndoJournal(budget=10 ** 6, path=path)
+        try:
+            self.assertTrue(os.path.exists(path))
+            history.record("modified_values", None,
+                           [("scan.nii", "Age", 1, 2),
+                            ("scan.nii", "Date", None,
+                             datetime(2020, 1, 2).date())])
+            history.record("add_tag", ["Site"], [])
+            self.assertEqual([kind for action_id, kind in history.undos],
+                             ["modified_values", "add_tag"])
+
+            # An action undone can be redone, until a new action is made
+            action_id, kind, parameters = history.undo()
+            self.assertEqual((kind, parameters), ("add_tag", ["Site"]))
+            action_id, kind, parameters = history.undo()
+            self.assertEqual(history.values(action_id),
+                             [("scan.nii", "Age", 1, 2),
+                              ("scan.nii", "Date", None,
+                               datetime(2020, 1, 2).date())])
+            self.assertIsNone(history.undo())
+            self.assertEqual(history.redo()[1], "modified_values")
+            self.assertTrue(history.can_redo())
+            history.record("remove_tags", ["Age"], [("scan.nii", "Age", 2,
+                                                     1)])
+            self.assertFalse(history.can_redo())
+            self.assertIsNone(history.redo())
+            self.assertEqual([kind for action_id, kind in history.undos],
+                             ["modified_values", "remove_tags"])
+            self.assertEqual(history.values(history.undos[-1][0]),
+                             [("scan.nii", "Age", 2, 1)])
+
+            # The oldest actions are forgotten, the last one being kept
+            history.budget = history.size() + 100000
+            for i in range(10):
+                history.record("modified_values", None,
+                               [("scan_{0}.nii".format(j), "Name",
+                                 "a" * 100, "b" * 100)
+                                for j in range(100)])
+            self.assertLessEqual(history.size(), history.budget)
+            self.assertLess(len(history.undos), 12)
+            self.assertEqual(len(history.values(history.undos[-1][0])), 100)
+            history.budget = 0
+            history.record("add_tag", ["Site"], [])
+            self.assertEqual([kind for action_id, kind in history.undos],
+                             ["add_tag"])
+
+            # The imports record their action from their thread
+            threads = [threading.Thread(
+                target=history.record,
+                args=("add_scans", [name], [(name, "Age", 1, 1)]))
+                for name in ("scan_a.nii", "scan_b.nii")]
+            history.budget = 10 ** 6
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(sorted(
+                history.values(action_id)[0][0]
+                for action_id, kind in history.undos[-2:]),
+                ["scan_a.nii", "scan_b.nii"])
+
+        finally:
+            history.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_unit_of_work(self):
+        """Checks that a unit of work writes its values at once, and that a
+        failing unit only cancels its own values"""
+
+        project = self.new_project()
+        session = project.session
+        session.add_field(COLLECTION_CURRENT, "Age", FIELD_TYPE_INTEGER, "",
+                          True, TAG_ORIGIN_USER, None, None)
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: "scan_a.nii", "Age": 1},
+            {TAG_FILENAME: "scan_b.nii", "Age": 2}])
+        project.saveModifications()
+
+        # The values buffered are read through the unit, and written with
+        # the ones pending before it
+        session.set_value(COLLECTION_CURRENT, "scan_a.nii", "Age", 10)
+        with project.unit_of_work() as unit:
+            unit.session = mock.Mock(wraps=session)
+            unit.add_document(COLLECTION_CURRENT, "scan_c.nii")
+            unit.set_value(COLLECTION_CURRENT, "scan_c.nii", "Age", 3)
+            unit.set_value(COLLECTION_CURRENT, "scan_b.nii", "Age", 20)
+            self.assertEqual(unit.get_value(COLLECTION_CURRENT,
+                                            "scan_b.nii", "Age"), 20)
+            self.assertEqual(session.get_value(COLLECTION_CURRENT,
+                                               "scan_b.nii", "Age"), 2)
+            self.assertRaises(ValueError, unit.set_value,
+                              COLLECTION_CURRENT, "scan_b.nii", "Age", "x")
+        # One bulk statement per collection for the new documents, and one
+        # for the values of the existing documents
+        (commands,), _ = unit.session.run_commands.call_args
+        self.assertEqual([command[0] for command in commands],
+                         ["upsert_documents", "update_documents"])
+        self.assertEqual(commands[1][1],
+                         (COLLECTION_CURRENT, {"scan_b.nii": {"Age": 20}}))
+        self.assertFalse(session.has_unsaved_modifications())
+        self.assertEqual([session.get_value(COLLECTION_CURRENT, scan, "Age")
+                          for scan in ("scan_a.nii", "scan_b.nii",
+                                       "scan_c.nii")], [10, 20, 3])
+
+        # An exception in the unit discards its buffer only
+        session.set_value(COLLECTION_CURRENT, "scan_a.nii", "Age", 100)
+        with self.assertRaises(KeyError):
+            with project.unit_of_work() as unit:
+                unit.set_value(COLLECTION_CURRENT, "scan_b.nii", "Age", 200)
+                raise KeyError("scan_b.nii")
+        self.assertTrue(session.has_unsaved_modifications())
+        self.assertEqual(session.get_value(COLLECTION_CURRENT, "scan_a.nii",
+                                           "Age"), 100)
+        self.assertEqual(session.get_value(COLLECTION_CURRENT, "scan_b.nii",
+                                           "Age"), 20)
+
+        # A write failing at the end of the unit cancels the writes of the
+        # unit already made
+        with self.assertRaises(ValueError):
+            with project.unit_of_work() as unit:
+                unit.add_document(COLLECTION_CURRENT, "scan_d.nii")
+                unit.set_value(COLLECTION_CURRENT, "scan_c.nii", "Age", 30)
+                session.remove_document(COLLECTION_CURRENT, "scan_c.nii")
+        self.assertIsNone(session.get_document(COLLECTION_CURRENT,
+                                               "scan_d.nii"))
+        self.assertIsNone(session.get_document(COLLECTION_CURRENT,
+                                               "scan_c.nii"))
+        self.assertEqual(session.get_value(COLLECTION_CURRENT, "scan_a.nii",
+                                           "Age"), 100)
+        self.assertEqual(
+            sorted(session.get_documents_names(COLLECTION_CURRENT)),
+            ["scan_a.nii", "scan_b.nii"])
+
+    def test_update_fields(self):
+        """Checks that the fields are added and removed at once, keeping the
+        values of the other fields"""
+
+        session = self.new_project().session
+        session.add_fields([
+            [COLLECTION_CURRENT, "Age", FIELD_TYPE_INTEGER, "", True,
+             TAG_ORIGIN_USER, None, None],
+            [COLLECTION_CURRENT, "Echoes", FIELD_TYPE_LIST_FLOAT, "", True,
+             TAG_ORIGIN_USER, None, None]])
+        session.add_document(COLLECTION_CURRENT,
+                             {TAG_FILENAME: "scan.nii", "Age": 30,
+                              "Echoes": [1.5, 2.5]})
+
+        # Added and removed in a single rebuild of the table
+        session.update_fields(
+            added_fields=[[COLLECTION_CURRENT, "Site", FIELD_TYPE_STRING,
+                           "", True, TAG_ORIGIN_USER, None, None]],
+            removed_fields=[(COLLECTION_CURRENT, "Echoes")])
+        self.assertIsNone(session.get_field(COLLECTION_CURRENT, "Echoes"))
+        self.assertEqual(session.get_field(COLLECTION_CURRENT,
+                                           "Site").type, FIELD_TYPE_STRING)
+        session.set_value(COLLECTION_CURRENT, "scan.nii", "Site", "Paris")
+        document = session.get_document(COLLECTION_CURRENT, "scan.nii")
+        self.assertEqual(document.Age, 30)
+        self.assertEqual(document.Site, "Paris")
+        self.assertEqual(session.filter_documents_names(
+            COLLECTION_CURRENT, '{Site} == "Paris" AND {Age} == 30'),
+            ["scan.nii"])
+
+        # Added with ALTER TABLE when nothing is removed
+        session.update_fields(added_fields=[
+            [COLLECTION_CURRENT, "Echoes", FIELD_TYPE_LIST_STRING, "", True,
+             TAG_ORIGIN_USER, None, None]])
+        self.assertIsNone(session.get_value(COLLECTION_CURRENT, "scan.nii",
+                                            "Echoes"))
+        session.set_value(COLLECTION_CURRENT, "scan.nii", "Echoes", ["a"])
+        self.assertEqual(session.get_value(COLLECTION_CURRENT, "scan.nii",
+                                           "Echoes"), ["a"])
+
+        # The checks are done before any change
+        self.assertRaises(ValueError, session.update_fields,
+                          [[COLLECTION_CURRENT, "Other", FIELD_TYPE_STRING,
+                            "", True, TAG_ORIGIN_USER, None, None]],
+                          [(COLLECTION_CURRENT, "Missing")])
+        self.assertIsNone(session.get_field(COLLECTION_CURRENT, "Other"))
+
+    def test_upsert_documents(self):
+        """Checks that the documents are added or replaced at once"""
+
+        session = self.new_project().session
+        session.add_field(COLLECTION_CURRENT, "Age", FIELD_TYPE_INTEGER,
+                          "", True, TAG_ORIGIN_USER, None, None)
+        session.add_document(COLLECTION_CURRENT,
+                             {TAG_FILENAME: "scan_a.nii", "Age": 1})
+
+        # The existing document is replaced, the missing field is created
+        session.upsert_documents(COLLECTION_CURRENT, [
+            {TAG_FILENAME: "scan_a.nii", "Age": 2},
+            {TAG_FILENAME: "scan_b.nii", "Age": 3, "Echoes": [1, 2]}])
+        self.assertEqual(
+            sorted(session.get_documents_names(COLLECTION_CURRENT)),
+            ["scan_a.nii", "scan_b.nii"])
+        self.assertEqual(session.get_field(COLLECTION_CURRENT,
+                                           "Echoes").type,
+                         FIELD_TYPE_LIST_INTEGER)
+        self.assertEqual(session.get_value(COLLECTION_CURRENT, "scan_a.nii",
+                                           "Age"), 2)
+        self.assertIsNone(session.get_value(COLLECTION_CURRENT,
+                                            "scan_a.nii", "Echoes"))
+        self.assertEqual(session.get_value(COLLECTION_CURRENT, "scan_b.nii",
+                                           "Echoes"), [1, 2])
+
+        # The values left out of a document are removed
+        session.upsert_documents(COLLECTION_CURRENT,
+                                 [{TAG_FILENAME: "scan_b.nii", "Age": 4}])
+        self.assertEqual(session.get_value(COLLECTION_CURRENT, "scan_b.nii",
+                                           "Age"), 4)
+        self.assertIsNone(session.get_value(COLLECTION_CURRENT,
+                                            "scan_b.nii", "Echoes"))
+        self.assertEqual(session.filter_documents(
+            COLLECTION_CURRENT, "{Age} == 4")[0].FileName, "scan_b.nii")
+
+        # A document without its primary key is refused
+        self.assertRaises(ValueError, session.upsert_documents,
+                          COLLECTION_CURRENT, [{"Age": 5}])
+
 if __name__ == '__main__':
     unittest.main()
@@ -10,6 +10,8 @@ Contains:
       - mini_viewer
       - modify_table
       - rapid_search
+      - table_fill
+      - table_model
 
 """
 
@@ -28,7 +28,7 @@ from PyQt5.QtWidgets import (
 # Populse_MIA imports
 from populse_mia.utils.tools import ClickableLabel
 from populse_mia.software_properties import Config
-from populse_mia.data_manager.project import TAG_FILENAME, COLLECTION_CURRENT
+from populse_mia.data_manager.project import COLLECTION_CURRENT
 
 # Populse_db imports
 from populse_db.database import (
@@ -211,13 +211,11 @@ class AdvancedSearch(QWidget):
             try:
 
                 filter_query = self.prepare_filters(
-                    links, fields, conditions, values, nots, self.scans_list)
-                result = self.project.session.filter_documents(
-                    COLLECTION_CURRENT, filter_query)
+                    links, fields, conditions, values, nots)
 
                 # data_browser updated with the new selection
-                result_names = [getattr(
-                    document, TAG_FILENAME) for document in result]
+                result_names = self.project.session.filter_documents_names(
+                    COLLECTION_CURRENT, filter_query, self.scans_list)
 
             except Exception as e:
                 print(e)
@@ -411,13 +409,11 @@ class AdvancedSearch(QWidget):
         try:
             # Result gotten
             filter_query = self.prepare_filters(
-                links, fields, conditions, values, nots, self.scans_list)
-            result = self.project.session.filter_documents(
-                COLLECTION_CURRENT, filter_query)
+                links, fields, conditions, values, nots)
 
             # data_browser updated with the new selection
-            result_names = [getattr(
-                document, TAG_FILENAME) for document in result]
+            result_names = self.project.session.filter_documents_names(
+                COLLECTION_CURRENT, filter_query, self.scans_list)
 
             if not self.from_pipeline:
                 self.project.currentFilter.nots = nots
@@ -449,16 +445,18 @@ class AdvancedSearch(QWidget):
         self.dataBrowser.table_data.update_visualized_rows(old_scans_list)
 
     @staticmethod
-    def prepare_filters(links, fields, conditions, values, nots, scans):
+    def prepare_filters(links, fields, conditions, values, nots):
         """Prepare the str representation of the filter
 
+        The filter does not contain the scans to search into: they are given
+        to DatabaseSessionMIA.filter_documents_names.
+
         :param links: list of links (AND/OR)
         :param fields: list of fields
         :param conditions: list of conditions (==, !=, <, >, <=, >=, IN,
            BETWEEN, CONTAINS, HAS VALUE, HAS NO VALUE)
         :param values: list of values
         :param nots: list of negations ("" or NOT)
-        :param scans: list of scans to search in
         :return: str representation of the filter
         """
 
@@ -517,10 +515,6 @@ class AdvancedSearch(QWidget):
             link = links[row]
             final_query += " " + link + " " + row_queries[row + 1]
 
-        # Taking into account the list of scans
-        final_query += " AND ({" + TAG_FILENAME + "} IN " + str(
-            scans).replace("'", "\"") + ")"
-
         final_query = "(" + final_query + ")"
 
         return final_query
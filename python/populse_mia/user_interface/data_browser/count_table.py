@@ -5,6 +5,8 @@ Module to define CountTable popup.
 Contains:
     Class:
         - CountTable
+    Function:
+        - _hashable
 """
 
 ##########################################################################
@@ -32,7 +34,7 @@ from populse_mia.software_properties import Config
 from populse_mia.user_interface.pop_ups import PopUpSelectTagCountTable
 from populse_mia.utils.tools import ClickableLabel
 from populse_mia.utils.utils import set_item_data, table_to_database
-from populse_mia.data_manager.project import COLLECTION_CURRENT, TAG_FILENAME
+from populse_mia.data_manager.project import COLLECTION_CURRENT
 
 
 class CountTable(QDialog):
@@ -63,6 +65,8 @@ class CountTable(QDialog):
         - remove_tag: removes a tag to visualize in the count table
         - select_tag: opens a pop-up to select which tag to visualize in
           the count table
+        - table_keys: gives the values of a column of a snapshot as they
+          are read from the cells of the table
 
     :Example:
 
@@ -347,61 +351,67 @@ class CountTable(QDialog):
     def fill_last_tag(self):
         """
         Fills the cells corresponding to the last selected tag
+
+        The scans are grouped by the values of the selected tags once, from
+        the columnar snapshot of the collection (see
+        DatabaseSessionMIA.get_snapshot), instead of being filtered for each
+        cell.
         """
 
+        # Types of the tags
+        first_tags = []
+        for idx_first_columns in range(self.idx_last_tag + 1):
+            tag_name = self.table.horizontalHeaderItem(
+                idx_first_columns).text()
+            first_tags.append((tag_name, self.project.session.get_field(
+                COLLECTION_CURRENT, tag_name).type))
+        tag_last_columns = self.push_buttons[-1].text()
+        tag_last_columns_type = self.project.session.get_field(
+            COLLECTION_CURRENT, tag_last_columns).type
+        tags = first_tags + [(tag_last_columns, tag_last_columns_type)]
+
+        # Scans by values of the tags, the values being compared as they
+        # are read from the cells of the table
+        snapshot = self.project.session.get_snapshot(
+            COLLECTION_CURRENT, [tag_name for tag_name, tag_type in tags])
+        keys = [self.table_keys(snapshot.column(tag_name), tag_type)
+                for tag_name, tag_type in tags]
+        scans_by_values = {}
+        for scan, scan_keys in zip(snapshot.documents, zip(*keys)):
+            if None not in scan_keys:
+                scans_by_values.setdefault(scan_keys, []).append(scan)
+
+        sources_images_dir = Config().getSourceImageDir()
+
         # Cells of the last tag
         for col in range(self.idx_last_tag + 1, self.nb_col):
             nb_scans_ok = 0
-            # Creating a tag_list that will contain
-            # couples tag_name/tag_value that
-            # will then querying the Database
+            value_last_columns = _hashable(table_to_database(
+                self.table.horizontalHeaderItem(col).data(Qt.EditRole),
+                tag_last_columns_type))
             for row in range(self.nb_row):
-                tag_list = []
-                for idx_first_columns in range(self.idx_last_tag + 1):
-                    tag_name = self.table.horizontalHeaderItem(
-                        idx_first_columns).text()
-                    tag_type = self.project.session.get_field(
-                        COLLECTION_CURRENT, tag_name).type
+                values = []
+                for idx_first_columns, (tag_name, tag_type) in enumerate(
+                        first_tags):
                     value_str = self.table.item(
                         row, idx_first_columns).data(Qt.EditRole)
-                    value_database = table_to_database(value_str, tag_type)
-                    tag_list.append([tag_name, value_database])
-                tag_last_columns = self.push_buttons[-1].text()
-                tag_last_columns_type = self.project.session.get_field(
-                    COLLECTION_CURRENT, tag_last_columns).type
-                value_last_columns_str = self.table.horizontalHeaderItem(
-                    col).data(Qt.EditRole)
-                value_last_columns_database = table_to_database(
-                    value_last_columns_str, tag_last_columns_type)
-                tag_list.append([tag_last_columns,
-                                 value_last_columns_database])
+                    values.append(_hashable(table_to_database(value_str,
+                                                              tag_type)))
+                values.append(value_last_columns)
 
                 item = QTableWidgetItem()
                 item.setFlags(QtCore.Qt.ItemIsEnabled)
-                # Getting the list of the scans that corresponds to the couples
-                # tag_name/tag_values
-                generator_scans = self.project.session.filter_documents(
-                    COLLECTION_CURRENT,
-                    self.prepare_filter(tag_list))
-
-                # List of scans created, given the generator
-                list_scans = [getattr(scan, TAG_FILENAME) for scan in
-                              generator_scans]
+                # The list of the scans that corresponds to the values
+                list_scans = scans_by_values.get(tuple(values), [])
 
-                sources_images_dir = Config().getSourceImageDir()
                 if list_scans:
                     icon = QIcon(os.path.join(sources_images_dir,
                                               'green_v.png'))
                     length = len(list_scans)
                     nb_scans_ok += length
-                    text = str(length)
-                    item.setText(text)
-                    tool_tip = ''
+                    item.setText(str(length))
                     # Setting as tooltip all the corresponding scans
-                    for tpl in list_scans:
-                        tool_tip += (tpl + '\n')
-                    tool_tip = tool_tip[:-1]
-                    item.setToolTip(tool_tip)
+                    item.setToolTip('\n'.join(list_scans))
                 else:
                     icon = QIcon(os.path.join(sources_images_dir,
                                               'red_cross.png'))
@@ -421,13 +431,13 @@ class CountTable(QDialog):
         """
 
         tag_name = self.push_buttons[idx].text()
+        column = self.project.session.get_snapshot(
+            COLLECTION_CURRENT, [tag_name]).column(tag_name)
         values = []
-        for scan in self.project.session.get_documents_names(
-                COLLECTION_CURRENT):
-            current_value = self.project.session.get_value(
-                COLLECTION_CURRENT, scan, tag_name)
-            if current_value is not None:
-                values.append(current_value)
+        if column is not None:
+            for current_value in column.tolist():
+                if current_value is not None:
+                    values.append(current_value)
 
         idx_to_fill = len(self.values_list)
         while len(self.values_list) <= idx:
@@ -516,4 +526,52 @@ class CountTable(QDialog):
         if pop_up.exec_():
             if pop_up.selected_tag is not None:
                 self.push_buttons[idx].setText(pop_up.selected_tag)
-                self.fill_values(idx)
\ No newline at end of file
+                self.fill_values(idx)
+
+    @staticmethod
+    def table_keys(column, tag_type):
+        """
+        Gives the values of a column of a snapshot as they are read from the
+        cells of the table, so that they can be compared with them
+
+        :param column: ColumnView of the tag (None if not in the snapshot)
+        :param tag_type: type of the tag
+        :return: list of the hashable values, None for the undefined ones
+        """
+
+        if column is None:
+            return []
+        if column.categories is None:
+            return column.tolist()
+
+        # Each distinct value is converted once
+        keys = []
+        item = QTableWidgetItem()
+        for value in column.categories:
+            item.setData(Qt.EditRole, None)
+            set_item_data(item, value, tag_type)
+            try:
+                key = table_to_database(item.data(Qt.EditRole), tag_type)
+            except (TypeError, ValueError):
+                key = value
+            keys.append(_hashable(key))
+        return [None if code < 0 else keys[code]
+                for code in column.values.tolist()]
+
+
+def _hashable(value):
+    """
+    Gives a hashable form of a value of the table
+
+    :param value: value of a cell
+    :return: the value, as a tuple for a list and as its representation
+       for the other values that cannot be hashed
+    """
+
+    if isinstance(value, list):
+        return tuple(_hashable(element) for element in value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
@@ -4,6 +4,7 @@ Module to define data browser tab appearance, settings and methods.
 
 Contains:
     Class:
+        - BricksDelegate
         - DataBrowser
         - DateFormatDelegate
         - DateTimeFormatDelegate
@@ -25,15 +26,16 @@ import ast
 import os
 
 # PyQt5 imports
-from PyQt5 import QtWidgets, QtCore
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QColor, QIcon, QPixmap
+from PyQt5 import QtWidgets
+from PyQt5.QtCore import (
+    Qt, QEvent, QItemSelection, QItemSelectionModel, QRect, QSize,
+    pyqtSignal)
+from PyQt5.QtGui import QIcon, QPixmap
 from PyQt5.QtWidgets import (
-    QTableWidgetItem, QMenu, QFrame, QToolBar, QToolButton, QAction,
-    QMessageBox, QPushButton, QProgressDialog, QDoubleSpinBox,
-    QDateTimeEdit, QDateEdit, QTimeEdit, QApplication, QWidget, QVBoxLayout,
-    QTableWidget, QHBoxLayout, QSplitter, QGridLayout, QItemDelegate,
-    QAbstractItemView)
+    QMenu, QFrame, QToolBar, QToolButton, QAction, QMessageBox, QPushButton,
+    QDoubleSpinBox, QDateTimeEdit, QDateEdit, QTimeEdit, QApplication,
+    QWidget, QVBoxLayout, QTableView, QHBoxLayout, QSplitter, QGridLayout,
+    QAbstractItemView, QStyle, QStyleOptionButton)
 
 # Populse_MIA imports
 from populse_mia.user_interface.data_browser.rapid_search import RapidSearch
@@ -42,6 +44,10 @@ from populse_mia.user_interface.data_browser.advanced_search import (
 from populse_mia.user_interface.data_browser.count_table import CountTable
 from populse_mia.user_interface.data_browser.modify_table import ModifyTable
 from populse_mia.user_interface.data_browser.mini_viewer import MiniViewer
+from populse_mia.user_interface.data_browser.table_fill import TableFill
+from populse_mia.user_interface.data_browser.table_model import (
+    BLOCK_SIZE, BRICKS_ROLE, COLORS_ROLE, DataBrowserModel, HeaderItem,
+    TableItem, ZebraDelegate, not_defined_value)
 from populse_mia.user_interface.pop_ups import (
     PopUpMultipleSort, PopUpProperties, PopUpShowBrick, PopUpAddPath,
     PopUpAddTag, PopUpCloneTag, PopUpRemoveTag, PopUpSelectFilter,
@@ -50,7 +56,7 @@ from populse_mia.user_interface.pop_ups import (
     PopUpDataBrowserCurrentSelection)
 from populse_mia.utils.tools import ClickableLabel
 from populse_mia.utils.utils import (
-    check_value_type, set_item_data, table_to_database)
+    check_value_type, table_to_database)
 from populse_mia.data_manager.project import (
     COLLECTION_CURRENT, COLLECTION_INITIAL, COLLECTION_BRICK, TAG_CHECKSUM,
     TAG_FILENAME, TAG_BRICKS, BRICK_NAME)
@@ -60,14 +66,146 @@ from populse_mia.software_properties import Config
 
 # Populse_db imports
 from populse_db.database import (
-    FIELD_TYPE_STRING, FIELD_TYPE_FLOAT, FIELD_TYPE_DATETIME,
+    FIELD_TYPE_FLOAT, FIELD_TYPE_DATETIME,
     FIELD_TYPE_DATE, FIELD_TYPE_TIME, FIELD_TYPE_LIST_DATE,
     FIELD_TYPE_LIST_DATETIME, FIELD_TYPE_LIST_TIME, FIELD_TYPE_LIST_INTEGER,
     FIELD_TYPE_LIST_STRING, FIELD_TYPE_LIST_FLOAT, FIELD_TYPE_LIST_BOOLEAN,
     LIST_TYPES)
 
-# Variable shown everywhere when no value for the tag
-not_defined_value = "*Not Defined*"
+# Margin (in pixels) around the bricks painted in a cell, and padding of
+# their text
+BRICK_MARGIN = 4
+BRICK_PADDING = 6
+
+
+class BricksDelegate(ZebraDelegate):
+    """Delegate of the cells of the TableDataBrowser, painting the bricks
+    of the documents as buttons.
+
+    The bricks are not widgets: they are painted in their cell, stacked
+    vertically, and a click on a brick shows its history.
+
+    .. Methods:
+        - brick_rects: gives the rectangles of the bricks painted in a cell
+        - bricks: gives the bricks of a cell, with their names
+        - bricks_size: gives the size taken by bricks
+        - editorEvent: shows the history of a brick clicked
+        - paint: paints a cell, with its bricks
+        - sizeHint: gives the size of a cell, with its bricks
+    """
+
+    def brick_rects(self, rect, font_metrics, count):
+        """Give the rectangles of the bricks painted in a cell.
+
+        :param rect: QRect of the cell
+        :param font_metrics: QFontMetrics of the text of the bricks
+        :param count: number of bricks
+        :return: list of QRect, one per brick
+        """
+
+        height = font_metrics.height() + 2 * BRICK_PADDING
+        rects = []
+        top = rect.top() + BRICK_MARGIN
+        for _ in range(count):
+            rects.append(QRect(rect.left() + BRICK_MARGIN, top,
+                               rect.width() - 2 * BRICK_MARGIN, height))
+            top += height + BRICK_MARGIN
+        return rects
+
+    def bricks(self, index):
+        """Give the bricks of a cell, with their names (the bricks that do
+        not exist any more are not displayed).
+
+        :param index: index of the cell
+        :return: list of (uuid, name), empty if the cell has no brick
+        """
+
+        brick_uuids = index.data(BRICKS_ROLE)
+        if not brick_uuids:
+            return []
+        brick_names = self.parent().get_brick_names(brick_uuids)
+        return [(brick_uuid, brick_names[brick_uuid])
+                for brick_uuid in brick_uuids if brick_names.get(brick_uuid)]
+
+    def bricks_size(self, font_metrics, brick_names):
+        """Give the size taken by bricks painted in a cell.
+
+        :param font_metrics: QFontMetrics of the text of the bricks
+        :param brick_names: list of the names of the bricks
+        :return: QSize
+        """
+
+        if not brick_names:
+            return QSize(0, 0)
+        width = max(font_metrics.width(brick_name)
+                    for brick_name in brick_names)
+        width += 2 * (BRICK_MARGIN + BRICK_PADDING)
+        height = (BRICK_MARGIN + len(brick_names) *
+                  (font_metrics.height() + 2 * BRICK_PADDING + BRICK_MARGIN))
+        return QSize(width, height)
+
+    def editorEvent(self, event, model, option, index):
+        """Show the history of the brick clicked in a cell.
+
+        :param event: QEvent
+        :param model: model of the table
+        :param option: QStyleOptionViewItem of the cell
+        :param index: index of the cell
+        :return: True if a brick has been clicked
+        """
+
+        if (event.type() == QEvent.MouseButtonRelease and
+                event.button() == Qt.LeftButton):
+            bricks = self.bricks(index)
+            rects = self.brick_rects(option.rect, option.fontMetrics,
+                                     len(bricks))
+            for (brick_uuid, brick_name), rect in zip(bricks, rects):
+                if rect.contains(event.pos()):
+                    self.parent().show_brick_history(brick_uuid)
+                    return True
+        return super().editorEvent(event, model, option, index)
+
+    def paint(self, painter, option, index):
+        """Paint a cell, with its bricks.
+
+        :param painter: QPainter
+        :param option: QStyleOptionViewItem of the cell
+        :param index: index of the cell
+        """
+
+        super().paint(painter, option, index)
+
+        bricks = self.bricks(index)
+        if not bricks:
+            return
+        widget = option.widget
+        style = widget.style() if widget else QApplication.style()
+        rects = self.brick_rects(option.rect, option.fontMetrics,
+                                 len(bricks))
+        for (brick_uuid, brick_name), rect in zip(bricks, rects):
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.text = brick_name
+            button.fontMetrics = option.fontMetrics
+            button.palette = option.palette
+            button.state = QStyle.State_Enabled | QStyle.State_Raised
+            style.drawControl(QStyle.CE_PushButton, button, painter, widget)
+
+    def sizeHint(self, option, index):
+        """Give the size of a cell, large enough for its bricks.
+
+        :param option: QStyleOptionViewItem of the cell
+        :param index: index of the cell
+        :return: QSize
+        """
+
+        size = super().sizeHint(option, index)
+        bricks = self.bricks(index)
+        if not bricks:
+            return size
+        return size.expandedTo(self.bricks_size(
+            option.fontMetrics,
+            [brick_name for brick_uuid, brick_name in bricks]))
 
 
 class DataBrowser(QWidget):
@@ -96,7 +234,7 @@ class DataBrowser(QWidget):
         - reset_search_bar: reset the rapid search bar
         - run_advanced_search: launch the advanced search
         - search_str: search a string in the table and updates the
-           visualized documents
+           visualized documents, keeping only the modified ones if asked
         - send_documents_to_pipeline: send the current list of scans to the
            Pipeline Manager
         - update_database: update the database in the software
@@ -143,6 +281,7 @@ class DataBrowser(QWidget):
         self.frame_test = QFrame()
         self.visualized_tags_button = QPushButton()
         self.count_table_button = QPushButton()
+        self.modified_scans_button = QPushButton()
 
         # Main table that will display the tags
         self.table_data = TableDataBrowser(
@@ -192,10 +331,10 @@ class DataBrowser(QWidget):
                            table_to_database(new_default_value, tag_type)])
 
         # For history
-        history_maker = ["add_tag", new_tag_name, tag_type, new_tag_unit,
-                         new_default_value, new_tag_description, values]
-        self.project.undos.append(history_maker)
-        self.project.redos.clear()
+        self.project.history.record(
+            "add_tag", [[new_tag_name, tag_type, new_tag_description, True,
+                         TAG_ORIGIN_USER, new_tag_unit, new_default_value]],
+            values)
 
         # New tag added to the table
         column = self.table_data.get_index_insertion(new_tag_name)
@@ -278,11 +417,11 @@ class DataBrowser(QWidget):
                      cloned_cur_value, cloned_init_value])
 
         # For history
-        history_maker = ["add_tag", new_tag_name, tag_cloned.type,
-                         tag_cloned.unit, tag_cloned.default_value,
-                         tag_cloned.description, values]
-        self.project.undos.append(history_maker)
-        self.project.redos.clear()
+        self.project.history.record(
+            "add_tag", [[new_tag_name, tag_cloned.type,
+                         tag_cloned.description, True, TAG_ORIGIN_USER,
+                         tag_cloned.unit, tag_cloned.default_value]],
+            values)
 
         # New tag added to the table
         column = self.table_data.get_index_insertion(new_tag_name)
@@ -336,6 +475,8 @@ class DataBrowser(QWidget):
         self.button_cross.clicked.connect(self.reset_search_bar)
         self.advanced_search_button.clicked.connect(self.run_advanced_search)
         self.count_table_button.clicked.connect(self.count_table_pop_up)
+        self.modified_scans_button.toggled.connect(
+            lambda: self.search_str(self.search_bar.text()))
         self.visualized_tags_button.clicked.connect(
             lambda: self.table_data.visualized_tags_pop_up())
 
@@ -381,6 +522,9 @@ class DataBrowser(QWidget):
 
         self.count_table_button.setText('Count table')
 
+        self.modified_scans_button.setText('Modified scans only')
+        self.modified_scans_button.setCheckable(True)
+
         self.menu_toolbar.addWidget(tags_tool_button)
         self.menu_toolbar.addSeparator()
         self.menu_toolbar.addWidget(filters_tool_button)
@@ -392,6 +536,8 @@ class DataBrowser(QWidget):
         self.menu_toolbar.addWidget(self.visualized_tags_button)
         self.menu_toolbar.addSeparator()
         self.menu_toolbar.addWidget(self.count_table_button)
+        self.menu_toolbar.addSeparator()
+        self.menu_toolbar.addWidget(self.modified_scans_button)
 
     def create_layout(self):
         """Create the layouts of the tab."""
@@ -514,38 +660,41 @@ class DataBrowser(QWidget):
         self.table_data.itemSelectionChanged.disconnect()
 
         # For history
-        history_maker = []
-        history_maker.append("remove_tags")
+        # The definition of each tag to remove is put in the history
         tags_removed = []
-
-        # Each Tag row to remove is put in the history
         for tag in tag_names_to_remove:
-            tag_object = self.project.session.get_field(COLLECTION_CURRENT,
-                                                        tag)
-            tags_removed.append([tag_object])
-        history_maker.append(tags_removed)
-
-        # Each value of the tags to remove are stored in the history
+            tag_row = self.project.session.get_field(COLLECTION_CURRENT, tag)
+            tags_removed.append(
+                [tag_row.field_name, tag_row.type, tag_row.description,
+                 tag_row.visibility, tag_row.origin, tag_row.unit,
+                 tag_row.default_value])
+
+        # Each value of the tags to remove are stored in the history, read
+        # in one query per collection
+        current_values = self.project.session.get_values(
+            COLLECTION_CURRENT, fields=tag_names_to_remove)
+        initial_values = self.project.session.get_values(
+            COLLECTION_INITIAL, current_values.documents,
+            tag_names_to_remove)
         values_removed = []
         for tag in tag_names_to_remove:
-            for scan in self.project.session.get_documents_names(
-                    COLLECTION_CURRENT):
-                current_value = self.project.session.get_value(
-                    COLLECTION_CURRENT, scan, tag)
-                initial_value = self.project.session.get_value(
-                    COLLECTION_INITIAL, scan, tag)
+            for scan in current_values.documents:
+                current_value = current_values.get(scan, tag)
+                initial_value = initial_values.get(scan, tag)
                 if current_value is not None or initial_value is not None:
                     values_removed.append(
                         [scan, tag, current_value, initial_value])
-        history_maker.append(values_removed)
 
-        self.project.undos.append(history_maker)
-        self.project.redos.clear()
+        self.project.history.record("remove_tags", tags_removed,
+                                    values_removed)
 
-        # Tags removed from the Database and table
+        # Tags removed from the Database, in a single schema change per
+        # collection, and from the table
+        self.project.session.update_fields(removed_fields=[
+            (collection, tag) for collection in (COLLECTION_CURRENT,
+                                                 COLLECTION_INITIAL)
+            for tag in tag_names_to_remove])
         for tag in tag_names_to_remove:
-            self.project.session.remove_field(COLLECTION_CURRENT, tag)
-            self.project.session.remove_field(COLLECTION_INITIAL, tag)
             self.table_data.removeColumn(self.table_data.get_tag_column(tag))
 
         # Selection updated
@@ -582,17 +731,26 @@ class DataBrowser(QWidget):
             if str_search == not_defined_value:
                 filter = self.search_bar.prepare_not_defined_filter(
                     self.project.session.get_shown_tags())
+                return_list = self.project.session.filter_documents_names(
+                    COLLECTION_CURRENT, filter,
+                    self.table_data.scans_to_search)
             # Scans matching the search
             else:
-                filter = self.search_bar.prepare_filter(
-                    str_search, self.project.session.get_shown_tags(),
+                return_list = self.search_bar.search_scans(
+                    self.project, str_search,
+                    self.project.session.get_shown_tags(),
                     self.table_data.scans_to_search)
 
-            generator = self.project.session.filter_documents(
-                COLLECTION_CURRENT, filter)
-
-            # Creating the list of scans
-            return_list = [getattr(scan, TAG_FILENAME) for scan in generator]
+        # Only the scans whose raw tags have been modified
+        if self.modified_scans_button.isChecked():
+            raw_tags = [
+                tag.field_name for tag in
+                self.project.session.get_fields(COLLECTION_CURRENT)
+                if tag.origin == TAG_ORIGIN_BUILTIN]
+            modified_scans = self.project.session.get_modified(
+                COLLECTION_CURRENT, COLLECTION_INITIAL).documents(raw_tags)
+            return_list = [scan for scan in return_list
+                           if scan in modified_scans]
 
         self.table_data.scans_to_visualize = return_list
 
@@ -629,10 +787,10 @@ class DataBrowser(QWidget):
         self.frame_advanced_search.setHidden(True)
 
 
-class DateFormatDelegate(QItemDelegate):
+class DateFormatDelegate(ZebraDelegate):
     """Delegate that is used to handle dates in the TableDataBrowser."""
     def __init__(self, parent=None):
-        QItemDelegate.__init__(self, parent)
+        ZebraDelegate.__init__(self, parent)
 
     def createEditor(self, parent, option, index):
         """Override of the createEditor method, called to generate the widget.
@@ -642,10 +800,10 @@ class DateFormatDelegate(QItemDelegate):
         return editor
 
 
-class DateTimeFormatDelegate(QItemDelegate):
+class DateTimeFormatDelegate(ZebraDelegate):
     """Delegate that is used to handle date & time in the TableDataBrowser."""
     def __init__(self, parent=None):
-        QItemDelegate.__init__(self, parent)
+        ZebraDelegate.__init__(self, parent)
 
     def createEditor(self, parent, option, index):
         """Override of the createEditor method, called to generate the widget.
@@ -655,10 +813,10 @@ class DateTimeFormatDelegate(QItemDelegate):
         return editor
 
 
-class NumberFormatDelegate(QItemDelegate):
+class NumberFormatDelegate(ZebraDelegate):
     """Delegate that is used to handle numbers in the TableDataBrowser."""
     def __init__(self, parent=None):
-        QItemDelegate.__init__(self, parent)
+        ZebraDelegate.__init__(self, parent)
 
     def createEditor(self, parent, option, index):
         """Override of the createEditor method, called to generate the widget.
@@ -671,45 +829,68 @@ class NumberFormatDelegate(QItemDelegate):
         return editor
 
 
-class TableDataBrowser(QTableWidget):
-    """Table widget that displays the documents contained in the database and
+class TableDataBrowser(QTableView):
+    """Table view that displays the documents contained in the database and
     their associated tags.
 
+    The cells are given by a DataBrowserModel, which only reads the values
+    of the documents displayed. The table keeps the interface of the
+    QTableWidget used by its callers (item, horizontalHeaderItem,
+    itemChanged, ...): its items are views of the cells of the model (see
+    TableItem).
+
     .. Methods:
         - add_column: add a column to the table
         - add_columns: add columns
         - add_path: call a pop-up to add any document to the project
         - add_rows: insert rows if they are not already in the table
+        - background: give the background color of a cell
+        - cell_edited: emit itemChanged for a cell edited in the table
         - change_cell_color: changes the background color and the value of
            cells when edited by the user
         - clear_cell: clear the selected cells
+        - columnCount: return the number of columns
         - context_menu_table: create the context menu of the table
         - delete_from_brick: delete a document from its brick id
         - display_unreset_values: display an error message when trying to
            reset user tags
+        - fill_bricks: fit the height of the rows of documents to their
+           bricks
         - fill_cells_update_table: initialize and fills the cells of the table
         - fill_headers: initialize and fill the headers of the table
+        - fill_rows: add rows at the end of the table, with their bricks
+        - forget_ranks: forget the ranks of the rows among the visible rows
+        - get_brick_names: get the names of bricks
         - get_current_filter: get the current data browser selection
         - get_index_insertion: get index insertion of a new column
         - get_scan_row: return the row index of the scan
         - get_tag_column: return the column index of the tag
+        - horizontalHeaderItem: return the header of a column
+        - item: return a cell of the table
         - mouseReleaseEvent: called when clicking released on cells
         - multiple_sort_infos: sort the table according to the tags specify
            in list_tags
         - multiple_sort_pop_up: display the multiple sort pop-up
+        - refresh_values: display the values of documents again
+        - remove_rows: remove the rows of documents from the table
         - remove_scan: remove documents from table and project
+        - removeColumn: remove a column from the table
+        - removeRow: remove a row from the table
         - reset_cell: reset the selected cells to their original values
         - reset_column: reset the selected columns to their original values
         - reset_row: reset the selected rows to their original values
+        - rowCount: return the number of rows
         - section_moved: called when the columns of the data_browser are moved
         - select_all_column: called when single clicking on the column header
            to select the whole column
         - select_all_columns: called from context menu to select the columns
+        - selectedItems: return the selected cells
         - selection_changed: called when the selection is changed
+        - setRowHidden: hide or show a row
         - show_brick_history: show brick history pop-up
         - sort_column: sort the current column
         - sort_updated: called when the button advanced search is called
-        - update_colors: update the background of all the cells
+        - update_colors: update the background of the cells modified
         - update_selection: called after searches to update the selection
         - update_table: fill the table with the project's data
         - update_visualized_columns: update the visualized tags
@@ -719,6 +900,11 @@ class TableDataBrowser(QTableWidget):
 
     """
 
+    # Emitted with the item of a cell edited by the user
+    itemChanged = pyqtSignal(object)
+    # Emitted when the selected cells change
+    itemSelectionChanged = pyqtSignal()
+
     def __init__(self, project, data_browser, tags_to_display,
                  update_values, activate_selection, link_viewer=True):
         """Initialization of the class
@@ -741,15 +927,33 @@ class TableDataBrowser(QTableWidget):
         self.update_values = update_values
         self.activate_selection = activate_selection
         self.link_viewer = link_viewer
-        self.bricks = {}
+        # Names of the bricks by uuid, read once (see get_brick_names)
+        self.brick_names = {}
+
+        # Cells of the table
+        self.data_model = DataBrowserModel(self)
+        self.setModel(self.data_model)
+        self.data_model.cellEdited.connect(self.cell_edited)
+
+        # Rows striped by the delegates, from the rank of each row among the
+        # visible rows (None if not computed since the rows have changed)
+        self.ranks = None
+        self.setItemDelegate(BricksDelegate(self))
+        self.data_model.rowsInserted.connect(self.forget_ranks)
+        self.data_model.rowsRemoved.connect(self.forget_ranks)
+        self.data_model.layoutChanged.connect(self.forget_ranks)
+        self.selectionModel().selectionChanged.connect(
+            self.itemSelectionChanged)
 
         self.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
 
         # It allows to move the columns (except the first column name)
         self.horizontalHeader().setSectionsMovable(True)
 
-        # It allows the automatic sort
-        self.setSortingEnabled(True)
+        # It allows the sort, made by sort_updated when the sort indicator
+        # changes
+        self.horizontalHeader().setSectionsClickable(True)
+        self.horizontalHeader().setSortIndicatorShown(True)
 
         # Adding a custom context menu
         self.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -765,6 +969,9 @@ class TableDataBrowser(QTableWidget):
             self.select_all_column)
         self.horizontalHeader().sectionMoved.connect(self.section_moved)
         self.verticalHeader().setMinimumSectionSize(30)
+        # The widths of the columns are given by the rows displayed and a
+        # block of the other rows, not by all the values of the project
+        self.verticalHeader().setResizeContentsPrecision(BLOCK_SIZE)
 
         self.update_table(True)
 
@@ -778,19 +985,11 @@ class TableDataBrowser(QTableWidget):
         :param tag: tag name to add
         """
 
-        self.itemChanged.disconnect()
-
         self.itemSelectionChanged.disconnect()
 
-        # Adding the column to the table
-        self.insertColumn(column)
-        item = QtWidgets.QTableWidgetItem()
-        self.setHorizontalHeaderItem(column, item)
-        tag_object = self.project.session.get_field(COLLECTION_CURRENT, tag)
-        item.setText(tag)
-        item.setToolTip(
-            "Description: " + str(tag_object.description) + "\nUnit: " +
-            str(tag_object.unit) + "\nType: " + str(tag_object.type))
+        # Adding the column to the table, its cells are read by the model
+        self.data_model.insert_tag(column, tag)
+        tag_object = self.data_model.fields[tag]
 
         # Set column type
         if tag_object.type == FIELD_TYPE_FLOAT:
@@ -804,37 +1003,18 @@ class TableDataBrowser(QTableWidget):
         else:
             self.setItemDelegateForColumn(column, None)
 
-        for row in range(0, self.rowCount()):
-            item = QtWidgets.QTableWidgetItem()
-            self.setItem(row, column, item)
-            scan = self.item(row, 0).text()
-            cur_value = self.project.session.get_value(
-                COLLECTION_CURRENT, scan, tag)
-            if cur_value is not None:
-                set_item_data(item, cur_value, tag_object.type)
-            else:
-                set_item_data(item, not_defined_value, FIELD_TYPE_STRING)
-                font = item.font()
-                font.setItalic(True)
-                font.setBold(True)
-                item.setFont(font)
-
         self.resizeColumnsToContents()  # New column re-sized
 
         # Selection updated
         self.update_selection()
 
-        self.update_colors()
+        self.update_colors(tags=[tag])
 
         self.itemSelectionChanged.connect(self.selection_changed)
 
-        self.itemChanged.connect(self.change_cell_color)
-
     def add_columns(self):
         """Add columns."""
 
-        self.itemChanged.disconnect()
-
         self.itemSelectionChanged.disconnect()
 
         tags = self.project.session.get_fields_names(COLLECTION_CURRENT)
@@ -854,18 +1034,8 @@ class TableDataBrowser(QTableWidget):
             if self.get_tag_column(tag) is None:
 
                 column_index = self.get_index_insertion(tag)
-                self.insertColumn(column_index)
-
-                item = QtWidgets.QTableWidgetItem()
-                self.setHorizontalHeaderItem(column_index, item)
-                item.setText(tag)
-                tag_object = self.project.session.get_field(
-                    COLLECTION_CURRENT, tag)
-
-                if tag_object is not None:
-                    item.setToolTip("Description: " + str(
-                        tag_object.description) + "\nUnit: " + str(
-                        tag_object.unit) + "\nType: " + str(tag_object.type))
+                self.data_model.insert_tag(column_index, tag)
+                tag_object = self.data_model.fields[tag]
 
                 # Set column type
 
@@ -884,40 +1054,14 @@ class TableDataBrowser(QTableWidget):
 
                 # Hide the column if not visible
 
-                if tag in visibles:
+                if tag not in visibles:
                     self.setColumnHidden(column_index, True)
 
-                # Rows filled for the column being added
-
-                for row in range(0, self.rowCount()):
-                    item = QtWidgets.QTableWidgetItem()
-                    self.setItem(row, column_index, item)
-                    scan = self.item(row, 0).text()
-                    cur_value = self.project.session.get_value(
-                        COLLECTION_CURRENT, scan, tag)
-
-                    if cur_value is not None:
-                        set_item_data(item, cur_value, tag_object.type)
-                    else:
-                        set_item_data(item, not_defined_value,
-                                      FIELD_TYPE_STRING)
-                        font = item.font()
-                        font.setItalic(True)
-                        font.setBold(True)
-                        item.setFont(font)
-
-                # Removing useless columns
-                tags_to_remove = []
-
-                for column in range(0, self.columnCount()):
-                    tag_name = self.horizontalHeaderItem(column).text()
-
-                    if not tag_name in self.project.session.get_fields_names(
-                            COLLECTION_CURRENT) and tag_name != TAG_FILENAME:
-                        tags_to_remove.append(tag_name)
+        # Removing useless columns
 
-                    for tag in tags_to_remove:
-                        self.removeColumn(self.get_tag_column(tag))
+        for tag in list(self.data_model.tags):
+            if tag not in tags:
+                self.removeColumn(self.get_tag_column(tag))
 
         self.resizeColumnsToContents()
 
@@ -928,8 +1072,6 @@ class TableDataBrowser(QTableWidget):
 
         self.itemSelectionChanged.connect(self.selection_changed)
 
-        self.itemChanged.connect(self.change_cell_color)
-
     def add_path(self):
         """Call a pop-up to add any document to the project."""
 
@@ -939,141 +1081,97 @@ class TableDataBrowser(QTableWidget):
     def add_rows(self, rows):
         """Insert rows if they are not already in the table.
 
+        The rows are inserted by chunks (see TableFill), their values are
+        read by the model when they are displayed. If the insertion is
+        cancelled, the rows not inserted are not visualized.
+
         :param rows: list of all scans
         """
 
-        self.setSortingEnabled(False)
-
         self.itemSelectionChanged.disconnect()
 
-        self.itemChanged.disconnect()
-
-        cells_number = len(rows) * self.columnCount()
-        self.progress = QProgressDialog("Please wait while the paths are "
-                                        "being added...", None, 0,
-                                        cells_number)
-        self.progress.setMinimumDuration(0)
-        self.progress.setValue(0)
-        self.progress.setMinimumWidth(350) # For mac OS
-        self.progress.setWindowTitle("Adding the paths")
-        self.progress.setWindowFlags(Qt.Window | Qt.WindowTitleHint |
-                                     Qt.CustomizeWindowHint)
-        self.progress.setModal(True)
-        self.progress.setAttribute(Qt.WA_DeleteOnClose, True)
-        self.progress.show()
-
-        idx = 0
+        # Scans added only if they are not already in the table
+        scans_in_table = set(self.data_model.scans)
+        scans_to_add = []
         for scan in rows:
-            # Scan added only if it's not already in the table
-            if self.get_scan_row(scan) is None:
-                rowCount = self.rowCount()
-                self.insertRow(rowCount)
+            if scan not in scans_in_table:
+                scans_in_table.add(scan)
+                scans_to_add.append(scan)
+
+        fill = TableFill("Please wait while the documents are being added...")
+        filled = fill.run(scans_to_add, self.fill_rows)
+        if fill.canceled:
+            scans_not_added = set(scans_to_add[filled:])
+            self.scans_to_visualize = [
+                scan for scan in self.scans_to_visualize
+                if scan not in scans_not_added]
 
-                # Columns filled for the row being added
-                for column in range(0, self.columnCount()):
+        self.resizeColumnsToContents()
 
-                    idx += 1
-                    self.progress.setValue(idx)
-                    QApplication.processEvents()
+        # Selection updated
+        self.update_selection()
 
-                    item = QtWidgets.QTableWidgetItem()
-                    tag = self.horizontalHeaderItem(column).text()
+        self.update_colors(scans=scans_to_add[:filled])
 
-                    if column == 0:
-                        # name tag, not editable
-                        item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-                        set_item_data(item, scan, FIELD_TYPE_STRING)
-                    else:
-                        cur_value = self.project.session.get_value(
-                            COLLECTION_CURRENT, scan, tag)
-                        if cur_value is not None:
-                            if tag != TAG_BRICKS:
-                                set_item_data(
-                                    item, cur_value,
-                                    self.project.session.get_field(
-                                        COLLECTION_CURRENT, tag).type)
-                            else:
-                                # Tag bricks, display list with buttons
-                                widget = QWidget()
-                                widget.moveToThread(QApplication.instance(
-                                ).thread())
-                                layout = QVBoxLayout()
-                                for brick_number in range(0, len(cur_value)):
-                                    brick_uuid = cur_value[brick_number]
-                                    brick_name = \
-                                        self.project.session.get_value(
-                                            COLLECTION_BRICK, brick_uuid,
-                                            BRICK_NAME)
-                                    brick_name_button = QPushButton(brick_name)
-                                    brick_name_button.moveToThread(
-                                        QApplication.instance().thread())
-                                    self.bricks[brick_name_button] = brick_uuid
-                                    brick_name_button.clicked.connect(
-                                        self.show_brick_history)
-                                    layout.addWidget(brick_name_button)
-                                widget.setLayout(layout)
-                                self.setCellWidget(rowCount, column, widget)
+        self.itemSelectionChanged.connect(self.selection_changed)
 
-                        else:
-                            if tag != TAG_BRICKS:
-                                set_item_data(
-                                    item, not_defined_value, FIELD_TYPE_STRING)
-                                font = item.font()
-                                font.setItalic(True)
-                                font.setBold(True)
-                                item.setFont(font)
-                            else:
-                                set_item_data(item, "", FIELD_TYPE_STRING)
-                                # bricks not editable
-                                item.setFlags(
-                                    item.flags() & ~Qt.ItemIsEditable)
-                    self.setItem(rowCount, column, item)
-
-        # Crash if self.setSortingEnabled(True) because it calls sortByColumn()
-        # self.setSortingEnabled(False)
+    def background(self, index):
+        """Give the background color of a cell, alternately for the visible
+        rows (see ZebraDelegate).
 
-        self.resizeColumnsToContents()
-        self.resizeRowsToContents()
+        :param index: index of the cell
+        :return: QColor, None for a hidden row
+        """
 
-        # Selection updated
-        self.update_selection()
+        if self.ranks is None:
+            self.ranks = []
+            rank = 0
+            for row in range(self.rowCount()):
+                if self.isRowHidden(row):
+                    self.ranks.append(None)
+                else:
+                    self.ranks.append(rank)
+                    rank += 1
 
-        self.update_colors()
+        rank = self.ranks[index.row()]
+        colors = index.data(COLORS_ROLE)
+        if rank is None or colors is None:
+            return None
+        return colors[rank % 2]
 
-        self.itemSelectionChanged.connect(self.selection_changed)
+    def cell_edited(self, row, column):
+        """Emit itemChanged for a cell edited in the table.
 
-        self.itemChanged.connect(self.change_cell_color)
+        :param row: row of the cell
+        :param column: column of the cell
+        """
 
-        self.progress.close()
+        self.itemChanged.emit(self.item(row, column))
 
     def change_cell_color(self, item_origin):
         """Change the background color and the value of cells when edited by
         the user.
         Handle the multi-selection case.
 
+        The value edited is written in the database for all the selected
+        cells, or forgotten if it is not valid.
+
         :param item_origin: item from where the call comes from
         """
 
-        self.itemChanged.disconnect()
         new_value = item_origin.data(Qt.EditRole)
 
         cells_types = []  # Will contain the type list of the selection
 
-        # To reset the first cell already changed
-        # self.fill_cells_update_table()
-
         # For each item selected, we check the validity of the types
         for item in self.selectedItems():
-            row = item.row()
-            col = item.column()
-            tag_name = self.horizontalHeaderItem(col).text()
+            tag_name = self.data_model.tags[item.column()]
             tag_object = self.project.session.get_field(
                 COLLECTION_CURRENT, tag_name)
             tag_type = tag_object.type
 
             if tag_name == TAG_BRICKS or tag_name == TAG_FILENAME:
-                self.update_colors()
-                self.itemChanged.connect(self.change_cell_color)
+                self.data_model.refresh()
                 return
 
             # Type added to types list
@@ -1098,7 +1196,7 @@ class TableDataBrowser(QTableWidget):
             msg.setStandardButtons(QMessageBox.Ok)
             msg.buttonClicked.connect(msg.close)
             msg.exec()
-            self.itemChanged.connect(self.change_cell_color)
+            self.data_model.refresh()
             return
 
         # Nothing to do if list
@@ -1108,9 +1206,12 @@ class TableDataBrowser(QTableWidget):
                 FIELD_TYPE_LIST_STRING in cells_types or
                 FIELD_TYPE_LIST_FLOAT in cells_types or
                 FIELD_TYPE_LIST_BOOLEAN in cells_types):
-            self.itemChanged.connect(self.change_cell_color)
+            self.data_model.refresh()
             return
 
+        # For history
+        modified_values = []
+
         # We check that the value is compatible with all the types
         types_compatibles = True
         for cell_type in cells_types:
@@ -1135,16 +1236,9 @@ class TableDataBrowser(QTableWidget):
         # Otherwise we update the values
         else:
 
-            # For history
-            history_maker = list()
-            history_maker.append("modified_values")
-            modified_values = []
-
             for item in self.selectedItems():
-                row = item.row()
-                col = item.column()
-                scan_path = self.item(row, 0).text()
-                tag_name = self.horizontalHeaderItem(col).text()
+                scan_path = self.data_model.scans[item.row()]
+                tag_name = self.data_model.tags[item.column()]
                 database_value = table_to_database(
                     new_value,
                     self.project.session.get_field(
@@ -1170,42 +1264,29 @@ class TableDataBrowser(QTableWidget):
                             COLLECTION_CURRENT, scan_path,
                             tag_name, database_value)
 
-                        # Font reset in case it was a not defined cell
-                        font = item.font()
-                        font.setItalic(False)
-                        font.setBold(False)
-                        item.setFont(font)
-
-                    set_item_data(
-                        item, new_value,
-                        self.project.session.get_field(
-                            COLLECTION_CURRENT, tag_name).type)
-
             # For history
-            history_maker.append(modified_values)
-            self.project.undos.append(history_maker)
-            self.project.redos.clear()
+            self.project.history.record("modified_values", None,
+                                        modified_values)
 
-            self.resizeColumnsToContents()  # Columns re-sized
+        # The cells display the values of the database
+        self.data_model.refresh()
 
-        self.update_colors()
+        self.resizeColumnsToContents()  # Columns re-sized
 
-        self.itemChanged.connect(self.change_cell_color)
+        # Only the cells modified are recolored
+        self.update_colors([value[0] for value in modified_values],
+                           [value[1] for value in modified_values])
 
     def clear_cell(self):
         """Clear the selected cells."""
 
         # For history
-        history_maker = []
-        history_maker.append("modified_values")
         modified_values = []
 
         points = self.selectedIndexes()
         for point in points:
-            row = point.row()
-            col = point.column()
-            tag_name = self.horizontalHeaderItem(col).text()
-            scan_name = self.item(row, 0).text()
+            tag_name = self.data_model.tags[point.column()]
+            scan_name = self.data_model.scans[point.row()]
             # We get the FileName of the scan from the first row
             current_value = self.project.session.get_value(
                 COLLECTION_CURRENT, scan_name, tag_name)
@@ -1213,17 +1294,23 @@ class TableDataBrowser(QTableWidget):
             modified_values.append([scan_name, tag_name, current_value, None])
             self.project.session.remove_value(COLLECTION_CURRENT, scan_name,
                                               tag_name)
-            item = self.item(row, col)
-            set_item_data(item, not_defined_value, FIELD_TYPE_STRING)
-            font = item.font()
-            font.setItalic(True)
-            font.setBold(True)
-            item.setFont(font)
+
+        self.data_model.refresh()
 
         # For history
-        history_maker.append(modified_values)
-        self.project.undos.append(history_maker)
-        self.project.redos.clear()
+        self.project.history.record("modified_values", None,
+                                    modified_values)
+
+        self.update_colors([value[0] for value in modified_values],
+                           [value[1] for value in modified_values])
+
+    def columnCount(self):
+        """Return the number of columns of the table.
+
+        :return: the number of tags
+        """
+
+        return self.data_model.columnCount()
 
     def context_menu_table(self, position):
         """Create the context menu of the table.
@@ -1231,8 +1318,6 @@ class TableDataBrowser(QTableWidget):
         :param position: position of the mouse cursor
         """
 
-        self.itemChanged.disconnect()
-
         self.menu = QMenu(self)
 
         self.action_reset_cell = self.menu.addAction("Reset cell(s)")
@@ -1277,9 +1362,7 @@ class TableDataBrowser(QTableWidget):
             msg.buttons()[0].clicked.connect(self.clear_cell)
             msg.exec()
         elif action == self.action_add_scan:
-            self.itemChanged.connect(self.change_cell_color)
             self.add_path()
-            self.itemChanged.disconnect()
         elif action == self.action_remove_scan:
             msg.setText("You are about to remove a scan from the project.")
             msg.buttonClicked.connect(msg.close)
@@ -1298,11 +1381,6 @@ class TableDataBrowser(QTableWidget):
         elif action == self.action_send_documents_to_pipeline:
             self.data_browser.send_documents_to_pipeline()
 
-        self.update_colors()
-
-        # Signals reconnected
-        self.itemChanged.connect(self.change_cell_color)
-
     def delete_from_brick(self, name):
         """Delete a document from its brick id.
 
@@ -1340,6 +1418,7 @@ class TableDataBrowser(QTableWidget):
                                 COLLECTION_INITIAL, doc_delete)
         if name in self.project.session.get_documents_names(COLLECTION_BRICK):
             self.project.session.remove_document(COLLECTION_BRICK, name)
+        self.brick_names.pop(name, None)
 
         self.resizeColumnsToContents()
 
@@ -1358,118 +1437,86 @@ class TableDataBrowser(QTableWidget):
         self.msg.buttonClicked.connect(self.msg.close)
         self.msg.show()
 
-    def fill_cells_update_table(self):
-        """Initialize and fill the cells of the table."""
-        cells_number = len(self.scans_to_visualize) * len(
-            self.horizontalHeader())
-        self.progress = QProgressDialog(
-            "Please wait while the cells are being filled...", None, 0,
-            cells_number)
-        self.progress.setMinimumDuration(0)
-        self.progress.setValue(0)
-        self.progress.setMinimumWidth(350) # For mac OS
-        self.progress.setWindowTitle("Filling the cells")
-        self.progress.setWindowFlags(Qt.Window | Qt.WindowTitleHint |
-                                     Qt.CustomizeWindowHint)
-        self.progress.setModal(True)
-        self.progress.setAttribute(Qt.WA_DeleteOnClose, True)
-        self.progress.show()
-
-        idx = 0
-        row = 0
-        for scan in self.scans_to_visualize:
-            for column in range(0, len(self.horizontalHeader())):
+    def fill_bricks(self, scans):
+        """Fit the height of the rows of documents to their bricks, painted
+        by the delegate of the table (see BricksDelegate).
+
+        :param scans: list of scans
+        """
 
-                idx += 1
-                self.progress.setValue(idx)
-                QApplication.processEvents()
+        column = self.get_tag_column(TAG_BRICKS)
+        if column is None or not scans:
+            return
 
-                current_tag = self.horizontalHeaderItem(column).text()
+        values = self.project.session.get_values(COLLECTION_CURRENT, scans,
+                                                 [TAG_BRICKS])
+        # The names of all the bricks are read at once
+        brick_names = self.get_brick_names(
+            [brick_uuid for brick_uuids in values.columns[TAG_BRICKS]
+             if brick_uuids for brick_uuid in brick_uuids])
+        if not brick_names:
+            return
 
-                item = QTableWidgetItem()
+        font_metrics = self.fontMetrics()
+        for scan, brick_uuids in zip(values.documents,
+                                     values.columns[TAG_BRICKS]):
+            if not brick_uuids:
+                continue
+            row = self.get_scan_row(scan)
+            if row is None:
+                continue
+            height = self.itemDelegate().bricks_size(
+                font_metrics,
+                [brick_names[brick_uuid] for brick_uuid in brick_uuids
+                 if brick_names.get(brick_uuid)]).height()
+            if height > self.rowHeight(row):
+                self.setRowHeight(row, height)
 
-                if column == 0:
-                    # name tag
-                    item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-                    # name not editable
-                    set_item_data(item, scan, FIELD_TYPE_STRING)
-                else:
-                    # Other tags
-                    current_value = self.project.session.get_value(
-                        COLLECTION_CURRENT, scan, current_tag)
-                    # The scan has a value for the tag
-                    if current_value is not None:
-                        if current_tag != TAG_BRICKS:
-                            set_item_data(
-                                item, current_value,
-                                self.project.session.get_field(
-                                    COLLECTION_CURRENT, current_tag).type)
-                        else:
-                            # Tag bricks, display list with buttons
-                            # Initialization of a widget, it is necessary
-                            # to remove it after a sort
-                            widget = QWidget()
-                            widget.moveToThread(
-                                QApplication.instance().thread())
-                            layout = QVBoxLayout()
-                            for brick_number in range(0, len(current_value)):
-                                brick_uuid = current_value[brick_number]
-
-                                brick_name = self.project.session.get_value(
-                                    COLLECTION_BRICK, brick_uuid, BRICK_NAME)
-                                if brick_name:
-                                    brick_name_button = QPushButton(brick_name)
-                                    brick_name_button.moveToThread(
-                                        QApplication.instance().thread())
-                                    self.bricks[brick_name_button] = brick_uuid
-                                    brick_name_button.clicked.connect(
-                                        self.show_brick_history)
-                                    layout.addWidget(brick_name_button)
-                            widget.setLayout(layout)
-                            self.setCellWidget(row, column, widget)
-
-                    # The scan does not have a value for the tag
-                    else:
-                        if current_tag != TAG_BRICKS:
-                            set_item_data(
-                                item, not_defined_value, FIELD_TYPE_STRING)
-                            font = item.font()
-                            font.setItalic(True)
-                            font.setBold(True)
-                            item.setFont(font)
-                        else:
-                            # The scan does not have a brick
-                            # Remove previous initialization of QWidget in cell
-                            self.setCellWidget(row, column, None)
-                            set_item_data(item, "", FIELD_TYPE_STRING)
-                            item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-                            # bricks not editable
-                self.setItem(row, column, item)
-            row += 1
+    def fill_cells_update_table(self):
+        """Initialize and fill the cells of the table.
+
+        The rows of the table are the scans to visualize (followed by the
+        other scans of the table), inserted by chunks (see TableFill):
+        their values are read by the model when they are displayed. If the
+        fill is cancelled, the table only has the rows filled.
+        """
+
+        scans = list(self.scans_to_visualize)
+        scans_to_visualize = set(scans)
+        scans.extend(scan for scan in self.data_model.scans
+                     if scan not in scans_to_visualize)
+        self.data_model.set_scans([])
+        # The bricks may have changed since they were read
+        self.brick_names = {}
+
+        fill = TableFill("Please wait while the cells are being filled...")
+        filled = fill.run(scans, self.fill_rows)
+        if fill.canceled:
+            scans_filled = set(scans[:filled])
+            self.scans_to_visualize = [scan for scan in self.scans_to_visualize
+                                       if scan in scans_filled]
 
         # We apply the saved sort when the project is opened or after the
         # tab is changed
         # Saved sort applied if it exists
-        self.setSortingEnabled(True)
-
         tag_to_sort = self.project.getSortedTag()
         column_to_sort = self.get_tag_column(tag_to_sort)
         sort_order = self.project.getSortOrder()
 
-        self.itemChanged.connect(self.change_cell_color)
+        if column_to_sort is None:
+            column_to_sort = 0
+            sort_order = 0
 
-        if column_to_sort is not None:
-            self.horizontalHeader().setSortIndicator(
-                column_to_sort, sort_order)
+        header = self.horizontalHeader()
+        if (header.sortIndicatorSection() == column_to_sort and
+                header.sortIndicatorOrder() == sort_order):
+            # The sort indicator does not change, the rows are sorted again
+            self.data_model.sort(column_to_sort, sort_order)
         else:
-            self.horizontalHeader().setSortIndicator(0, 0)
-
+            header.setSortIndicator(column_to_sort, sort_order)
 
-        self.resizeRowsToContents()
         self.resizeColumnsToContents()
 
-        self.progress.close()
-
     def fill_headers(self, take_tags_to_update=False):
         """Initialize and fill the headers of the table.
 
@@ -1484,21 +1531,16 @@ class TableDataBrowser(QTableWidget):
         tags = sorted(tags)
         tags.insert(0, TAG_FILENAME)
 
-        self.setColumnCount(len(tags))
+        if tags != self.data_model.tags:
+            self.data_model.set_tags(tags)
+        else:
+            self.data_model.update_fields()
 
         column = 0
         # Filling the headers
         for tag_name in tags:
-            item = QtWidgets.QTableWidgetItem()
-            self.setHorizontalHeaderItem(column, item)
-            item.setText(tag_name)
-
-            element = self.project.session.get_field(
-                COLLECTION_CURRENT, tag_name)
+            element = self.data_model.fields.get(tag_name)
             if element is not None:
-                item.setToolTip(
-                    "Description: " + str(element.description) + "\nUnit: "
-                    + str(element.unit) + "\nType: " + str(element.type))
 
                 # Set column type
                 if element.type == FIELD_TYPE_FLOAT:
@@ -1513,6 +1555,8 @@ class TableDataBrowser(QTableWidget):
                 elif element.type == FIELD_TYPE_TIME:
                     self.setItemDelegateForColumn(
                         column, TimeFormatDelegate(self))
+                else:
+                    self.setItemDelegateForColumn(column, None)
 
                 # Hide the column if not visible
                 if take_tags_to_update:
@@ -1528,10 +1572,45 @@ class TableDataBrowser(QTableWidget):
                     else:
                         self.setColumnHidden(column, True)
 
-            self.setHorizontalHeaderItem(column, item)
-
             column += 1
 
+    def fill_rows(self, scans):
+        """Add rows at the end of the table, with their bricks.
+
+        :param scans: list of the scans of the rows
+        """
+
+        self.data_model.insert_scans(scans)
+        self.fill_bricks(scans)
+
+    def forget_ranks(self, *args):
+        """Forget the ranks of the rows among the visible rows, after the
+        rows or their visibility have changed.
+
+        :param args: arguments of the signal of the model (not used)
+        """
+
+        self.ranks = None
+
+    def get_brick_names(self, brick_uuids):
+        """Get the names of bricks, the names not known yet being read at
+        once in the database.
+
+        :param brick_uuids: list of the uuids of the bricks
+        :return: dictionary of the names of the bricks by uuid (the names
+           of all the bricks read, None for a brick that does not exist)
+        """
+
+        unknown = [brick_uuid for brick_uuid in set(brick_uuids)
+                   if brick_uuid not in self.brick_names]
+        if unknown:
+            names = self.project.session.get_values(COLLECTION_BRICK,
+                                                    unknown, [BRICK_NAME])
+            self.brick_names.update(zip(unknown, [None] * len(unknown)))
+            self.brick_names.update(zip(names.documents,
+                                        names.columns[BRICK_NAME]))
+        return self.brick_names
+
     def get_current_filter(self):
         """Get the current data browser selection (list of paths).
 
@@ -1559,8 +1638,8 @@ class TableDataBrowser(QTableWidget):
         :param to_insert: tag to insert
         """
 
-        for column in range(1, len(self.horizontalHeader())):
-            if self.horizontalHeaderItem(column).text() > to_insert:
+        for column in range(1, self.columnCount()):
+            if self.data_model.tags[column] > to_insert:
                 return column
         return self.columnCount()
 
@@ -1571,25 +1650,41 @@ class TableDataBrowser(QTableWidget):
         :param scan: scan filename
         :return: index of the row of the scan
         """
-        # for row in range(0, len(self.scans_to_visualize)):
-        for row in range(0, self.rowCount()):
-            item = self.item(row, 0)
-            scan_name = item.text()
-            if scan_name == scan:
-                return row
+
+        return self.data_model.rows.get(scan)
 
     def get_tag_column(self, tag):
         """Return the column index of the tag.
 
         :param tag: tag name
-        :return: index of the column of the tag
+        :return: index of the column of the tag (its logical index, which
+           does not change when the columns are moved)
         """
 
-        for column in range(0, self.columnCount()):
-            item = self.horizontalHeaderItem(column)
-            tag_name = item.text()
-            if tag_name == tag:
-                return column
+        return self.data_model.columns.get(tag)
+
+    def horizontalHeaderItem(self, column):
+        """Return the header of a column.
+
+        :param column: index of the column
+        :return: the HeaderItem of the column, None if there is no column
+        """
+
+        if 0 <= column < self.columnCount():
+            return HeaderItem(self, column)
+        return None
+
+    def item(self, row, column):
+        """Return a cell of the table.
+
+        :param row: row of the cell
+        :param column: column of the cell
+        :return: the TableItem of the cell, None if there is no cell
+        """
+
+        if 0 <= row < self.rowCount() and 0 <= column < self.columnCount():
+            return TableItem(self, row, column)
+        return None
 
     def mouseReleaseEvent(self, e):
         """Update table after mouse release.
@@ -1615,11 +1710,11 @@ class TableDataBrowser(QTableWidget):
                 column = item.column()
                 row = item.row()
                 self.coordinates.append([row, column])
-                tag_name = self.horizontalHeaderItem(column).text()
+                tag_name = self.data_model.tags[column]
                 tag_object = self.project.session.get_field(
                     COLLECTION_CURRENT, tag_name)
                 tag_type = tag_object.type
-                scan_name = self.item(row, 0).text()
+                scan_name = self.data_model.scans[row]
 
                 if tag_name == TAG_BRICKS:
                     self.setMouseTracking(True)
@@ -1681,37 +1776,23 @@ class TableDataBrowser(QTableWidget):
                     pass
 
                 # For history
-                history_maker = []
-                history_maker.append("modified_values")
                 modified_values = []
 
-                self.itemChanged.disconnect()
-
                 # Lists updated
                 for i in range(0, len(self.coordinates)):
-                    new_item = QTableWidgetItem()
                     old_value = self.old_database_values[i]
                     new_cur_value = self.project.session.get_value(
                         COLLECTION_CURRENT, self.scans_list[i], self.tags[i])
                     modified_values.append(
                         [self.scans_list[i], self.tags[i],
                          old_value, new_cur_value])
-                    set_item_data(
-                        new_item, new_cur_value,
-                        self.project.session.get_field(
-                            COLLECTION_CURRENT, self.tags[i]).type)
-                    self.setItem(
-                        self.coordinates[i][0],
-                        self.coordinates[i][1], new_item)
+                self.data_model.refresh()
 
                 # For history
-                history_maker.append(modified_values)
-                self.project.undos.append(history_maker)
-                self.project.redos.clear()
+                self.project.history.record("modified_values", None,
+                                            modified_values)
 
-                self.update_colors()
-
-                self.itemChanged.connect(self.change_cell_color)
+                self.update_colors(self.scans_list, self.tags)
 
             self.setMouseTracking(True)
 
@@ -1728,19 +1809,13 @@ class TableDataBrowser(QTableWidget):
         :param order: "Ascending" or "Descending"
         """
 
-        self.itemChanged.disconnect()
-
-        list_tags_name = list_tags
-        list_tags = []
-        for tag_name in list_tags_name:
-            list_tags.append(self.project.session.get_field(
-                COLLECTION_CURRENT, tag_name))
+        values = self.project.session.get_values(
+            COLLECTION_CURRENT, self.scans_to_visualize, list_tags)
         list_sort = []
         for scan in self.scans_to_visualize:
             tags_value = []
             for tag in list_tags:
-                current_value = str(self.project.session.get_value(
-                    COLLECTION_CURRENT, scan, tag.field_name))
+                current_value = str(values.get(scan, tag))
                 if current_value is not None:
                     tags_value.append(current_value)
                 else:
@@ -1754,49 +1829,59 @@ class TableDataBrowser(QTableWidget):
             self.scans_to_visualize = [x for _, x in sorted(zip(
                 list_sort, self.scans_to_visualize))]
 
-        # Table updated
-        self.setSortingEnabled(False)
-        for row in range(0, self.rowCount()):
-            scan = self.scans_to_visualize[row]
-            old_row = self.get_scan_row(scan)
-            if old_row != row:
-                for column in range(0, self.columnCount()):
-                    item_to_move = self.takeItem(old_row, column)
-                    item_wrong_row = self.takeItem(row, column)
-                    self.setItem(row, column, item_to_move)
-                    self.setItem(old_row, column, item_wrong_row)
-        self.itemChanged.connect(self.change_cell_color)
+        # Table updated, the scans to visualize first
+        scans_to_visualize = set(self.scans_to_visualize)
+        self.data_model.set_order(
+            self.scans_to_visualize +
+            [scan for scan in self.data_model.scans
+             if scan not in scans_to_visualize])
         self.horizontalHeader().setSortIndicator(-1, 0)
-        self.itemChanged.disconnect()
-        self.setSortingEnabled(True)
-
-        self.itemChanged.connect(self.change_cell_color)
 
     def multiple_sort_pop_up(self):
         """Display the multiple sort pop-up."""
         self.pop_up = PopUpMultipleSort(self.project, self)
         self.pop_up.show()
 
+    def refresh_values(self, scans=None):
+        """Display the values of documents again, after they have been
+        modified in the database.
+
+        :param scans: list of scans (all the scans if None)
+        """
+
+        self.data_model.refresh(scans)
+        self.resizeColumnsToContents()
+
+    def remove_rows(self, scans):
+        """Remove the rows of documents from the table, and from the
+        documents to visualize.
+
+        :param scans: list of scans
+        """
+
+        scans_removed = set(scans)
+        self.scans_to_visualize = [scan for scan in self.scans_to_visualize
+                                   if scan not in scans_removed]
+        self.data_model.remove_scans(scans)
+
     def remove_scan(self):
         """Remove documents from table and project."""
 
         points = self.selectedIndexes()
 
-        history_maker = []
-        history_maker.append("remove_scans")
         scans_removed = []
-        values_removed = []
+        scans_selected = set()
         scan_list = self.data_browser.main_window.pipeline_manager.scan_list
         repeat_pop_up = False
         cancel = False
         for point in points:
             row = point.row()
-            scan_path = self.item(row, 0).text()
-
-            scan_object = self.project.session.get_document(
-                COLLECTION_CURRENT, scan_path)
+            scan_path = self.data_model.scans[row]
 
-            if scan_object is not None:
+            # A row is selected by several cells
+            if (scan_path not in scans_selected and
+                    self.project.session.get_document(
+                        COLLECTION_CURRENT, scan_path) is not None):
                 if scan_path in scan_list and self.data_browser.data_sent is\
                         True:
                     if not repeat_pop_up:
@@ -1806,44 +1891,63 @@ class TableDataBrowser(QTableWidget):
                         repeat_pop_up = self.pop.repeat
                     if cancel:
                         continue
-                scans_removed.append(scan_object)
-
-                # Adding removed values to history
-                for tag in self.project.session.get_fields_names(
-                        COLLECTION_CURRENT):
-                    if tag != TAG_FILENAME:
-                        current_value = self.project.session.get_value(
-                            COLLECTION_CURRENT, scan_path, tag)
-                        initial_value = self.project.session.get_value(
-                            COLLECTION_INITIAL, scan_path, tag)
-                        if current_value is not None \
-                                or initial_value is not None:
-                            values_removed.append(
-                                [scan_path, tag, current_value, initial_value])
-
-                self.scans_to_visualize.remove(scan_path)
-                self.project.session.remove_document(
-                    COLLECTION_CURRENT, scan_path)
-                self.project.session.remove_document(
-                    COLLECTION_INITIAL, scan_path)
-
-        for scan in scans_removed:
-            scan_name = getattr(scan, TAG_FILENAME)
-            self.removeRow(self.get_scan_row(scan_name))
-
-        history_maker.append(scans_removed)
-        history_maker.append(values_removed)
-        self.project.undos.append(history_maker)
-        self.project.redos.clear()
+                scans_removed.append(scan_path)
+                scans_selected.add(scan_path)
+
+        # Adding removed values to history, read in one query per
+        # collection
+        tags = [tag for tag in self.project.session.get_fields_names(
+            COLLECTION_CURRENT) if tag != TAG_FILENAME]
+        current_values = self.project.session.get_values(
+            COLLECTION_CURRENT, scans_removed, tags)
+        initial_values = self.project.session.get_values(
+            COLLECTION_INITIAL, scans_removed, tags)
+        values_removed = []
+        for scan_path in scans_removed:
+            for tag, current_value, initial_value in zip(
+                    tags, current_values.row(scan_path),
+                    initial_values.row(scan_path)):
+                if current_value is not None or initial_value is not None:
+                    values_removed.append(
+                        [scan_path, tag, current_value, initial_value])
+
+        # The scans are removed from the Database at once
+        self.project.session.remove_documents(COLLECTION_CURRENT,
+                                              scans_removed)
+        self.project.session.remove_documents(COLLECTION_INITIAL,
+                                              scans_removed)
+
+        self.remove_rows(scans_removed)
+
+        # For history
+        self.project.history.record("remove_scans", scans_removed,
+                                    values_removed)
 
         self.resizeColumnsToContents()
 
+        # The removed documents are not modified anymore
+        self.update_colors(scans=[])
+
+    def removeColumn(self, column):
+        """Remove a column from the table.
+
+        :param column: index of the column
+        """
+
+        self.data_model.remove_tag(column)
+
+    def removeRow(self, row):
+        """Remove a row from the table.
+
+        :param row: index of the row
+        """
+
+        self.data_model.remove_scans([self.data_model.scans[row]])
+
     def reset_cell(self):
         """Reset the selected cells to their original values."""
 
         # For history
-        history_maker = []
-        history_maker.append("modified_values")
         modified_values = []
 
         points = self.selectedIndexes()
@@ -1852,11 +1956,9 @@ class TableDataBrowser(QTableWidget):
         has_unreset_values = False
 
         for point in points:
-            row = point.row()
-            col = point.column()
-            tag_name = self.horizontalHeaderItem(col).text()
+            tag_name = self.data_model.tags[point.column()]
             # We get the FileName of the scan from the first row
-            scan_name = self.item(row, 0).text()
+            scan_name = self.data_model.scans[point.row()]
 
             current_value = self.project.session.get_value(
                 COLLECTION_CURRENT, scan_name, tag_name)
@@ -1866,9 +1968,6 @@ class TableDataBrowser(QTableWidget):
                 try:
                     self.project.session.set_value(
                         COLLECTION_CURRENT, scan_name, tag_name, initial_value)
-                    set_item_data(self.item(row, col), initial_value,
-                                  self.project.session.get_field(
-                                      COLLECTION_CURRENT, tag_name).type)
                     # For history
                     modified_values.append(
                         [scan_name, tag_name, current_value, initial_value])
@@ -1878,22 +1977,22 @@ class TableDataBrowser(QTableWidget):
                 has_unreset_values = True
 
         # For history
-        history_maker.append(modified_values)
-        self.project.undos.append(history_maker)
-        self.project.redos.clear()
+        self.project.history.record("modified_values", None,
+                                    modified_values)
 
         # Warning message if unreset values
         if has_unreset_values:
             self.display_unreset_values()
 
-        self.resizeColumnsToContents()
+        self.refresh_values()
+
+        self.update_colors([value[0] for value in modified_values],
+                           [value[1] for value in modified_values])
 
     def reset_column(self):
         """Reset the selected columns to their original values."""
 
         # For history
-        history_maker = list()
-        history_maker.append("modified_values")
         modified_values = []
 
         points = self.selectedIndexes()
@@ -1902,12 +2001,11 @@ class TableDataBrowser(QTableWidget):
         has_unreset_values = False
 
         for point in points:
-            col = point.column()
-            tag_name = self.horizontalHeaderItem(col).text()
+            tag_name = self.data_model.tags[point.column()]
 
             for row_iter in range(0, len(self.scans_to_visualize)):
                 # We get the FileName of the scan from the first column
-                scan = self.item(row_iter, 0).text()
+                scan = self.data_model.scans[row_iter]
                 initial_value = self.project.session.get_value(
                     COLLECTION_INITIAL, scan, tag_name)
                 current_value = self.project.session.get_value(
@@ -1916,9 +2014,6 @@ class TableDataBrowser(QTableWidget):
                     try:
                         self.project.session.set_value(
                             COLLECTION_CURRENT, scan, tag_name, initial_value)
-                        set_item_data(self.item(row_iter, col), initial_value,
-                                      self.project.session.get_field(
-                                          COLLECTION_CURRENT, tag_name).type)
                         # For history
                         modified_values.append(
                             [scan, tag_name, current_value, initial_value])
@@ -1928,22 +2023,22 @@ class TableDataBrowser(QTableWidget):
                     has_unreset_values = True
 
         # For history
-        history_maker.append(modified_values)
-        self.project.undos.append(history_maker)
-        self.project.redos.clear()
+        self.project.history.record("modified_values", None,
+                                    modified_values)
 
         # Warning message if unreset values
         if has_unreset_values:
             self.display_unreset_values()
 
-        self.resizeColumnsToContents()
+        self.refresh_values()
+
+        self.update_colors([value[0] for value in modified_values],
+                           [value[1] for value in modified_values])
 
     def reset_row(self):
         """Reset the selected rows to their original values."""
 
         # For history
-        history_maker = []
-        history_maker.append("modified_values")
         modified_values = []
 
         points = self.selectedIndexes()
@@ -1953,13 +2048,10 @@ class TableDataBrowser(QTableWidget):
 
         # For each selected cell
         for point in points:
-            row = point.row()
             # FileName is always the first column
-            scan_name = self.item(row, 0).text()
+            scan_name = self.data_model.scans[point.row()]
 
-            for column in range(0, len(self.horizontalHeader())):
-                # We get the tag name from the header
-                tag = self.horizontalHeaderItem(column).text()
+            for tag in self.data_model.tags:
                 current_value = self.project.session.get_value(
                     COLLECTION_CURRENT, scan_name, tag)
                 initial_value = self.project.session.get_value(
@@ -1970,9 +2062,6 @@ class TableDataBrowser(QTableWidget):
                     try:
                         self.project.session.set_value(
                             COLLECTION_CURRENT, scan_name, tag, initial_value)
-                        set_item_data(self.item(row, column), initial_value,
-                                      self.project.session.get_field(
-                                          COLLECTION_CURRENT, tag).type)
                         # For history
                         modified_values.append(
                             [scan_name, tag, current_value, initial_value])
@@ -1983,15 +2072,25 @@ class TableDataBrowser(QTableWidget):
                     has_unreset_values = True
 
         # For history
-        history_maker.append(modified_values)
-        self.project.undos.append(history_maker)
-        self.project.redos.clear()
+        self.project.history.record("modified_values", None,
+                                    modified_values)
 
         # Warning message if unreset values
         if has_unreset_values:
             self.display_unreset_values()
 
-        self.resizeColumnsToContents()
+        self.refresh_values()
+
+        self.update_colors([value[0] for value in modified_values],
+                           [value[1] for value in modified_values])
+
+    def rowCount(self):
+        """Return the number of rows of the table.
+
+        :return: the number of scans
+        """
+
+        return self.data_model.rowCount()
 
     def section_moved(self, logical_index, old_index, new_index):
         """Update the visual index and forbid to move the first column when
@@ -2003,6 +2102,8 @@ class TableDataBrowser(QTableWidget):
         """
         # The logical index is not used in this method but it is returned by
         # the event we're connected to.
+        # The columns of the tags (see get_tag_column) are logical indexes,
+        # moving a section does not change them.
 
         self.itemSelectionChanged.disconnect()
 
@@ -2044,17 +2145,24 @@ class TableDataBrowser(QTableWidget):
             self.selectColumn(col)
         self.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
 
+    def selectedItems(self):
+        """Return the selected cells that are not hidden.
+
+        :return: the list of the TableItems of the cells
+        """
+
+        return [TableItem(self, index.row(), index.column())
+                for index in self.selectedIndexes()]
+
     def selection_changed(self):
         """Update the tab view when the selection changes."""
 
         # List of selected scans updated
         self.scans.clear()
 
-        for point in self.selectedItems():
-            row = point.row()
-            column = point.column()
-            scan_name = self.item(row, 0).text()
-            tag_name = self.horizontalHeaderItem(column).text()
+        for point in self.selectedIndexes():
+            scan_name = self.data_model.scans[point.row()]
+            tag_name = self.data_model.tags[point.column()]
             scan_already_in_list = False
             for scan in self.scans:
                 if scan[0] == scan_name:
@@ -2071,10 +2179,23 @@ class TableDataBrowser(QTableWidget):
         if self.link_viewer:
             self.data_browser.connect_mini_viewer()
 
-    def show_brick_history(self):
-        """Show brick history pop-up."""
+    def setRowHidden(self, row, hide):
+        """Hide or show a row, the rows being striped again.
+
+        :param row: index of the row
+        :param hide: True to hide the row
+        """
+
+        if self.isRowHidden(row) != hide:
+            self.ranks = None
+            super().setRowHidden(row, hide)
+
+    def show_brick_history(self, brick_uuid):
+        """Show brick history pop-up.
+
+        :param brick_uuid: uuid of the brick
+        """
 
-        brick_uuid = self.bricks[self.sender()]
         self.show_brick_popup = PopUpShowBrick(
             self.project, brick_uuid, self.data_browser,
             self.data_browser.parent)
@@ -2086,12 +2207,8 @@ class TableDataBrowser(QTableWidget):
         :param order: order of sort (0 for ascending, 1 for descending)
         """
 
-        self.itemChanged.connect(self.change_cell_color)
-
         self.horizontalHeader().setSortIndicator(
-            self.currentItem().column(), order)
-
-        self.itemChanged.disconnect()
+            self.currentIndex().column(), order)
 
     def sort_updated(self, column, order):
         """Update project and tab parameters after a sort.
@@ -2100,82 +2217,39 @@ class TableDataBrowser(QTableWidget):
         :param order: boolean of the new order
         """
 
-        self.itemChanged.disconnect()
-
         if column != -1:
             self.project.setSortOrder(int(order))
-            self.project.setSortedTag(self.horizontalHeaderItem(column).text())
+            self.project.setSortedTag(self.data_model.tags[column])
 
-            self.sortItems(column, order)
+            # The rows are striped again after the sort of the model
+            self.data_model.sort(column, order)
 
-            self.update_colors()
-            self.resizeRowsToContents()
+            self.update_colors(scans=[])
 
-        self.itemChanged.connect(self.change_cell_color)
+    def update_colors(self, scans=None, tags=None):
+        """Update the background of the cells of documents and tags, after
+        they have been modified.
 
-    def update_colors(self):
-        """Update the background of all the cells."""
-
-        # itemChanged signal is always disconnected when calling this method
-
-        for column in range(0, self.columnCount()):
-            if not self.isColumnHidden(column):
-                tag = self.horizontalHeaderItem(column).text()
-                row_number = 0
-                for row in range(0, self.rowCount()):
-                    if not self.isRowHidden(row):
-                        scan = self.item(row, 0).text()
-
-                        item = self.item(row, column)
-
-                        color = QColor()
-
-                        if column == 0:
-                            if row_number % 2 == 0:
-                                color.setRgb(255, 255, 255)  # White
-                            else:
-                                color.setRgb(230, 230, 230)  # Grey
-                        # Avoid issues after switching tab and not saving
-                        elif (self.project.session.get_field(
-                                COLLECTION_CURRENT, tag) is None):
-                            if row_number % 2 == 0:
-                                color.setRgb(245, 215, 215)  # Pink
-                            else:
-                                color.setRgb(245, 175, 175)  # Red
-                        # Raw tag
-                        elif (self.project.session.get_field(
-                                COLLECTION_CURRENT, tag).origin ==
-                                TAG_ORIGIN_BUILTIN):
-                            current_value = self.project.session.get_value(
-                                COLLECTION_CURRENT, scan, tag)
-                            initial_value = self.project.session.get_value(
-                                COLLECTION_INITIAL, scan, tag)
-                            if current_value != initial_value:
-                                if row_number % 2 == 0:
-                                    color.setRgb(200, 230, 245)  # Cyan
-                                else:
-                                    color.setRgb(150, 215, 230)  # Blue
-                            else:
-                                if row_number % 2 == 0:
-                                    color.setRgb(255, 255, 255)  # White
-                                else:
-                                    color.setRgb(230, 230, 230)  # Grey
-
-                        # User tag
-                        else:
-                            if row_number % 2 == 0:
-                                color.setRgb(245, 215, 215)  # Pink
-                            else:
-                                color.setRgb(245, 175, 175)  # Red
+        Only these cells are repainted, the values that differ from their
+        initial value being compared again by the database for the
+        documents written since the last update only.
 
-                        row_number += 1
+        :param scans: list of scans (all the scans if None)
+        :param tags: list of tags (all the tags if None)
+        """
 
-                        item.setData(Qt.BackgroundRole, QtCore.QVariant(color))
+        if scans is None and tags is None:
+            # Avoid issues after switching tab and not saving
+            self.data_model.update_fields()
+        # Values that differ from their initial value
+        self.data_model.modified = self.project.session.get_modified(
+            COLLECTION_CURRENT, COLLECTION_INITIAL)
+        self.data_model.colors_changed(scans, tags)
 
-        # Auto-save
+        # Auto-save, gathering the modifications made in a short time
         config = Config()
         if config.isAutoSave() == True:
-            self.project.saveModifications()
+            self.project.auto_save.schedule()
 
     def update_selection(self):
         """Update the selection after a search."""
@@ -2183,15 +2257,20 @@ class TableDataBrowser(QTableWidget):
         # Selection updated
         self.clearSelection()
 
+        selection = QItemSelection()
         for scan in self.scans:
             scan_selected = scan[0]
             row = self.get_scan_row(scan_selected)
+            if row is None:
+                continue
             # We select the columns of the row if it was selected
             tags = scan[1]
             for tag in tags:
-                if self.get_tag_column(tag) is not None :
-                    item_to_select = self.item(row, self.get_tag_column(tag))
-                    item_to_select.setSelected(True)
+                column = self.get_tag_column(tag)
+                if column is not None:
+                    index = self.data_model.index(row, column)
+                    selection.select(index, index)
+        self.selectionModel().select(selection, QItemSelectionModel.Select)
 
     def update_table(self, take_tags_to_update=False):
         """Fill the table with the project's data.
@@ -2201,8 +2280,6 @@ class TableDataBrowser(QTableWidget):
         :param take_tags_to_update: boolean
         """
 
-        self.setSortingEnabled(False)
-
         self.clearSelection()  # Selection cleared when switching project
 
         # The list of scans to visualize
@@ -2215,28 +2292,17 @@ class TableDataBrowser(QTableWidget):
         if self.activate_selection:
             self.scans = []
 
-        self.itemChanged.disconnect()
-
-        self.setRowCount(len(self.scans_to_visualize))
+        # The rows are the scans to visualize only
+        self.data_model.set_scans([])
 
         # Sort visual management
         self.fill_headers(take_tags_to_update)
 
-        # Cells filled
+        # Cells filled, columns resized
         self.fill_cells_update_table()
 
-        self.itemChanged.disconnect()
-
-        # Columns and rows resized
-        self.resizeColumnsToContents()
-        self.resizeRowsToContents()
-
         self.update_colors()
 
-        # When the user changes one item of the table, the background
-        # will change
-        self.itemChanged.connect(self.change_cell_color)
-
     def update_visualized_columns(self, old_tags, showed):
         """Update the tags shown in the table.
 
@@ -2244,7 +2310,6 @@ class TableDataBrowser(QTableWidget):
         :param showed: list of tags to display
         """
 
-        self.itemChanged.disconnect()
         if self.activate_selection:
             self.itemSelectionChanged.disconnect()
 
@@ -2270,34 +2335,36 @@ class TableDataBrowser(QTableWidget):
 
         self.resizeColumnsToContents()
 
-        self.update_colors()
+        # The colors of the cells are the same, hidden or not
+        self.update_colors(scans=[])
 
         # Selection updated
         if self.activate_selection:
             self.update_selection()
             self.itemSelectionChanged.connect(self.selection_changed)
 
-        self.itemChanged.connect(self.change_cell_color)
-
     def update_visualized_rows(self, old_scans):
         """Update the list of documents (scans) in the table.
 
         :param old_scans: old list of scans
         """
-        self.itemChanged.disconnect()
 
         if self.activate_selection:
             self.itemSelectionChanged.disconnect()
 
+        # The visible rows are the ones of the old scans, only the rows
+        # whose visibility changes are updated
+        old_scans = set(old_scans)
+        scans_to_visualize = set(self.scans_to_visualize)
+
         # Scans that are not visible anymore are hidden
-        for scan in old_scans:
-            if scan not in self.scans_to_visualize:
-                row = self.get_scan_row(scan)
-                if row is not None:
-                    self.setRowHidden(row, True)
+        for scan in old_scans - scans_to_visualize:
+            row = self.get_scan_row(scan)
+            if row is not None:
+                self.setRowHidden(row, True)
 
         # Scans that became visible must be visible
-        for scan in self.scans_to_visualize:
+        for scan in scans_to_visualize - old_scans:
             row = self.get_scan_row(scan)
             if row is not None:
                 self.setRowHidden(row, False)
@@ -2307,14 +2374,8 @@ class TableDataBrowser(QTableWidget):
         # Selection updated
         if self.activate_selection:
             self.update_selection()
-
-        self.update_colors()
-
-        if self.activate_selection:
             self.itemSelectionChanged.connect(self.selection_changed)
 
-        self.itemChanged.connect(self.change_cell_color)
-
     def visualized_tags_pop_up(self):
         """Display the visualized tags pop-up."""
 
@@ -2330,7 +2391,7 @@ class TableDataBrowser(QTableWidget):
         self.pop_up.show()
 
 
-class TimeFormatDelegate(QItemDelegate):
+class TimeFormatDelegate(ZebraDelegate):
     """Delegate that is used to handle times in the TableDataBrowser.
 
     """
@@ -2339,14 +2400,14 @@ class TimeFormatDelegate(QItemDelegate):
 
         :param parent: QWidget parent
         """
-        QItemDelegate.__init__(self, parent)
+        ZebraDelegate.__init__(self, parent)
 
     def createEditor(self, parent, option, index):
         """Override of the createEditor method, called to generate the widget.
 
         :param parent: QWidget parent
-        :param option: Only used to overload the QItemDelegate class
-        :param index: Only used to overload the QItemDelegate class
+        :param option: Only used to overload the ZebraDelegate class
+        :param index: Only used to overload the ZebraDelegate class
         :return: The QWidget with a specified format
         """
         editor = QTimeEdit(parent)
@@ -19,7 +19,8 @@ Contains:
 from PyQt5.QtWidgets import QLineEdit
 
 # Populse_MIA imports
-from populse_mia.data_manager.project import TAG_FILENAME, TAG_BRICKS
+from populse_mia.data_manager.project import COLLECTION_CURRENT, TAG_BRICKS
+from populse_mia.software_properties import Config
 
 
 class RapidSearch(QLineEdit):
@@ -30,12 +31,18 @@ class RapidSearch(QLineEdit):
     for the scans with missing value(s).
     Dates are in the following format: yyyy-mm-dd hh:mm:ss.fff”
 
+    The filters prepared do not contain the scans to search into: they are
+    given to DatabaseSessionMIA.filter_documents_names, so that the same
+    search is only compiled once. If the search_index config entry is set,
+    the search is done with the full-text index of the values.
+
     :param databrowser: parent data browser widget
 
     .. Methods:
         - prepare_filter: prepares the rapid search filter
         - prepare_not_defined_filter: prepares the rapid search filter for not
           defined values
+        - search_scans: gives the scans matching the rapid search
     """
 
     def __init__(self, databrowser):
@@ -52,7 +59,8 @@ class RapidSearch(QLineEdit):
                                 "dates are in the following format: "
                                 "yyyy-mm-dd hh:mm:ss.fff")
 
-    def prepare_not_defined_filter(self, tags):
+    @staticmethod
+    def prepare_not_defined_filter(tags):
         """Prepare the rapid search filter for not defined values.
 
         :param tags: list of tags to take into account
@@ -75,21 +83,16 @@ class RapidSearch(QLineEdit):
 
                 or_to_write = True
 
-        query += " AND ({" + TAG_FILENAME + "} IN " + str(
-            self.databrowser.table_data.scans_to_search).replace("'",
-                                                                 "\"") + ")"
-
         query = "(" + query + ")"
 
         return query
 
     @staticmethod
-    def prepare_filter(search, tags, scans):
+    def prepare_filter(search, tags):
         """Prepare the rapid search filter.
 
         :param search: Search (str)
         :param tags: List of tags to take into account
-        :param scans: List of scans to search into
         :return: str filter corresponding to the rapid search
         """
 
@@ -108,7 +111,31 @@ class RapidSearch(QLineEdit):
 
                 or_to_write = True
 
-        query += ") AND ({" + TAG_FILENAME + "} IN " + str(
-            scans).replace("'", "\"") + ")"
+        query += ")"
 
         return query
+
+    @staticmethod
+    def search_scans(project, search, tags, scans):
+        """Give the scans matching the rapid search.
+
+        The full-text index of the values is used if it is enabled and
+        supported by SQLite, the LIKE filter otherwise.
+
+        :param project: current project in the software
+        :param search: Search (str)
+        :param tags: List of tags to take into account
+        :param scans: List of scans to search into
+        :return: list of the scans matching the rapid search
+        """
+
+        if Config().get_search_index():
+            result = project.session.search_values(
+                COLLECTION_CURRENT, search,
+                [tag for tag in tags if tag != TAG_BRICKS], scans)
+            if result is not None:
+                return result
+
+        return project.session.filter_documents_names(
+            COLLECTION_CURRENT, RapidSearch.prepare_filter(search, tags),
+            scans)
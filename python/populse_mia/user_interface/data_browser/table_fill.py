@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*- #
+"""
+Module to fill the rows of the data browser table by chunks.
+
+The rows are given to a fill function by chunks of rows, during a time
+slice of FILL_TICK seconds, before the progress of the fill is displayed
+and the events of the application are processed: the software stays
+responsive during a long fill, which can be cancelled by the user.
+
+Contains:
+    Class:
+        - TableFill
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import time
+
+# PyQt5 imports
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QProgressDialog
+
+# Number of rows given at once to the fill function
+CHUNK_SIZE = 64
+
+# Duration (in seconds) of the fill between two processings of the events
+FILL_TICK = 0.016
+
+# Duration (in milliseconds) of the fill before the progress is displayed
+PROGRESS_DELAY = 500
+
+
+class TableFill:
+    """Fill of rows of the data browser table, by time-sliced chunks.
+
+    The fill function is called with the chunks of rows until the time
+    slice is elapsed, then the progress dialog is updated and the events
+    are processed once. When the fill is cancelled, the rows already
+    filled are kept.
+
+    :param label: text of the progress dialog
+
+    .. Methods:
+        - run: fill rows by chunks
+    """
+
+    def __init__(self, label):
+        """Initialization of the TableFill class.
+
+        :param label: text of the progress dialog
+        """
+
+        self.label = label
+        self.canceled = False
+
+    def run(self, rows, fill):
+        """Fill rows by chunks.
+
+        :param rows: list of the rows (document names) to fill
+        :param fill: function filling a list of rows
+        :return: the number of rows filled, the first ones (less than the
+           number of rows if the fill has been cancelled)
+        """
+
+        self.canceled = False
+
+        # A small fill is made at once
+        if len(rows) <= CHUNK_SIZE:
+            if rows:
+                fill(rows)
+            return len(rows)
+
+        progress = QProgressDialog(self.label, "Cancel", 0, len(rows))
+        progress.setMinimumDuration(PROGRESS_DELAY)
+        progress.setMinimumWidth(350)  # For mac OS
+        progress.setWindowTitle("Filling the cells")
+        progress.setWindowFlags(Qt.Window | Qt.WindowTitleHint |
+                                Qt.CustomizeWindowHint)
+        progress.setModal(True)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+
+        filled = 0
+        try:
+            while filled < len(rows):
+                start = time.perf_counter()
+                while (filled < len(rows) and
+                       time.perf_counter() - start < FILL_TICK):
+                    chunk = rows[filled:filled + CHUNK_SIZE]
+                    fill(chunk)
+                    filled += len(chunk)
+
+                # Progress updated once per time slice
+                progress.setValue(filled)
+                QApplication.processEvents()
+                if progress.wasCanceled():
+                    self.canceled = True
+                    break
+        finally:
+            progress.close()
+
+        return filled
@@ -0,0 +1,782 @@
+# -*- coding: utf-8 -*- #
+"""
+Module to define the model of the data browser table.
+
+The table does not hold one item per cell: the cells are read by the view
+through the model, which fetches the values of the documents by blocks of
+rows (see DatabaseSessionMIA.get_values), only when the rows are displayed,
+and keeps the last blocks read. The display data, the fonts and the colors
+of the cells are given by the roles of the model.
+
+The rows are striped by the delegates of the table (see ZebraDelegate),
+from the order of the rows displayed: the model only gives the two colors
+of a cell, which do not change when the rows are sorted or hidden.
+
+Contains:
+    Class:
+        - DataBrowserModel
+        - HeaderItem
+        - TableItem
+        - ZebraDelegate
+    Function:
+        - display_text
+"""
+
+##########################################################################
+# Populse_mia - Copyright (C) IRMaGe/CEA, 2018
+# Distributed under the terms of the CeCILL license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL_V2.1-en.html
+# for details.
+##########################################################################
+
+import locale
+from collections import OrderedDict
+from functools import cmp_to_key
+
+# PyQt5 imports
+from PyQt5.QtCore import (
+    QAbstractTableModel, QDate, QDateTime, QItemSelectionModel, QModelIndex,
+    Qt, QTime, pyqtSignal)
+from PyQt5.QtGui import QColor, QFont
+from PyQt5.QtWidgets import QItemDelegate, QStyle
+
+# Populse_MIA imports
+from populse_mia.data_manager.project import (
+    COLLECTION_CURRENT, TAG_BRICKS)
+from populse_mia.data_manager.database_mia import TAG_ORIGIN_BUILTIN
+from populse_mia.utils.utils import item_data
+
+# Variable shown everywhere when no value for the tag
+not_defined_value = "*Not Defined*"
+
+# Number of rows whose values are read at once
+BLOCK_SIZE = 256
+
+# Number of blocks of rows kept by the model
+MAX_BLOCKS = 16
+
+# Role of the colors of a cell, for the even and the odd visible rows
+COLORS_ROLE = Qt.UserRole
+
+# Role of the bricks (uuids) of a cell of the bricks column
+BRICKS_ROLE = Qt.UserRole + 1
+
+# Colors of the cells: not modified, modified and user tag (or tag that
+# does not exist any more)
+COLORS = (QColor(255, 255, 255), QColor(230, 230, 230))  # White, grey
+COLORS_MODIFIED = (QColor(200, 230, 245), QColor(150, 215, 230))  # Cyan, blue
+COLORS_USER = (QColor(245, 215, 215), QColor(245, 175, 175))  # Pink, red
+
+
+class DataBrowserModel(QAbstractTableModel):
+    """Model of the data browser table: the documents (rows) and the tags
+    (columns) of the table, whose values are read lazily.
+
+    The values edited in the table are kept by the model (and emitted by
+    the cellEdited signal) until the table writes them in the database and
+    refreshes the documents.
+
+    :param table: TableDataBrowser displaying the model
+
+    .. Methods:
+        - colors_changed: repaints the cells of documents and tags
+        - columnCount: gives the number of tags
+        - data: gives the data of a cell for a role
+        - flags: gives the flags of a cell
+        - headerData: gives the data of a header section for a role
+        - insert_scans: adds documents at the end of the table
+        - insert_tag: adds a tag
+        - refresh: reads the values of documents again
+        - remove_scans: removes documents
+        - remove_tag: removes a tag
+        - rowCount: gives the number of documents
+        - set_order: reorders the documents
+        - set_scans: replaces the documents
+        - set_tags: replaces the tags
+        - setData: sets the data of a cell edited in the table
+        - sort: sorts the documents by the values of a tag
+        - update_fields: reads the definitions of the tags again
+        - value: gives the value of a cell in the database
+    """
+
+    # Emitted with the row and the column of a cell edited in the table
+    cellEdited = pyqtSignal(int, int)
+
+    def __init__(self, table):
+        """Initialization of the DataBrowserModel class.
+
+        :param table: TableDataBrowser displaying the model
+        """
+
+        super().__init__(table)
+        self.table = table
+        self.scans = []
+        self.tags = []
+        # Document name -> row and tag -> column, kept with the lists
+        self.rows = {}
+        self.columns = {}
+        # Tag -> field row (None if the tag does not exist any more)
+        self.fields = {}
+        # Block number -> ValuesBlock of its rows, the last used at the end
+        self.blocks = OrderedDict()
+        # (scan, tag) -> value edited in the table and not written yet
+        self.edits = {}
+        # Values that differ from their initial value, for the colors
+        self.modified = None
+        self.not_defined_font = QFont()
+        self.not_defined_font.setItalic(True)
+        self.not_defined_font.setBold(True)
+
+    def colors_changed(self, scans=None, tags=None):
+        """Repaint the cells of documents and tags, whose colors may have
+        changed.
+
+        :param scans: list of the document names (all the documents if
+           None)
+        :param tags: list of the tag names (all the tags if None)
+        """
+
+        if scans is None:
+            rows = [0, len(self.scans) - 1] if self.scans else []
+        else:
+            rows = [self.rows[scan] for scan in scans if scan in self.rows]
+        if tags is None:
+            columns = [0, len(self.tags) - 1] if self.tags else []
+        else:
+            columns = [self.columns[tag] for tag in tags
+                       if tag in self.columns]
+        if rows and columns:
+            # The cells are repainted by the view only if they are displayed
+            self.dataChanged.emit(self.index(min(rows), min(columns)),
+                                  self.index(max(rows), max(columns)),
+                                  [COLORS_ROLE])
+
+    def columnCount(self, parent=QModelIndex()):
+        """Give the number of tags of the table.
+
+        :param parent: parent index (the table has no child)
+        :return: the number of columns
+        """
+
+        if parent.isValid():
+            return 0
+        return len(self.tags)
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Give the data of a cell for a role.
+
+        :param index: index of the cell
+        :param role: role
+        :return: the data, None if the cell has no data for the role
+        """
+
+        if not index.isValid():
+            return None
+
+        row = index.row()
+        column = index.column()
+        scan = self.scans[row]
+        tag = self.tags[column]
+
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if column == 0:
+                return scan
+            if (scan, tag) in self.edits:
+                return self.edits[(scan, tag)]
+            if tag == TAG_BRICKS:
+                # The bricks are painted by the delegate of the table
+                return ""
+            value, value_type = self.value(row, tag)
+            if value is None:
+                return not_defined_value
+            return item_data(value, value_type)
+
+        if role == Qt.FontRole:
+            if (column == 0 or tag == TAG_BRICKS or
+                    (scan, tag) in self.edits):
+                return None
+            if self.value(row, tag)[0] is None:
+                return self.not_defined_font
+            return None
+
+        if role == COLORS_ROLE:
+            field = self.fields.get(tag)
+            if column == 0:
+                return COLORS
+            # Avoid issues after switching tab and not saving
+            if field is None:
+                return COLORS_USER
+            # Raw tag
+            if field.origin == TAG_ORIGIN_BUILTIN:
+                if (self.modified is not None and
+                        self.modified.is_modified(scan, tag)):
+                    return COLORS_MODIFIED
+                return COLORS
+            # User tag
+            return COLORS_USER
+
+        if role == BRICKS_ROLE:
+            if tag != TAG_BRICKS:
+                return None
+            return self.value(row, tag)[0]
+
+        return None
+
+    def flags(self, index):
+        """Give the flags of a cell: the names of the documents and the
+        bricks are not editable.
+
+        :param index: index of the cell
+        :return: the flags
+        """
+
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsSelectable | Qt.ItemIsEnabled
+        if index.column() != 0 and self.tags[index.column()] != TAG_BRICKS:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        """Give the data of a header section for a role: the name of the tag
+        and its definition for the columns, the number of the row for the
+        rows.
+
+        :param section: section number
+        :param orientation: Qt.Horizontal or Qt.Vertical
+        :param role: role
+        :return: the data, None if the section has no data for the role
+        """
+
+        if orientation == Qt.Vertical:
+            if role == Qt.DisplayRole:
+                return str(section + 1)
+            return None
+
+        if section >= len(self.tags):
+            return None
+        tag = self.tags[section]
+        if role == Qt.DisplayRole:
+            return tag
+        if role == Qt.ToolTipRole:
+            field = self.fields.get(tag)
+            if field is not None:
+                return ("Description: " + str(field.description) +
+                        "\nUnit: " + str(field.unit) + "\nType: " +
+                        str(field.type))
+        return None
+
+    def insert_scans(self, scans):
+        """Add documents at the end of the table.
+
+        :param scans: list of the document names
+        """
+
+        if not scans:
+            return
+        first = len(self.scans)
+        self.beginInsertRows(QModelIndex(), first, first + len(scans) - 1)
+        self.scans.extend(scans)
+        self._index_rows(first)
+        # The last block read does not have the new documents
+        self.blocks.pop(first // BLOCK_SIZE, None)
+        self.endInsertRows()
+
+    def insert_tag(self, column, tag):
+        """Add a tag to the table.
+
+        :param column: index of the new column
+        :param tag: tag name
+        """
+
+        self.beginInsertColumns(QModelIndex(), column, column)
+        self.tags.insert(column, tag)
+        self._index_columns(column)
+        self.fields[tag] = self.table.project.session.get_field(
+            COLLECTION_CURRENT, tag)
+        self.blocks.clear()
+        self.endInsertColumns()
+
+    def refresh(self, scans=None):
+        """Read the values of documents again, forgetting their values
+        edited in the table.
+
+        :param scans: list of the document names (all the documents if None)
+        """
+
+        if scans is None:
+            self.edits.clear()
+        else:
+            scans = set(scans)
+            for scan, tag in list(self.edits):
+                if scan in scans:
+                    del self.edits[(scan, tag)]
+        self.blocks.clear()
+        if self.scans and self.tags:
+            self.dataChanged.emit(
+                self.index(0, 0),
+                self.index(len(self.scans) - 1, len(self.tags) - 1))
+
+    def remove_scans(self, scans):
+        """Remove documents from the table.
+
+        :param scans: list of the document names (the documents that are
+           not in the table are ignored)
+        """
+
+        rows = sorted(set(self.rows[scan] for scan in scans
+                          if scan in self.rows))
+        if not rows:
+            return
+        first_removed = rows[0]
+        # The consecutive rows are removed together, from the last ones
+        while rows:
+            last = rows.pop()
+            first = last
+            while rows and rows[-1] == first - 1:
+                first = rows.pop()
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for scan in self.scans[first:last + 1]:
+                del self.rows[scan]
+            del self.scans[first:last + 1]
+            self.endRemoveRows()
+        # The rows after the first one removed have moved
+        self._index_rows(first_removed)
+        self.blocks.clear()
+
+    def remove_tag(self, column):
+        """Remove a tag from the table.
+
+        :param column: index of the column
+        """
+
+        self.beginRemoveColumns(QModelIndex(), column, column)
+        tag = self.tags.pop(column)
+        del self.columns[tag]
+        self._index_columns(column)
+        self.fields.pop(tag, None)
+        self.blocks.clear()
+        self.endRemoveColumns()
+
+    def rowCount(self, parent=QModelIndex()):
+        """Give the number of documents of the table.
+
+        :param parent: parent index (the table has no child)
+        :return: the number of rows
+        """
+
+        if parent.isValid():
+            return 0
+        return len(self.scans)
+
+    def set_order(self, scans):
+        """Reorder the documents of the table, the selection and the hidden
+        rows following their documents.
+
+        :param scans: list of the document names of the table, in their new
+           order
+        """
+
+        self.layoutAboutToBeChanged.emit(
+            [], QAbstractTableModel.VerticalSortHint)
+        positions = {scan: row for row, scan in enumerate(scans)}
+        old_indexes = self.persistentIndexList()
+        new_indexes = [self.index(positions[self.scans[index.row()]],
+                                  index.column())
+                       for index in old_indexes]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.scans = list(scans)
+        self.rows = positions
+        self.blocks.clear()
+        self.layoutChanged.emit([], QAbstractTableModel.VerticalSortHint)
+
+    def set_scans(self, scans):
+        """Replace the documents of the table.
+
+        The tags are kept, with their hidden columns.
+
+        :param scans: list of the document names
+        """
+
+        if self.scans:
+            self.beginRemoveRows(QModelIndex(), 0, len(self.scans) - 1)
+            self.scans = []
+            self.rows = {}
+            self.endRemoveRows()
+        self.edits.clear()
+        self.blocks.clear()
+        self.insert_scans(list(scans))
+
+    def set_tags(self, tags):
+        """Replace the tags of the table.
+
+        The documents are kept, with their hidden rows.
+
+        :param tags: list of the tag names
+        """
+
+        if self.tags:
+            self.beginRemoveColumns(QModelIndex(), 0, len(self.tags) - 1)
+            self.tags = []
+            self.columns = {}
+            self.endRemoveColumns()
+        self.blocks.clear()
+        self.update_fields()
+        if tags:
+            self.beginInsertColumns(QModelIndex(), 0, len(tags) - 1)
+            self.tags = list(tags)
+            self._index_columns()
+            self.endInsertColumns()
+
+    def setData(self, index, value, role=Qt.EditRole):
+        """Set the data of a cell edited in the table.
+
+        The value is kept until the document is refreshed, the table
+        writing it in the database (see TableDataBrowser.change_cell_color).
+
+        :param index: index of the cell
+        :param value: new value
+        :param role: role (only Qt.EditRole is handled)
+        :return: True if the data has been set
+        """
+
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+
+        self.edits[(self.scans[index.row()],
+                    self.tags[index.column()])] = value
+        self.dataChanged.emit(index, index)
+        self.cellEdited.emit(index.row(), index.column())
+        return True
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sort the documents by the values of a tag.
+
+        The cells are compared as their display data, as in the Qt item
+        models: the numbers by value, the other data as strings. The sort
+        is stable.
+
+        :param column: index of the column
+        :param order: Qt.AscendingOrder or Qt.DescendingOrder
+        """
+
+        if column < 0 or column >= len(self.tags) or not self.scans:
+            return
+
+        tag = self.tags[column]
+        if column == 0 or tag == TAG_BRICKS:
+            keys = [self.data(self.index(row, column))
+                    for row in range(len(self.scans))]
+        else:
+            # The values of the tag are read at once
+            values = self.table.project.session.get_values(
+                COLLECTION_CURRENT, self.scans, [tag])
+            keys = []
+            for scan in self.scans:
+                value = values.get(scan, tag)
+                if (scan, tag) in self.edits:
+                    keys.append(self.edits[(scan, tag)])
+                elif value is None:
+                    keys.append(not_defined_value)
+                else:
+                    keys.append(item_data(value, values.types[tag]))
+
+        kinds = set(_sort_kind(key) for key in keys)
+        if max(kinds) <= 1:
+            keys = [float(key) for key in keys]
+        elif kinds == {2}:
+            keys = [locale.strxfrm(display_text(key)) for key in keys]
+        else:
+            keys = [cmp_to_key(_compare)(key) for key in keys]
+
+        rows = sorted(range(len(self.scans)), key=keys.__getitem__,
+                      reverse=order == Qt.DescendingOrder)
+        self.set_order([self.scans[row] for row in rows])
+
+    def update_fields(self):
+        """Read the definitions of the tags of the current collection
+        again."""
+
+        self.fields = {
+            field.field_name: field for field in
+            self.table.project.session.get_fields(COLLECTION_CURRENT)}
+
+    def value(self, row, tag):
+        """Give the value of a cell in the database, reading the block of
+        its row if it is not kept by the model.
+
+        :param row: row of the document
+        :param tag: tag name
+        :return: tuple (value, type of the tag)
+        """
+
+        block_number = row // BLOCK_SIZE
+        block = self.blocks.get(block_number)
+        if block is None:
+            first = block_number * BLOCK_SIZE
+            block = self.table.project.session.get_values(
+                COLLECTION_CURRENT, self.scans[first:first + BLOCK_SIZE],
+                self.tags[1:])
+            self.blocks[block_number] = block
+            if len(self.blocks) > MAX_BLOCKS:
+                self.blocks.popitem(last=False)
+        else:
+            self.blocks.move_to_end(block_number)
+        return block.get(self.scans[row], tag), block.types.get(tag)
+
+    def _index_columns(self, first=0):
+        """Update the columns of the tags, from a column.
+
+        :param first: index of the first column that has changed
+        """
+
+        for column in range(first, len(self.tags)):
+            self.columns[self.tags[column]] = column
+
+    def _index_rows(self, first=0):
+        """Update the rows of the documents, from a row.
+
+        :param first: index of the first row that has changed
+        """
+
+        for row in range(first, len(self.scans)):
+            self.rows[self.scans[row]] = row
+
+
+class HeaderItem:
+    """Header of a column of the data browser table, with the interface of
+    the QTableWidgetItem used by the callers of the table.
+
+    :param table: TableDataBrowser
+    :param column: index of the column
+
+    .. Methods:
+        - text: gives the name of the tag
+        - toolTip: gives the definition of the tag
+    """
+
+    def __init__(self, table, column):
+        """Initialization of the HeaderItem class.
+
+        :param table: TableDataBrowser
+        :param column: index of the column
+        """
+
+        self.table = table
+        self.column = column
+
+    def text(self):
+        """Give the name of the tag of the column.
+
+        :return: the tag name
+        """
+
+        return self.table.data_model.headerData(self.column, Qt.Horizontal)
+
+    def toolTip(self):
+        """Give the definition of the tag of the column.
+
+        :return: the description, the unit and the type of the tag
+        """
+
+        return self.table.data_model.headerData(self.column, Qt.Horizontal,
+                                                Qt.ToolTipRole) or ""
+
+
+class TableItem:
+    """Cell of the data browser table, with the interface of the
+    QTableWidgetItem used by the callers of the table. The data is read from
+    and written to the model.
+
+    :param table: TableDataBrowser
+    :param row: row of the cell
+    :param column: column of the cell
+
+    .. Methods:
+        - column: gives the column of the cell
+        - data: gives the data of the cell for a role
+        - font: gives the font of the cell
+        - index: gives the model index of the cell
+        - isSelected: tells if the cell is selected
+        - row: gives the row of the cell
+        - setData: sets the data of the cell, as edited in the table
+        - setSelected: selects or deselects the cell
+        - setText: sets the text of the cell, as edited in the table
+        - text: gives the text of the cell
+    """
+
+    def __init__(self, table, row, column):
+        """Initialization of the TableItem class.
+
+        :param table: TableDataBrowser
+        :param row: row of the cell
+        :param column: column of the cell
+        """
+
+        self.table = table
+        self._row = row
+        self._column = column
+
+    def column(self):
+        """Give the column of the cell.
+
+        :return: the column index
+        """
+
+        return self._column
+
+    def data(self, role):
+        """Give the data of the cell for a role.
+
+        :param role: role
+        :return: the data
+        """
+
+        if role == Qt.BackgroundRole:
+            return self.table.background(self.index())
+        return self.table.data_model.data(self.index(), role)
+
+    def font(self):
+        """Give the font of the cell.
+
+        :return: QFont
+        """
+
+        return QFont(self.data(Qt.FontRole) or QFont())
+
+    def index(self):
+        """Give the model index of the cell.
+
+        :return: QModelIndex
+        """
+
+        return self.table.data_model.index(self._row, self._column)
+
+    def isSelected(self):
+        """Tell if the cell is selected.
+
+        :return: boolean
+        """
+
+        return self.table.selectionModel().isSelected(self.index())
+
+    def row(self):
+        """Give the row of the cell.
+
+        :return: the row index
+        """
+
+        return self._row
+
+    def setData(self, role, value):
+        """Set the data of the cell, as edited in the table.
+
+        :param role: role (only Qt.EditRole is handled)
+        :param value: new value
+        """
+
+        self.table.data_model.setData(self.index(), value, role)
+
+    def setSelected(self, select):
+        """Select or deselect the cell.
+
+        :param select: True to select the cell
+        """
+
+        self.table.selectionModel().select(
+            self.index(), QItemSelectionModel.Select if select else
+            QItemSelectionModel.Deselect)
+
+    def setText(self, text):
+        """Set the text of the cell, as edited in the table.
+
+        :param text: new text
+        """
+
+        self.setData(Qt.EditRole, text)
+
+    def text(self):
+        """Give the text of the cell.
+
+        :return: str
+        """
+
+        return display_text(self.data(Qt.DisplayRole))
+
+
+
+class ZebraDelegate(QItemDelegate):
+    """Delegate of the cells of the data browser table, painting their
+    background with the colors given by the model, alternately for the
+    visible rows.
+
+    The rank of a row among the visible rows is given by the table (see
+    TableDataBrowser.background).
+
+    .. Methods:
+        - paint: paints a cell
+    """
+
+    def paint(self, painter, option, index):
+        """Paint a cell, over its background.
+
+        :param painter: QPainter
+        :param option: QStyleOptionViewItem of the cell
+        :param index: index of the cell
+        """
+
+        if not option.state & QStyle.State_Selected:
+            color = self.parent().background(index)
+            if color is not None:
+                painter.fillRect(option.rect, color)
+        super().paint(painter, option, index)
+
+
+def display_text(data):
+    """Give the text of the data of a cell, as converted by Qt.
+
+    :param data: data of the cell (see DataBrowserModel.data)
+    :return: str
+    """
+
+    if data is None:
+        return ""
+    if isinstance(data, bool):
+        return "true" if data else "false"
+    if isinstance(data, float):
+        text = repr(data)
+        return text[:-2] if text.endswith(".0") else text
+    if isinstance(data, (QDateTime, QTime)):
+        return data.toString(Qt.ISODateWithMs)
+    if isinstance(data, QDate):
+        return data.toString(Qt.ISODate)
+    return str(data)
+
+
+def _compare(data, other):
+    """Compare the data of two cells, as the Qt item models.
+
+    :param data: data of a cell
+    :param other: data of another cell
+    :return: a negative number, zero or a positive number
+    """
+
+    if max(_sort_kind(data), _sort_kind(other)) <= 1:
+        return (data > other) - (data < other)
+    return locale.strcoll(display_text(data), display_text(other))
+
+
+def _sort_kind(data):
+    """Give how the data of a cell is compared.
+
+    :param data: data of a cell
+    :return: 0 for an integer, 1 for a float, 2 for the data compared as
+       strings
+    """
+
+    if isinstance(data, (bool, int)):
+        return 0
+    if isinstance(data, float):
+        return 1
+    return 2
@@ -28,7 +28,7 @@ import yaml
 
 # PyQt5 imports
 from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import QCoreApplication
+from PyQt5.QtCore import Qt, QCoreApplication
 from PyQt5.QtWidgets import (QWidget, QTabWidget, QVBoxLayout, QAction,
                              QMainWindow, QMessageBox, QMenu,
                              QPushButton, QApplication, QLabel)
@@ -42,6 +42,9 @@ from populse_mia.user_interface.pipeline_manager.pipeline_manager_tab import (
 from populse_mia.user_interface.pipeline_manager.process_library import (
     InstallProcesses, PackageLibraryDialog)
 import populse_mia.data_manager.data_loader as data_loader
+from populse_mia.data_manager.database_mia import (copy_database,
+                                                   remove_database)
+from populse_mia.data_manager.index_advisor import IndexAdvisor
 from populse_mia.data_manager.project import Project, COLLECTION_CURRENT
 from populse_mia.user_interface.pop_ups import (PopUpDeletedProject,
                                                 PopUpNewProject,
@@ -50,7 +53,8 @@ from populse_mia.user_interface.pop_ups import (PopUpDeletedProject,
                                                 PopUpProperties,
                                                 PopUpSaveProjectAs,
                                                 PopUpQuit,
-                                                PopUpSeeAllProjects)
+                                                PopUpSeeAllProjects,
+                                                PopUpVerifyScans)
 
 
 class MainWindow(QMainWindow):
@@ -75,6 +79,8 @@ class MainWindow(QMainWindow):
         - install_processes_pop_up: open the install processes pop-up
         - open_project_pop_up: open a pop-up to open a project and updates
           the recent projects
+        - optimize_database: index the tags filtered the most in the
+          project's database
         - open_recent_project: open a recent project
         - package_library_pop_up: open the package library pop-up
         - project_properties_pop_up: open the project properties pop-up
@@ -88,6 +94,8 @@ class MainWindow(QMainWindow):
         - saveChoice: checks if the project needs to be saved as or just saved
         - see_all_projects: open a pop-up to show the recent projects
         - software_preferences_pop_up: open the MIA2 preferences pop-up
+        - start_verification: check the project's scans in the background
+        - stop_verification: stop the background verification of the scans
         - switch_project: switches project if it's possible
         - tab_changed: method called when the tab is changed
         - undo: undoes the last action made by the user
@@ -96,6 +104,8 @@ class MainWindow(QMainWindow):
         - update_project: update the project once the database has been
           updated
         - update_recent_projects_actions: update the list of recent projects
+        - verify_scans: hash all the scans of the project in the background
+          to check if they have been modified
 
     """
 
@@ -135,6 +145,10 @@ class MainWindow(QMainWindow):
 
         self.saved_projects_actions = []
 
+        # Background verification of the project's scans
+        self.verify_worker = None
+        self.pop_up_verify_scans = None
+
         # Define main window view
         self.create_view_window()
 
@@ -181,6 +195,9 @@ class MainWindow(QMainWindow):
         self.action_credits = QAction('Credits', self)
         self.action_install_processes_folder = QAction('From folder', self)
         self.action_install_processes_zip = QAction('From zip file', self)
+        self.action_verify_scans = QAction('Verify all the scans', self)
+        self.action_optimize_database = QAction('Optimize project database',
+                                                self)
 
         # Connect actions & menus views
         self.create_view_actions()
@@ -206,6 +223,9 @@ class MainWindow(QMainWindow):
         :return: Boolean. True if there are unsaved modifications,
            False otherwise
         """
+        # The pending auto-save is not considered as unsaved modifications
+        self.project.auto_save.flush()
+
         if self.project.isTempProject:
             if len(self.project.session.get_documents_names(
                     COLLECTION_CURRENT)) > 0:
@@ -234,6 +254,8 @@ class MainWindow(QMainWindow):
             can_exit = self.pop_up_close.can_exit()
 
         if can_exit:
+            self.stop_verification()
+
             if self.pipeline_manager.init_clicked:
                 self.project.unsaveModifications()
                 for brick in self.pipeline_manager.brick_list:
@@ -308,11 +330,16 @@ class MainWindow(QMainWindow):
                                 self.install_processes_pop_up(folder=True))
         self.action_install_processes_zip.triggered.connect(lambda:
                                 self.install_processes_pop_up(folder=False))
+        self.action_verify_scans.triggered.connect(self.verify_scans)
+        self.action_optimize_database.triggered.connect(
+            self.optimize_database)
 
     def create_view_menus(self):
         """Create the menu-bar view."""
 
         self.menu_more.addMenu(self.menu_install_process)
+        self.menu_more.addAction(self.action_verify_scans)
+        self.menu_more.addAction(self.action_optimize_database)
 
         # Actions in the "File" menu
         self.menu_file.addAction(self.action_create)
@@ -492,23 +519,33 @@ class MainWindow(QMainWindow):
         # Opens the conversion software to convert the MRI files in Nifti/Json
         config = Config()
         home = expanduser("~")
-        code_exit = subprocess.call(['java', '-Xmx4096M', '-jar',
-                                      config.get_mri_conv_path(),
-                                     '[ProjectsDir] '+ home,
-                                     '[ExportNifti] ' + os.path.join(
-                                         self.project.folder, 'data',
-                                         'raw_data'),
-                                     '[ExportToMIA] PatientName-StudyName-'
-                                     'CreationDate-SeqNumber-Protocol-'
-                                     'SequenceName-AcquisitionTime',
-                                     'CloseAfterExport'])
-        
+        command = ['java', '-Xmx4096M', '-jar',
+                   config.get_mri_conv_path(),
+                   '[ProjectsDir] '+ home,
+                   '[ExportNifti] ' + os.path.join(
+                       self.project.folder, 'data',
+                       'raw_data'),
+                   '[ExportToMIA] PatientName-StudyName-'
+                   'CreationDate-SeqNumber-Protocol-'
+                   'SequenceName-AcquisitionTime',
+                   'CloseAfterExport']
+
         # 'NoLogExport'if we don't want log export
 
-        if code_exit == 0:
+        if config.get_import_streaming():
+            # The scans are imported while mri_conv is converting them
+            code_exit, new_scans = data_loader.read_streaming(
+                self.project, self, command)
+
+        else:
+            code_exit = subprocess.call(command)
+            new_scans = None
+
+        if code_exit == 0 or new_scans:
 
-            # Database filled
-            new_scans = data_loader.read_log(self.project, self)
+            if new_scans is None:
+                # Database filled
+                new_scans = data_loader.read_log(self.project, self)
 
             # Table updated
             documents = self.project.session.get_documents_names(
@@ -522,9 +559,10 @@ class MainWindow(QMainWindow):
             self.data_browser.frame_advanced_search.setHidden(True)
             self.data_browser.advanced_search.rows = []
 
-        elif code_exit == 100: # User only close mri_conv and do nothing
+        if code_exit in (0, 100):
+            # Export done, or user only close mri_conv and do nothing
             pass
-        
+
         else:
             print(
                 "\nmri_conv, did not work properly. Current absolute path to "
@@ -609,6 +647,51 @@ class MainWindow(QMainWindow):
                 self.switch_project(relative_path, name)
                 # We switch the project
 
+    def optimize_database(self):
+        """Index the tags filtered the most in the project's database, and
+        drop the indexes of the tags that are not filtered any more."""
+
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        # Every tag filtered since the creation of the project is a
+        # candidate, as the user asked for it. The advisor uses the
+        # SQLAlchemy session: it is run by the thread writing the database
+        advisor = IndexAdvisor(self.project.session, self.project.query_log,
+                               min_hits=1)
+        (events,) = self.project.session.run_commands(
+            [(advisor.optimize, ())])
+        QApplication.restoreOverrideCursor()
+
+        msg = QMessageBox()
+        msg.setIcon(QMessageBox.Information)
+        msg.setWindowTitle("Optimize project database")
+
+        if events:
+            # The indexes are written when the project is saved
+            self.project.unsavedModifications = True
+            str_msg = ""
+            for event in events:
+                if event["created"]:
+                    str_msg += "Indexed tags: {0}\n".format(
+                        ", ".join(event["created"]))
+                if event["dropped"]:
+                    str_msg += "Tags not indexed any more: {0}\n".format(
+                        ", ".join(event["dropped"]))
+                str_msg += ("Last {0} searches: {1:.3f} s before, "
+                            "{2:.3f} s after\n\n".format(
+                                event["filters"], event["duration_before"],
+                                event["duration_after"]))
+            msg.setText("The indexes of the database have been updated, "
+                        "they will be kept when the project is saved.")
+            msg.setInformativeText(str_msg)
+
+        else:
+            msg.setText("The indexes of the database are already adapted to "
+                        "the searches of the project.")
+
+        msg.setStandardButtons(QMessageBox.Ok)
+        msg.buttonClicked.connect(msg.close)
+        msg.exec()
+
     def package_library_pop_up(self):
         """Open the package library pop-up"""
 
@@ -650,7 +733,7 @@ class MainWindow(QMainWindow):
 
         # If it's unnamed project, we can remove the whole project
         if self.project.isTempProject:
-            self.project.database.__exit__(None, None, None)
+            self.project.close()
             shutil.rmtree(self.project.folder)
         else:
             for filename in glob.glob(
@@ -694,7 +777,7 @@ class MainWindow(QMainWindow):
                             "data", "downloaded_data", scan))
                         is None and "logExport" not in scan):
                     os.remove(filename)
-            self.project.database.__exit__(None, None, None)
+            self.project.close()
 
     def save(self):
         """Save either the current project or the current pipeline"""
@@ -784,14 +867,18 @@ class MainWindow(QMainWindow):
                         os.path.relpath(filters_path)))
 
             # First we register the Database before commiting the last
-            # pending modifications
-            shutil.copy(os.path.join(os.path.relpath(old_folder),
-                                     'database', 'mia.db'),
-                        os.path.join(os.path.relpath(old_folder),
-                                     'database', 'mia_before_commit.db'))
-
-            # We commit the last pending modifications
+            # pending modifications (the write-ahead log can not be written
+            # in the database file during the pending transaction, it is
+            # copied with it)
+            copy_database(os.path.join(os.path.relpath(old_folder),
+                                       'database', 'mia.db'),
+                          os.path.join(os.path.relpath(old_folder),
+                                       'database', 'mia_before_commit.db'))
+
+            # We commit the last pending modifications, and write them in
+            # the database file
             self.project.saveModifications()
+            self.project.session.checkpoint()
 
             os.mkdir(properties_path)
             shutil.copy(os.path.join(os.path.relpath(old_folder),
@@ -801,24 +888,25 @@ class MainWindow(QMainWindow):
             # We copy the Database with all the modifications commited in
             # the new project
             os.mkdir(os.path.relpath(database_path))
-            shutil.copy(os.path.join(os.path.relpath(old_folder),
-                                     'database', 'mia.db'),
-                        os.path.relpath(database_path))
+            copy_database(os.path.join(os.path.relpath(old_folder),
+                                       'database', 'mia.db'),
+                          os.path.join(os.path.relpath(database_path),
+                                       'mia.db'))
 
             # We remove the Database with all the modifications saved in
             # the old project
-            os.remove(os.path.join(
+            remove_database(os.path.join(
                 os.path.relpath(old_folder), 'database', 'mia.db'))
 
             # We reput the Database without the last modifications
             # in the old project
-            shutil.copy(os.path.join(os.path.relpath(old_folder), 'database',
-                                     'mia_before_commit.db'),
-                        os.path.join(os.path.relpath(old_folder), 'database',
-                                     'mia.db'))
+            copy_database(os.path.join(os.path.relpath(old_folder),
+                                       'database', 'mia_before_commit.db'),
+                          os.path.join(os.path.relpath(old_folder),
+                                       'database', 'mia.db'))
 
-            os.remove(os.path.join(os.path.relpath(old_folder), 'database',
-                                   'mia_before_commit.db'))
+            remove_database(os.path.join(os.path.relpath(old_folder),
+                                         'database', 'mia_before_commit.db'))
 
             self.remove_raw_files_useless()
             # We remove the useless files from the old project
@@ -886,6 +974,33 @@ class MainWindow(QMainWindow):
         # self.pop_up_preferences.signal_preferences_change.connect(
         #     self.update_package_library_action)
 
+    def start_verification(self, deep=False):
+        """Check the project's scans in the background.
+
+        The modified or removed scans are listed in a non-modal pop-up as
+        they are found.
+
+        :param deep: True to hash all the scans, whatever their stat
+        """
+
+        self.stop_verification()
+        self.verify_worker = data_loader.VerifyWorker(self.project, deep)
+        self.pop_up_verify_scans = PopUpVerifyScans(self.verify_worker)
+        self.verify_worker.start()
+
+    def stop_verification(self):
+        """Stop the background verification of the scans, if any, and close
+        its pop-up."""
+
+        if self.verify_worker is not None:
+            self.verify_worker.cancel()
+            self.verify_worker.wait()
+            self.verify_worker = None
+
+        if self.pop_up_verify_scans is not None:
+            self.pop_up_verify_scans.close()
+            self.pop_up_verify_scans = None
+
     def switch_project(self, file_path, name):
         """Check if it's possible to open the selected project
         and quit the current one.
@@ -936,7 +1051,6 @@ class MainWindow(QMainWindow):
                             yaml.dump(properties, stream,
                                       default_flow_style=False,
                                       allow_unicode=True)
-                    # We check for invalid scans in the project
                     try:
                         temp_database = Project(file_path, False)
                     except IOError:
@@ -952,24 +1066,6 @@ class MainWindow(QMainWindow):
                         msg.buttonClicked.connect(msg.close)
                         msg.exec()
                         return False
-                    problem_list = data_loader.verify_scans(temp_database)
-
-                    # Message if invalid files
-                    if problem_list:
-                        str_msg = ""
-                        for element in problem_list:
-                            str_msg += element + "\n\n"
-                        msg = QMessageBox()
-                        msg.setIcon(QMessageBox.Warning)
-                        msg.setText(
-                            "These files have been modified or removed since "
-                            "they have been converted for the first time:")
-                        msg.setInformativeText(str_msg)
-                        msg.setWindowTitle("Warning")
-                        msg.setStandardButtons(QMessageBox.Ok)
-                        msg.buttonClicked.connect(msg.close)
-                        msg.exec()
-
                     self.project.session.unsave_modifications()
                     self.remove_raw_files_useless()
                     # We remove the useless files from the old project
@@ -985,6 +1081,10 @@ class MainWindow(QMainWindow):
                     self.update_project(file_path)
                     # project updated everywhere
 
+                    # We check for invalid scans in the project, while the
+                    # project can already be used
+                    self.start_verification()
+
                     return True
 
                 # Not a MIA project
@@ -1155,3 +1255,14 @@ class MainWindow(QMainWindow):
                     self.saved_projects_list[i])
                 self.saved_projects_actions[i].setVisible(True)
 
+    def verify_scans(self):
+        """Hash all the scans of the project in the background, whatever
+        their stat, to check if they have been modified since they have been
+        converted.
+
+        The pop-up of the verification is shown at once, and tells at its
+        end if no scan has been modified or removed.
+        """
+
+        self.start_verification(deep=True)
+        self.pop_up_verify_scans.show()
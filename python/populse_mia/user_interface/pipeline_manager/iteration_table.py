@@ -28,7 +28,7 @@ from PyQt5.QtWidgets import QTableWidgetItem, QPushButton, QVBoxLayout, \
 from populse_mia.user_interface.pipeline_manager.process_mia import ProcessMIA
 from populse_mia.user_interface.pop_ups import \
     PopUpSelectTagCountTable
-from populse_mia.data_manager.project import COLLECTION_CURRENT, TAG_FILENAME
+from populse_mia.data_manager.project import COLLECTION_CURRENT
 from populse_mia.utils.tools import ClickableLabel
 from populse_mia.software_properties import Config
 
@@ -180,10 +180,8 @@ class IterationTable(QWidget):
         """
         tag_name = self.push_buttons[idx].text()
         values = []
-        for scan in self.project.session.get_documents_names(
-                COLLECTION_CURRENT):
-            current_value = self.project.session.get_value(COLLECTION_CURRENT,
-                                                           scan, tag_name)
+        for current_value in self.project.session.get_values(
+                COLLECTION_CURRENT, None, [tag_name]).columns[tag_name]:
             if current_value is not None:
                 values.append(current_value)
 
@@ -301,9 +299,8 @@ class IterationTable(QWidget):
         scans_names = list(set(scans_names).intersection(self.scan_list))
         # tag_values_list contains all the values that can take iterated tag
         self.tag_values_list = []
-        for scan_name in scans_names:
-            tag_value = self.project.session.get_value(COLLECTION_CURRENT,
-                                                       scan_name, tag_name)
+        for tag_value in self.project.session.get_values(
+                COLLECTION_CURRENT, scans_names, [tag_name]).columns[tag_name]:
             if str(tag_value) not in self.tag_values_list:
                 self.tag_values_list.append(str(tag_value))
 
@@ -342,27 +339,23 @@ class IterationTable(QWidget):
         # Searching the database scans that correspond to iterated tag value
         filter_query = "({" + self.iterated_tag + "} " + "==" + " \"" + \
                        self.combo_box.currentText() + "\")"
-        scans_list = self.project.session.filter_documents(COLLECTION_CURRENT,
-                                                           filter_query)
-        scans_res = [getattr(document, TAG_FILENAME)
-                     for document in scans_list]
-
-        # Taking the intersection between the found database scans and the
-        # user selection in the data_browser
-        self.iteration_scans = list(
-            set(scans_res).intersection(self.scan_list))
+        # Only among the user selection in the data_browser
+        self.iteration_scans = self.project.session.filter_documents_names(
+            COLLECTION_CURRENT, filter_query, self.scan_list)
         self.iteration_table.setRowCount(len(self.iteration_scans))
 
         # Filling the table cells
+        tag_names = [push_button.text() for push_button in self.push_buttons]
+        values = self.project.session.get_values(
+            COLLECTION_CURRENT, self.iteration_scans, tag_names)
         row = -1
         for scan_name in self.iteration_scans:
             row += 1
             for idx in range(len(self.push_buttons)):
-                tag_name = self.push_buttons[idx].text()
+                tag_name = tag_names[idx]
 
                 item = QTableWidgetItem()
-                item.setText(str(self.project.session.get_value(
-                    COLLECTION_CURRENT, scan_name, tag_name)))
+                item.setText(str(values.get(scan_name, tag_name)))
                 self.iteration_table.setItem(row, idx, item)
 
         # This will change the scans list in the current Pipeline Manager tab
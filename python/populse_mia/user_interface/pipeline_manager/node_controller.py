@@ -228,19 +228,16 @@ class FilterWidget(QWidget):
         else:
             # Scans with at least a not defined value
             if str_search == not_defined_value:
-                filter = self.prepare_not_defined_filter(
+                filter = self.rapid_search.prepare_not_defined_filter(
                     self.project.session.get_shown_tags())
+                return_list = self.project.session.filter_documents_names(
+                    COLLECTION_CURRENT, filter,
+                    self.table_data.scans_to_search)
             # Scans matching the search
             else:
-                filter = self.rapid_search.prepare_filter(
-                    str_search, self.project.session.get_shown_tags(),
-                    old_scan_list)
-
-            generator = self.project.session.filter_documents(
-                COLLECTION_CURRENT, filter)
-
-            # Creating the list of scans
-            return_list = [getattr(scan, TAG_FILENAME) for scan in generator]
+                return_list = self.rapid_search.search_scans(
+                    self.project, str_search,
+                    self.project.session.get_shown_tags(), old_scan_list)
 
         self.table_data.scans_to_visualize = return_list
         self.advanced_search.scans_list = return_list
@@ -929,21 +926,19 @@ class PlugFilter(QWidget):
         else:
             # Scans with at least a not defined value
             if str_search == not_defined_value:
-                filter = self.prepare_not_defined_filter(
+                filter = self.rapid_search.prepare_not_defined_filter(
                     self.project.session.get_shown_tags())
+                return_list = self.project.session.filter_documents_names(
+                    COLLECTION_CURRENT, filter,
+                    self.table_data.scans_to_search)
 
             # Scans matching the search
             else:
-                filter = self.rapid_search.prepare_filter(
-                    str_search, self.project.session.get_shown_tags(),
+                return_list = self.rapid_search.search_scans(
+                    self.project, str_search,
+                    self.project.session.get_shown_tags(),
                     self.table_data.scans_to_search)
 
-            generator = self.project.session.filter_documents(
-                COLLECTION_CURRENT, filter)
-
-            # Creating the list of scans
-            return_list = [getattr(scan, TAG_FILENAME) for scan in generator]
-
         self.table_data.scans_to_visualize = return_list
         self.advanced_search.scans_list = return_list
 
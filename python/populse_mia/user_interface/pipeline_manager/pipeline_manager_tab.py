@@ -262,7 +262,10 @@ class PipelineManagerTab(QWidget):
             open(p_value, 'a').close()
         except IOError:
             raise IOError('Could not open {0} file.'.format(p_value))
-        else:
+
+        # The values are written with the ones of the other outputs, at the
+        # end of the initialization of the pipeline
+        with self.project.unit_of_work() as unit:
             # Deleting the project's folder in the file name so it can
             # fit to the database's syntax
             old_value = p_value
@@ -274,43 +277,34 @@ class PipelineManagerTab(QWidget):
             # If the file name is already in the database,
             # no exception is raised
             # but the user is warned
-            if self.project.session.get_document(COLLECTION_CURRENT, p_value):
+            if unit.get_document(COLLECTION_CURRENT, p_value):
                 print("Path {0} already in database.".format(p_value))
             else:
-                self.project.session.add_document(COLLECTION_CURRENT, p_value)
-                self.project.session.add_document(COLLECTION_INITIAL, p_value)
+                unit.add_document(COLLECTION_CURRENT, p_value)
+                unit.add_document(COLLECTION_INITIAL, p_value)
 
             # Adding the new brick to the output files
-            bricks = self.project.session.get_value(
-                COLLECTION_CURRENT, p_value, TAG_BRICKS)
+            bricks = unit.get_value(COLLECTION_CURRENT, p_value, TAG_BRICKS)
             if bricks is None:
                 bricks = []
             bricks.append(self.brick_id)
-            self.project.session.set_value(
-                COLLECTION_CURRENT, p_value, TAG_BRICKS, bricks)
-            self.project.session.set_value(
-                COLLECTION_INITIAL, p_value, TAG_BRICKS, bricks)
+            unit.set_value(COLLECTION_CURRENT, p_value, TAG_BRICKS, bricks)
+            unit.set_value(COLLECTION_INITIAL, p_value, TAG_BRICKS, bricks)
             # Type tag
             filename, file_extension = os.path.splitext(p_value)
             if file_extension == ".nii":
-                self.project.session.set_value(
-                    COLLECTION_CURRENT, p_value, TAG_TYPE, TYPE_NII)
-                self.project.session.set_value(
-                    COLLECTION_INITIAL, p_value, TAG_TYPE, TYPE_NII)
+                unit.set_value(COLLECTION_CURRENT, p_value, TAG_TYPE, TYPE_NII)
+                unit.set_value(COLLECTION_INITIAL, p_value, TAG_TYPE, TYPE_NII)
             elif file_extension == ".mat":
-                self.project.session.set_value(
-                    COLLECTION_CURRENT, p_value, TAG_TYPE, TYPE_MAT)
-                self.project.session.set_value(
-                    COLLECTION_INITIAL, p_value, TAG_TYPE, TYPE_MAT)
+                unit.set_value(COLLECTION_CURRENT, p_value, TAG_TYPE, TYPE_MAT)
+                unit.set_value(COLLECTION_INITIAL, p_value, TAG_TYPE, TYPE_MAT)
             elif file_extension == ".txt":
-                self.project.session.set_value(
-                    COLLECTION_CURRENT, p_value, TAG_TYPE, TYPE_TXT)
-                self.project.session.set_value(
-                    COLLECTION_INITIAL, p_value, TAG_TYPE, TYPE_TXT)
+                unit.set_value(COLLECTION_CURRENT, p_value, TAG_TYPE, TYPE_TXT)
+                unit.set_value(COLLECTION_INITIAL, p_value, TAG_TYPE, TYPE_TXT)
             else:
-                self.project.session.set_value(
+                unit.set_value(
                     COLLECTION_CURRENT, p_value, TAG_TYPE, TYPE_UNKNOWN)
-                self.project.session.set_value(
+                unit.set_value(
                     COLLECTION_INITIAL, p_value, TAG_TYPE, TYPE_UNKNOWN)
 
             inputs = self.inputs
@@ -372,8 +366,7 @@ class PipelineManagerTab(QWidget):
             if self.inheritance_dict:
                 database_parent_file = None
                 parent_file = self.inheritance_dict[old_value]
-                for scan in self.project.session.get_documents_names(
-                        COLLECTION_CURRENT):
+                for scan in unit.get_documents_names(COLLECTION_CURRENT):
                     if scan in str(parent_file):
                         database_parent_file = scan
                 banished_tags = [TAG_TYPE, TAG_EXP_TYPE, TAG_BRICKS,
@@ -382,19 +375,17 @@ class PipelineManagerTab(QWidget):
                         COLLECTION_CURRENT):
                     if tag not in banished_tags and database_parent_file is \
                             not None:
-                        parent_current_value = self.project.session.get_value(
+                        parent_current_value = unit.get_value(
                             COLLECTION_CURRENT, database_parent_file, tag)
-                        self.project.session.set_value(
+                        unit.set_value(
                             COLLECTION_CURRENT, p_value, tag,
                             parent_current_value)
-                        parent_initial_value = self.project.session.get_value(
+                        parent_initial_value = unit.get_value(
                             COLLECTION_INITIAL, database_parent_file, tag)
-                        self.project.session.set_value(
+                        unit.set_value(
                             COLLECTION_INITIAL, p_value, tag,
                             parent_initial_value)
 
-            self.project.saveModifications()
-
     def add_process_to_preview(self, class_process, node_name=None):
         """Add a process to the pipeline.
 
@@ -736,16 +727,12 @@ class PipelineManagerTab(QWidget):
             # Adding the brick to the bricks history
             self.brick_id = str(uuid.uuid4())
             self.brick_list.append(self.brick_id)
-            self.project.session.add_document(COLLECTION_BRICK,
-                                              self.brick_id)
-            self.project.session.set_value(
-                COLLECTION_BRICK, self.brick_id, BRICK_NAME, node_name)
-            self.project.session.set_value(
-                COLLECTION_BRICK, self.brick_id, BRICK_INIT_TIME,
-                datetime.datetime.now())
-            self.project.session.set_value(
-                COLLECTION_BRICK, self.brick_id, BRICK_INIT, "Not Done")
-            self.project.saveModifications()
+            with self.project.unit_of_work() as unit:
+                unit.add_document(COLLECTION_BRICK, self.brick_id)
+                unit.set_values(COLLECTION_BRICK, self.brick_id,
+                                {BRICK_NAME: node_name,
+                                 BRICK_INIT_TIME: datetime.datetime.now(),
+                                 BRICK_INIT: "Not Done"})
 
             process = node.process
             process_name = str(process).split('.')[0].split('_')[0][1:]
@@ -784,6 +771,12 @@ class PipelineManagerTab(QWidget):
 
             # Getting the list of the outputs of the node according
             # to its inputs
+            # The processes using the project may read the values of the
+            # outputs of the previous nodes
+            if hasattr(process, 'use_project') and process.use_project:
+                with self.project.unit_of_work() as unit:
+                    unit.flush()
+
             try:
                 self.inheritance_dict = None
                 (process_outputs,
@@ -922,11 +915,10 @@ class PipelineManagerTab(QWidget):
                 value = outputs[key]
                 if value is Undefined:
                     outputs[key] = "<undefined>"
-            self.project.saveModifications()
-            self.project.session.set_value(COLLECTION_BRICK, self.brick_id,
-                                           BRICK_INPUTS, inputs)
-            self.project.session.set_value(COLLECTION_BRICK, self.brick_id,
-                                           BRICK_OUTPUTS, outputs)
+            with self.project.unit_of_work() as unit:
+                unit.set_values(COLLECTION_BRICK, self.brick_id,
+                                {BRICK_INPUTS: inputs,
+                                 BRICK_OUTPUTS: outputs})
 
             if process_outputs:
                 for plug_name, plug_value in process_outputs.items():
@@ -983,15 +975,12 @@ class PipelineManagerTab(QWidget):
                 value = outputs[key]
                 if value is Undefined:
                     outputs[key] = "<undefined>"
-            self.project.session.set_value(COLLECTION_BRICK, self.brick_id,
-                                           BRICK_INPUTS, inputs)
-            self.project.session.set_value(COLLECTION_BRICK, self.brick_id,
-                                           BRICK_OUTPUTS, outputs)
-
             # Setting brick init state if init finished correctly
-            self.project.session.set_value(COLLECTION_BRICK, self.brick_id,
-                                           BRICK_INIT, "Done")
-            self.project.saveModifications()
+            with self.project.unit_of_work() as unit:
+                unit.set_values(COLLECTION_BRICK, self.brick_id,
+                                {BRICK_INPUTS: inputs,
+                                 BRICK_OUTPUTS: outputs,
+                                 BRICK_INIT: "Done"})
 
         # Test, if it works, comment.
         pipeline.on_trait_change(
@@ -1086,9 +1075,11 @@ class PipelineManagerTab(QWidget):
         self.ignore_node = False
         self.key = {}
         self.ignore = {}
-        self.init_pipeline() # When clicking on the Pipeline > Initialize
-                             # pipeline in the Pipeline Manager tab,
-                             # this is the first method launched.
+        # The database is written once, at the end of the initialization
+        with self.project.unit_of_work():
+            self.init_pipeline() # When clicking on the Pipeline > Initialize
+                                 # pipeline in the Pipeline Manager tab,
+                                 # this is the first method launched.
 
         # ** pathway from the self.init_pipeline() command (ex. for the
         #    User_processes Smooth brick):
@@ -1349,7 +1340,8 @@ class PipelineManagerTab(QWidget):
                         idx_combo_box)
                     self.iterationTable.update_table()
 
-                    self.init_pipeline()
+                    with self.project.unit_of_work():
+                        self.init_pipeline()
                     self.main_window.statusBar().showMessage(
                         'Pipeline "{0}" is getting run for {1} {2}. '
                         'Please wait.'.format(name, iterated_tag, tag_value))
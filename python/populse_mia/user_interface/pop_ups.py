@@ -30,6 +30,7 @@
         - PopUpSelectTag
         - PopUpSelectTagCountTable
         - PopUpShowBrick
+        - PopUpVerifyScans
         - PopUpVisualizedTags
 
 """
@@ -43,7 +44,6 @@
 ##########################################################################
 
 import ast
-import hashlib
 import os
 import shutil
 import subprocess
@@ -79,6 +79,8 @@ from populse_mia.data_manager.project import (
     TAG_TYPE, TYPE_NII, TYPE_MAT, TAG_CHECKSUM, TAG_FILENAME,
     COLLECTION_CURRENT, TYPE_UNKNOWN, TYPE_TXT)
 
+from populse_mia.data_manager.fingerprint import compute_checksum
+
 from populse_mia.software_properties import Config
 from populse_mia.user_interface.data_browser import data_browser
 
@@ -702,38 +704,26 @@ class PopUpAddPath(QDialog):
 
         elif path != "" and os.path.exists(path) and path_type != "":
 
-            # For history
-            history_maker = []
-            history_maker.append("add_scans")
-
             path = os.path.relpath(path)
             filename = os.path.basename(path)
             copy_path = os.path.join(self.project.folder, "data",
                                      "downloaded_data", filename)
             shutil.copy(path, copy_path)
-            with open(path, 'rb') as scan_file:
-                data = scan_file.read()
-                checksum = hashlib.md5(data).hexdigest()
+            checksum = compute_checksum(path,
+                                        Config().get_checksum_algorithm())
             path = os.path.join("data", "downloaded_data", filename)
-            self.project.session.add_document(COLLECTION_CURRENT, path)
-            self.project.session.add_document(COLLECTION_INITIAL, path)
+            document = {TAG_FILENAME: path, TAG_TYPE: path_type,
+                        TAG_CHECKSUM: checksum}
+            self.project.session.upsert_documents(COLLECTION_CURRENT,
+                                                  [document])
+            self.project.session.upsert_documents(COLLECTION_INITIAL,
+                                                  [document])
             values_added = []
-            self.project.session.add_value(COLLECTION_INITIAL, path, TAG_TYPE,
-                                           path_type)
-            self.project.session.add_value(COLLECTION_CURRENT, path, TAG_TYPE,
-                                           path_type)
             values_added.append([path, TAG_TYPE, path_type, path_type])
-            self.project.session.add_value(COLLECTION_INITIAL, path,
-                                           TAG_CHECKSUM, checksum)
-            self.project.session.add_value(COLLECTION_CURRENT, path,
-                                           TAG_CHECKSUM, checksum)
             values_added.append([path, TAG_CHECKSUM, checksum, checksum])
 
             # For history
-            history_maker.append([path])
-            history_maker.append(values_added)
-            self.project.undos.append(history_maker)
-            self.project.redos.clear()
+            self.project.history.record("add_scans", [path], values_added)
 
             # Databrowser updated
 
@@ -2494,7 +2484,6 @@ class PopUpProperties(QDialog):
     def ok_clicked(self):
         """Saves the modifications and updates the data browser."""
 
-        history_maker = ["modified_visibilities", self.old_tags]
         new_visibilities = []
 
         for x in range(self.tab_tags.list_widget_selected_tags.count()):
@@ -2504,10 +2493,10 @@ class PopUpProperties(QDialog):
 
         new_visibilities.append(TAG_FILENAME)
         self.project.session.set_shown_tags(new_visibilities)
-        history_maker.append(new_visibilities)
 
-        self.project.undos.append(history_maker)
-        self.project.redos.clear()
+        # For history
+        self.project.history.record("modified_visibilities",
+                                    [self.old_tags, new_visibilities], ())
 
         # Columns updated
         self.databrowser.table_data.update_visualized_columns(
@@ -3520,11 +3509,130 @@ class PopUpShowBrick(QDialog):
         self.databrowser.table_data.clearSelection()
         row_to_select = self.databrowser.table_data.get_scan_row(file)
         self.databrowser.table_data.selectRow(row_to_select)
-        item_to_scroll_to = self.databrowser.table_data.item(row_to_select, 0)
-        self.databrowser.table_data.scrollToItem(item_to_scroll_to)
+        self.databrowser.table_data.scrollTo(
+            self.databrowser.table_data.data_model.index(row_to_select, 0))
         self.close()
 
 
+class PopUpVerifyScans(QDialog):
+    """Non-modal panel listing the scans that have been modified or removed,
+    as they are found by a VerifyWorker.
+
+    The panel is shown when the first problem is found, so that nothing is
+    displayed for a valid project, unless it is shown by the caller. At the
+    end of the verification, a panel that is shown tells if no problem has
+    been found.
+
+    .. Methods:
+        - add_problem: adds a modified or missing scan to the list
+        - cancel_clicked: stops the verification
+        - set_nb_scans: sets the number of scans to check
+        - update_progress: updates the number of scans checked
+        - verification_finished: updates the panel at the end of the
+          verification
+
+    """
+
+    def __init__(self, worker):
+        """Initialization.
+
+        :param worker: VerifyWorker checking the project's scans
+
+        """
+
+        super().__init__()
+        self.worker = worker
+        self.nb_scans = 0
+        self.setWindowTitle("Warning")
+        self.setModal(False)
+
+        self.label_message = QLabel(
+            "These files have been modified or removed since they have "
+            "been converted for the first time:")
+        self.label_progress = QLabel("Reading the scans...")
+        self.list_widget_scans = QtWidgets.QListWidget(self)
+
+        self.push_button_cancel = QPushButton("Stop the verification")
+        self.push_button_cancel.clicked.connect(self.cancel_clicked)
+        self.push_button_close = QPushButton("Close")
+        self.push_button_close.clicked.connect(self.close)
+
+        hbox_buttons = QHBoxLayout()
+        hbox_buttons.addWidget(self.label_progress)
+        hbox_buttons.addStretch(1)
+        hbox_buttons.addWidget(self.push_button_cancel)
+        hbox_buttons.addWidget(self.push_button_close)
+
+        vbox_layout = QVBoxLayout()
+        vbox_layout.addWidget(self.label_message)
+        vbox_layout.addWidget(self.list_widget_scans)
+        vbox_layout.addLayout(hbox_buttons)
+        self.setLayout(vbox_layout)
+        self.setMinimumWidth(500)
+
+        self.worker.notifyProblem.connect(self.add_problem)
+        self.worker.notifyProgress.connect(self.update_progress)
+        self.worker.notifyStarted.connect(self.set_nb_scans)
+        self.worker.finished.connect(self.verification_finished)
+
+    def add_problem(self, scan, missing):
+        """Adds a modified or missing scan to the list.
+
+        :param scan: database path of the scan
+        :param missing: True if the file has been removed
+
+        """
+
+        if missing:
+            self.list_widget_scans.addItem("{0} (removed)".format(scan))
+        else:
+            self.list_widget_scans.addItem("{0} (modified)".format(scan))
+
+        if not self.isVisible():
+            self.show()
+
+    def cancel_clicked(self):
+        """Stops the verification."""
+
+        self.worker.cancel()
+        self.push_button_cancel.setEnabled(False)
+
+    def set_nb_scans(self, nb_scans):
+        """Sets the number of scans to check.
+
+        :param nb_scans: number of scans read from the database
+
+        """
+
+        self.nb_scans = nb_scans
+        self.update_progress(0)
+
+    def update_progress(self, nb_checked):
+        """Updates the number of scans checked.
+
+        :param nb_checked: number of scans checked
+
+        """
+
+        self.label_progress.setText("{0}/{1} scans checked".format(
+            nb_checked, self.nb_scans))
+
+    def verification_finished(self):
+        """Updates the panel at the end of the verification."""
+
+        self.push_button_cancel.setEnabled(False)
+
+        if self.worker.cancelled.is_set():
+            self.label_progress.setText(
+                self.label_progress.text() + " (stopped)")
+
+        elif self.list_widget_scans.count() == 0:
+            self.setWindowTitle("Verify all the scans")
+            self.label_message.setText(
+                "No file has been modified or removed since they have been "
+                "converted for the first time.")
+
+
 class PopUpVisualizedTags(QWidget):
     """
     Is called when the user wants to update the tags that are visualized.
@@ -4,6 +4,7 @@ Module that contains multiple functions used across the software.
 :Contains:
     :Functions:
         - check_value_type
+        - item_data
         - message_already_exists
         - set_filters_directory_as_default
         - set_item_data
@@ -119,44 +120,13 @@ def check_value_type(value, value_type, is_subvalue=False):
                 return False
 
 
-def message_already_exists():
-    """
-    Displays a message box to tell that a name already exists
+def item_data(value, value_type):
     """
-    msg = QMessageBox()
-    msg.setIcon(QMessageBox.Warning)
-    msg.setText("This name already exists in this parent folder")
-    msg.setWindowTitle("Warning")
-    msg.setStandardButtons(QMessageBox.Ok)
-    msg.buttonClicked.connect(msg.close)
-    msg.exec()
-
+    Gives the data of a value in the data browser (Qt.EditRole)
 
-def set_filters_directory_as_default(dialog):
-    """
-    Sets the filters directory as default (Json files)
-
-    :param dialog: current file dialog
-    """
-    if not (os.path.exists(os.path.join(
-            os.path.join(os.path.relpath(
-                os.curdir), '..', '..'), 'filters'))):
-        os.makedirs(os.path.join(
-            os.path.join(os.path.relpath(
-                os.curdir), '..', '..'), 'filters'))
-    dialog.setDirectory(
-        os.path.expanduser(os.path.join(
-            os.path.join(os.path.relpath(
-                os.curdir), '..', '..'), 'filters')))
-
-
-def set_item_data(item, value, value_type):
-    """
-    Sets the item data in the data browser
-
-    :param item: item to set
-    :param value: new item value
-    :param value_type: new value type
+    :param value: value
+    :param value_type: value type
+    :return: the data of the value, None if the type is not displayed
     """
 
     if value_type in LIST_TYPES:
@@ -177,46 +147,84 @@ def set_item_data(item, value, value_type):
             for subvalue in value:
                 new_list.append(subvalue.strftime('%H:%M:%S.%f'))
             value = new_list
-        value_prepared = str(value)
-        item.setData(Qt.EditRole, QVariant(value_prepared))
+        return str(value)
     elif value_type == FIELD_TYPE_DATETIME:
         if isinstance(value, datetime):
-            value_prepared = QDateTime(value)
+            return QDateTime(value)
         elif isinstance(value, QDateTime):
-            value_prepared = value
+            return value
         elif isinstance(value, str):
             format = "%d/%m/%Y %H:%M:%S.%f"
-            value_prepared = QDateTime(datetime.strptime(value, format))
-        item.setData(Qt.EditRole, QVariant(value_prepared))
+            return QDateTime(datetime.strptime(value, format))
     elif value_type == FIELD_TYPE_DATE:
         if isinstance(value, date):
-            value_prepared = QDate(value)
+            return QDate(value)
         elif isinstance(value, QDate):
-            value_prepared = value
+            return value
         elif isinstance(value, str):
             format = "%d/%m/%Y"
-            value_prepared = QDate(datetime.strptime(value, format).date())
-        item.setData(Qt.EditRole, QVariant(value_prepared))
+            return QDate(datetime.strptime(value, format).date())
     elif value_type == FIELD_TYPE_TIME:
         if isinstance(value, time):
-            value_prepared = QTime(value)
+            return QTime(value)
         elif isinstance(value, QTime):
-            value_prepared = value
+            return value
         elif isinstance(value, str):
             format = "%H:%M:%S.%f"
-            value_prepared = QTime(datetime.strptime(value, format).time())
-        item.setData(Qt.EditRole, QVariant(value_prepared))
+            return QTime(datetime.strptime(value, format).time())
     elif value_type == FIELD_TYPE_FLOAT:
-        value_prepared = float(value)
-        item.setData(Qt.EditRole, QVariant(value_prepared))
+        return float(value)
     elif value_type == FIELD_TYPE_INTEGER:
-        value_prepared = int(value)
-        item.setData(Qt.EditRole, QVariant(value_prepared))
+        return int(value)
     elif value_type == FIELD_TYPE_BOOLEAN:
-        value_prepared = value
-        item.setData(Qt.EditRole, QVariant(value_prepared))
+        return value
     elif value_type == FIELD_TYPE_STRING:
-        value_prepared = str(value)
+        return str(value)
+    return None
+
+
+def message_already_exists():
+    """
+    Displays a message box to tell that a name already exists
+    """
+    msg = QMessageBox()
+    msg.setIcon(QMessageBox.Warning)
+    msg.setText("This name already exists in this parent folder")
+    msg.setWindowTitle("Warning")
+    msg.setStandardButtons(QMessageBox.Ok)
+    msg.buttonClicked.connect(msg.close)
+    msg.exec()
+
+
+def set_filters_directory_as_default(dialog):
+    """
+    Sets the filters directory as default (Json files)
+
+    :param dialog: current file dialog
+    """
+    if not (os.path.exists(os.path.join(
+            os.path.join(os.path.relpath(
+                os.curdir), '..', '..'), 'filters'))):
+        os.makedirs(os.path.join(
+            os.path.join(os.path.relpath(
+                os.curdir), '..', '..'), 'filters'))
+    dialog.setDirectory(
+        os.path.expanduser(os.path.join(
+            os.path.join(os.path.relpath(
+                os.curdir), '..', '..'), 'filters')))
+
+
+def set_item_data(item, value, value_type):
+    """
+    Sets the item data in the data browser
+
+    :param item: item to set
+    :param value: new item value
+    :param value_type: new value type
+    """
+
+    value_prepared = item_data(value, value_type)
+    if value_prepared is not None:
         item.setData(Qt.EditRole, QVariant(value_prepared))
 
 